@@ -655,7 +655,7 @@ def find_command(cls):
 
     from ..tools import introspection
 
-    tables = introspection.get_arguments_tables()
+    scripts, tables = introspection.get_scripts_and_tables()
     # table_matches = introspection.find_matches_tables(script_name, tables)
 
     import inspect
@@ -18,6 +18,7 @@ definition.add_optional("output", "string", "output directory")
 
 # Add flags
 definition.add_flag("spectral_convolution", "convolve over the wavelengths to get the most accurate fluxes", True)
+definition.add_flag("use_store", "reuse (and store) the spectrally convolved frames from the filter convolution store", True)
 
 # -----------------------------------------------------------------
 
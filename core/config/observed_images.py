@@ -35,6 +35,7 @@ definition.add_flag("write_kernels", "write the prepared convolution kernels", F
 
 # Add flags
 definition.add_flag("spectral_convolution", "convolve over the wavelengths to get the most accurate images", True)
+definition.add_flag("use_store", "reuse (and store) the spectrally convolved frames from the filter convolution store", True)
 definition.add_flag("group", "group the images per instrument", False)
 
 # Number of parallel processes to use to create the images
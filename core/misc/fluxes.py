@@ -306,7 +306,8 @@ class ObservedFluxCalculator(Configurable):
             # Create the observed images from the current datacube (the frames get the correct unit, wcs, filter)
             nprocesses = 1
             frames = datacube.frames_for_filters(self.filters, convolve=self.spectral_convolution_filters,
-                                                 nprocesses=nprocesses, check_previous_sessions=True, as_dict=True)
+                                                 nprocesses=nprocesses, check_previous_sessions=True, as_dict=True,
+                                                 use_store=self.config.use_store)
 
             # Mask the images
             for fltr in frames:
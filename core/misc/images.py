@@ -1274,7 +1274,7 @@ class ObservedImageMaker(DatacubesMiscMaker):
             nprocesses = min(len(make_filters), nprocesses)
 
             # Create the observed images from the current datacube (the frames get the correct unit, wcs, filter)
-            frames = self.datacubes[instr_name].frames_for_filters(make_filters, convolve=self.spectral_convolution_filters, nprocesses=nprocesses, check_previous_sessions=True)
+            frames = self.datacubes[instr_name].frames_for_filters(make_filters, convolve=self.spectral_convolution_filters, nprocesses=nprocesses, check_previous_sessions=True, use_store=self.config.use_store)
 
             # Add the observed images to the dictionary
             for filter_name, frame in zip(make_filter_names, frames): images[filter_name] = frame # these frames can be RemoteFrames if the datacube was a RemoteDataCube
@@ -1466,6 +1466,9 @@ class ObservedImageMaker(DatacubesMiscMaker):
         from ...magic.core.remote import RemoteFrame
         from ...magic.core.frame import Frame
 
+        # The local frames that have to be convolved
+        batch = []
+
         # Loop over the images
         for instr_name in self.images:
 
@@ -1618,33 +1621,83 @@ class ObservedImageMaker(DatacubesMiscMaker):
                     # Convert into remote
                     self.images[instr_name][filter_name] = RemoteFrame.from_local(frame, self.session)
 
-                # Convolve the frame
-                self.images[instr_name][filter_name].convolve(kernel)
+                # Remote frame: convolve right away
+                if isinstance(self.images[instr_name][filter_name], RemoteFrame):
 
-                # If intermediate results have to be written
-                if self.config.write_intermediate:
+                    # Convolve the frame
+                    self.images[instr_name][filter_name].convolve(kernel)
 
-                    # Remote frame?
-                    frame = self.images[instr_name][filter_name]
-                    if isinstance(frame, RemoteFrame):
+                    # Write the intermediate result
+                    if self.config.write_intermediate: self.write_intermediate_convolved(instr_name, filter_name)
 
-                        # Determine the path
-                        path = self.remote_intermediate_convolve_path_for_image(instr_name, filter_name)
+                # Local frame: add to the batch
+                else: batch.append((instr_name, filter_name, kernel))
 
-                        # Save the frame remotely
-                        frame.saveto_remote(path)
+        # Convolve the local frames
+        if len(batch) > 0: self.convolve_batch(batch)
 
-                    # Regular frame?
-                    elif isinstance(frame, Frame):
+    # -----------------------------------------------------------------
 
-                        # Determine the path
-                        path = self.intermediate_convolve_path_for_image(instr_name, filter_name)
+    def convolve_batch(self, batch):
 
-                        # Save the frame locally
-                        frame.saveto(path)
+        """
+        This function convolves the local frames together, so that frames with the same kernel and shape share
+        the kernel transform and are convolved in the same FFT batch
+        :param batch: list of (instrument name, filter name, kernel)
+        :return:
+        """
 
-                    # Invalid
-                    else: raise ValueError("Something went wrong")
+        from ...magic.convolution.service import convolve_frames
+
+        # Debugging
+        log.debug("Convolving " + str(len(batch)) + " local images ...")
+
+        # Get the frames and kernels
+        frames = [self.images[instr_name][filter_name] for instr_name, filter_name, _ in batch]
+        kernels = [kernel for _, _, kernel in batch]
+
+        # Convolve
+        convolve_frames(frames, kernels)
+
+        # Write the intermediate results
+        if self.config.write_intermediate:
+            for instr_name, filter_name, _ in batch: self.write_intermediate_convolved(instr_name, filter_name)
+
+    # -----------------------------------------------------------------
+
+    def write_intermediate_convolved(self, instr_name, filter_name):
+
+        """
+        This function ...
+        :param instr_name:
+        :param filter_name:
+        :return:
+        """
+
+        from ...magic.core.remote import RemoteFrame
+        from ...magic.core.frame import Frame
+
+        # Remote frame?
+        frame = self.images[instr_name][filter_name]
+        if isinstance(frame, RemoteFrame):
+
+            # Determine the path
+            path = self.remote_intermediate_convolve_path_for_image(instr_name, filter_name)
+
+            # Save the frame remotely
+            frame.saveto_remote(path)
+
+        # Regular frame?
+        elif isinstance(frame, Frame):
+
+            # Determine the path
+            path = self.intermediate_convolve_path_for_image(instr_name, filter_name)
+
+            # Save the frame locally
+            frame.saveto(path)
+
+        # Invalid
+        else: raise ValueError("Something went wrong")
 
     # -----------------------------------------------------------------
 
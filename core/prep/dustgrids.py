@@ -14,6 +14,7 @@ from __future__ import absolute_import, division, print_function
 
 # Import standard modules
 import math
+import numpy as np
 
 # Import astronomical modules
 from astropy.units import dimensionless_angles
@@ -25,7 +26,9 @@ from ...core.basics.range import zip_linear
 from ..basics.configurable import Configurable
 from ..basics.table import SmartTable
 from ..basics.range import RealRange, QuantityRange, IntegerRange
+from ..basics.map import Map
 from ..tools import types
+from ..units.parsing import parse_unit as u
 
 # -----------------------------------------------------------------
 
@@ -57,10 +60,13 @@ class DustGridsTable(SmartTable):
         self.add_column_info("Smallest scale", float, "pc", "Smallest scale")
         self.add_column_info("Min level", int, None, "Minimum level")
         self.add_column_info("Max mass fraction", float, None, "Maximum mass fraction")
+        self.add_column_info("Predicted cells", int, None, "predicted number of dust cells")
+        self.add_column_info("Predicted memory", float, "GB", "predicted memory footprint of the dust grid")
+        self.add_column_info("Predicted max cell mass fraction", float, None, "predicted largest mass fraction of a dust cell")
 
     # -----------------------------------------------------------------
 
-    def add_entry(self, grid_type, x_range, y_range, z_range, scale, min_level, max_mass_fraction):
+    def add_entry(self, grid_type, x_range, y_range, z_range, scale, min_level, max_mass_fraction, prediction=None):
 
         """
         This function ...
@@ -71,11 +77,16 @@ class DustGridsTable(SmartTable):
         :param scale:
         :param min_level:
         :param max_mass_fraction:
+        :param prediction:
         :return:
         """
 
+        # Get the predicted properties
+        if prediction is not None: predicted = [prediction.ncells, prediction.memory, prediction.max_mass_fraction]
+        else: predicted = [None, None, None]
+
         # Add a row to the table
-        self.add_row([grid_type, x_range.min, x_range.max, y_range.min, y_range.max, z_range.min, z_range.max, scale, min_level, max_mass_fraction])
+        self.add_row([grid_type, x_range.min, x_range.max, y_range.min, y_range.max, z_range.min, z_range.max, scale, min_level, max_mass_fraction] + predicted)
 
 # -----------------------------------------------------------------
 
@@ -109,9 +120,16 @@ class DustGridGenerator(Configurable):
         self.y_radius = None
         self.z_radius = None
 
+        # The density for predicting the tree grids
+        self.density = None
+        self.total_mass = None
+
         # The dust grids
         self.grids = []
 
+        # The predicted properties of the tree grids
+        self.predictions = []
+
         # The dust grid property table
         self.table = None
 
@@ -308,6 +326,9 @@ class DustGridGenerator(Configurable):
             self.level_range = kwargs.pop("level_range")
             self.mass_fraction_range = kwargs.pop("mass_fraction_range")
 
+        # Get the density (Model3D or density function) for predicting the tree grids
+        self.density = kwargs.pop("density", None)
+
         # Initialize the table
         self.table = DustGridsTable()
 
@@ -356,7 +377,10 @@ class DustGridGenerator(Configurable):
             print("")
 
         # Add a row to the table
-        self.table.add_row([self.grid_type, self.x_min, self.x_max, self.y_min, self.y_max, self.z_min, self.z_max, scale, None, None])
+        self.table.add_row([self.grid_type, self.x_min, self.x_max, self.y_min, self.y_max, self.z_min, self.z_max, scale, None, None, None, None, None])
+
+        # No prediction for cartesian grids
+        self.predictions.append(None)
 
     # -----------------------------------------------------------------
 
@@ -383,8 +407,14 @@ class DustGridGenerator(Configurable):
             print(grid)
             print("")
 
-        # Add a row to the table
-        self.table.add_row([self.grid_type, self.x_min, self.x_max, self.y_min, self.y_max, self.z_min, self.z_max, scale, min_level, max_mass_fraction])
+        # Predict the grid
+        prediction = self.predict(grid)
+
+        # Add entry to the table
+        x_range = QuantityRange(self.x_min, self.x_max)
+        y_range = QuantityRange(self.y_min, self.y_max)
+        z_range = QuantityRange(self.z_min, self.z_max)
+        self.table.add_entry(self.grid_type, x_range, y_range, z_range, scale, min_level, max_mass_fraction, prediction)
 
     # -----------------------------------------------------------------
 
@@ -411,11 +441,43 @@ class DustGridGenerator(Configurable):
             print(grid)
             print("")
 
+        # Predict the grid
+        prediction = self.predict(grid)
+
         # Add entry to the table
-        x_range = RealRange(self.x_min, self.x_max)
-        y_range = RealRange(self.y_min, self.y_max)
-        z_range = RealRange(self.z_min, self.z_max)
-        self.table.add_entry(self, self.grid_type, x_range, y_range, z_range, scale, min_level, max_mass_fraction)
+        x_range = QuantityRange(self.x_min, self.x_max)
+        y_range = QuantityRange(self.y_min, self.y_max)
+        z_range = QuantityRange(self.z_min, self.z_max)
+        self.table.add_entry(self.grid_type, x_range, y_range, z_range, scale, min_level, max_mass_fraction, prediction)
+
+    # -----------------------------------------------------------------
+
+    def predict(self, grid):
+
+        """
+        This function predicts the number of cells, the memory footprint and the cell mass fractions of a tree grid
+        :param grid:
+        :return:
+        """
+
+        # No density: no prediction
+        if self.density is None:
+            self.predictions.append(None)
+            return None
+
+        # Inform the user
+        log.info("Predicting the dust grid structure ...")
+
+        # Predict, with the same total mass for all grids
+        prediction = predict_dust_grid(self.density, grid, total_mass=self.total_mass, seed=len(self.grids))
+        self.total_mass = prediction.total_mass
+
+        # Debugging
+        log.debug("Predicted " + str(prediction.ncells) + " dust cells, with a memory footprint of " + str(prediction.memory) + " and a maximum cell mass fraction of " + str(prediction.max_mass_fraction))
+
+        # Add the prediction
+        self.predictions.append(prediction)
+        return prediction
 
     # -----------------------------------------------------------------
 
@@ -804,3 +866,222 @@ def smallest_scale_for_dust_grid(grid):
     else: raise NotImplementedError("Other dust grids not implemented")
 
 # -----------------------------------------------------------------
+
+# Approximate memory footprint of a SKIRT tree node (extent, father, children and neighbour lists) and of the
+# per-cell data of the dust system (densities, volume, cell indices), in bytes
+tree_node_bytes = 300
+dust_cell_bytes = 64
+
+# -----------------------------------------------------------------
+
+def predict_dust_grid(density, grid, total_mass=None, nwavelengths=None, seed=None):
+
+    """
+    This function predicts the structure of a binary tree or octtree dust grid for the specified density, without
+    running SKIRT (see predict_tree_dust_grid)
+    :param density: a Model3D or a density function f(x, y, z) of the positions in pc
+    :param grid: a BinaryTreeDustGrid or an OctTreeDustGrid
+    :param total_mass:
+    :param nwavelengths:
+    :param seed:
+    :return:
+    """
+
+    # Get the grid type
+    if isinstance(grid, BinaryTreeDustGrid): grid_type = "bintree"
+    elif isinstance(grid, OctTreeDustGrid): grid_type = "octtree"
+    else: raise ValueError("Only binary tree and octtree dust grids can be predicted")
+
+    # Predict
+    return predict_tree_dust_grid(density, grid_type, grid.min_x, grid.max_x, grid.min_y, grid.max_y, grid.min_z,
+                                  grid.max_z, grid.min_level, grid.max_level, grid.max_mass_fraction,
+                                  sample_count=grid.sample_count, total_mass=total_mass, nwavelengths=nwavelengths,
+                                  seed=seed)
+
+# -----------------------------------------------------------------
+
+def predict_tree_dust_grid(density, grid_type, x_min, x_max, y_min, y_max, z_min, z_max, min_level, max_level,
+                           max_mass_fraction, sample_count=100, total_mass=None, nsamples_total=1000000,
+                           nwavelengths=None, seed=None, chunk_size=2**20):
+
+    """
+    This function predicts the structure of a binary tree or octtree dust grid for the specified density, without
+    running SKIRT. The tree is constructed level by level with the subdivision criterion of SKIRT: a cell is
+    subdivided when its level is below the minimum level, or when its level is below the maximum level and its dust
+    mass fraction exceeds the maximum mass fraction. As in SKIRT, the mass of a cell is estimated from the density
+    at a number of random positions in the cell, but the density is evaluated for all cells of a level at once. The
+    sample count can be lowered for a faster (but noisier) prediction.
+    :param density: a Model3D or a density function f(x, y, z) of the positions in pc (numpy arrays)
+    :param grid_type: 'bintree' or 'octtree'
+    :param x_min:
+    :param x_max:
+    :param y_min:
+    :param y_max:
+    :param z_min:
+    :param z_max:
+    :param min_level:
+    :param max_level:
+    :param max_mass_fraction:
+    :param sample_count: the number of random positions per cell
+    :param total_mass: the total mass (in the units of the density function times pc^3), estimated if not given
+    :param nsamples_total: the number of random positions for estimating the total mass
+    :param nwavelengths: if given, the memory of the absorbed luminosities (per cell and wavelength) is included
+    :param seed:
+    :param chunk_size: the maximum number of positions for which the density is evaluated at once
+    :return: a Map with the number of cells and nodes, the memory footprint and the mass fraction statistics
+    """
+
+    # Check the grid type
+    if grid_type not in ["bintree", "octtree"]: raise ValueError("Invalid grid type: " + str(grid_type))
+
+    # Get the density function
+    if hasattr(density, "density_function"): density = density.density_function(unit="pc")
+
+    # Get the domain in pc
+    domain = np.array([to_pc(x_min), to_pc(y_min), to_pc(z_min), to_pc(x_max), to_pc(y_max), to_pc(z_max)])
+
+    # Create the random number generator
+    prng = np.random.RandomState(seed)
+
+    # Estimate the total mass
+    if total_mass is None: total_mass = cell_masses(density, domain[np.newaxis, :], nsamples_total, prng, chunk_size)[0]
+    if total_mass <= 0: raise ValueError("The total mass in the domain is zero")
+
+    # Construct the tree, level by level
+    cells = domain[np.newaxis, :]
+    level = 0
+    nnodes = 0
+    leaf_fractions = []
+    leaf_counts = []
+    while len(cells) > 0:
+
+        nnodes += len(cells)
+
+        # Determine which cells are subdivided
+        if level < min_level:
+            fractions = None
+            divide = np.ones(len(cells), dtype=bool)
+        else:
+            fractions = cell_masses(density, cells, sample_count, prng, chunk_size) / total_mass
+            if level < max_level: divide = fractions > max_mass_fraction
+            else: divide = np.zeros(len(cells), dtype=bool)
+
+        # Add the leaf cells
+        if fractions is not None: leaf_fractions.append(fractions[~divide])
+        leaf_counts.append(len(cells) - np.count_nonzero(divide))
+
+        # Subdivide
+        cells = subdivide_cells(cells[divide], grid_type, level)
+        level += 1
+
+    # Gather the mass fractions of the leaf cells
+    fractions = np.concatenate(leaf_fractions)
+    ncells = len(fractions)
+
+    # Determine the memory footprint
+    nbytes = nnodes * tree_node_bytes + ncells * dust_cell_bytes
+    if nwavelengths is not None: nbytes += ncells * nwavelengths * 8
+
+    # Create the prediction
+    prediction = Map()
+    prediction.ncells = ncells
+    prediction.nnodes = nnodes
+    prediction.level_counts = leaf_counts
+    prediction.min_cell_level = next(index for index, count in enumerate(leaf_counts) if count > 0)
+    prediction.max_cell_level = len(leaf_counts) - 1
+    prediction.memory = nbytes * 1e-9 * u("GB")
+    prediction.total_mass = total_mass
+    prediction.min_mass_fraction = np.min(fractions)
+    prediction.max_mass_fraction = np.max(fractions)
+    prediction.mean_mass_fraction = np.mean(fractions)
+    prediction.median_mass_fraction = np.median(fractions)
+    prediction.stddev_mass_fraction = np.std(fractions)
+
+    # The cells that could not be subdivided far enough because of the maximum level
+    unresolved = fractions > max_mass_fraction
+    prediction.nunresolved = np.count_nonzero(unresolved)
+    prediction.unresolved_mass_fraction = np.sum(fractions[unresolved])
+
+    # Return the prediction
+    return prediction
+
+# -----------------------------------------------------------------
+
+def cell_masses(density, cells, sample_count, prng, chunk_size=2**20):
+
+    """
+    This function estimates the masses of the specified cells from the density at random positions in each cell.
+    The positions relative to the cell are the same for all cells of a chunk, so that only a few random numbers
+    have to be drawn.
+    :param density: density function f(x, y, z)
+    :param cells: array of shape (ncells, 6) with the minimum x, y, z and maximum x, y, z of each cell
+    :param sample_count: the number of random positions per cell
+    :param prng:
+    :param chunk_size: the maximum number of positions for which the density is evaluated at once
+    :return:
+    """
+
+    masses = np.empty(len(cells))
+    ncells_per_chunk = max(1, chunk_size // sample_count)
+    for start in range(0, len(cells), ncells_per_chunk):
+
+        chunk = cells[start:start+ncells_per_chunk]
+        extent = chunk[:, 3:] - chunk[:, :3]
+
+        # Draw the random positions, relative to the cell, and shared by all cells of the chunk
+        offsets = prng.random_sample((3, sample_count))
+
+        # Evaluate the density at the positions in each cell
+        x = (chunk[:, 0, np.newaxis] + extent[:, 0, np.newaxis] * offsets[0]).ravel()
+        y = (chunk[:, 1, np.newaxis] + extent[:, 1, np.newaxis] * offsets[1]).ravel()
+        z = (chunk[:, 2, np.newaxis] + extent[:, 2, np.newaxis] * offsets[2]).ravel()
+        densities = np.reshape(density(x, y, z), (len(chunk), sample_count))
+
+        # The mass is the mean density times the volume
+        masses[start:start+len(chunk)] = np.mean(densities, axis=1) * np.prod(extent, axis=1)
+
+    # Return the masses
+    return masses
+
+# -----------------------------------------------------------------
+
+def subdivide_cells(cells, grid_type, level):
+
+    """
+    This function subdivides the specified cells in their middle, in two along the x, y or z direction (alternating
+    with the level) for a binary tree, or in eight for an octtree
+    :param cells: array of shape (ncells, 6) with the minimum x, y, z and maximum x, y, z of each cell
+    :param grid_type: 'bintree' or 'octtree'
+    :param level: the level of the cells
+    :return:
+    """
+
+    # The directions in which the cells are divided
+    directions = [level % 3] if grid_type == "bintree" else [0, 1, 2]
+
+    # Divide in each direction
+    for direction in directions:
+        middle = 0.5 * (cells[:, direction] + cells[:, direction + 3])
+        lower = cells.copy()
+        lower[:, direction + 3] = middle
+        upper = cells.copy()
+        upper[:, direction] = middle
+        cells = np.concatenate((lower, upper))
+
+    # Return the child cells
+    return cells
+
+# -----------------------------------------------------------------
+
+def to_pc(value):
+
+    """
+    This function ...
+    :param value: a length quantity or a value in pc
+    :return:
+    """
+
+    if hasattr(value, "unit"): return value.to("pc").value
+    else: return float(value)
+
+# -----------------------------------------------------------------
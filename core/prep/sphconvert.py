@@ -12,11 +12,18 @@
 #  - EAGLE old column text format (compatible with SKIRT5)
 #  - AWAT column text format
 #  - DOLAG column text format
+#  - ULB column text format
 #
 # There is a separate function for star and gas particles, for each format.
 # The arguments for each function are:
 #  - infile: the name of the input file in foreign format
 #  - outfile: the name of the output file in SKIRT6 format (file is overwritten)
+#  - chunksize: the (approximate) number of bytes of the input file that is converted at once
+#  - nprocesses: the number of processes used to convert the chunks in parallel
+#
+# The conversion is streaming: the input file is read and converted in chunks of lines, so that the memory
+# usage does not depend on the number of particles. Each format is described by an SPHFormat object, which lists
+# the input columns and the expressions for the output columns in terms of these (compiled once).
 
 # -----------------------------------------------------------------
 
@@ -24,6 +31,125 @@
 import math as math
 import numpy as np
 
+# -----------------------------------------------------------------
+
+## This class describes the conversion of a foreign SPH column text format into the SKIRT input format:
+# - names: the names of the input columns that are used in the expressions
+# - usecols: the indices of these columns in the input file (None means all columns, in order)
+# - expressions: for each output column, a python expression in terms of the input column names (evaluated
+#   on numpy arrays, with numpy available as np and the helper functions in this module as global names)
+# - header: the header lines written to the output file (without the leading '# ')
+class SPHFormat(object):
+
+    def __init__(self, names, usecols, expressions, header):
+        self.names = tuple(names)
+        self.usecols = tuple(usecols) if usecols is not None else None
+        self.expressions = tuple(expressions)
+        self.header = tuple(header)
+
+    ## This function returns the compiled expressions (compiled once per process)
+    def compiled(self):
+        return [ _compile(expression) for expression in self.expressions ]
+
+    ## This function returns the output array for the specified input array, which contains one row per particle
+    # and the input columns (all columns of the file, or only the columns in usecols, as returned by parse_lines())
+    def transform(self, data):
+        columns = dict(zip(self.names, data.T))
+        out = np.empty((data.shape[0], len(self.expressions)))
+        for index, code in enumerate(self.compiled()):
+            out[:, index] = eval(code, _namespace, columns)
+        return out
+
+## This private dictionary caches the compiled expressions
+_codes = {}
+
+## This private helper function returns the compiled version of the specified expression
+def _compile(expression):
+    if expression not in _codes: _codes[expression] = compile(expression, "<sphconvert>", "eval")
+    return _codes[expression]
+
+# -----------------------------------------------------------------
+
+## This function converts the specified SPH data file in text column format, described by the specified SPHFormat
+# object, to the SKIRT input format. The input file is read and converted in chunks of (approximately) the specified
+# number of bytes, split at line boundaries; if \em nprocesses is larger than one, the chunks are read, parsed,
+# transformed and formatted in parallel by a pool of processes, while the output is written in order by the
+# calling process.
+#
+# The output is a text column file with the same contents as produced by np.savetxt with format "%1.9g".
+#
+# The function returns the number of converted particles.
+def convert(infile, outfile, format, chunksize=2**24, nprocesses=1):
+
+    nparticles = 0
+    with open(outfile, 'w') as outfid:
+
+        # write the header
+        for line in format.header: outfid.write("# " + line + "\n")
+
+        # the chunks of the input file
+        chunks = [ (infile, start, end, format) for start, end in chunkranges(infile, chunksize) ]
+
+        # convert the chunks, serially or in parallel, and write the results in order
+        if nprocesses > 1 and len(chunks) > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(min(nprocesses, len(chunks)))
+            try:
+                for count, output in pool.imap(_convert_chunk, chunks):
+                    outfid.write(output)
+                    nparticles += count
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for chunk in chunks:
+                count, output = _convert_chunk(chunk)
+                outfid.write(output)
+                nparticles += count
+
+    return nparticles
+
+## This function returns a list of (start, end) byte offsets that split the specified file in chunks of at least the
+# specified number of bytes, at line boundaries.
+def chunkranges(infile, chunksize):
+    with open(infile, 'rb') as fid:
+        fid.seek(0, 2)
+        size = fid.tell()
+        ranges = []
+        start = 0
+        while start < size:
+            fid.seek(min(start + chunksize, size))
+            fid.readline()
+            end = min(fid.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+## This private helper function converts a chunk of the input file, and returns the number of particles and the
+# output text
+def _convert_chunk(arguments):
+    infile, start, end, format = arguments
+    with open(infile, 'rb') as fid:
+        fid.seek(start)
+        lines = fid.read(end - start).decode('ascii', 'replace').splitlines()
+    out = format.transform(parse_lines(lines, format.usecols))
+    return out.shape[0], ((" ".join(["%1.9g"] * out.shape[1]) + "\n") * out.shape[0]) % tuple(out.ravel())
+
+## This function parses the specified lines of a column text file (ignoring comments, which start with '#', and empty
+# lines), and returns a 2D array with one row per line, containing all columns or only the specified columns.
+def parse_lines(lines, usecols=None):
+    lines = [ line.split("#", 1)[0] for line in lines ]
+    lines = [ line for line in lines if line.strip() ]
+    if len(lines) == 0: return np.zeros((0, len(usecols) if usecols is not None else 0))
+
+    # parse all numbers at once if all lines have the same number of columns, otherwise fall back to loadtxt
+    ncolumns = len(lines[0].split())
+    data = np.array(" ".join(lines).split(), dtype=float)
+    if data.size != ncolumns * len(lines):
+        return np.loadtxt(lines, usecols=usecols, ndmin=2)
+    data = data.reshape(len(lines), ncolumns)
+    return data[:, usecols] if usecols is not None else data
+
 # -----------------------------------------------------------------
 #  EAGLE column text format
 # -----------------------------------------------------------------
@@ -31,26 +157,26 @@ import numpy as np
 ## EAGLE star particles:
 # - incoming:  x(kpc) y(kpc) z(kpc) t(yr) h(kpc) Z(0-1) M(Msun)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)
-def convert_stars_EAGLE(infile, outfile):
-    x,y,z,t,h,Z,M = np.loadtxt(infile, unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Star Particles\n')
-    fid.write('# Converted from EAGLE SKIRT5 output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)\n')
-    np.savetxt(fid, np.transpose((x*1e3,y*1e3,z*1e3,h*1e3,M,Z,t)), fmt="%1.9g")
-    fid.close()
+stars_EAGLE = SPHFormat(("x","y","z","t","h","Z","M"), None,
+                        ("x*1e3","y*1e3","z*1e3","h*1e3","M","Z","t"),
+                        ('SPH Star Particles',
+                         'Converted from EAGLE SKIRT5 output format into SKIRT6 format',
+                         'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)'))
+
+def convert_stars_EAGLE(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, stars_EAGLE, chunksize, nprocesses)
 
 ## EAGLE gas particles:
 # - incoming:  x(kpc) y(kpc) z(kpc) SFR(?) h(kpc) Z(0-1) M(Msun)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)
-def convert_gas_EAGLE(infile, outfile):
-    x,y,z,SFR,h,Z,M = np.loadtxt(infile, unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Gas Particles\n')
-    fid.write('# Converted from EAGLE SKIRT5 output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)\n')
-    np.savetxt(fid, np.transpose((x*1e3,y*1e3,z*1e3,h*1e3,M,Z)), fmt="%1.9g")
-    fid.close()
+gas_EAGLE = SPHFormat(("x","y","z","SFR","h","Z","M"), None,
+                      ("x*1e3","y*1e3","z*1e3","h*1e3","M","Z"),
+                      ('SPH Gas Particles',
+                       'Converted from EAGLE SKIRT5 output format into SKIRT6 format',
+                       'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)'))
+
+def convert_gas_EAGLE(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, gas_EAGLE, chunksize, nprocesses)
 
 # -----------------------------------------------------------------
 #  AWAT column text format
@@ -60,34 +186,34 @@ def convert_gas_EAGLE(infile, outfile):
 # - incoming:  x y z vx vy vz M ms0 mzHe mzC mzN mzO mzNe mzMg mzSi mzFe mzZ Z ts id flagfd rho h ...
 # -    units:  x,y,z,h (100kpc); M (1e12 Msun); ts(0.471Gyr) with t = (1Gyr-ts)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)
-def convert_stars_AWAT(infile, outfile):
-    x,y,z,M,Z,ts,h = np.loadtxt(infile, usecols=(0,1,2,6,17,18,22), unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Star Particles\n')
-    fid.write('# Converted from AWAT output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)\n')
-    np.savetxt(fid, np.transpose((x*1e5,y*1e5,z*1e5,h*1e5,M*1e12,Z,1e9-ts*0.471e9)), fmt="%1.9g")
-    fid.close()
+stars_AWAT = SPHFormat(("x","y","z","M","Z","ts","h"), (0,1,2,6,17,18,22),
+                       ("x*1e5","y*1e5","z*1e5","h*1e5","M*1e12","Z","1e9-ts*0.471e9"),
+                       ('SPH Star Particles',
+                        'Converted from AWAT output format into SKIRT6 format',
+                        'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)'))
+
+def convert_stars_AWAT(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, stars_AWAT, chunksize, nprocesses)
 
 ## AWAT gas particles:
 # - incoming:  x y z vx vy vz M rho u mzHe mzC mzN mzO mzNe mzMg mzSi mzFe mzZ id flagfd h myu nhp Temp ...
 # -    units:  x,y,z,h (100kpc); M (1e12 Msun); mzZ (Msun) so that Z=mzZ/(M*1e12)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)
-def convert_gas_AWAT(infile, outfile):
-    x,y,z,M,mzZ,h = np.loadtxt(infile, usecols=(0,1,2,6,17,20), unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Gas Particles\n')
-    fid.write('# Converted from AWAT output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)\n')
-    np.savetxt(fid, np.transpose((x*1e5,y*1e5,z*1e5,h*1e5,M*1e12,mzZ/(M*1e12))), fmt="%1.9g")
-    fid.close()
+gas_AWAT = SPHFormat(("x","y","z","M","mzZ","h"), (0,1,2,6,17,20),
+                     ("x*1e5","y*1e5","z*1e5","h*1e5","M*1e12","mzZ/(M*1e12)"),
+                     ('SPH Gas Particles',
+                      'Converted from AWAT output format into SKIRT6 format',
+                      'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)'))
+
+def convert_gas_AWAT(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, gas_AWAT, chunksize, nprocesses)
 
 # -----------------------------------------------------------------
 #  DOLAG column text format
 # -----------------------------------------------------------------
 
 # return the age of a star (in yr) given the universe expansion factor when the star was born (in range 0-1)
-@np.vectorize
+# (works elementwise on numpy arrays)
 def age(R):
     H0 = 2.3e-18
     OmegaM0 = 0.27
@@ -96,7 +222,7 @@ def age(R):
     return T0 - (2./3./H0/np.sqrt(1-OmegaM0)) * np.arcsinh(np.sqrt( (1/OmegaM0-1)*R**3 )) / yr
 
 # return the radius of a particle (in kpc) given its mass (in Msun) and density (in Msun/kpc3)
-@np.vectorize
+# (works elementwise on numpy arrays)
 def radius(M,rho):
     return (M/rho*3/4/math.pi*64)**(1./3.)
 
@@ -104,46 +230,52 @@ def radius(M,rho):
 # - incoming:  id x y z vx vy vz M R
 # -    units:  x,y,z (kpc); M (Msun); R (0-1); assume Z=0.02 & h=1kpc; calculate t(R)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)
-def convert_stars_DOLAG(infile, outfile):
-    x,y,z,M,R = np.loadtxt(infile, usecols=(1,2,3,7,8), unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Star Particles\n')
-    fid.write('# Converted from DOLAG output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)\n')
-    np.savetxt(fid, np.transpose((x*1e3,y*1e3,z*1e3,np.ones_like(x)*1e3,M,np.ones_like(x)*0.02,age(R))), fmt="%1.9g")
-    fid.close()
+stars_DOLAG = SPHFormat(("x","y","z","M","R"), (1,2,3,7,8),
+                        ("x*1e3","y*1e3","z*1e3","1e3","M","0.02","age(R)"),
+                        ('SPH Star Particles',
+                         'Converted from DOLAG output format into SKIRT6 format',
+                         'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)'))
+
+def convert_stars_DOLAG(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, stars_DOLAG, chunksize, nprocesses)
 
 ## DOLAG gas particles:
 # - incoming:  id x y z vx vy vz M rho T cf u sfr
 # -    units:  x,y,z (kpc); M (Msun); assume Z=0.02; calculate h(M,rho)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)
-def convert_gas_DOLAG(infile, outfile):
-    x,y,z,M,rho = np.loadtxt(infile, usecols=(1,2,3,7,8), unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Gas Particles\n')
-    fid.write('# Converted from DOLAG output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)\n')
-    np.savetxt(fid, np.transpose((x*1e3,y*1e3,z*1e3,radius(M,rho)*1e3,M,np.ones_like(x)*0.02)), fmt="%1.9g")
-    fid.close()
+gas_DOLAG = SPHFormat(("x","y","z","M","rho"), (1,2,3,7,8),
+                      ("x*1e3","y*1e3","z*1e3","radius(M,rho)*1e3","M","0.02"),
+                      ('SPH Gas Particles',
+                       'Converted from DOLAG output format into SKIRT6 format',
+                       'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)'))
+
+def convert_gas_DOLAG(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, gas_DOLAG, chunksize, nprocesses)
 
 # -----------------------------------------------------------------
 #  ULB column text format
 # -----------------------------------------------------------------
 
+PARSEC = 3.08568e16   # 1 parsec (in m)
+AU = 1.496e11         # 1 AU (in m)
+CONV = (100. * AU) / PARSEC
+
 ## ULB gas particles:
 # - incoming:  x y z M h rho vx vy vz ...
 # -    units:  x,y,z,h (100AU); M (Msun)
 # - outgoing:  x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)
-def convert_gas_ULB(infile, outfile):
-    PARSEC = 3.08568e16   # 1 parsec (in m)
-    AU = 1.496e11         # 1 AU (in m)
-    CONV = (100. * AU) / PARSEC
-    x,y,z,M,h = np.loadtxt(infile, usecols=(0,1,2,3,4), unpack=True)
-    fid = open(outfile, 'w')
-    fid.write('# SPH Gas Particles\n')
-    fid.write('# Converted from ULB output format into SKIRT6 format\n')
-    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)\n')
-    np.savetxt(fid, np.transpose((x*CONV,y*CONV,z*CONV,5*h*CONV,M,np.zeros_like(M)+0.02)), fmt="%1.9g")  # inflated h!
-    fid.close()
+gas_ULB = SPHFormat(("x","y","z","M","h"), (0,1,2,3,4),
+                    ("x*CONV","y*CONV","z*CONV","5*h*CONV","M","0.02"),  # inflated h!
+                    ('SPH Gas Particles',
+                     'Converted from ULB output format into SKIRT6 format',
+                     'Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1)'))
+
+def convert_gas_ULB(infile, outfile, chunksize=2**24, nprocesses=1):
+    return convert(infile, outfile, gas_ULB, chunksize, nprocesses)
+
+# -----------------------------------------------------------------
+
+## The namespace in which the output column expressions are evaluated
+_namespace = dict(np=np, math=math, age=age, radius=radius, CONV=CONV)
 
 # -----------------------------------------------------------------
@@ -14,7 +14,7 @@ from __future__ import absolute_import, division, print_function
 
 # Import standard modules
 import numpy as np
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
 
 # Import the relevant PTS classes and modules
 from ...core.basics.log import log
@@ -26,7 +26,6 @@ from ..basics.range import QuantityRange
 from ..units.parsing import parse_unit as u
 from ..filter.broad import BroadBandFilter
 from ..filter.narrow import NarrowBandFilter
-from ..tools import sequences
 from ..basics.containers import DefaultOrderedDict
 from ..tools.stringify import stringify_list_fancy
 from ..tools import parsing
@@ -63,6 +62,12 @@ relpoints[aromatic] = 125./325.         # 125
 relpoints[thermal] = 50./325.         # 50
 relpoints[microwave] = 25./325.    # 25
 
+# The unit in which the wavelength grids are constructed
+grid_unit = "micron"
+
+# The ranges of the subgrids, as values in the grid unit
+range_values = OrderedDict((subgrid, (ranges[subgrid].min.to(grid_unit).value, ranges[subgrid].max.to(grid_unit).value)) for subgrid in subgrids)
+
 # -----------------------------------------------------------------
 
 class WavelengthGridsTable(SmartTable):
@@ -530,20 +535,22 @@ class WavelengthGridGenerator(Configurable):
         # Inform the user
         log.info("Generating the wavelength grids ...")
 
-        # Loop over the different number of points
-        for index, npoints in enumerate(self.config.npoints_range.linear(self.config.ngrids)):
+        # The target numbers of points
+        npoints_range = self.config.npoints_range.linear(self.config.ngrids)
 
-            # Debugging
-            log.debug("Creating a wavelength grid with a target of " + str(npoints) + " points ...")
+        # Create the grids
+        grids = create_subgrid_wavelength_grids(npoints_range, self.emission_lines, self.config.fixed,
+                                                min_wavelength=self.min_wavelength, max_wavelength=self.max_wavelength,
+                                                filters=self.config.filters, adjust_to=self.config.adjust_to,
+                                                min_wavelengths_in_filter=self.config.min_wavelengths_in_filter,
+                                                min_wavelengths_in_fwhm=self.config.min_wavelengths_in_fwhm,
+                                                return_elements=True)
 
-            # Create the grid
-            wavelength_grid, subgrid_wavelengths, filter_wavelengths, replaced, new, line_wavelengths, fixed = create_one_subgrid_wavelength_grid(
-                npoints, self.emission_lines, self.config.fixed,
-                min_wavelength=self.min_wavelength, max_wavelength=self.max_wavelength,
-                filters=self.config.filters, adjust_to=self.config.adjust_to,
-                min_wavelengths_in_filter=self.config.min_wavelengths_in_filter,
-                min_wavelengths_in_fwhm=self.config.min_wavelengths_in_fwhm,
-                return_elements=True)
+        # Loop over the different number of points
+        for index, npoints in enumerate(npoints_range):
+
+            # Get the grid and its elements
+            wavelength_grid, subgrid_wavelengths, filter_wavelengths, replaced, new, line_wavelengths, fixed = grids[index]
 
             #print("Filters:", filter_wavelengths)
 
@@ -1379,40 +1386,9 @@ def get_subgrid_wavelengths(npoints, min_wavelength=None, max_wavelength=None):
     :return:
     """
 
-    subgrid_wavelengths = OrderedDict()
-
-    # Loop over the subgrids
-    for subgrid in subgrids:
-
-        # Debugging
-        log.debug("Checking " + subgrid + " subgrid wavelengths ...")
-
-        # Determine minimum, maximum
-        min_lambda = ranges[subgrid].min
-        max_lambda = ranges[subgrid].max
-
-        # Skip subgrids out of range
-        if min_wavelength is not None and max_lambda < min_wavelength: continue
-        if max_wavelength is not None and min_lambda > max_wavelength: continue
-
-        # Determine the normal number of wavelength points for this subgrid
-        points = int(round(relpoints[subgrid] * npoints))
-
-        # Generate and add the wavelength points
-        wavelengths_subgrid_original = make_grid(min_lambda, max_lambda, points)
-
-        # Filter based on given boundaries
-        wavelengths_subgrid = []
-        for wav in wavelengths_subgrid_original:
-            if min_wavelength is not None and wav < min_wavelength: continue
-            if max_wavelength is not None and wav > max_wavelength: continue
-            wavelengths_subgrid.append(wav)
-
-        # Add the sequence of wavelengths
-        subgrid_wavelengths[subgrid] = wavelengths_subgrid
-
-    # Return
-    return subgrid_wavelengths
+    # Create the subgrids, attach the unit
+    values = subgrid_values(npoints, to_grid_values(min_wavelength), to_grid_values(max_wavelength))
+    return OrderedDict((subgrid, to_grid_quantities(values[subgrid])) for subgrid in values)
 
 # -----------------------------------------------------------------
 
@@ -1427,380 +1403,440 @@ def resample_filter_wavelengths(wavelengths, filters, min_wavelengths_in_filter=
     :return:
     """
 
-    # Initialize dictionary for the wavelengths for each filter
-    filter_wavelengths = DefaultOrderedDict(list)
+    # Get the filter properties
+    properties = [FilterSampling(fltr, min_wavelengths_in_filter, min_wavelengths_in_fwhm) for fltr in filters]
 
-    # Debugging
-    log.debug("Adding wavelengths for sampling filter bandpasses ...")
+    # Resample (the wavelengths should be sorted)
+    values, filter_values, exact_values = resampled_filter_values(np.sort(to_grid_values(wavelengths)), properties, min_wavelengths_in_filter, min_wavelengths_in_fwhm)
 
-    # Keep track of the wavelengths that need to remain exactly as they are
-    exact_wavelengths = defaultdict(list)
+    # Replace the wavelengths in the list
+    wavelengths[:] = to_grid_quantities(values)
 
-    # Loop over the filters
-    for fltr in filters:
-
-        # Debugging
-        log.debug("Adding wavelength(s) for the " + str(fltr) + " filter ...")
-
-        # Broad band filter: make sure there are at least 10 wavelength points in the range min_wavelength > max_wavelength
-        if isinstance(fltr, BroadBandFilter):
+    # Return the filter wavelengths and exact wavelengths
+    return to_grid_quantities_dict(filter_values), to_grid_quantities_dict(exact_values)
 
-            # Get filter minimum and maximum wavelength
-            min_wavelength = fltr.min
-            max_wavelength = fltr.max
-
-            # Get wavelength of maximum transmission
-
-            # Check that at least 5 wavelength points sample the range of the filter
-            # Get the indices of the wavelengths that fall within this range in the current list of wavelengths
-            current_indices = [i for i in range(len(wavelengths)) if min_wavelength < wavelengths[i] < max_wavelength]
-
-            # Check if there at least ..
-            #if len(current_indices) >= min_wavelengths_in_filter: continue
+# -----------------------------------------------------------------
 
-            if len(current_indices) < min_wavelengths_in_filter:
+def adjust_to_wavelengths(wavelengths, adjust_to, keep=None):
 
-                # Otherwise, delete the current wavelengths and add 10 new ones
-                # NO: DON'T DELETE JUST YET: DON'T DELETE WAVELENGTHS OF OTHER FILTERS
-                # FIRST DELETE AT THE END AND THEN ADD THEM ALL
-                #for index in sorted(current_indices, reverse=True): del wavelengths[index]
+    """
+    This function ...
+    :param wavelengths:
+    :param adjust_to:
+    :param keep:
+    :return:
+    """
 
-                # Generate new wavelengths for sampling the filter range on a logarithmic grid
-                new_wavelengths = fltr.range.log(min_wavelengths_in_filter, as_list=True)
+    # Adjust
+    values, replaced, new = adjusted_values(to_grid_values(wavelengths), to_grid_values(adjust_to), to_grid_values(keep) if keep is not None else None)
 
-                #print(fltr, fltr.range, [str(wavelength) for wavelength in new_wavelengths])
+    # Replace the wavelengths in the list
+    wavelengths[:] = to_grid_quantities(values)
 
-                # Add the new wavelengths
-                # NO: DON'T ADD JUST YET: DON'T DELETE WAVELENGTHS OF OTHER FILTERS
-                # FIRST DELETE AT THE END AND THEN ADD THEM ALL
-                #wavelengths += new_wavelengths
+    # Return
+    return [tuple(to_grid_quantities(pair)) for pair in replaced], to_grid_quantities(new)
 
-                # Add the wavelengths
-                filter_wavelengths[fltr].extend(new_wavelengths)
+# -----------------------------------------------------------------
 
-            else: new_wavelengths = None
+def create_one_subgrid_wavelength_grid(npoints, emission_lines=None, fixed=None, min_wavelength=None, max_wavelength=None,
+                                       filters=None, min_wavelengths_in_filter=5, min_wavelengths_in_fwhm=3, adjust_to=None,
+                                       return_elements=False):
 
-            # If FWHM of the filter is defined
-            if fltr.fwhm is not None:
+    """
+    This function ...
+    :param npoints:
+    :param emission_lines:
+    :param fixed:
+    :param min_wavelength:
+    :param max_wavelength:
+    :param filters:
+    :param min_wavelengths_in_filter:
+    :param min_wavelengths_in_fwhm:
+    :param adjust_to:
+    :param return_elements:
+    :return:
+    """
 
-                min_wavelength_fwhm = fltr.mean - fltr.fwhm
-                max_wavelength_fwhm = fltr.mean + fltr.fwhm
+    # Create the engine, and create the grid
+    engine = WavelengthGridEngine(emission_lines=emission_lines, fixed=fixed, min_wavelength=min_wavelength,
+                                  max_wavelength=max_wavelength, filters=filters,
+                                  min_wavelengths_in_filter=min_wavelengths_in_filter,
+                                  min_wavelengths_in_fwhm=min_wavelengths_in_fwhm, adjust_to=adjust_to)
+    return engine.create(npoints, return_elements=return_elements)
 
-                # Check that at least 3 wavelength points sample the inner range of the filter
-                current_indices = [i for i in range(len(wavelengths)) if min_wavelength_fwhm < wavelengths[i] < max_wavelength_fwhm]
-                if new_wavelengths is not None: current_indices_new = [i for i in range(len(new_wavelengths)) if min_wavelength_fwhm < new_wavelengths[i] < max_wavelength_fwhm]
-                else: current_indices_new = None
+# -----------------------------------------------------------------
 
-                # Check if there are at least 3
-                #if len(current_indices) >= min_wavelengths_in_fwhm: continue
+def create_subgrid_wavelength_grids(npoints_range, emission_lines=None, fixed=None, min_wavelength=None, max_wavelength=None,
+                                    filters=None, min_wavelengths_in_filter=5, min_wavelengths_in_fwhm=3, adjust_to=None,
+                                    return_elements=False):
 
-                if len(current_indices) < min_wavelengths_in_fwhm:
+    """
+    This function creates a family of wavelength grids, one for each number of points in the specified sequence,
+    with the same emission lines, fixed wavelengths, filters and wavelength range
+    :param npoints_range: sequence of the target numbers of points
+    :param emission_lines:
+    :param fixed:
+    :param min_wavelength:
+    :param max_wavelength:
+    :param filters:
+    :param min_wavelengths_in_filter:
+    :param min_wavelengths_in_fwhm:
+    :param adjust_to:
+    :param return_elements:
+    :return: a list with, for each grid, the same as create_one_subgrid_wavelength_grid
+    """
 
-                    # Otherwise, delete the current wavelengths and add 3 new ones
-                    # NO: DON'T DELETE JUST YET: DON'T DELETE WAVELENGTHS OF OTHER FILTERS
-                    # FIRST DELETE AT THE END AND THEN ADD THEM ALL
-                    #for index in sorted(current_indices, reverse=True): del wavelengths[index]
+    # Create the engine, and create the grids
+    engine = WavelengthGridEngine(emission_lines=emission_lines, fixed=fixed, min_wavelength=min_wavelength,
+                                  max_wavelength=max_wavelength, filters=filters,
+                                  min_wavelengths_in_filter=min_wavelengths_in_filter,
+                                  min_wavelengths_in_fwhm=min_wavelengths_in_fwhm, adjust_to=adjust_to)
+    return engine.create_family(npoints_range, return_elements=return_elements)
 
-                    # Generate new wavelengths for sampling the inner filter range on a logarithmic grid
-                    new_wavelengths = fltr.fwhm_range.log(min_wavelengths_in_fwhm, as_list=True)
+# -----------------------------------------------------------------
 
-                    #print("(FWHM)", fltr, fltr.fwhm_range, [str(wavelength) for wavelength in new_wavelengths])
+class FilterSampling(object):
 
-                    # Add the new wavelengths
-                    # NO: DON'T ADD JUST YET: DON'T DELETE WAVELENGTHS OF OTHER FILTERS
-                    # FIRST DELETE AT THE END AND THEN ADD THEM ALL
-                    #wavelengths += new_wavelengths
+    """
+    This class contains the properties of a filter that determine how it is sampled by a wavelength grid, as floating
+    point values in the grid unit (converted once)
+    """
 
-                    # Add to dictionary
-                    if current_indices_new is not None:
-                        for index in sorted(current_indices_new, reverse=True): del filter_wavelengths[fltr][index]
-                    filter_wavelengths[fltr].extend(new_wavelengths)
+    def __init__(self, fltr, min_wavelengths_in_filter=5, min_wavelengths_in_fwhm=3):
 
-            #print(str(fltr), fltr.peak)
+        """
+        The constructor ...
+        :param fltr:
+        :param min_wavelengths_in_filter:
+        :param min_wavelengths_in_fwhm:
+        """
 
-            # NEW: Make sure the peak wavelength is included
-            if fltr.peak is not None:
+        # The filter
+        self.filter = fltr
+        self.broad = isinstance(fltr, BroadBandFilter)
 
-                # New wavelengths have been added
-                filter_wavelengths[fltr].extend([]) # make sure there is a list
-                if len(filter_wavelengths[fltr]) > 0:
+        # Broad band filter
+        if self.broad:
 
-                    # Find closest
-                    index = sequences.find_closest_index(filter_wavelengths[fltr], fltr.peak)
-                    #all_index = sequences.find_closest_index(wavelengths, fltr.peak)
+            # The range of the filter, and the wavelengths for sampling it on a logarithmic grid
+            self.min = to_grid_value(fltr.min)
+            self.max = to_grid_value(fltr.max)
+            self.range_wavelengths = to_grid_values(fltr.range.log(min_wavelengths_in_filter))
 
-                    # Replace
-                    filter_wavelengths[fltr][index] = fltr.peak
-                    #wavelengths[all_index] = fltr.peak
+            # The inner range (mean +- FWHM), and the wavelengths for sampling it on a logarithmic grid
+            if fltr.fwhm is not None:
+                self.min_fwhm = to_grid_value(fltr.mean - fltr.fwhm)
+                self.max_fwhm = to_grid_value(fltr.mean + fltr.fwhm)
+                self.fwhm_wavelengths = to_grid_values(fltr.fwhm_range.log(min_wavelengths_in_fwhm))
+            else: self.min_fwhm = self.max_fwhm = self.fwhm_wavelengths = None
 
-                # Nothing has been added
-                else:
+            # The peak wavelength
+            self.peak = to_grid_value(fltr.peak) if fltr.peak is not None else None
 
-                    #wavelengths.append(fltr.peak)
-                    filter_wavelengths[fltr].append(fltr.peak)
+        # Narrow band filter
+        elif isinstance(fltr, NarrowBandFilter): self.wavelength = to_grid_value(fltr.wavelength)
 
-                # ADD AS EXACT WAVELENGTH
-                exact_wavelengths[fltr].append(fltr.peak)
+        # Unrecognized filter
+        else: raise ValueError("Unrecognized filter object: " + str(fltr))
 
-        # For a narrow band filter, add the exact wavelength of the filter to the wavelength grid
-        elif isinstance(fltr, NarrowBandFilter):
+# -----------------------------------------------------------------
 
-            # Add the wavelength
-            #wavelengths.append(fltr.wavelength)
+class WavelengthGridEngine(object):
 
-            # One more filter for which we have added a wavelength
-            #narrow_added.append(str(fltr))
+    """
+    This class creates subgrid wavelength grids. The grids are constructed on arrays of floating point wavelengths in
+    the grid unit (micron): the filter properties, emission lines and fixed wavelengths are converted once, so that
+    a whole family of grids (e.g. for a range of numbers of points) can be created efficiently, and units are only
+    attached to the results.
+    """
 
-            # Add the wavelength
-            filter_wavelengths[fltr].append(fltr.wavelength)
+    def __init__(self, emission_lines=None, fixed=None, min_wavelength=None, max_wavelength=None, filters=None,
+                 min_wavelengths_in_filter=5, min_wavelengths_in_fwhm=3, adjust_to=None):
 
-            # Add as exact wavelength
-            exact_wavelengths[fltr].append(fltr.wavelength)
+        """
+        The constructor ...
+        :param emission_lines:
+        :param fixed:
+        :param min_wavelength:
+        :param max_wavelength:
+        :param filters:
+        :param min_wavelengths_in_filter:
+        :param min_wavelengths_in_fwhm:
+        :param adjust_to:
+        """
 
-        # Unrecognized filter
-        else: raise ValueError("Unrecognized filter object: " + str(fltr))
+        # The range
+        self.min_wavelength = to_grid_value(min_wavelength) if min_wavelength is not None else None
+        self.max_wavelength = to_grid_value(max_wavelength) if max_wavelength is not None else None
 
-    # DELETE WAVELENGTHS
-    for fltr in filter_wavelengths:
+        # The filters
+        self.min_wavelengths_in_filter = min_wavelengths_in_filter
+        self.min_wavelengths_in_fwhm = min_wavelengths_in_fwhm
+        self.filters = [FilterSampling(fltr, min_wavelengths_in_filter, min_wavelengths_in_fwhm) for fltr in filters] if filters is not None else None
 
-        fltr_wavelengths = filter_wavelengths[fltr]
-        nwavelengths = len(fltr_wavelengths)
-        if nwavelengths == 1: continue
+        # The wavelengths to adjust to
+        self.adjust_to = to_grid_values(adjust_to) if adjust_to is not None else None
 
-        min_wavelength = min(fltr_wavelengths)
-        max_wavelength = max(fltr_wavelengths)
+        # The emission lines: identifier, center, left and right
+        if emission_lines is not None:
+            self.lines = [(line.identifier, to_grid_value(line.center), to_grid_value(line.left), to_grid_value(line.right)) for line in emission_lines]
+        else: self.lines = None
 
-        #print(str(fltr), min_wavelength, max_wavelength)
+        # The fixed wavelengths
+        self.fixed = to_grid_values(fixed) if fixed is not None else None
 
-        # DELETE WAVELENGTHS BETWEEN
-        # Get indices of wavelengths between
-        indices = [i for i in range(len(wavelengths)) if min_wavelength < wavelengths[i] < max_wavelength]
+    # -----------------------------------------------------------------
 
-        # Remove indices
-        for index in sorted(indices, reverse=True): del wavelengths[index]
+    def create_values(self, npoints):
 
-    # ADD FILTER WAVELENGTHS
-    for fltr in filter_wavelengths: wavelengths.extend(filter_wavelengths[fltr])
+        """
+        This function creates the wavelengths of the grid with the specified target number of points, and returns
+        them (sorted) together with the elements of the grid, all as floating point values in the grid unit
+        :param npoints:
+        :return:
+        """
 
-    # Return the filter wavelengths and exact wavelength
-    return filter_wavelengths, exact_wavelengths
+        # Get the subgrids, combine them (the subgrids are sorted and don't overlap)
+        subgrids = subgrid_values(npoints, self.min_wavelength, self.max_wavelength)
+        values = np.concatenate(list(subgrids.values())) if len(subgrids) > 0 else np.array([])
 
-# -----------------------------------------------------------------
+        # Sample the filters
+        if self.filters is not None: values, filter_values, exact_filter_values = resampled_filter_values(values, self.filters, self.min_wavelengths_in_filter, self.min_wavelengths_in_fwhm)
+        else: filter_values = exact_filter_values = OrderedDict()
 
-def adjust_to_wavelengths(wavelengths, adjust_to, keep=None):
+        # Adjust to the passed wavelengths, keeping the exact filter wavelengths
+        if self.adjust_to is not None:
+            keep = [value for fltr in exact_filter_values for value in exact_filter_values[fltr]]
+            values, replaced, new = adjusted_values(values, self.adjust_to, keep)
+        else: replaced = new = []
 
-    """
-    This function ...
-    :param wavelengths:
-    :param adjust_to:
-    :param keep:
-    :return:
-    """
+        # Add the emission lines
+        if self.lines is not None: values, line_values = emission_line_values(values, self.lines, self.min_wavelength, self.max_wavelength)
+        else: line_values = OrderedDict()
 
-    # Debugging
-    log.debug("Adjusting wavelength grid to include exact wavelengths ...")
+        # Add the fixed wavelength points that are not yet in the grid and lie within the range
+        new_fixed = []
+        if self.fixed is not None:
+            present = set(values.tolist())
+            for value in self.fixed.tolist():
+                if value in present: continue
+                if self.min_wavelength is not None and value < self.min_wavelength: continue
+                if self.max_wavelength is not None and value > self.max_wavelength: continue
+                present.add(value)
+                new_fixed.append(value)
+            values = np.concatenate((values, new_fixed))
 
-    # Replace dict
-    replace_dict = defaultdict(list)
+        # Return the sorted wavelengths, and the elements
+        return np.sort(values), subgrids, filter_values, replaced, new, line_values, new_fixed
 
-    # Original wavelengths with replaced
-    replaced = []
+    # -----------------------------------------------------------------
 
-    # New wavelengths
-    new = []
+    def create(self, npoints, return_elements=False):
 
-    # Loop over the wavelengths
-    for wavelength in adjust_to:
+        """
+        This function creates the grid with the specified target number of points
+        :param npoints:
+        :param return_elements:
+        :return:
+        """
 
         # Debugging
-        log.debug("Adjusting the wavelength grid for " + str(wavelength) + "...")
+        log.debug("Creating wavelength grid with " + str(npoints) + " points ...")
 
-        # Find closest
-        index = sequences.find_closest_index(wavelengths, wavelength)
+        # Create
+        values, subgrids, filter_values, replaced, new, line_values, new_fixed = self.create_values(npoints)
 
-        # Check if wavelength needs to be kept
-        if keep is not None and wavelengths[index] in keep:
-            wavelengths.append(wavelength)
-            new.append(wavelength)
+        # Create the wavelength grid
+        grid = WavelengthGrid.from_wavelengths(values, unit=u(grid_unit))
 
-        # Add wavelength to be replaced
-        else: replace_dict[index].append(wavelength)
+        # Return the grid and the elements (with units)
+        if return_elements: return grid, OrderedDict((subgrid, to_grid_quantities(subgrids[subgrid])) for subgrid in subgrids), \
+                                   to_grid_quantities_dict(filter_values), [tuple(to_grid_quantities(pair)) for pair in replaced], \
+                                   to_grid_quantities(new), to_grid_quantities_dict(line_values), to_grid_quantities(new_fixed)
 
-    # Loop over the indices for which a replacement will be performed
-    for index in replace_dict:
+        # Return the grid and some information about the elements
+        else:
 
-        # Only one replacement
-        if len(replace_dict[index]) == 1:
+            subgrid_npoints = OrderedDict((subgrid, len(subgrids[subgrid])) for subgrid in subgrids)
+            broad_resampled = [fltr for fltr in filter_values if isinstance(fltr, BroadBandFilter)]
+            narrow_added = [fltr for fltr in filter_values if isinstance(fltr, NarrowBandFilter)]
+            emission_npoints = sum(len(line_values[identifier]) for identifier in line_values)
+            fixed_npoints = len(new_fixed)
+            return grid, subgrid_npoints, emission_npoints, fixed_npoints, broad_resampled, narrow_added, \
+                   [tuple(to_grid_quantities(pair)) for pair in replaced], to_grid_quantities(new)
 
-            # Get the new wavelength
-            wavelength = replace_dict[index][0]
+    # -----------------------------------------------------------------
 
-            # Set
-            replaced.append((wavelengths[index], wavelength))
+    def create_family(self, npoints_range, return_elements=False):
 
-            # Replace the wavelength
-            wavelengths[index] = wavelength
+        """
+        This function creates the grids for each of the specified target numbers of points
+        :param npoints_range:
+        :param return_elements:
+        :return:
+        """
 
-        # Multiple wavelengths for one index
-        else:
+        return [self.create(npoints, return_elements=return_elements) for npoints in npoints_range]
 
-            # Get the wavelengths
-            adjust_wavelengths = replace_dict[index]
+# -----------------------------------------------------------------
 
-            # Get the closest wavelength to the previous wavelength
-            previous_wavelength = wavelengths[index]
+def subgrid_values(npoints, min_wavelength=None, max_wavelength=None):
 
-            # Find closest
-            adjust_index = sequences.find_closest_index(adjust_wavelengths, previous_wavelength)
+    """
+    This function returns the wavelengths of the subgrids (as arrays of values in the grid unit) for the specified
+    target number of points
+    :param npoints:
+    :param min_wavelength: value in the grid unit, or None
+    :param max_wavelength: value in the grid unit, or None
+    :return:
+    """
 
-            # Set
-            replaced.append((wavelengths[index], adjust_wavelengths[adjust_index]))
+    values = OrderedDict()
 
-            # Replace closest
-            wavelengths[index] = adjust_wavelengths[adjust_index]
+    # Loop over the subgrids
+    for subgrid in subgrids:
 
-            # Add other
-            for j in range(len(adjust_wavelengths)):
+        # Determine minimum, maximum
+        min_lambda, max_lambda = range_values[subgrid]
 
-                # Already added
-                if j == adjust_index: continue
+        # Skip subgrids out of range
+        if min_wavelength is not None and max_lambda < min_wavelength: continue
+        if max_wavelength is not None and min_lambda > max_wavelength: continue
 
-                # Add the wavelength
-                wavelengths.append(adjust_wavelengths[j])
+        # Generate the wavelength points for the normal number of wavelength points for this subgrid
+        subgrid_values = make_grid_values(min_lambda, max_lambda, int(round(relpoints[subgrid] * npoints)))
 
-                # Add to new
-                new.append(adjust_wavelengths[j])
+        # Filter based on given boundaries
+        if min_wavelength is not None: subgrid_values = subgrid_values[subgrid_values >= min_wavelength]
+        if max_wavelength is not None: subgrid_values = subgrid_values[subgrid_values <= max_wavelength]
+        values[subgrid] = subgrid_values
 
     # Return
-    return replaced, new
+    return values
 
 # -----------------------------------------------------------------
 
-def create_one_subgrid_wavelength_grid(npoints, emission_lines=None, fixed=None, min_wavelength=None, max_wavelength=None,
-                                       filters=None, min_wavelengths_in_filter=5, min_wavelengths_in_fwhm=3, adjust_to=None,
-                                       return_elements=False):
+def resampled_filter_values(values, filters, min_wavelengths_in_filter=5, min_wavelengths_in_fwhm=3):
 
     """
-    This function ...
-    :param npoints:
-    :param emission_lines:
-    :param fixed:
-    :param min_wavelength:
-    :param max_wavelength:
-    :param filters:
+    This function samples the filters with the wavelengths of the specified (sorted) grid: for broad band filters
+    that are not sampled by at least the specified number of grid points (over the full range or over the FWHM range),
+    the grid points in the filter range are replaced by a logarithmic grid over that range (and the peak wavelength),
+    for narrow band filters, the filter wavelength is added.
+    :param values: the sorted array of wavelengths in the grid unit
+    :param filters: list of FilterSampling objects
     :param min_wavelengths_in_filter:
     :param min_wavelengths_in_fwhm:
-    :param adjust_to:
-    :param return_elements:
-    :return:
+    :return: the new (unsorted) wavelengths, the added wavelengths for each filter, and the exact wavelengths for each filter
     """
 
-    # Debugging
-    log.debug("Creating wavelength grid with " + str(npoints) + " points ...")
-
-    # A list of the wavelength points
-    wavelengths = []
-
-    # Get subgrid wavelength sequences
-    subgrid_wavelengths = get_subgrid_wavelengths(npoints, min_wavelength=min_wavelength, max_wavelength=max_wavelength)
-
-    # Loop over the subgrids
-    for subgrid in subgrid_wavelengths:
-
-        # Debugging
-        log.debug("Adding the " + subgrid + " subgrid ...")
-
-        # Add the wavelength points
-        wavelengths += subgrid_wavelengths[subgrid]
+    # Initialize dictionary for the wavelengths for each filter, and the wavelengths that need to remain exactly as they are
+    filter_values = OrderedDict()
+    exact_values = OrderedDict()
 
     # Loop over the filters
-    if filters is not None: filter_wavelengths, exact_filter_wavelengths = resample_filter_wavelengths(wavelengths, filters, min_wavelengths_in_filter=min_wavelengths_in_filter, min_wavelengths_in_fwhm=min_wavelengths_in_fwhm)
-    else:
-        filter_wavelengths = dict()
-        exact_filter_wavelengths = dict()
-
-    # Get a list of all the exact wavelengths that can't be adjusted
-    exact_wavelengths = []
-    for fltr in exact_filter_wavelengths: exact_wavelengths.extend(exact_filter_wavelengths[fltr])
+    for sampling in filters:
 
-    # Adjust to passed wavelengths
-    if adjust_to is not None: replaced, new = adjust_to_wavelengths(wavelengths, adjust_to, keep=exact_wavelengths)
-    else: replaced = new = []
+        fltr = sampling.filter
+        wavelengths = []
 
-    # Add the emission lines
-    if emission_lines is not None:
-
-        # Debugging
-        log.debug("Adding the emission lines ...")
+        # Broad band filter
+        if sampling.broad:
 
-        # Add the mission lines
-        wavelengths, line_wavelengths = added_emission_lines(wavelengths, emission_lines, min_wavelength, max_wavelength, return_added=True)
+            # Check that the range of the filter is sampled by enough grid points (strictly inside the range)
+            if npoints_between(values, sampling.min, sampling.max) < min_wavelengths_in_filter:
+                wavelengths = list(sampling.range_wavelengths)
+                added_range = True
+            else: added_range = False
 
-    # No emission lines
-    else: line_wavelengths = dict()
+            # Check that the inner range of the filter is sampled by enough grid points
+            if sampling.fwhm_wavelengths is not None and npoints_between(values, sampling.min_fwhm, sampling.max_fwhm) < min_wavelengths_in_fwhm:
 
-    # Add fixed wavelength points
-    new_fixed = []
-    if fixed is not None:
+                # Remove the wavelengths of the full range that lie in the inner range, add the inner range wavelengths
+                if added_range: wavelengths = [value for value in wavelengths if not sampling.min_fwhm < value < sampling.max_fwhm]
+                wavelengths.extend(sampling.fwhm_wavelengths)
 
-        # Debugging
-        log.debug("Adding the fixed points to the grid ...")
+            # Make sure the peak wavelength is included, replacing the closest wavelength
+            if sampling.peak is not None:
+                if len(wavelengths) > 0: wavelengths[int(np.argmin(np.abs(np.array(wavelengths) - sampling.peak)))] = sampling.peak
+                else: wavelengths.append(sampling.peak)
+                exact_values.setdefault(fltr, []).append(sampling.peak)
 
-        # Loop over the wavelengths
-        for wavelength in fixed:
+        # Narrow band filter: add the exact wavelength of the filter
+        else:
+            wavelengths.append(sampling.wavelength)
+            exact_values.setdefault(fltr, []).append(sampling.wavelength)
 
-            # Check if not already there (e.g. from adjust_to)
-            if wavelength in wavelengths: continue
+        # Add the wavelengths
+        if len(wavelengths) > 0: filter_values.setdefault(fltr, []).extend(wavelengths)
 
-            # Debugging
-            log.debug("Adding fixed wavelength " + str(wavelength) + " ...")
+    # Remove the grid points between the minimum and maximum added wavelength for each filter
+    keep = np.ones(len(values), dtype=bool)
+    for fltr in filter_values:
+        if len(filter_values[fltr]) == 1: continue
+        keep[np.searchsorted(values, min(filter_values[fltr]), side="right"):np.searchsorted(values, max(filter_values[fltr]), side="left")] = False
 
-            if min_wavelength is not None and wavelength < min_wavelength: continue
-            if max_wavelength is not None and wavelength > max_wavelength: continue
-            wavelengths.append(wavelength)
+    # Add the filter wavelengths
+    values = np.concatenate([values[keep]] + [np.array(filter_values[fltr]) for fltr in filter_values])
 
-            # Add to fixed
-            new_fixed.append(wavelength)
+    # Return the new wavelengths, the filter wavelengths and the exact wavelengths
+    return values, filter_values, exact_values
 
-    #print(wavelengths)
+# -----------------------------------------------------------------
 
-    # Sort the wavelength points
-    wavelengths = sorted(wavelengths)
+def npoints_between(values, minimum, maximum):
 
-    # Create the wavelength grid
-    grid = WavelengthGrid.from_wavelengths(wavelengths)
+    """
+    This function returns the number of values in the sorted array that lie strictly between the minimum and maximum
+    :param values:
+    :param minimum:
+    :param maximum:
+    :return:
+    """
 
-    # Return the grid and some information about the subgrids
-    if return_elements: return grid, subgrid_wavelengths, filter_wavelengths, replaced, new, line_wavelengths, new_fixed
-    else:
+    return max(0, np.searchsorted(values, maximum, side="left") - np.searchsorted(values, minimum, side="right"))
 
-        # Keep track of the number of points per subgrid
-        subgrid_npoints = OrderedDict()
-        for subgrid in subgrid_wavelengths:
-            subgrid_npoints[subgrid] = len(subgrid_wavelengths[subgrid])
+# -----------------------------------------------------------------
 
-        # Set broad resampled nwavelengths
-        broad_resampled = []
-        for fltr in filter_wavelengths:
-            if not isinstance(fltr, BroadBandFilter): continue
-            broad_resampled.append(fltr)
+def adjusted_values(values, adjust_to, keep=None):
 
-        # Set narrow band filter added nwavelengths
-        narrow_added = []
-        for fltr in filter_wavelengths:
-            if not isinstance(fltr, NarrowBandFilter): continue
-            narrow_added.append(fltr)
+    """
+    This function replaces the wavelengths closest to each of the wavelengths in adjust_to by that wavelength, unless
+    the closest wavelength should be kept (then the new wavelength is added). If multiple wavelengths have the same
+    closest wavelength, the one closest to it replaces it and the others are added.
+    :param values: the array of wavelengths in the grid unit
+    :param adjust_to: the array of wavelengths to adjust to, in the grid unit
+    :param keep: the wavelengths that should not be replaced, in the grid unit
+    :return: the new wavelengths, the list of (original, new) replaced wavelengths, the list of added wavelengths
+    """
 
-        # Set emission npoints
-        emission_npoints = 0
-        for line_identifier in line_wavelengths:
-            emission_npoints += len(line_wavelengths[line_identifier])
+    keep = set(keep) if keep is not None else set()
+    values = np.array(values, dtype=float)
+    new = []
 
-        # Set fixed npoints
-        fixed_npoints = len(new_fixed)
+    # Find the closest wavelength for each wavelength to adjust to (add the wavelength if the closest should be kept)
+    replace = OrderedDict()
+    for value in adjust_to:
+        index = int(np.argmin(np.abs(values - value)))
+        if values[index] in keep:
+            values = np.append(values, value)
+            new.append(value)
+        else: replace.setdefault(index, []).append(value)
+
+    # Replace (if multiple wavelengths have the same closest wavelength, the closest of them replaces it, the
+    # others are added)
+    replaced = []
+    added = []
+    for index in sorted(replace):
+        candidates = replace[index]
+        closest = int(np.argmin(np.abs(np.array(candidates) - values[index])))
+        replaced.append((values[index], candidates[closest]))
+        values[index] = candidates[closest]
+        added.extend(candidate for j, candidate in enumerate(candidates) if j != closest)
+    new.extend(added)
 
-        # Return
-        return grid, subgrid_npoints, emission_npoints, fixed_npoints, broad_resampled, narrow_added, replaced, new
+    # Return
+    return np.concatenate((values, added)), replaced, new
 
 # -----------------------------------------------------------------
 
@@ -1921,11 +1957,50 @@ def create_one_nested_log_wavelength_grid(wrange, npoints, wrange_zoom, npoints_
 
 # -----------------------------------------------------------------
 
+def emission_line_values(values, lines, min_wavelength=None, max_wavelength=None):
+
+    """
+    This function adds the emission lines to the wavelengths: for each line, the wavelengths in the (slightly widened)
+    range of the line are replaced by the center, left and right wavelength of the line
+    :param values: the array of wavelengths in the grid unit
+    :param lines: sequence of (identifier, center, left, right) tuples, in the grid unit
+    :param min_wavelength: value in the grid unit, or None
+    :param max_wavelength: value in the grid unit, or None
+    :return: the new wavelengths, and the wavelengths added for each line
+    """
+
+    # Initialize dictionary to contain the wavelengths added to the grid for each emission line
+    line_values = OrderedDict()
+
+    # Add emission line grid points
+    logdelta = 0.001
+    for identifier, center, left, right in lines:
+
+        if min_wavelength is not None and center < min_wavelength: continue
+        if max_wavelength is not None and center > max_wavelength: continue
+
+        logleft = np.log10(left if left > 0 else center) - logdelta
+        logright = np.log10(right if right > 0 else center) + logdelta
+
+        # Remove the wavelengths within the range of the line
+        logvalues = np.log10(values)
+        values = values[(logvalues < logleft) | (logvalues > logright)]
+
+        # Add the line wavelengths
+        added = [center] + ([left] if left > 0 else []) + ([right] if right > 0 else [])
+        values = np.concatenate((values, added))
+        line_values.setdefault(identifier, []).extend(added)
+
+    # Return the new wavelengths
+    return values, line_values
+
+# -----------------------------------------------------------------
+
 def added_emission_lines(wavelengths, emission_lines, min_wavelength=None, max_wavelength=None, return_added=False):
 
     """
     This function ...
-    :param wavelengths:
+    :param wavelengths: wavelength quantities, or values in micron
     :param emission_lines:
     :param min_wavelength:
     :param max_wavelength:
@@ -1933,75 +2008,100 @@ def added_emission_lines(wavelengths, emission_lines, min_wavelength=None, max_w
     :return:
     """
 
-    # Initialize dictionary to contain the wavelengths added to the grid for each emission line
-    line_wavelengths = DefaultOrderedDict(list)
+    lines = [(line.identifier, to_grid_value(line.center), to_grid_value(line.left), to_grid_value(line.right)) for line in emission_lines]
+    values, line_values = emission_line_values(to_grid_values(wavelengths), lines,
+                                               to_grid_value(min_wavelength) if min_wavelength is not None else None,
+                                               to_grid_value(max_wavelength) if max_wavelength is not None else None)
 
-    # Add emission line grid points
-    logdelta = 0.001
-    for line in emission_lines:
+    # Return the new wavelength list (with units if the wavelengths had units)
+    with_unit = len(wavelengths) > 0 and hasattr(wavelengths[0], "unit")
+    wavelengths = to_grid_quantities(values) if with_unit else list(values)
+    if return_added: return wavelengths, to_grid_quantities_dict(line_values)
+    else: return wavelengths
 
-        center_micron = line.center.to("micron").value
-        left_micron = line.left.to("micron").value
-        right_micron = line.right.to("micron").value
+# -----------------------------------------------------------------
 
-        if min_wavelength is not None and line.center < min_wavelength: continue
-        if max_wavelength is not None and line.center > max_wavelength: continue
+def make_grid_values(wmin, wmax, N):
 
-        # logcenter = np.log10(center)
-        logleft = np.log10(left_micron if left_micron > 0 else center_micron) - logdelta
-        logright = np.log10(right_micron if right_micron > 0 else center_micron) + logdelta
+    """
+    This function returns a wavelength grid (as an array of values in micron) with a given resolution (nr of points
+    per decade) in the specified range (in micron), aligned with the 10^n grid points.
+    """
 
-        newgrid = []
+    if N < 1: return np.array([])
 
-        for w in wavelengths:
+    # generate wavelength points p on a logarithmic scale with lambda = 10**p micron
+    #  -2 <==> 0.01
+    #   4 <==> 10000
+    values = 10.**(np.arange(-2*N, 4*N+1) / float(N))
+    return values[(wmin <= values) & (values < wmax)]
 
-            logw = np.log10(w.to("micron").value)
-            if logw < logleft or logw > logright: newgrid.append(w)
+# -----------------------------------------------------------------
 
-        newgrid.append(line.center)
-        line_wavelengths[line.identifier].append(line.center)
+def make_grid(wmin, wmax, N):
 
-        if left_micron > 0:
-            newgrid.append(line.left)
-            line_wavelengths[line.identifier].append(line.left)
+    """
+    This function returns a wavelength grid (in micron) with a given resolution (nr of points per decade)
+    # in the specified range (in micron), aligned with the 10^n grid points.
+    """
 
-        if right_micron > 0:
-            newgrid.append(line.right)
-            line_wavelengths[line.identifier].append(line.right)
+    return to_grid_quantities(make_grid_values(to_grid_value(wmin), to_grid_value(wmax), N))
 
-        wavelengths = newgrid
+# -----------------------------------------------------------------
 
-    # Return the new wavelength list
-    if return_added: return wavelengths, line_wavelengths
-    else: return wavelengths
+def to_grid_value(wavelength):
+
+    """
+    This function returns the value of the specified wavelength in the grid unit
+    :param wavelength:
+    :return:
+    """
+
+    return wavelength.to(grid_unit).value if hasattr(wavelength, "unit") else float(wavelength)
 
 # -----------------------------------------------------------------
 
-def make_grid(wmin, wmax, N):
+def to_grid_values(wavelengths):
 
     """
-    This function returns a wavelength grid (in micron) with a given resolution (nr of points per decade)
-    # in the specified range (in micron), aligned with the 10^n grid points.
+    This function returns the values of the specified wavelengths (sequence of quantities, quantity array, or values
+    in the grid unit) as an array in the grid unit
+    :param wavelengths:
+    :return:
     """
 
-    result = []
+    if wavelengths is None: return None
+    if hasattr(wavelengths, "unit"): return np.asarray(wavelengths.to(grid_unit).value, dtype=float).ravel()
+    return np.array([to_grid_value(wavelength) for wavelength in wavelengths], dtype=float)
 
-    wmin = wmin.to("micron").value
-    wmax = wmax.to("micron").value
+# -----------------------------------------------------------------
 
-    # generate wavelength points p on a logarithmic scale with lambda = 10**p micron
-    #  -2 <==> 0.01
-    #   4 <==> 10000
-    for i in range(-2*N,4*N+1):
-        p = float(i)/N
-        w = 10.**p
-        if wmin <= w < wmax: result.append(w * u("micron"))
+def to_grid_quantities(values):
 
-    # Return the grid
-    return result
+    """
+    This function returns a list of wavelength quantities for the specified values in the grid unit
+    :param values:
+    :return:
+    """
+
+    unit = u(grid_unit)
+    return [value * unit for value in np.asarray(values, dtype=float).tolist()]
 
 # -----------------------------------------------------------------
 
+def to_grid_quantities_dict(values):
+
+    """
+    This function ...
+    :param values:
+    :return:
+    """
+
+    quantities = DefaultOrderedDict(list)
+    for key in values: quantities[key] = to_grid_quantities(values[key])
+    return quantities
+
+# -----------------------------------------------------------------
 def get_min_wavelength(minimum, check_filters=None, adjust_minmax=False):
 
     """
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.core.remote.blobstore Contains the RemoteBlobStore class, a content-addressed store of (input) files
+#  on a remote host.
+#
+# Each file is stored once on the remote host, under the SHA1 digest of its contents. Only the files of which the
+# digest is not yet present are uploaded (in one bulk transfer, compressed or not depending on the file type).
+# Directories with the files under the desired names (e.g. simulation input directories) are then created on the
+# remote host with hard links to the stored files (or symbolic links, if hard links are not possible).
+# The digests of the local files are cached, based on their path, size and modification time.
+#
+# The uploaded files are only moved into the store after their digest is verified on the remote host. Files that are
+# no longer linked from any directory (and were not used recently, to protect symbolic links) can be pruned.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import re
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+# Import the relevant PTS classes and modules
+from ..tools import filesystem as fs
+from ..tools import introspection
+from ..basics.log import log
+from .metadata import quote, chunks
+
+# -----------------------------------------------------------------
+
+# The path of the local digest cache
+digests_path = fs.join(introspection.pts_temp_dir, "digests.dat")
+
+# The extensions of files that are already compressed (these are transferred without compression)
+compressed_extensions = ["gz", "bz2", "xz", "zip", "tgz", "fz", "npz", "png", "jpg", "jpeg", "pdf", "h5", "hdf5"]
+
+# The pattern of the output lines of sha1sum (or shasum)
+digest_line_pattern = re.compile(r"^([0-9a-f]{40})\s+\*?([0-9a-f]{40})$")
+
+# The default number of days after which stored files that are not linked anymore are pruned
+default_prune_days = 30
+
+# -----------------------------------------------------------------
+
+def file_digest(path, blocksize=2**20):
+
+    """
+    This function calculates the SHA1 digest of the contents of a file
+    :param path:
+    :param blocksize:
+    :return:
+    """
+
+    sha = hashlib.sha1()
+    with open(path, "rb") as fh:
+        while True:
+            data = fh.read(blocksize)
+            if not data: break
+            sha.update(data)
+    return sha.hexdigest()
+
+# -----------------------------------------------------------------
+
+def is_compressible(path):
+
+    """
+    This function returns whether a file benefits from compression during the transfer, based on its extension
+    :param path:
+    :return:
+    """
+
+    return fs.get_extension(fs.name(path)).lower() not in compressed_extensions
+
+# -----------------------------------------------------------------
+
+class DigestCache(object):
+
+    """
+    This class keeps the digests of local files, which are only recalculated when the size or modification time of
+    a file changes
+    """
+
+    def __init__(self, path=digests_path):
+
+        """
+        The constructor ...
+        :param path: the path of the cache file
+        """
+
+        # The path of the cache file
+        self.path = path
+
+        # The digests: path -> (size, modification time, digest)
+        self.entries = dict()
+        if fs.is_file(path): self.load()
+
+    # -----------------------------------------------------------------
+
+    @staticmethod
+    def stamp(path):
+
+        """
+        This function returns the size and the modification time of a file, as they are kept in the cache
+        :param path:
+        :return:
+        """
+
+        stat = os.stat(path)
+        return stat.st_size, repr(stat.st_mtime)
+
+    # -----------------------------------------------------------------
+
+    def load(self):
+
+        """
+        This function loads the cache file. The digests are appended to the file as they are calculated, so the
+        file is rewritten when it contains entries that are replaced or of which the file has been changed or removed
+        :return:
+        """
+
+        # Read the entries (later entries for the same path replace the earlier ones)
+        nlines = 0
+        for line in fs.read_lines(self.path):
+            nlines += 1
+            parts = line.split(" ", 3)
+            if len(parts) != 4: continue
+            digest, size, mtime, filepath = parts
+            self.entries[filepath] = (int(size), mtime, digest)
+
+        # Remove the entries of files that have been changed or removed
+        for filepath, (size, mtime, digest) in list(self.entries.items()):
+            try: current = self.stamp(filepath) == (size, mtime)
+            except OSError: current = False
+            if not current: del self.entries[filepath]
+
+        # Rewrite the file without the stale entries
+        if len(self.entries) < nlines: self.save()
+
+    # -----------------------------------------------------------------
+
+    def save(self):
+
+        """
+        This function writes the cache file
+        :return:
+        """
+
+        lines = [digest + " " + str(size) + " " + mtime + " " + filepath for filepath, (size, mtime, digest) in self.entries.items()]
+        try:
+            with fs.atomic_write(self.path) as temp_path: fs.write_lines(temp_path, lines)
+        except (IOError, OSError): pass # the cache is only rewritten to keep it small
+
+    # -----------------------------------------------------------------
+
+    def digest(self, path):
+
+        """
+        This function returns the digest of a file
+        :param path:
+        :return:
+        """
+
+        path = fs.absolute_path(path)
+        size, mtime = self.stamp(path)
+
+        # Cached
+        if path in self.entries:
+            cached_size, cached_mtime, digest = self.entries[path]
+            if cached_size == size and cached_mtime == mtime: return digest
+
+        # Calculate, add to the cache
+        digest = file_digest(path)
+        self.entries[path] = (size, mtime, digest)
+        fs.append_line(self.path, digest + " " + str(size) + " " + mtime + " " + path)
+        return digest
+
+# -----------------------------------------------------------------
+
+class RemoteBlobStore(object):
+
+    """
+    This class represents a content-addressed store of files on a remote host
+    """
+
+    def __init__(self, remote, path=None, digests=None):
+
+        """
+        The constructor ...
+        :param remote: the Remote instance
+        :param path: the path of the store on the remote host (the 'blobs' directory in the remote PTS root by default)
+        :param digests: the DigestCache (the default cache if None)
+        """
+
+        # The remote
+        self.remote = remote
+
+        # The path of the store
+        self.path = path if path is not None else fs.join(remote.pts_root_path, "blobs")
+
+        # The digest cache
+        self.digests = digests if digests is not None else DigestCache()
+
+    # -----------------------------------------------------------------
+
+    def blob_path(self, digest):
+
+        """
+        This function ...
+        :param digest:
+        :return:
+        """
+
+        return fs.join(self.path, digest)
+
+    # -----------------------------------------------------------------
+
+    def missing(self, digests):
+
+        """
+        This function returns the digests of which the file is not yet in the store
+        :param digests:
+        :return:
+        """
+
+        infos = self.remote.metadata.stat([self.blob_path(digest) for digest in digests], list_directories=False)
+        return [digest for digest in digests if not infos[self.blob_path(digest)].is_file]
+
+    # -----------------------------------------------------------------
+
+    def add(self, paths):
+
+        """
+        This function adds local files to the store, uploading only the files of which the contents are not yet
+        present on the remote host
+        :param paths: the local file paths
+        :return: dictionary of the digests of the files (per path)
+        """
+
+        # Get the digests
+        digests = OrderedDict((path, self.digests.digest(path)) for path in paths)
+
+        # Determine the files that have to be uploaded (each distinct content only once)
+        unique = OrderedDict((digest, path) for path, digest in digests.items())
+        missing = self.missing(list(unique.keys()))
+        if len(missing) == 0:
+            log.debug("All " + str(len(digests)) + " files are already present on the remote host")
+            return digests
+
+        # Debugging
+        log.debug("Uploading " + str(len(missing)) + " of " + str(len(digests)) + " files to the store on the remote host ...")
+
+        # Create a local directory with links to the files, named after their digest
+        staging_path = tempfile.mkdtemp(prefix="blobs-", dir=introspection.pts_temp_dir)
+        incoming_path = fs.join(self.path, "incoming-" + fs.name(staging_path))
+        try:
+
+            compressed = []
+            uncompressed = []
+            for digest in missing:
+                link_path = fs.join(staging_path, digest)
+                os.symlink(fs.absolute_path(unique[digest]), link_path)
+                if is_compressible(unique[digest]): compressed.append(link_path)
+                else: uncompressed.append(link_path)
+
+            # Upload to a temporary directory in the store
+            self.remote.create_directory(incoming_path, recursive=True)
+            try:
+                if len(compressed) > 0 and not self.remote.upload(compressed, incoming_path, compress=True): raise RuntimeError("The files could not be uploaded to the store on the remote host")
+                if len(uncompressed) > 0 and not self.remote.upload(uncompressed, incoming_path): raise RuntimeError("The files could not be uploaded to the store on the remote host")
+                self.verify(incoming_path, missing)
+
+            # Remove the (partially) uploaded files
+            except Exception:
+                self.remote.execute("rm -rf " + quote(incoming_path), output=False)
+                raise
+
+            # Move the files into the store
+            self.remote.execute("mv " + quote(incoming_path) + "/* " + quote(self.path) + "/ && rmdir " + quote(incoming_path), output=False)
+
+        # Remove the local links
+        finally: fs.remove_directory(staging_path)
+
+        # Return the digests
+        return digests
+
+    # -----------------------------------------------------------------
+
+    def verify(self, directory, digests):
+
+        """
+        This function checks whether the files in a remote directory (named after their digest) are complete, by
+        calculating their digest on the remote host
+        :param directory:
+        :param digests:
+        :return:
+        """
+
+        # Debugging
+        log.debug("Verifying the digests of the uploaded files ...")
+
+        # Calculate the digests on the remote host
+        found = set()
+        for group in chunks(digests):
+            names = " ".join(quote(digest) for digest in group)
+            output = self.remote.execute("( cd " + quote(directory) + " && { sha1sum " + names + " 2>/dev/null || shasum -a 1 " + names + "; } )", read_only=True)
+            for line in output:
+                match = digest_line_pattern.match(line.strip())
+                if match is not None and match.group(1) == match.group(2): found.add(match.group(1))
+
+        # Check
+        corrupt = [digest for digest in digests if digest not in found]
+        if len(corrupt) > 0: raise RuntimeError("The contents of " + str(len(corrupt)) + " uploaded files do not match (e.g. '" + corrupt[0] + "')")
+
+    # -----------------------------------------------------------------
+
+    def prune(self, days=default_prune_days):
+
+        """
+        This function removes the files from the store that are not linked from any directory anymore (that have
+        no other hard links) and that were not used for a number of days. Files that are linked with symbolic links
+        are touched, so that they are kept while they are used. Incomplete uploads of more than a day old are
+        removed as well.
+        :param days: the number of days
+        :return: the number of removed files
+        """
+
+        # Inform the user
+        log.info("Pruning the store of input files on the remote host ...")
+
+        # Remove the files, print their names
+        command = "find " + quote(self.path) + " -maxdepth 1 -type f -links 1 -mtime +" + str(int(days)) + " -print -delete"
+        output = self.remote.execute(command)
+        nremoved = len([line for line in output if line.strip().startswith(self.path + "/")])
+
+        # Remove incomplete uploads
+        self.remote.execute("find " + quote(self.path) + " -maxdepth 1 -type d -name 'incoming-*' -mtime +1 -exec rm -rf {} +", output=False)
+
+        # Debugging
+        log.debug("Removed " + str(nremoved) + " files from the store")
+
+        # Return the number of removed files
+        return nremoved
+
+    # -----------------------------------------------------------------
+
+    def materialize(self, files, directory):
+
+        """
+        This function creates a directory on the remote host with the specified files, as links to the files
+        in the store (the files are added to the store if necessary)
+        :param files: dictionary of the local file paths, for each name (relative path) in the directory
+        :param directory: the remote directory
+        :return:
+        """
+
+        # Add the files to the store
+        digests = self.add(list(files.values()))
+
+        # Determine the directories that have to be created
+        directories = set([directory] + [fs.join(directory, fs.directory_of(name)) for name in files if "/" in name])
+
+        # Create the directories and the links (hard links, symbolic links if hard links are not possible: then the
+        # stored file is touched, so that it is not pruned while it is used)
+        commands = ["mkdir -p " + " ".join(quote(path) for path in sorted(directories))]
+        for name, path in files.items():
+            blob_path = self.blob_path(digests[path])
+            link_path = fs.join(directory, name)
+            commands.append("{ ln -f " + quote(blob_path) + " " + quote(link_path) + " 2>/dev/null || { ln -sf " + quote(blob_path) + " " + quote(link_path) + " && touch -c " + quote(blob_path) + "; }; }")
+
+        # Execute the commands (as few times as possible)
+        for group in chunks(commands): self.remote.execute(" && ".join(group), output=False)
+
+# -----------------------------------------------------------------
@@ -0,0 +1,585 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.core.remote.metadata Contains the RemoteMetadata class, which obtains the type, size, modification
+#  time and (optionally) the checksum of many paths on a remote file system in one shell command.
+#
+# The results are kept in a cache for a limited time (or until they are invalidated, e.g. because PTS itself changed
+# something on the remote file system). The shell is abstracted as a function that executes a command and returns
+# the output lines, so that the same code can be used (and tested) with a local shell.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import re
+import time
+import subprocess
+from collections import OrderedDict
+
+# Import the relevant PTS classes and modules
+from ..tools import filesystem as fs
+
+# -----------------------------------------------------------------
+
+# The default time (in seconds) during which cached metadata is considered valid
+default_ttl = 10.
+
+# The maximum length of the path arguments in one command (the length of a terminal input line is limited)
+max_arguments_length = 2500
+
+# The minimum number of paths in the same directory for which the directory is listed rather than the paths
+listing_threshold = 8
+
+# The maximum number of entries of such a directory, relative to the number of paths (larger directories are not
+# listed, the paths are obtained separately)
+max_listing_ratio = 4
+
+# -----------------------------------------------------------------
+
+# Shell function that prints a line with the type, size, modification time, checksum and path for its argument
+# (the '#S' prefix distinguishes the lines from the echo of the command)
+stat_function = """_pts_stat() { if [ -d "$1" ]; then t=d; elif [ -f "$1" ]; then t=f; elif [ -e "$1" ] || [ -L "$1" ]; then t=o; else echo "#""S n 0 0 - $1"; return; fi; s=$(stat -c '%s %Y' "$1" 2>/dev/null || stat -f '%z %m' "$1" 2>/dev/null || echo '0 0'); h=-; if [ $_pts_hash = 1 ] && [ $t = f ]; then h=$( (md5sum "$1" 2>/dev/null || md5 -r "$1") | cut -d' ' -f1); fi; echo "#""S $t $s $h $1"; }"""
+
+# Shell function that prints the metadata of a directory (its first argument) and of its contents, unless it has more
+# entries than its second argument (if that is positive): then a line with the '#L' prefix is printed instead
+list_function = """_pts_list() { _pts_stat "$1"; if [ -d "$1" ]; then if [ $2 -gt 0 ] && [ $(find "$1" -mindepth 1 -maxdepth 1 | head -n $(($2 + 1)) | wc -l) -gt $2 ]; then echo "#""L $1"; else find "$1" -mindepth 1 $_pts_depth | while IFS= read -r _pts_p; do _pts_stat "$_pts_p"; done; fi; fi; }"""
+
+# The pattern of the output lines
+stat_line_pattern = re.compile(r"^#S ([dfon]) (\d+) (\d+) (\S+) (.*)$")
+
+# The pattern of the output lines for directories that are not listed
+skipped_line_pattern = re.compile(r"^#L (.*)$")
+
+# -----------------------------------------------------------------
+
+def quote(path):
+
+    """
+    This function quotes a path for the shell
+    :param path:
+    :return:
+    """
+
+    return "'" + path.replace("'", "'\\''") + "'"
+
+# -----------------------------------------------------------------
+
+def normalize(path):
+
+    """
+    This function removes trailing slashes from a path
+    :param path:
+    :return:
+    """
+
+    return path.rstrip("/") if path != "/" else path
+
+# -----------------------------------------------------------------
+
+def chunks(paths, max_length=max_arguments_length, overhead=3):
+
+    """
+    This function divides a list of paths in groups for which the total length of the arguments is limited
+    :param paths:
+    :param max_length:
+    :param overhead: the number of characters that is added to each path in the command
+    :return:
+    """
+
+    group = []
+    length = 0
+    for path in paths:
+        if len(group) > 0 and length + len(path) + overhead > max_length:
+            yield group
+            group = []
+            length = 0
+        group.append(path)
+        length += len(path) + overhead
+    if len(group) > 0: yield group
+
+# -----------------------------------------------------------------
+
+def stat_command(paths, checksums=False):
+
+    """
+    This function creates the command that prints the metadata of the given paths
+    :param paths:
+    :param checksums:
+    :return:
+    """
+
+    hash_flag = "1" if checksums else "0"
+    return stat_function + "; _pts_hash=" + hash_flag + "; for _pts_p in " + " ".join(quote(path) for path in paths) + '; do _pts_stat "$_pts_p"; done'
+
+# -----------------------------------------------------------------
+
+def listing_command(directories, recursive=False, checksums=False, max_entries=None):
+
+    """
+    This function creates the command that prints the metadata of the given directories and of their contents
+    :param directories:
+    :param recursive:
+    :param checksums:
+    :param max_entries: the maximum number of entries of each directory (in the same order), or None: larger
+    directories are not listed
+    :return:
+    """
+
+    hash_flag = "1" if checksums else "0"
+    depth = "" if recursive else "-maxdepth 1"
+    if max_entries is None: max_entries = [0] * len(directories)
+    command = stat_function + "; " + list_function + "; _pts_hash=" + hash_flag + "; _pts_depth='" + depth + "'; "
+    command += "; ".join("_pts_list " + quote(path) + " " + str(int(maximum)) for path, maximum in zip(directories, max_entries))
+    return command
+
+# -----------------------------------------------------------------
+
+def parse_output(lines):
+
+    """
+    This function parses the output of a stat or listing command
+    :param lines:
+    :return: list of PathInfo objects
+    """
+
+    infos = []
+    for line in lines:
+        match = stat_line_pattern.match(line.strip("\r"))
+        if match is None: continue
+        ptype, size, mtime, checksum, path = match.groups()
+        infos.append(PathInfo(normalize(path), ptype, int(size), int(mtime), checksum if checksum != "-" else None))
+    return infos
+
+# -----------------------------------------------------------------
+
+def parse_skipped(lines):
+
+    """
+    This function parses the directories that were not listed from the output of a listing command
+    :param lines:
+    :return: list of paths
+    """
+
+    matches = [skipped_line_pattern.match(line.strip("\r")) for line in lines]
+    return [normalize(match.group(1)) for match in matches if match is not None]
+
+# -----------------------------------------------------------------
+
+def local_execute(command):
+
+    """
+    This function executes a command with the local shell (bash), as a stand-in for the remote shell
+    :param command:
+    :return: the output lines
+    """
+
+    output = subprocess.check_output(["bash", "-c", command])
+    if not isinstance(output, str): output = output.decode("utf8")
+    return output.splitlines()
+
+# -----------------------------------------------------------------
+
+class PathInfo(object):
+
+    """
+    This class contains the metadata of a path on the (remote) file system
+    """
+
+    def __init__(self, path, ptype, size, mtime, checksum=None):
+
+        """
+        The constructor ...
+        :param path:
+        :param ptype: 'f' (file), 'd' (directory), 'o' (other) or 'n' (not existing)
+        :param size: the size in bytes
+        :param mtime: the modification time (seconds since the epoch)
+        :param checksum: the MD5 checksum (for files, if requested)
+        """
+
+        self.path = path
+        self.type = ptype
+        self.size = size
+        self.mtime = mtime
+        self.checksum = checksum
+
+    # -----------------------------------------------------------------
+
+    @property
+    def exists(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.type != "n"
+
+    # -----------------------------------------------------------------
+
+    @property
+    def is_file(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.type == "f"
+
+    # -----------------------------------------------------------------
+
+    @property
+    def is_directory(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.type == "d"
+
+    # -----------------------------------------------------------------
+
+    @property
+    def name(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.name(self.path)
+
+    # -----------------------------------------------------------------
+
+    def __repr__(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return "<PathInfo " + self.type + " " + self.path + ">"
+
+# -----------------------------------------------------------------
+
+class RemoteMetadata(object):
+
+    """
+    This class obtains and caches the metadata of paths on a remote file system. Only absolute paths are cached.
+    """
+
+    def __init__(self, execute, ttl=default_ttl):
+
+        """
+        The constructor ...
+        :param execute: function that executes a shell command and returns the output lines
+        :param ttl: the time (in seconds) during which the metadata is cached (no caching if zero)
+        """
+
+        # The function to execute commands
+        self.execute = execute
+
+        # The time to live
+        self.ttl = ttl
+
+        # The cached metadata: path -> (time, PathInfo)
+        self.infos = dict()
+
+        # The cached directory listings: (directory, recursive) -> (time, list of paths)
+        self.listings = dict()
+
+        # The number of commands that have been executed
+        self.ncommands = 0
+
+    # -----------------------------------------------------------------
+
+    def invalidate(self, path=None):
+
+        """
+        This function removes a path (and everything within or above it) from the cache, or clears the cache
+        :param path: the path (the complete cache is cleared if None)
+        :return:
+        """
+
+        # Clear everything
+        if path is None:
+            self.infos.clear()
+            self.listings.clear()
+            return
+
+        path = normalize(path)
+        prefix = path + "/"
+
+        # Remove the path and everything within it
+        for cached_path in list(self.infos.keys()):
+            if cached_path == path or cached_path.startswith(prefix): del self.infos[cached_path]
+
+        # Remove the listings of the directories that contain the path, or are within it
+        for key in list(self.listings.keys()):
+            directory = key[0]
+            if path == directory or path.startswith(directory + "/") or directory.startswith(prefix): del self.listings[key]
+
+    # -----------------------------------------------------------------
+
+    def is_fresh(self, timestamp):
+
+        """
+        This function ...
+        :param timestamp:
+        :return:
+        """
+
+        return time.time() - timestamp < self.ttl
+
+    # -----------------------------------------------------------------
+
+    def cached(self, path, checksums=False):
+
+        """
+        This function returns the cached metadata for a path, or None
+        :param path:
+        :param checksums: whether the checksum is required
+        :return:
+        """
+
+        if path not in self.infos: return None
+        timestamp, info = self.infos[path]
+        if not self.is_fresh(timestamp): return None
+        if checksums and info.is_file and info.checksum is None: return None
+        return info
+
+    # -----------------------------------------------------------------
+
+    def add(self, infos):
+
+        """
+        This function adds metadata to the cache
+        :param infos:
+        :return:
+        """
+
+        if self.ttl <= 0: return
+        now = time.time()
+        for info in infos:
+            if info.path.startswith("/"): self.infos[info.path] = (now, info)
+
+    # -----------------------------------------------------------------
+
+    def run(self, command, skipped=None):
+
+        """
+        This function executes a command and parses the output
+        :param command:
+        :param skipped: list to which the directories that were not listed are added
+        :return:
+        """
+
+        self.ncommands += 1
+        lines = self.execute(command)
+        infos = parse_output(lines)
+        self.add(infos)
+        if skipped is not None: skipped.extend(parse_skipped(lines))
+        return infos
+
+    # -----------------------------------------------------------------
+
+    def stat(self, paths, checksums=False, list_directories=True):
+
+        """
+        This function returns the metadata of a number of paths, with as few commands as possible: paths that are
+        not cached are combined in one command (or a few, for very long lists), and directories that contain many
+        of the paths are listed instead
+        :param paths:
+        :param checksums: whether the checksums of the files are required
+        :param list_directories: list the directories that contain many of the paths (not for directories with
+        more than max_listing_ratio times as many entries)
+        :return: an ordered dictionary of the PathInfo objects for the (normalized) paths
+        """
+
+        paths = [normalize(path) for path in paths]
+        result = OrderedDict((path, self.cached(path, checksums=checksums)) for path in paths)
+        missing = [path for path in result if result[path] is None]
+
+        # List the directories that contain many of the missing paths
+        counts = OrderedDict()
+        for path in missing:
+            if path.startswith("/"): counts[fs.directory_of(path)] = counts.get(fs.directory_of(path), 0) + 1
+        directories = [directory for directory in counts if list_directories and counts[directory] >= listing_threshold]
+        if len(directories) > 0:
+
+            found = dict()
+            skipped = []
+            for group in chunks(directories, overhead=20):
+                command = listing_command(group, checksums=checksums, max_entries=[max_listing_ratio * counts[directory] for directory in group])
+                found.update((info.path, info) for info in self.run(command, skipped=skipped))
+
+            # Paths that are not in the listing of a directory do not exist (only if the directory was listed, or
+            # does not exist itself)
+            listed = set(directory for directory in directories if directory in found and directory not in skipped and (found[directory].is_directory or not found[directory].exists))
+            not_existing = [PathInfo(path, "n", 0, 0) for path in missing if path not in found and fs.directory_of(path) in listed]
+            self.add(not_existing)
+            result.update((path, found[path]) for path in missing if path in found)
+            result.update((info.path, info) for info in not_existing)
+
+        # Get the metadata of the remaining paths
+        missing = [path for path in missing if result[path] is None]
+        for group in chunks(missing):
+            for info in self.run(stat_command(group, checksums=checksums)): result[info.path] = info
+
+        # Paths for which there is no output (e.g. with newlines) do not exist
+        for path in result:
+            if result[path] is None: result[path] = PathInfo(path, "n", 0, 0)
+
+        # Return the metadata
+        return result
+
+    # -----------------------------------------------------------------
+
+    def info(self, path, checksums=False):
+
+        """
+        This function returns the metadata of one path
+        :param path:
+        :param checksums:
+        :return:
+        """
+
+        return list(self.stat([path], checksums=checksums).values())[0]
+
+    # -----------------------------------------------------------------
+
+    def exists(self, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        return self.info(path).exists
+
+    # -----------------------------------------------------------------
+
+    def is_file(self, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        return self.info(path).is_file
+
+    # -----------------------------------------------------------------
+
+    def is_directory(self, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        return self.info(path).is_directory
+
+    # -----------------------------------------------------------------
+
+    def size(self, path):
+
+        """
+        This function returns the size of a file (in bytes)
+        :param path:
+        :return:
+        """
+
+        info = self.info(path)
+        if not info.exists: raise IOError("The path '" + path + "' does not exist")
+        return info.size
+
+    # -----------------------------------------------------------------
+
+    def checksum(self, path):
+
+        """
+        This function returns the MD5 checksum of a file (None if it is not a file)
+        :param path:
+        :return:
+        """
+
+        return self.info(path, checksums=True).checksum
+
+    # -----------------------------------------------------------------
+
+    def listing(self, directory, recursive=False, ignore_hidden=True, checksums=False):
+
+        """
+        This function returns the metadata of the contents of a directory, sorted on path
+        :param directory:
+        :param recursive:
+        :param ignore_hidden: ignore hidden files and directories (and the contents of hidden directories)
+        :param checksums:
+        :return: list of PathInfo objects
+        """
+
+        directory = normalize(directory)
+        key = (directory, recursive)
+
+        # Get the cached listing
+        paths = None
+        if key in self.listings and self.is_fresh(self.listings[key][0]):
+            paths = self.listings[key][1]
+            infos = [self.cached(path, checksums=checksums) for path in paths]
+            if any(info is None for info in infos): paths = None
+
+        # List the directory (the listing is only cached if the directory itself was found)
+        if paths is None:
+            infos = self.run(listing_command([directory], recursive=recursive, checksums=checksums))
+            listed = any(info.path == directory and info.is_directory for info in infos)
+            infos = [info for info in infos if info.path != directory]
+            if listed and directory.startswith("/") and self.ttl > 0: self.listings[key] = (time.time(), [info.path for info in infos])
+
+        # Ignore hidden items
+        if ignore_hidden:
+            start = len(directory) + 1
+            infos = [info for info in infos if not any(part.startswith(".") for part in info.path[start:].split("/"))]
+
+        # Return the sorted metadata
+        return sorted(infos, key=lambda info: info.path)
+
+    # -----------------------------------------------------------------
+
+    def files(self, directory, recursive=False, ignore_hidden=True):
+
+        """
+        This function returns the paths of the files in a directory
+        :param directory:
+        :param recursive:
+        :param ignore_hidden:
+        :return:
+        """
+
+        return [info.path for info in self.listing(directory, recursive=recursive, ignore_hidden=ignore_hidden) if info.is_file]
+
+    # -----------------------------------------------------------------
+
+    def directories(self, directory, recursive=False, ignore_hidden=True):
+
+        """
+        This function returns the paths of the directories in a directory
+        :param directory:
+        :param recursive:
+        :param ignore_hidden:
+        :return:
+        """
+
+        return [info.path for info in self.listing(directory, recursive=recursive, ignore_hidden=ignore_hidden) if info.is_directory]
+
+# -----------------------------------------------------------------
@@ -18,6 +18,7 @@ import sys
 import pexpect
 from pexpect import pxssh, ExceptionPexpect
 import tempfile
+import weakref
 import StringIO
 import subprocess
 from lxml import etree
@@ -26,6 +27,7 @@ from lxml import etree
 from .host import Host, load_host
 from .utils import HostDownException
 from .vpn import VPN
+from .metadata import RemoteMetadata
 from ..basics.log import log
 from ..tools import parsing
 from ..tools import filesystem as fs
@@ -142,6 +144,21 @@ def load_remote(remote, silent=False):
 
 # -----------------------------------------------------------------
 
+def read_only_executor(remote):
+
+    """
+    This function returns a function that executes commands on the remote without invalidating its metadata cache
+    (without keeping the remote alive)
+    :param remote:
+    :return:
+    """
+
+    reference = weakref.ref(remote)
+    def execute(command): return reference().execute(command, read_only=True)
+    return execute
+
+# -----------------------------------------------------------------
+
 def get_host_id(host_id):
 
     """
@@ -204,6 +221,9 @@ class Remote(object):
         # Remember the commands that were executed on the remote host
         self.commands = []
 
+        # The (cached) metadata of the remote file system
+        self.metadata = RemoteMetadata(read_only_executor(self))
+
         # Set silent flag
         self.silent = silent
 
@@ -2500,7 +2520,7 @@ class Remote(object):
     # -----------------------------------------------------------------
 
     def execute(self, command, output=True, expect_eof=True, contains_extra_eof=False, show_output=False, timeout=None,
-                expect=None, cwd=None, output_start=1):
+                expect=None, cwd=None, output_start=1, read_only=False):
 
         """
         This function ...
@@ -2513,12 +2533,16 @@ class Remote(object):
         :param expect:
         :param cwd:
         :param output_start:
+        :param read_only: the command does not change the file system (the metadata cache remains valid)
         :return:
         """
 
         # Check whether connected
         if not self.connected: raise RuntimeError("The remote is not available")
 
+        # The command can change the file system: invalidate the metadata cache
+        if not read_only: self.metadata.invalidate()
+
         # Change the working directory if necessary
         if cwd is not None: original_cwd = self.change_cwd(cwd)
         else: original_cwd = None
@@ -2596,6 +2620,9 @@ class Remote(object):
         timeout = kwargs.pop("timeout", None)
         cwd = kwargs.pop("cwd", None)
 
+        # The commands can change the file system: invalidate the metadata cache
+        self.metadata.invalidate()
+
         # Change the working directory if necessary
         if cwd is not None: original_cwd = self.change_cwd(cwd)
         else: original_cwd = None
@@ -2965,24 +2992,8 @@ class Remote(object):
         :return:
         """
 
-        if not ignore_hidden: self.warning("Not ignoring hidden folders is not yet supported")
-
-        # List the directories in the provided path
-        if recursive:
-            command = "ls -R -d */ | awk '\n/:$/&&f{s=$0;f=0}\n/:$/&&!f{sub(/:$/,"
-            command += '"");s=$0;f=1;next}\nNF&&f{ print '
-            command += 's"/"$0 }'
-            command += "'"
-            output = self.execute(command, cwd=path)
-            paths = [line for line in output if not line.startswith(">")]
-            paths = [dirpath for dirpath in paths if self.is_directory(dirpath)]
-        else:
-            #print(path)
-            output = self.execute("for i in $(ls -d */); do echo ${i%%/}; done", cwd=path)
-            #print(output)
-            if "cannot access */" in output[0]: return []
-            elif "cannot access '*/'" in output[0]: return []
-            paths = [fs.join(path, name) for name in output]
+        # List the directories in the provided path (with one command)
+        paths = self.metadata.directories(path, recursive=recursive, ignore_hidden=ignore_hidden)
 
         if returns == "dict":
             returns = ["name", "path"]
@@ -3102,22 +3113,8 @@ class Remote(object):
         :return:
         """
 
-        if not ignore_hidden: self.warning("Not ignoring hidden files is not yet supported")
-
-        # List the files in the provided path
-        if recursive:
-            command = "ls -R '" + path + "' | awk '\n/:$/&&f{s=$0;f=0}\n/:$/&&!f{sub(/:$/,"
-            command += '"");s=$0;f=1;next}\nNF&&f{ print '
-            command += 's"/"$0 }'
-            command += "'"
-            output = self.execute(command, cwd=path)
-            #print(output)
-            paths = [line for line in output if not line.startswith(">")]
-            paths = [filepath for filepath in paths if self.is_file(filepath)]
-        else:
-            output = self.execute("for f in *; do [[ -d $f ]] || echo $f; done", cwd=path)
-            if len(output) == 1 and output[0] == "*": return []
-            paths = [fs.join(path, name) for name in output]
+        # List the files in the provided path (with one command)
+        paths = self.metadata.files(path, recursive=recursive, ignore_hidden=ignore_hidden)
 
         if returns == "dict":
             returns = ["name", "path"]
@@ -3242,15 +3239,9 @@ class Remote(object):
         # Filenames are given
         if filenames is not None:
 
-            # Loop over the filenames
-            for filename in filenames:
-
-                # Check
-                filepath = fs.join(directory, filename)
-                if not self.is_file(filepath): return False
-
-            # All checks passed
-            return True
+            # Check all files at once
+            infos = self.metadata.stat([fs.join(directory, filename) for filename in filenames])
+            return all(info.is_file for info in infos.values())
 
         # No filenames are given
         else: return self.has_files_in_path(directory)
@@ -3365,7 +3356,7 @@ class Remote(object):
         from ..units.parsing import parse_quantity
 
         command = "du -sh '" + path + "'"
-        output = self.execute(command)
+        output = self.execute(command, read_only=True)
 
         string = output[0].split(" ")[0].split("\t")[0].strip()
 
@@ -3381,17 +3372,23 @@ class Remote(object):
     def file_size(self, path):
 
         """
-        This function ...
+        This function returns the size of a file: the exact size in bytes (like fs.file_size), rather than the disk
+        usage rounded by 'du -h'. For a directory, the disk usage of the directory and its contents is returned.
         :param path:
         :return:
         """
 
         from ..units.parsing import parse_quantity
 
+        # File
+        info = self.metadata.info(path)
+        if not info.is_directory: return self.metadata.size(path) * u("byte")
+
+        # Directory
         command = "du -sh '" + path + "'"
-        output = self.execute(command)
+        output = self.execute(command, read_only=True)
 
-        string = output[0].split(" ")[0].lower() + "byte"
+        string = output[0].split(" ")[0].split("\t")[0].lower() + "byte"
         return parse_quantity(string)
 
     # -----------------------------------------------------------------
@@ -3701,10 +3698,10 @@ class Remote(object):
         command = 'while IFS= read -r LINE; do     echo "$LINE"; done < "' + path + '"'
 
         # 2 tries
-        try: output = self.execute(command)
+        try: output = self.execute(command, read_only=True)
         except RuntimeError:
             log.warning("A runtime error was encountered. Trying again ...")
-            output = self.execute(command)
+            output = self.execute(command, read_only=True)
 
         # Loop over the output lines
         for line in output:
@@ -3750,7 +3747,7 @@ class Remote(object):
         command = "head -n " + str(nlines) + " " + path
 
         # Execute
-        output = self.execute(command)
+        output = self.execute(command, read_only=True)
 
         # Return the lines
         return output
@@ -3791,7 +3788,7 @@ class Remote(object):
         """
 
         # Execute 'tail'
-        output = self.execute("tail -" + str(nlines) + " " + path)
+        output = self.execute("tail -" + str(nlines) + " " + path, read_only=True)
 
         # Return the lines
         return output
@@ -3823,7 +3820,7 @@ class Remote(object):
 
         # Launch the command
         command = "sed '1!G;h;$!d' " + path
-        output = self.execute(command)
+        output = self.execute(command, read_only=True)
 
         # Return the output
         for line in output: yield line
@@ -3890,9 +3887,12 @@ class Remote(object):
         # If the origin is a string, we assume it represents a single file path or directory path
         if types.is_string_type(origin):
 
+            # Get the type of the origin
+            origin_info = self.metadata.info(origin)
+
             # Check if the origin represents a file
             #if self.is_file(origin): copy_command += origin.replace(" ", "\\\ ") + " "
-            if self.is_file(origin):
+            if origin_info.is_file:
 
                 copy_command += self.host.user + "@" + self.host.name + ":"
 
@@ -3902,7 +3902,7 @@ class Remote(object):
             # Check if it represents a directory
             #elif self.is_directory(origin): copy_command += origin.replace(" ", "\\ ") + "/* " + "-r "
             #elif self.is_directory(origin): copy_command += origin.replace(" ", "\\\ ") + "/* "
-            elif self.is_directory(origin):
+            elif origin_info.is_directory:
 
                 origin_type = "directory"
                 #copy_command += "-r '" + origin + "' "
@@ -3918,9 +3918,9 @@ class Remote(object):
         # If the origin is a list, we assume it contains multiple file paths
         elif types.is_sequence(origin):
 
-            # Check whether the files exist remotely
-            for file_path in origin:
-                if not self.is_file(file_path): raise ValueError("The file " + file_path + " does not exist on the remote host")
+            # Check whether the files exist remotely (with one command)
+            for file_path, info in self.metadata.stat(origin).items():
+                if not info.is_file: raise ValueError("The file " + file_path + " does not exist on the remote host")
 
             origin_type = "files"
 
@@ -4034,15 +4034,10 @@ class Remote(object):
 
         elif origin_type == "directory":
 
-            for remote_path in self.files_in_path(origin):
-                filename = fs.name(remote_path)
-                local_path = fs.join(destination, filename)
-                if not fs.is_file(local_path): raise RuntimeError("Something went wrong: file '" + filename + "' is missing (" + local_path + ")")
-
-            for remote_path in self.directories_in_path(origin):
-                dirname = fs.name(remote_path)
-                local_path = fs.join(destination, dirname)
-                if not fs.is_directory(local_path): raise RuntimeError("Something went wrong: directory '" + dirname + "' is missing (" + local_path + ")")
+            for info in self.metadata.listing(origin):
+                local_path = fs.join(destination, info.name)
+                if info.is_file and not fs.is_file(local_path): raise RuntimeError("Something went wrong: file '" + info.name + "' is missing (" + local_path + ")")
+                if info.is_directory and not fs.is_directory(local_path): raise RuntimeError("Something went wrong: directory '" + info.name + "' is missing (" + local_path + ")")
 
         else: raise ValueError("Invalid origin type")
 
@@ -4296,6 +4291,9 @@ class Remote(object):
 
         if lines is None: lines = child.logfile.getvalue()
 
+        # The remote file system has changed
+        self.metadata.invalidate()
+
         # Show output lines in debug mode
         if not show_output:
 
@@ -4331,10 +4329,9 @@ class Remote(object):
         # EXTRA check
         if origin_type == "files":
 
-            for filepath in origin:
-                filename = fs.name(filepath)
-                remote_path = fs.join(destination, filename)
-                if not self.is_file(remote_path): raise RuntimeError("Something went wrong: file " + filename + " is not present at destination (" + remote_path + ")")
+            remote_paths = [fs.join(destination, fs.name(filepath)) for filepath in origin]
+            for remote_path, info in self.metadata.stat(remote_paths).items():
+                if not info.is_file: raise RuntimeError("Something went wrong: file " + fs.name(remote_path) + " is not present at destination (" + remote_path + ")")
 
         elif origin_type == "file":
 
@@ -4350,18 +4347,18 @@ class Remote(object):
 
             directory_name = fs.name(origin)
 
-            for local_path in fs.files_in_path(origin):
+            # Get the remote paths of the files and directories
+            remote_file_paths = [fs.join(destination, directory_name, fs.name(local_path)) for local_path in fs.files_in_path(origin)]
+            remote_directory_paths = [fs.join(destination, directory_name, fs.name(local_path)) for local_path in fs.directories_in_path(origin)]
 
-                filename = fs.name(local_path)
-                #remote_path = fs.join(destination, filename)
-                remote_path = fs.join(destination, directory_name, filename)
-                if not self.is_file(remote_path): raise RuntimeError("Something went wrong: file " + filename + " is not present at destination (" + remote_path + ")")
+            # Check them with one command
+            infos = self.metadata.stat(remote_file_paths + remote_directory_paths)
 
-            for local_path in fs.directories_in_path(origin):
+            for remote_path in remote_file_paths:
+                if not infos[remote_path].is_file: raise RuntimeError("Something went wrong: file " + fs.name(remote_path) + " is not present at destination (" + remote_path + ")")
 
-                dirname = fs.name(local_path)
-                remote_path = fs.join(destination, directory_name, dirname)
-                if not self.is_directory(remote_path): raise RuntimeError("Something went wrong: directory " + dirname + " is not present at destination (" + remote_path + ")")
+            for remote_path in remote_directory_paths:
+                if not infos[remote_path].is_directory: raise RuntimeError("Something went wrong: directory " + fs.name(remote_path) + " is not present at destination (" + remote_path + ")")
 
         else: raise ValueError("Invalid origin type: " + str(origin_type))
 
@@ -5950,12 +5947,13 @@ class Remote(object):
         :return:
         """
 
-        # Launch a bash command to check whether the path exists as either a file or a directory on the remote file system
-        output = self.execute("if [ -f " + path + " ]; then echo file; elif [ -d " + path + " ]; then echo directory; else echo None; fi")
+        # Get the type of the path
+        info = self.metadata.info(path)
 
         # Return the result
-        if output[0] == "None": return None
-        else: return output[0]
+        if info.is_file: return "file"
+        elif info.is_directory: return "directory"
+        else: return None
 
     # -----------------------------------------------------------------
 
@@ -6004,8 +6002,8 @@ class Remote(object):
         :return:
         """
 
-        # Launch a bash command to check whether the path exists as a directory on the remote file system
-        return self.evaluate_boolean_expression("-d '" + path + "'")
+        # Check whether the path exists as a directory on the remote file system
+        return self.metadata.is_directory(path)
 
     # -----------------------------------------------------------------
 
@@ -6047,10 +6045,8 @@ class Remote(object):
         :return:
         """
 
-        #print("path,", path)
-
-        # Launch a bash command to check whether the path exists as a regular file on the remote file system
-        return self.evaluate_boolean_expression("-f '" + path + "'")
+        # Check whether the path exists as a regular file on the remote file system
+        return self.metadata.is_file(path)
 
     # -----------------------------------------------------------------
 
@@ -6074,36 +6070,17 @@ class Remote(object):
     def get_file_hash(self, path):
 
         """
-        This function ...
+        This function returns the MD5 checksum of a file
         :param path:
         :return:
         """
 
-        # MacOS
-        if self.is_macos:
-
-            command = "md5 '" + path + "'"
-            output = self.execute(command)
-            if len(output) == 0: raise RuntimeError("No output")
-            elif len(output) > 1: raise RuntimeError("Too much output")
-            line = output[0]
-            # MD5(path) =
-            hash = line.split(") = ")[1]
-
-        # Linux
-        elif self.is_linux:
-
-            command = "md5sum '" + path + "' | awk '{ print $1 }'"
-            output = self.execute(command)
-            if len(output) == 0: raise RuntimeError("No output")
-            elif len(output) > 1: raise RuntimeError("Too much output")
-            hash = output[0]
-
-        # Not supported
-        else: raise NotImplementedError("Only MacOS and Linux are supported")
+        # Get the checksum
+        checksum = self.metadata.checksum(path)
+        if checksum is None: raise IOError("Not a file: '" + path + "'")
 
         # Return the hash code
-        return hash
+        return checksum
 
     # -----------------------------------------------------------------
 
@@ -6116,7 +6093,9 @@ class Remote(object):
         :return:
         """
 
-        return self.is_file(path) and self.equal_to_local_file(path, local_path)
+        # Get the type and checksum of the remote file with one command
+        info = self.metadata.info(path, checksums=True)
+        return info.is_file and info.checksum == fs.get_file_hash(local_path)
 
     # -----------------------------------------------------------------
 
@@ -6146,7 +6125,7 @@ class Remote(object):
         :return:
         """
 
-        return self.execute("echo $" + name)[0]
+        return self.execute("echo $" + name, read_only=True)[0]
 
     # -----------------------------------------------------------------
 
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.core.simulation.cellprojection Contains the CellProjector class, which projects quantities defined
+#  on the cells of a dust grid onto regular images and radial and vertical profiles.
+#
+# The cells are deposited onto the pixels with weighted bincounts, in chunks of cells to bound the memory. Each cell
+# is either deposited as a point (at its center) or with the exact overlap of its footprint with the pixels. The
+# face-on, edge-on and mid-plane maps and the radial and vertical profiles are all obtained in the same pass over the
+# cells, as weighted averages (e.g. mass- or volume-weighted) of the cell values.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 functionality
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from ..basics.map import Map
+from . import textfile
+
+# -----------------------------------------------------------------
+
+# The default number of cells per chunk
+default_chunk_size = 2**20
+
+# -----------------------------------------------------------------
+
+def load_cell_extents(path):
+
+    """
+    This function loads the extents of the dust cells from a dust grid tree data file
+    :param path: the path of the tree data file
+    :return: an array of shape (ncells, 6) with the minimum and maximum x, y and z of each cell (ordered by cell index),
+    and the unit of length
+    """
+
+    # Load the cell index and the extents of each node
+    data = np.loadtxt(path, usecols=range(1, 8), ndmin=2)
+
+    # Keep the leaves, sorted by cell index
+    leaves = data[:, 0] >= 0
+    indices = data[leaves, 0].astype(int)
+    extents = np.empty((len(indices), 6))
+    extents[indices] = data[leaves, 1:]
+
+    # Return the extents and the unit
+    return extents, textfile.get_units(path)[2]
+
+# -----------------------------------------------------------------
+
+def overlaps(lower, upper, edges, indices):
+
+    """
+    This function returns the lengths of the overlap of intervals with the pixels with the specified indices
+    :param lower:
+    :param upper:
+    :param edges:
+    :param indices:
+    :return:
+    """
+
+    return np.maximum(0., np.minimum(upper, edges[indices + 1]) - np.maximum(lower, edges[indices]))
+
+# -----------------------------------------------------------------
+
+def deposit_points(sums, weights, a, b, a_edges, b_edges, values, cell_weights):
+
+    """
+    This function adds the weighted values of cells to the pixels that contain their centers
+    :param sums: the sums of the weighted values, an array of shape (len(b_edges) - 1, len(a_edges) - 1)
+    :param weights: the sums of the weights
+    :param a: the coordinates of the cell centers along the horizontal axis
+    :param b: the coordinates of the cell centers along the vertical axis
+    :param a_edges:
+    :param b_edges:
+    :param values:
+    :param cell_weights:
+    :return:
+    """
+
+    na = len(a_edges) - 1
+    nb = len(b_edges) - 1
+    i = np.floor((a - a_edges[0]) / (a_edges[1] - a_edges[0])).astype(int)
+    j = np.floor((b - b_edges[0]) / (b_edges[1] - b_edges[0])).astype(int)
+    inside = (i >= 0) & (i < na) & (j >= 0) & (j < nb)
+    flat = j[inside] * na + i[inside]
+    sums += np.bincount(flat, weights=(values * cell_weights)[inside], minlength=na * nb).reshape(nb, na)
+    weights += np.bincount(flat, weights=cell_weights[inside], minlength=na * nb).reshape(nb, na)
+
+# -----------------------------------------------------------------
+
+def deposit_footprints(sums, weights, a_lower, a_upper, b_lower, b_upper, a_edges, b_edges, values, cell_weights):
+
+    """
+    This function adds the weighted values of cells to the pixels, in proportion to the overlap of the footprints of
+    the cells with the pixels
+    :param sums: the sums of the weighted values, an array of shape (len(b_edges) - 1, len(a_edges) - 1)
+    :param weights: the sums of the weights
+    :param a_lower: the lower borders of the cells along the horizontal axis
+    :param a_upper:
+    :param b_lower:
+    :param b_upper:
+    :param a_edges:
+    :param b_edges:
+    :param values:
+    :param cell_weights:
+    :return:
+    """
+
+    na = len(a_edges) - 1
+    nb = len(b_edges) - 1
+    a_step = a_edges[1] - a_edges[0]
+    b_step = b_edges[1] - b_edges[0]
+
+    # The first and last pixel covered by each footprint (clipped to the image)
+    i0 = np.clip(np.floor((a_lower - a_edges[0]) / a_step).astype(int), 0, na - 1)
+    i1 = np.clip(np.ceil((a_upper - a_edges[0]) / a_step).astype(int) - 1, 0, na - 1)
+    j0 = np.clip(np.floor((b_lower - b_edges[0]) / b_step).astype(int), 0, nb - 1)
+    j1 = np.clip(np.ceil((b_upper - b_edges[0]) / b_step).astype(int) - 1, 0, nb - 1)
+    a_spans = i1 - i0 + 1
+    b_spans = j1 - j0 + 1
+
+    # Sort the cells on decreasing horizontal span, so that the cells spanning more than a number of pixels are
+    # always the first ones
+    order = np.argsort(-a_spans, kind="mergesort")
+    a_lower, a_upper, b_lower, b_upper = a_lower[order], a_upper[order], b_lower[order], b_upper[order]
+    i0, j0, a_spans, b_spans = i0[order], j0[order], a_spans[order], b_spans[order]
+    areas = (a_upper - a_lower) * (b_upper - b_lower)
+    weighted_values = (values * cell_weights)[order] / areas
+    cell_weights = cell_weights[order] / areas
+
+    # Loop over the horizontal offsets
+    ncells = len(a_spans)
+    for offset_a in range(np.max(a_spans) if ncells > 0 else 0):
+
+        # The cells spanning more than this number of pixels
+        n = ncells - np.searchsorted(a_spans[::-1], offset_a, side="right")
+        i = i0[:n] + offset_a
+        a_overlaps = overlaps(a_lower[:n], a_upper[:n], a_edges, i)
+
+        # Loop over the vertical offsets
+        for offset_b in range(np.max(b_spans[:n])):
+
+            selection = b_spans[:n] > offset_b
+            j = j0[:n][selection] + offset_b
+            fractions = a_overlaps[selection] * overlaps(b_lower[:n][selection], b_upper[:n][selection], b_edges, j)
+
+            # Add
+            flat = j * na + i[selection]
+            sums += np.bincount(flat, weights=weighted_values[:n][selection] * fractions, minlength=na * nb).reshape(nb, na)
+            weights += np.bincount(flat, weights=cell_weights[:n][selection] * fractions, minlength=na * nb).reshape(nb, na)
+
+# -----------------------------------------------------------------
+
+class CellProjector(object):
+
+    """
+    This class projects quantities defined on the cells of a dust grid onto face-on, edge-on and mid-plane maps and
+    onto radial and vertical profiles
+    """
+
+    def __init__(self, x, y, z, x_sizes, y_sizes, z_sizes, chunk_size=default_chunk_size):
+
+        """
+        The constructor ...
+        :param x: the x coordinates of the cell centers
+        :param y:
+        :param z:
+        :param x_sizes: the sizes of the cells along the x axis
+        :param y_sizes:
+        :param z_sizes:
+        :param chunk_size: the number of cells that are projected at once
+        """
+
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.z = np.asarray(z, dtype=float)
+        self.x_sizes = np.broadcast_to(np.asarray(x_sizes, dtype=float), self.x.shape)
+        self.y_sizes = np.broadcast_to(np.asarray(y_sizes, dtype=float), self.x.shape)
+        self.z_sizes = np.broadcast_to(np.asarray(z_sizes, dtype=float), self.x.shape)
+        self.chunk_size = chunk_size
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def from_extents(cls, extents, chunk_size=default_chunk_size):
+
+        """
+        This function creates the projector from the cell extents (as returned by load_cell_extents)
+        :param extents:
+        :param chunk_size:
+        :return:
+        """
+
+        centers = 0.5 * (extents[:, 0::2] + extents[:, 1::2])
+        sizes = extents[:, 1::2] - extents[:, 0::2]
+        return cls(centers[:, 0], centers[:, 1], centers[:, 2], sizes[:, 0], sizes[:, 1], sizes[:, 2], chunk_size=chunk_size)
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def from_volumes(cls, x, y, z, volumes, chunk_size=default_chunk_size):
+
+        """
+        This function creates the projector from the cell volumes, assuming cubical cells
+        :param x:
+        :param y:
+        :param z:
+        :param volumes:
+        :param chunk_size:
+        :return:
+        """
+
+        sizes = np.cbrt(np.asarray(volumes, dtype=float))
+        return cls(x, y, z, sizes, sizes, sizes, chunk_size=chunk_size)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def ncells(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return len(self.x)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def radii(self):
+
+        """
+        This function returns the (cylindrical) radii of the cell centers
+        :return:
+        """
+
+        return np.sqrt(self.x**2 + self.y**2)
+
+    # -----------------------------------------------------------------
+
+    def project(self, values, weights=None, radius=None, height=None, npixels=200, nheight_pixels=None, nbins=50,
+                exact=False, where=None):
+
+        """
+        This function projects the cell values, as weighted averages
+        :param values: the cell values
+        :param weights: the cell weights (e.g. the masses or volumes of the cells, equal weights if None)
+        :param radius: the half width of the maps along x and y (the extent of the cells if None)
+        :param height: the half width of the edge-on map along z (the extent of the cells if None)
+        :param npixels: the number of pixels along x and y
+        :param nheight_pixels: the number of pixels along z (npixels if None)
+        :param nbins: the number of bins of the radial and vertical profiles
+        :param exact: use the exact overlap of the cell footprints with the pixels (instead of the cell centers)
+        :param where: a mask of the cells to take into account (all cells if None)
+        :return: a Map with the face-on, edge-on and mid-plane maps, the radial and vertical profiles and the edges
+        """
+
+        values = np.asarray(values, dtype=float)
+        weights = np.ones_like(values) if weights is None else np.broadcast_to(np.asarray(weights, dtype=float), values.shape)
+        if where is None: where = np.isfinite(values)
+        else: where = np.asarray(where, dtype=bool) & np.isfinite(values)
+
+        # Determine the extent
+        if radius is None: radius = max(np.max(np.abs(self.x) + 0.5 * self.x_sizes), np.max(np.abs(self.y) + 0.5 * self.y_sizes))
+        if height is None: height = np.max(np.abs(self.z) + 0.5 * self.z_sizes)
+        if nheight_pixels is None: nheight_pixels = npixels
+
+        # The edges of the pixels and bins
+        result = Map()
+        result.x_edges = np.linspace(-radius, radius, npixels + 1)
+        result.y_edges = np.linspace(-radius, radius, npixels + 1)
+        result.z_edges = np.linspace(-height, height, nheight_pixels + 1)
+        result.radius_edges = np.linspace(0., radius, nbins + 1)
+        result.height_edges = np.linspace(0., height, nbins + 1)
+
+        # Initialize the sums
+        sums = dict()
+        for name, shape in [("faceon", (npixels, npixels)), ("edgeon", (nheight_pixels, npixels)), ("midplane", (npixels, npixels)),
+                            ("radial", (1, nbins)), ("vertical", (1, nbins))]:
+            sums[name] = (np.zeros(shape), np.zeros(shape))
+
+        # Loop over the chunks of cells
+        for start in range(0, self.ncells, self.chunk_size):
+
+            end = min(start + self.chunk_size, self.ncells)
+            cells = np.flatnonzero(where[start:end]) + start
+            if len(cells) == 0: continue
+
+            x, y, z = self.x[cells], self.y[cells], self.z[cells]
+            dx, dy, dz = self.x_sizes[cells], self.y_sizes[cells], self.z_sizes[cells]
+            chunk_values, chunk_weights = values[cells], weights[cells]
+
+            # The cells that intersect the mid-plane (from above)
+            midplane = (z - 0.5 * dz <= 0.) & (z + 0.5 * dz > 0.)
+
+            # Deposit on the maps
+            if exact:
+                deposit_footprints(sums["faceon"][0], sums["faceon"][1], x - 0.5 * dx, x + 0.5 * dx, y - 0.5 * dy, y + 0.5 * dy, result.x_edges, result.y_edges, chunk_values, chunk_weights)
+                deposit_footprints(sums["edgeon"][0], sums["edgeon"][1], x - 0.5 * dx, x + 0.5 * dx, z - 0.5 * dz, z + 0.5 * dz, result.x_edges, result.z_edges, chunk_values, chunk_weights)
+                deposit_footprints(sums["midplane"][0], sums["midplane"][1], (x - 0.5 * dx)[midplane], (x + 0.5 * dx)[midplane], (y - 0.5 * dy)[midplane], (y + 0.5 * dy)[midplane], result.x_edges, result.y_edges, chunk_values[midplane], chunk_weights[midplane])
+            else:
+                deposit_points(sums["faceon"][0], sums["faceon"][1], x, y, result.x_edges, result.y_edges, chunk_values, chunk_weights)
+                deposit_points(sums["edgeon"][0], sums["edgeon"][1], x, z, result.x_edges, result.z_edges, chunk_values, chunk_weights)
+                deposit_points(sums["midplane"][0], sums["midplane"][1], x[midplane], y[midplane], result.x_edges, result.y_edges, chunk_values[midplane], chunk_weights[midplane])
+
+            # Deposit on the profiles
+            zeros = np.zeros(len(cells))
+            deposit_points(sums["radial"][0], sums["radial"][1], np.sqrt(x**2 + y**2), zeros, result.radius_edges, [0., 1.], chunk_values, chunk_weights)
+            deposit_points(sums["vertical"][0], sums["vertical"][1], np.abs(z), zeros, result.height_edges, [0., 1.], chunk_values, chunk_weights)
+
+        # Calculate the weighted averages
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name in sums: result[name] = sums[name][0] / sums[name][1]
+        result.radial = result.radial[0]
+        result.vertical = result.vertical[0]
+
+        # Return the maps and profiles
+        return result
+
+# -----------------------------------------------------------------
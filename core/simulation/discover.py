@@ -13,8 +13,11 @@
 from __future__ import absolute_import, division, print_function
 
 # Import standard modules
+import os
 import re
 import math
+import pickle
+import hashlib
 #import filecmp
 #import difflib
 from collections import defaultdict
@@ -29,6 +32,15 @@ from ..basics.log import log
 from ..simulation.logfile import LogFile
 from ..basics.map import Map
 from ..tools import types
+from ..tools import introspection
+
+# -----------------------------------------------------------------
+
+# The path of the on-disk index of ski and parameter file fingerprints
+fingerprints_path = fs.join(introspection.pts_temp_dir, "ski_fingerprints.pickle")
+
+# The attributes (of the root element) that differ between otherwise identical ski and parameter files
+volatile_attributes = ["producer", "time"]
 
 # -----------------------------------------------------------------
 
@@ -89,6 +101,9 @@ class SimulationDiscoverer(Configurable):
         self.simulations_ski = defaultdict(list)
         self.simulations_no_ski = defaultdict(list)
 
+        # The index of ski and parameter file fingerprints
+        self.fingerprints = None
+
     # -----------------------------------------------------------------
 
     def run(self, **kwargs):
@@ -181,6 +196,9 @@ class SimulationDiscoverer(Configurable):
         # Inform the user
         log.info("Finding simulations ...")
 
+        # Load the index of fingerprints
+        self.fingerprints = FingerprintIndex()
+
         # Find ski files
         self.find_ski_files()
 
@@ -193,6 +211,9 @@ class SimulationDiscoverer(Configurable):
         # Find simulations
         self.find_simulations()
 
+        # Save the fingerprints of new or changed files
+        self.fingerprints.save()
+
     # -----------------------------------------------------------------
 
     def find_ski_files(self):
@@ -249,25 +270,20 @@ class SimulationDiscoverer(Configurable):
 
         #parpaths = dict()
 
-        # Compare the parameter files
+        # Group the parameter files with the same fingerprint
         for prefix in parameter_files:
 
             distinct_parpaths = defaultdict(list)
+            first_parpaths = dict()
 
             for dirpath in parameter_files[prefix]:
 
                 parpath = fs.join(dirpath, prefix + "_parameters.xml")
 
-                if len(distinct_parpaths) == 0: distinct_parpaths[parpath].append(parpath)
-                else:
-
-                    for path in distinct_parpaths:
-
-                        if equaltextfiles(parpath, path, 1):
-                            distinct_parpaths[path].append(parpath)
-                            break
-
-                    else: distinct_parpaths[parpath].append(parpath)
+                # Get the fingerprint, add to the group of the first parameter file with this fingerprint
+                fingerprint = self.fingerprints.fingerprint(parpath)
+                if fingerprint not in first_parpaths: first_parpaths[fingerprint] = parpath
+                distinct_parpaths[first_parpaths[fingerprint]].append(parpath)
 
             # Set ...
             self.parameter_paths[prefix] = distinct_parpaths
@@ -311,6 +327,14 @@ class SimulationDiscoverer(Configurable):
 
         input_paths_ski_files = dict()
 
+        # Map the fingerprints of the ski files to their paths (the first ski file for each fingerprint), per prefix
+        ski_fingerprints = defaultdict(dict)
+        for prefix in self.ski_paths:
+            for dirpath in self.ski_paths[prefix]:
+                skipath = fs.join(dirpath, prefix + ".ski")
+                fingerprint = self.fingerprints.fingerprint(skipath)
+                if fingerprint not in ski_fingerprints[prefix]: ski_fingerprints[prefix][fingerprint] = skipath
+
         # Loop over the ...
         for prefix in self.parameter_paths:
 
@@ -320,51 +344,11 @@ class SimulationDiscoverer(Configurable):
                 #rel_parpath = parpath.split(self.config.path)[1]
                 ski_found = False
 
-                # Loop over the ski files with this prefix
-                for dirpath in self.ski_paths[prefix]:
-
-                    skipath = fs.join(dirpath, prefix + ".ski")
-                    rel_skipath = skipath.split(self.config.path)[1]
-
-                    #print("DIFFERENCES", parpath, skipath)
-                    #for line1, line2 in textfiledifferences(parpath, skipath):
-                    #    print(line1, line2)
-
-                    #output = textfiledifferences(parpath, skipath)
-                    #print(output)
-
-                    par = SkiFile(parpath)
-                    ski = SkiFile(skipath)
-
-                    #print(set(par.tree.getroot().text))
-                    #print(set(ski.tree.getroot().text))
-
-                    #par_string = str(par)
-                    #ski_string = str(ski)
-
-                    #par_string = simplify_xml(par_string)
-                    #ski_string = simplify_xml(ski_string)
-
-                    #print(par_string)
-                    #print(ski_string)
-
-                    #par_string = str(par).split("MonteCarloSimulation")[1]
-                    #ski_string = str(ski).split("MonteCarloSimulation")[1]
-
-                    #exit()
-
-                    #par_dict = par.to_dict()
-                    #ski_dict = ski.to_dict()
-
-                    #print(par_dict)
-                    #print(ski_dict)
-                    #exit()
-
-                    # Compare ski file with parameter file
-                    if equaltextfiles(parpath, skipath, 1):
-                        key = skipath
-                        ski_found = True
-                        break
+                # Find the ski file with the same fingerprint
+                fingerprint = self.fingerprints.fingerprint(parpath)
+                if fingerprint in ski_fingerprints[prefix]:
+                    key = ski_fingerprints[prefix][fingerprint]
+                    ski_found = True
 
                 # String of relative parameter file paths concated together
                 #else: key = " + ".join(map(itemgetter(1), map(lambda x: str.split(x, self.config.config_path), parpaths[prefix][parpath]))) #
@@ -709,6 +693,123 @@ def find_input(ski_path, output_path):
 
 # -----------------------------------------------------------------
 
+def canonical_xml(filepath):
+
+    """
+    This function returns a canonical string representation of the specified ski or parameter file, which is
+    independent of whitespace, comments, the order of the attributes, and the volatile attributes of the root element
+    :param filepath:
+    :return:
+    """
+
+    from lxml import etree
+
+    # Parse
+    parser = etree.XMLParser(remove_blank_text=True, remove_comments=True)
+    root = etree.parse(filepath, parser=parser).getroot()
+
+    # Serialize each element as its tag, its sorted attributes, its text and its children
+    parts = []
+    def add(element, volatile):
+        attributes = sorted((name, value) for name, value in element.attrib.items() if name not in volatile)
+        parts.append("<" + element.tag + "".join(" " + name + "=\"" + value.replace("\"", "&quot;") + "\"" for name, value in attributes) + ">")
+        if element.text is not None and element.text.strip(): parts.append(element.text.strip())
+        for child in element: add(child, ())
+        parts.append("</" + element.tag + ">")
+    add(root, volatile_attributes)
+
+    # Return the string
+    return "".join(parts)
+
+# -----------------------------------------------------------------
+
+def ski_fingerprint(filepath):
+
+    """
+    This function returns the fingerprint of the specified ski or parameter file: the SHA-1 hash of its canonical
+    representation. Files with the same fingerprint describe the same simulation.
+    :param filepath:
+    :return:
+    """
+
+    return hashlib.sha1(canonical_xml(filepath).encode("utf-8")).hexdigest()
+
+# -----------------------------------------------------------------
+
+class FingerprintIndex(object):
+
+    """
+    This class keeps the fingerprints of ski and parameter files, cached on disk by path, modification time and
+    size, so that unchanged files don't have to be parsed again
+    """
+
+    def __init__(self, path=fingerprints_path):
+
+        """
+        The constructor ...
+        :param path:
+        """
+
+        # The index path
+        self.path = path
+
+        # The fingerprints: absolute path -> (modification time, size, fingerprint)
+        self.entries = dict()
+        self.changed = False
+
+        # Load the index
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'rb') as index_file: self.entries = pickle.load(index_file)
+            except Exception: self.entries = dict()
+
+    # -----------------------------------------------------------------
+
+    def fingerprint(self, filepath):
+
+        """
+        This function returns the fingerprint of the specified file, from the index if the file is unchanged
+        :param filepath:
+        :return:
+        """
+
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        entry = self.entries.get(filepath)
+
+        # Unchanged file
+        if entry is not None and entry[0] == stat.st_mtime and entry[1] == stat.st_size: return entry[2]
+
+        # Compute the fingerprint
+        fingerprint = ski_fingerprint(filepath)
+        self.entries[filepath] = (stat.st_mtime, stat.st_size, fingerprint)
+        self.changed = True
+        return fingerprint
+
+    # -----------------------------------------------------------------
+
+    def save(self):
+
+        """
+        This function writes the index, if it has changed
+        :return:
+        """
+
+        if not self.changed: return
+
+        # Remove the entries of files that no longer exist
+        for filepath in [filepath for filepath in self.entries if not os.path.isfile(filepath)]: del self.entries[filepath]
+
+        # Write to a temporary file first, and then move it into place (so that concurrent processes never read
+        # an incomplete index)
+        try:
+            with fs.atomic_write(self.path) as temp_path:
+                with open(temp_path, 'wb') as index_file: pickle.dump(self.entries, index_file, protocol=2)
+            self.changed = False
+        except (IOError, OSError): pass # just don't cache the fingerprints
+
+# -----------------------------------------------------------------
+
 def equaltextfiles(filepath1, filepath2, allowedDiffs, ignore_empty=True):
 
     """
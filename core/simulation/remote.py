@@ -16,6 +16,7 @@ from __future__ import absolute_import, division, print_function
 # Import standard modules
 import math
 import tempfile
+from collections import OrderedDict
 
 # Import the relevant PTS classes and modules
 from ..remote.remote import Remote
@@ -34,6 +35,8 @@ from ..tools import types
 from ..tools import numbers
 from .output import get_output_type, get_parent_type
 from .data import SimulationData
+from ..remote.blobstore import RemoteBlobStore
+from ..tools.utils import lazyproperty
 
 # -----------------------------------------------------------------
 
@@ -284,6 +287,10 @@ class SKIRTRemote(Remote):
         # Initialize a dictionary for the scheduling options
         self.scheduling_options = dict()
 
+        # Flag: upload the input files only once (in the content-addressed store on the remote host), and link them
+        # in the simulation input directories
+        self.deduplicate_input = True
+
         # If host ID is given, setup
         if host_id is not None:
             if not self.setup(host_id): log.warning("The connection could not be made. Run setup().")
@@ -920,7 +927,10 @@ class SKIRTRemote(Remote):
                 remote_input_path = fs.join(remote_simulation_path, "in")
 
                 # Copy the input directory to the remote host
-                self.upload(definition.input_path, remote_input_path, show_output=True)
+                if self.deduplicate_input:
+                    files = OrderedDict((fs.relative_to(path, definition.input_path), path) for path in fs.files_in_path(definition.input_path, recursive=True, ignore_hidden=False))
+                    self.input_store.materialize(files, remote_input_path)
+                else: self.upload(definition.input_path, remote_input_path, show_output=True)
 
             # The specified remote input directory (for re-usage of already uploaded input) does not exist
             else:
@@ -951,7 +961,7 @@ class SKIRTRemote(Remote):
                 else: remote_input_file_paths = None
 
                 # Upload the local input files to the new remote directory
-                self.upload(local_input_file_paths, remote_input_path)
+                self.upload_input(OrderedDict((fs.name(filepath), filepath) for filepath in local_input_file_paths), remote_input_path)
 
                 # Copy the already remote files to the new remote directory
                 if remote_input_file_paths is not None: self.copy_files(remote_input_file_paths, remote_input_path)
@@ -977,13 +987,7 @@ class SKIRTRemote(Remote):
                 self.create_directory(remote_input_path)
 
                 # Upload the local input files to the new remote directory
-                for name, path in definition.input_path:
-
-                    # Debugging
-                    log.debug("Uploading the '" + path + "' file to '" + remote_input_path + "' under the name '" + name + "'")
-
-                    # Upload the file, giving it the desired name
-                    self.upload(path, remote_input_path, new_name=name)
+                self.upload_input(OrderedDict(definition.input_path), remote_input_path)
 
             # The specified remote directory (for re-usage of already uploaded input) does not exist
             else:
@@ -1002,6 +1006,9 @@ class SKIRTRemote(Remote):
                 # Create the remote directory
                 self.create_directory(remote_input_path)
 
+                # The local input files
+                local_input_files = OrderedDict()
+
                 # Upload the local input files to the new remote directory
                 for name, path in definition.input_path.items():
 
@@ -1009,13 +1016,7 @@ class SKIRTRemote(Remote):
                     if has_remote_input:
 
                         # Is local
-                        if fs.is_file(path):
-
-                            # Debugging
-                            log.debug("Uploading the '" + path + "' file to '" + remote_input_path + "' under the name '" + name + "'")
-
-                            # Upload
-                            self.upload(path, remote_input_path, new_name=name)
+                        if fs.is_file(path): local_input_files[name] = path
 
                         # Is remote
                         elif self.is_file(path):
@@ -1030,13 +1031,10 @@ class SKIRTRemote(Remote):
                         else: raise ValueError("The input file '" + name + "' is not found remotely or locally")
 
                     # No checking
-                    else:
-
-                        # Debugging
-                        log.debug("Uploading the '" + path + "' file to '" + remote_input_path + "' under the name '" + name + "'")
+                    else: local_input_files[name] = path
 
-                        # Upload the file, giving it the desired name
-                        self.upload(path, remote_input_path, new_name=name)
+                # Upload the local input files, giving them the desired names
+                if len(local_input_files) > 0: self.upload_input(local_input_files, remote_input_path)
 
             # The specified remote directory (for re-usage of already uploaded input) does not exist
             else:
@@ -1067,6 +1065,49 @@ class SKIRTRemote(Remote):
 
     # -----------------------------------------------------------------
 
+    @lazyproperty
+    def input_store(self):
+
+        """
+        This function returns the store of input files on the remote host
+        :return:
+        """
+
+        return RemoteBlobStore(self)
+
+    # -----------------------------------------------------------------
+
+    def upload_input(self, files, remote_directory):
+
+        """
+        This function uploads input files to a remote directory, through the store of input files (so that files that
+        have been uploaded before, e.g. for other simulations, are not transferred again) unless deduplication is
+        disabled
+        :param files: dictionary of the local file paths, for each name in the remote directory
+        :param remote_directory:
+        :return:
+        """
+
+        # Through the store
+        if self.deduplicate_input:
+            log.debug("Linking " + str(len(files)) + " input files from the store in '" + remote_directory + "' ...")
+            self.input_store.materialize(files, remote_directory)
+
+        # All files keep their name: upload at once
+        elif all(name == fs.name(path) for name, path in files.items()): self.upload(list(files.values()), remote_directory)
+
+        # Upload each file, giving it the desired name
+        else:
+            for name, path in files.items():
+
+                # Debugging
+                log.debug("Uploading the '" + path + "' file to '" + remote_directory + "' under the name '" + name + "'")
+
+                # Upload the file
+                self.upload(path, remote_directory, new_name=name)
+
+    # -----------------------------------------------------------------
+
     def create_simulation_object(self, arguments, name, simulation_id, remote_simulation_path, local_ski_path, local_input_path, local_output_path):
 
         """
@@ -28,6 +28,7 @@ from ..tools import filesystem as fs
 from ..tools.stringify import str_from_bool, str_from_angle
 from ..tools import xml
 from .input import SimulationInput
+from .skiindex import SkiFileIndex, invalidate_on_mutation
 from ..tools import types
 
 # -----------------------------------------------------------------
@@ -52,7 +53,7 @@ fake_quantities[("BolLuminosityStellarCompNormalization", "luminosity")] = "Lsun
 # A SkiFile class instance is always constructed from an existing ski file; creating a new ski file from scratch
 # is not supported. To create a new ski file, start SKIRT in interactive mode (without any arguments).
 #
-class SkiFile7:
+class SkiFile7(SkiFileIndex):
     # ---------- Constructing and saving -----------------------------
 
     ## The constructor loads the contents of the specified ski file into a new SkiFile instance.
@@ -151,6 +152,7 @@ class SkiFile7:
     def copy(self):
         ski = copy.deepcopy(self)
         ski.path = None # set the path to None so this copy won't be involuntarily saved over the original file
+        ski.invalidate_index()
         return ski
 
     ## This function returns the ski contents as a string
@@ -161,6 +163,13 @@ class SkiFile7:
     def to_lines(self):
         return etree.tostringlist(self.tree)
 
+    # ---------- Querying ---------------------------------------------
+
+    ## This function evaluates the specified XPath expression on the ski file tree (or on the specified element),
+    # using a compiled version of the expression that is shared by all SkiFile instances.
+    def xpath(self, expression, element=None):
+        return xml.xpath(self.tree if element is None else element, expression)
+
     # ---------- Retrieving information -------------------------------
 
     @property
@@ -295,7 +304,7 @@ class SkiFile7:
     ## This function returns a SkirtUnits object initialized with the SKIRT unit system ('SI', 'stellar', or
     # 'extragalactic') and the flux style ('neutral', 'wavelength' or 'frequency') specified in the ski file.
     def units(self):
-        unitelements = self.tree.xpath("//units/*[1]")
+        unitelements = self.xpath("//units/*[1]")
         if len(unitelements) == 1:
             unitsystem = unitelements[0].tag
             fluxstyle = unitelements[0].get("fluxOutputStyle", default='neutral')
@@ -324,7 +333,7 @@ class SkiFile7:
         if wavelengths: return len(wavelengths)
         # If the list is empty, the ski file either represents a panchromatic simulation (and we can get the
         # number of points directly from the tree) or a FileWavelengthGrid is used (in which case we raise an error)
-        entry = self.tree.xpath("//wavelengthGrid/*[1]")[0]
+        entry = self.xpath("//wavelengthGrid/*[1]")[0]
         if entry.tag == 'FileWavelengthGrid':
             raise ValueError("The number of wavelengths is not defined within the ski file. Call nwavelengthsfile().")
         else:
@@ -333,14 +342,14 @@ class SkiFile7:
     ## This function returns the name of the wavelengths file, if any
     def wavelengthsfilename(self):
         # If this ski file contains a file wavelength grid
-        entry = self.tree.xpath("//FileWavelengthGrid")
+        entry = self.xpath("//FileWavelengthGrid")
         if entry: return self.get_value(entry[0], "filename")
 
     ## This function returns the path of the wavelengths file that is used for the simulation, if any
     def wavelengthsfile(self, input_path=None):
 
         # If this ski file contains a file wavelength grid
-        entry = self.tree.xpath("//FileWavelengthGrid")
+        entry = self.xpath("//FileWavelengthGrid")
         if entry:
 
             filename = self.get_value(entry[0], "filename")
@@ -409,7 +418,7 @@ class SkiFile7:
     ## This function
     def treegridfile(self, input_path=None):
         # If this ski file contains a file tree dust grid
-        entry = self.tree.xpath("//FileTreeDustGrid")
+        entry = self.xpath("//FileTreeDustGrid")
         if entry:
 
             filename = self.get_value(entry[0], "filename")
@@ -433,14 +442,14 @@ class SkiFile7:
     ## This function returns the number of photon packages per wavelength
     def packages(self):
         # Get the MonteCarloSimulation element
-        elems = self.tree.xpath("//OligoMonteCarloSimulation | //PanMonteCarloSimulation")
+        elems = self.xpath("//OligoMonteCarloSimulation | //PanMonteCarloSimulation")
         if len(elems) != 1: raise ValueError("No MonteCarloSimulation in ski file")
         # Get the number of packages
         return int(float(elems[0].get("packages")))
 
     ## This function looks for elements with a given name
     def find_elements(self, name):
-        return self.tree.xpath("//"+name+"/*")
+        return self.xpath("//"+name+"/*")
 
     ## This function looks for a single element with a given name
     def find_element(self, name):
@@ -484,7 +493,7 @@ class SkiFile7:
     ## This function returns the number of dust cells in the x direction
     def nxcells(self):
         try:
-            xpoints = int(self.tree.xpath("//meshX/*")[0].get("numBins"))
+            xpoints = int(self.xpath("//meshX/*")[0].get("numBins"))
         except (TypeError, IndexError):
             raise ValueError("The number of dust cells is not defined within the ski file")
         return xpoints
@@ -492,7 +501,7 @@ class SkiFile7:
     ## This function returns the number of dust cells in the y direction
     def nycells(self):
         try:
-            ypoints = int(self.tree.xpath("//meshY/*")[0].get("numBins"))
+            ypoints = int(self.xpath("//meshY/*")[0].get("numBins"))
         except (TypeError, IndexError):
             raise ValueError("The dimension of the dust grid is lower than 2")
         return ypoints
@@ -500,14 +509,14 @@ class SkiFile7:
     ## This function returns the number of dust cells in the z direction
     def nzcells(self):
         try:
-            zpoints = int(self.tree.xpath("//meshZ/*")[0].get("numBins"))
+            zpoints = int(self.xpath("//meshZ/*")[0].get("numBins"))
         except (TypeError, IndexError):
             raise ValueError("The dimension of the dust grid is lower than 3")
         return zpoints
 
     ## This function returns the number of dust cells in the radial direction
     def nrcells(self):
-        return int(self.tree.xpath("//meshR/*")[0].get("numBins"))
+        return int(self.xpath("//meshR/*")[0].get("numBins"))
 
     ## This function returns the grid type
     def gridtype(self):
@@ -555,7 +564,7 @@ class SkiFile7:
 
     ## This function returns the number of dust components
     def ncomponents(self):
-        components = self.tree.xpath("//CompDustDistribution/components/*")
+        components = self.xpath("//CompDustDistribution/components/*")
         return int(len(components))
 
     ## This function returns the dust lib type
@@ -585,7 +594,7 @@ class SkiFile7:
     def npopulations(self):
         npops = 0
         # For each dust mix
-        for dustmix in self.tree.xpath("//mix/*[1]"):
+        for dustmix in self.xpath("//mix/*[1]"):
             if dustmix.tag in ["InterstellarDustMix", "Benchmark1DDustMix", "Benchmark2DDustMix", "DraineLiDustMix"]:
                 npops += 1
             elif dustmix.tag == "TrustDustMix":
@@ -593,7 +602,7 @@ class SkiFile7:
                 npops += int(dustmix.attrib["silicatePops"])
                 npops += int(dustmix.attrib["PAHPops"])
             elif dustmix.tag == "ConfigurableDustMix":
-                npops += len(self.tree.xpath("//ConfigurableDustMix/populations/*"))
+                npops += len(self.xpath("//ConfigurableDustMix/populations/*"))
             elif dustmix.tag == "ThemisDustMix":
                 npops += int(dustmix.attrib["hydrocarbonPops"])
                 npops += int(dustmix.attrib["silicatePops"])
@@ -605,24 +614,24 @@ class SkiFile7:
 
     ## This function returns the number of simple instruments
     def nsimpleinstruments(self):
-        return len(self.tree.xpath("//SimpleInstrument"))
+        return len(self.xpath("//SimpleInstrument"))
 
     ## This function returns the number of full instruments
     def nfullinstruments(self):
-        return len(self.tree.xpath("//FullInstrument"))
+        return len(self.xpath("//FullInstrument"))
 
     ## This function returns whether transient heating is enabled
     def transientheating(self):
-        return len(self.tree.xpath("//TransientDustEmissivity")) > 0
+        return len(self.xpath("//TransientDustEmissivity")) > 0
 
     ## This function returns whether dust emission is enabled
     def dustemission(self):
-        return len(self.tree.xpath("//dustEmissivity"))
+        return len(self.xpath("//dustEmissivity"))
 
     @property
     def emission_boost(self):
         try:
-            pandustsystem = self.tree.xpath("//PanDustSystem")[0]
+            pandustsystem = self.xpath("//PanDustSystem")[0]
             return float(pandustsystem.attrib["emissionBoost"])
         except:
             raise ValueError("Not a panchromatic simulation")
@@ -630,7 +639,7 @@ class SkiFile7:
     ## This function returns whether dust selfabsorption is enabled
     def dustselfabsorption(self):
         try:
-            pandustsystem = self.tree.xpath("//PanDustSystem")[0]
+            pandustsystem = self.xpath("//PanDustSystem")[0]
             return (pandustsystem.attrib["selfAbsorption"] == "true")
         except:
             return False
@@ -830,7 +839,7 @@ class SkiFile7:
     def npixels(self, nwavelengths=None):
         pixels = []
         nwavelengths = nwavelengths if nwavelengths is not None else self.nwavelengths()
-        instruments = self.tree.xpath("//instruments/*")
+        instruments = self.xpath("//instruments/*")
         for instrument in instruments:
             type = instrument.tag
             name = instrument.attrib["instrumentName"]
@@ -866,7 +875,7 @@ class SkiFile7:
     # The current implementation requires that the wavelengths in the ski file are specified in micron.
     def wavelengths(self):
         # get the value of the wavelengths attribute on the OligoWavelengthGrid element (as a list of query results)
-        results = self.tree.xpath("//OligoWavelengthGrid/@wavelengths")
+        results = self.xpath("//OligoWavelengthGrid/@wavelengths")
         # if not found, return an empty list
         if len(results) != 1: return []
         # split the first result in separate strings, extract the numbers using the appropriate units
@@ -882,7 +891,7 @@ class SkiFile7:
     ## This function returns the first instrument's distance, in the specified units (default is 'pc').
     def instrumentdistance(self, unit='pc'):
         # get the first instrument element
-        instruments = self.tree.xpath("//instruments/*[1]")
+        instruments = self.xpath("//instruments/*[1]")
         if len(instruments) != 1: raise ValueError("No instruments in ski file")
         # get the distance including the unit string
         distance = instruments[0].get("distance")
@@ -892,7 +901,7 @@ class SkiFile7:
     ## This function returns the shape of the first instrument's frame, in pixels.
     def instrumentshape(self):
         # get the first instrument element
-        instruments = self.tree.xpath("//instruments/*[1]")
+        instruments = self.xpath("//instruments/*[1]")
         if len(instruments) != 1: raise ValueError("No instruments in ski file")
         # get its shape (for SKIRT7 and SKIRT8)
         return ( int(instruments[0].get("pixelsX", instruments[0].get("numPixelsX"))),
@@ -901,7 +910,7 @@ class SkiFile7:
     ## This function returns the angular area (in sr) of a single pixel in the first instrument's frame.
     def angularpixelarea(self):
         # get the first instrument element
-        instruments = self.tree.xpath("//instruments/*[1]")
+        instruments = self.xpath("//instruments/*[1]")
         if len(instruments) != 1: raise ValueError("No instruments in ski file")
         instrument = instruments[0]
         # get the distance in m
@@ -920,7 +929,7 @@ class SkiFile7:
     ## This function returns a list of instrument names, in order of occurrence in the ski file.
     def instrumentnames(self):
         # get the instrument elements
-        instruments = self.tree.xpath("//instruments/*")
+        instruments = self.xpath("//instruments/*")
         # return their names
         return [ instr.get("instrumentName") for instr in instruments ]
 
@@ -928,7 +937,7 @@ class SkiFile7:
     # or 0 if the element or the attribute are not present.
     def dustfraction(self):
         # get the value of the relevant attribute on the SPHDustDistribution element (as a list of query results)
-        results = self.tree.xpath("//SPHDustDistribution/@dustFraction")
+        results = self.xpath("//SPHDustDistribution/@dustFraction")
         # if not found, return zero
         if len(results) != 1: return 0
         # convert the first result
@@ -938,7 +947,7 @@ class SkiFile7:
     # or 0 if the element or the attribute are not present.
     def maximumtemperature(self):
         # get the value of the relevant attribute on the SPHDustDistribution element (as a list of query results)
-        results = self.tree.xpath("//SPHDustDistribution/@maximumTemperature")
+        results = self.xpath("//SPHDustDistribution/@maximumTemperature")
         # if not found, return zero
         if len(results) != 1: return 0
         # extract the number from the first result, assuming units of K
@@ -946,12 +955,12 @@ class SkiFile7:
 
     ## This function returns whether the ski file describes a oligochromatic simulation
     def oligochromatic(self):
-        elems = self.tree.xpath("//OligoMonteCarloSimulation")
+        elems = self.xpath("//OligoMonteCarloSimulation")
         return len(elems) > 0
 
     ## This function returns whether the ski file describes a panchromatic simulation
     def panchromatic(self):
-        elems = self.tree.xpath("//PanMonteCarloSimulation")
+        elems = self.xpath("//PanMonteCarloSimulation")
         return len(elems) > 0
 
     ## This function converts the ski file to a ski file that describes an oligochromatic simulation
@@ -962,7 +971,7 @@ class SkiFile7:
 
             from ..units.stringify import represent_quantity
 
-            simulation = self.tree.xpath("//PanMonteCarloSimulation")[0]
+            simulation = self.xpath("//PanMonteCarloSimulation")[0]
             simulation.tag = "OligoMonteCarloSimulation"
 
             # Remove the old wavelength grid
@@ -1015,7 +1024,7 @@ class SkiFile7:
         if self.panchromatic(): warnings.warn("The simulation is already panchromatic")
         else:
 
-            simulation = self.tree.xpath("//OligoMonteCarloSimulation")[0]
+            simulation = self.xpath("//OligoMonteCarloSimulation")[0]
             simulation.tag = "PanMonteCarloSimulation"
 
     # ---------- Updating information ---------------------------------
@@ -1029,7 +1038,7 @@ class SkiFile7:
     # element and the identity template are automatically added and must not be contained in the argument string.
     # The function returns true if the transform was applied, and false if it was not (i.e. the document is unchanged).
     def transformif(self, condition, templates):
-        needed = self.tree.xpath("boolean(" + condition + ")")
+        needed = self.xpath("boolean(" + condition + ")")
         if needed:
             prefix  = '''<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
                            <xsl:template match="@*|node()">
@@ -1046,7 +1055,7 @@ class SkiFile7:
     # to the specified value
     def setpackages(self, number):
         # get the MonteCarloSimulation element
-        elems = self.tree.xpath("//OligoMonteCarloSimulation | //PanMonteCarloSimulation")
+        elems = self.xpath("//OligoMonteCarloSimulation | //PanMonteCarloSimulation")
         if len(elems) != 1: raise ValueError("No MonteCarloSimulation in ski file")
         # set the attribute value, using the appropriate name for SKIRT7 or SKIRT8
         if "packages" in elems[0].keys():
@@ -1056,24 +1065,24 @@ class SkiFile7:
 
     ## This function sets the number of wavelengths
     def setnwavelengths(self, number):
-        elems = self.tree.xpath("//wavelengthGrid/*[1]")
+        elems = self.xpath("//wavelengthGrid/*[1]")
         elems[0].set("points", str(number))
 
     ## This function sets the number of dust cells in the x direction
     def setxdustcells(self, number):
-        self.tree.xpath("//dustGridStructure/*[1]")[0].set("pointsX", str(number))
+        self.xpath("//dustGridStructure/*[1]")[0].set("pointsX", str(number))
 
     ## This function sets the number of dust cells in the y direction
     def setydustcells(self, number):
         try:
-            self.tree.xpath("//dustGridStructure/*[1]")[0].set("pointsY", str(number))
+            self.xpath("//dustGridStructure/*[1]")[0].set("pointsY", str(number))
         except TypeError:
             raise ValueError("The dimension of the dust grid is lower than 2")
 
     ## This function sets the number of dust cells in the z direction
     def setzdustcells(self, number):
         try:
-            self.tree.xpath("//dustGridStructure/*[1]")[0].set("pointsZ", str(number))
+            self.xpath("//dustGridStructure/*[1]")[0].set("pointsZ", str(number))
         except TypeError:
             raise ValueError("The dimension of the dust grid is lower than 3")
 
@@ -1097,7 +1106,7 @@ class SkiFile7:
     # to the specified value
     def setmaxmassfraction(self, number):
         # get the tree dust grid element
-        elems = self.tree.xpath("//BinTreeDustGrid | //OctTreeDustGrid")
+        elems = self.xpath("//BinTreeDustGrid | //OctTreeDustGrid")
         if len(elems) != 1: raise ValueError("No tree dust grid in ski file")
         # set the attribute value
         elems[0].set("maxMassFraction", str(number))
@@ -1106,7 +1115,7 @@ class SkiFile7:
     # to the specified value, which must be an astropy quantity expressed in a length unit
     def setdustextent(self, extent):
         # get the tree dust grid element
-        elems = self.tree.xpath("//BinTreeDustGrid | //OctTreeDustGrid")
+        elems = self.xpath("//BinTreeDustGrid | //OctTreeDustGrid")
         if len(elems) != 1: raise ValueError("No tree dust grid in ski file")
         # set the attribute value
         self.set_quantity(elems[0], "minX", -extent)
@@ -1120,7 +1129,7 @@ class SkiFile7:
     # to the specified value
     def setdustfraction(self, number):
         # get the tree dust grid element
-        elems = self.tree.xpath("//SPHDustDistribution")
+        elems = self.xpath("//SPHDustDistribution")
         if len(elems) != 1: raise ValueError("No SPHDustDistribution in ski file")
         # set the attribute value
         elems[0].set("dustFraction", str(number))
@@ -1135,7 +1144,7 @@ class SkiFile7:
     # [ ((Nx,Ny),(Sx,Sy),(Vx,Vy,Vz),(Cx,Cy,Cz),(Ux,Uy,Uz),Fe) , ... ]
     def setperspectiveinstruments(self, frames):
         # get the instruments element
-        parents = self.tree.xpath("//instruments")
+        parents = self.xpath("//instruments")
         if len(parents) == 0: raise ValueError("No 'instruments' element in ski file")
         if len(parents) > 1: raise ValueError("Multiple 'instruments' elements in ski file")
         parent = parents[0]
@@ -1156,7 +1165,7 @@ class SkiFile7:
     ## This function sets the filename attribute of the SPHStellarComp element to the specified value.
     def setstarfile(self, filename):
         # get the SPHStellarComp element
-        elems = self.tree.xpath("//SPHStellarComp[./sedFamily/BruzualCharlotSEDFamily]")
+        elems = self.xpath("//SPHStellarComp[./sedFamily/BruzualCharlotSEDFamily]")
         if len(elems) != 1: raise ValueError("No SPHStellarComp with BruzualCharlotSEDFamily in ski file")
         # set the attribute value
         elems[0].set("filename", filename)
@@ -1164,7 +1173,7 @@ class SkiFile7:
     ## This function sets the filename attribute of the SPHStarburstComp element to the specified value.
     def sethiifile(self, filename):
         # get the SPHStarburstComp element
-        elems = self.tree.xpath("//SPHStellarComp[./sedFamily/MappingsSEDFamily]")
+        elems = self.xpath("//SPHStellarComp[./sedFamily/MappingsSEDFamily]")
         if len(elems) != 1: raise ValueError("No SPHStellarComp with MappingsSEDFamily in ski file")
         # set the attribute value
         elems[0].set("filename", filename)
@@ -1172,7 +1181,7 @@ class SkiFile7:
     ## This function sets the filename attribute of the SPHDustDistribution element to the specified value.
     def setgasfile(self, filename):
         # get the SPHDustDistribution element
-        elems = self.tree.xpath("//SPHDustDistribution")
+        elems = self.xpath("//SPHDustDistribution")
         if len(elems) != 1: raise ValueError("No SPHDustDistribution in ski file")
         # set the attribute value
         elems[0].set("filename", filename)
@@ -1181,9 +1190,9 @@ class SkiFile7:
     # regardless of the element in which such attributes reside.
     def setextent(self, value):
         strvalue = str(value)
-        for attr in self.tree.xpath("//*/@extentX"): attr.getparent().set("extentX", strvalue)
-        for attr in self.tree.xpath("//*/@extentY"): attr.getparent().set("extentY", strvalue)
-        for attr in self.tree.xpath("//*/@extentZ"): attr.getparent().set("extentZ", strvalue)
+        for attr in self.xpath("//*/@extentX"): attr.getparent().set("extentX", strvalue)
+        for attr in self.xpath("//*/@extentY"): attr.getparent().set("extentY", strvalue)
+        for attr in self.xpath("//*/@extentZ"): attr.getparent().set("extentZ", strvalue)
 
     ## This function returns the stellar system
     def get_stellar_system(self):
@@ -1231,7 +1240,7 @@ class SkiFile7:
         stellar_system = self.get_stellar_system()
 
         # Get the 'components' element
-        stellar_components_parents = stellar_system.xpath("components")
+        stellar_components_parents = self.xpath("components", stellar_system)
 
         # Check if only one 'components' element is present
         if len(stellar_components_parents) == 0:
@@ -1311,7 +1320,7 @@ class SkiFile7:
             "Dust distribution is not composed of components")
 
         # Get the 'components' element
-        dust_components_parents = dust_distribution.xpath("components")
+        dust_components_parents = self.xpath("components", dust_distribution)
 
         # Check if only one 'components' element is present
         if len(dust_components_parents) == 0:
@@ -4369,21 +4378,9 @@ class LabeledSkiFile7(SkiFile7):
         This function returns all labels
         :return:
         """
-        from .skifile import get_label, is_labeled
-
-        labels = set()
-
-        # Loop over all elements in the tree
-        for element in self.tree.getiterator():
-
-            # Loop over the settings of the element
-            for setting_name, setting_value in element.items():
-
-                # Get label, if labeled
-                if is_labeled(setting_value): labels.add(get_label(setting_value))
 
-        # Return the list of labels
-        return list(labels)
+        # Return the list of labels, from the element index
+        return list(self.get_index()[1].keys())
 
     # -----------------------------------------------------------------
 
@@ -4450,44 +4447,31 @@ class LabeledSkiFile7(SkiFile7):
         :return:
         """
 
-        from ..tools.stringify import stringify_not_list
-
-        if label not in self.labels: raise ValueError("The label '" + label + "' is not present in the ski file")
-
-        # Get the labeled elements
-        elements = self.get_labeled_elements(label)
-
-        # Labeled value
-        labeled_value = "[" + label + ":" + stringify_not_list(value)[1] + "]"
-
-        # Set the new value for each corresponding element
-        for element, setting_name in elements: element.set(setting_name, labeled_value)
+        self.set_labeled_values({label: value})
 
     # -----------------------------------------------------------------
 
     def set_labeled_values(self, values):
 
         """
-        This function ...
+        This function sets the values of the specified labeled properties, using the element index (so that the
+        tree is not traversed for each label)
         :param values: a dictionary, with the keys a subset of the labels in the ski file
         :return:
         """
 
         from ..tools.stringify import stringify_not_list
 
-        existing_labels = self.labels
+        labeled = self.get_index()[1]
 
         # Loop over the labels
         for label in values:
 
             # Check for label existence
-            if label not in existing_labels: raise ValueError("The label '" + label + "' is not present in the ski file")
-
-            # Get the labeled elements
-            elements = self.get_labeled_elements(label)
+            if label not in labeled: raise ValueError("The label '" + label + "' is not present in the ski file")
 
             # Set the new value for each corresponding element
-            for element, setting_name in elements:
+            for element, setting_name in labeled[label]:
 
                 # Convert the value into a string
                 if (element.tag, setting_name) in fake_quantities: string = repr(values[label].to(fake_quantities[(element.tag, setting_name)]).value)
@@ -4499,29 +4483,30 @@ class LabeledSkiFile7(SkiFile7):
 
     # -----------------------------------------------------------------
 
-    def get_labeled_elements(self, label):
+    def apply_parameter_vector(self, labels, vector):
 
         """
-        This function ...
+        This function sets the values of many labeled properties in one pass, e.g. the free parameters of one model
+        in a generation of a fitting run
+        :param labels: the sequence of labels
+        :param vector: the sequence of values, in the same order as the labels
         :return:
         """
-        from .skifile import get_label, is_labeled
 
-        # The list of elements
-        elements = []
+        if len(labels) != len(vector): raise ValueError("The number of values (" + str(len(vector)) + ") does not match the number of labels (" + str(len(labels)) + ")")
+        self.set_labeled_values(OrderedDict(zip(labels, vector)))
 
-        # Loop over all elements in the tree
-        for element in self.tree.getiterator():
+    # -----------------------------------------------------------------
 
-            # Loop over the settings of the element
-            for setting_name, setting_value in element.items():
+    def get_labeled_elements(self, label):
 
-                if is_labeled(setting_value):
-                    label_item = get_label(setting_value)
-                    if label_item == label: elements.append((element, setting_name))
+        """
+        This function ...
+        :return:
+        """
 
-        # Return the list of elements
-        return elements
+        # Return the list of (element, property name) tuples, from the element index
+        return list(self.get_index()[1].get(label, []))
 
     # -----------------------------------------------------------------
 
@@ -4562,24 +4547,17 @@ class LabeledSkiFile7(SkiFile7):
         :return:
         """
 
-        from .skifile import get_label, is_labeled
-
         values = dict()
 
-        # Loop over all elements in the tree
-        for element in self.tree.getiterator():
-
-            # Loop over the settings of the element
-            for setting_name, setting_value in element.items():
-
-                if is_labeled(setting_value):
+        # Loop over the labeled properties in the element index
+        for label, elements in self.get_index()[1].items():
+            for element, setting_name in elements:
 
-                    label = get_label(setting_value)
-                    value = self.get_quantity(element, setting_name)
+                value = self.get_quantity(element, setting_name)
 
-                    if label in values and values[label] != value:
-                        warnings.warn("The '" + label + "' property has different values throughout the SkiFile (" + str(values[label]) + " and " + str(value) + ")")
-                    else: values[label] = value
+                if label in values and values[label] != value:
+                    warnings.warn("The '" + label + "' property has different values throughout the SkiFile (" + str(values[label]) + " and " + str(value) + ")")
+                else: values[label] = value
 
         # Return the dictionary of values
         return values
@@ -5176,3 +5154,9 @@ class LabeledSkiFile7(SkiFile7):
         return elements
 
 # -----------------------------------------------------------------
+
+# Invalidate the element index after the functions that can change the tree
+invalidate_on_mutation(SkiFile7)
+invalidate_on_mutation(LabeledSkiFile7)
+
+# -----------------------------------------------------------------
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.core.simulation.skiindex The element index of a ski file, shared by the SkiFile classes for the
+#  different SKIRT versions.
+
+# -----------------------------------------------------------------
+
+# Import standard modules
+import inspect
+from functools import wraps
+from collections import OrderedDict
+from lxml import etree
+
+# -----------------------------------------------------------------
+
+## The prefixes of the names of the SkiFile functions that can change the structure or the labels of the tree
+mutating_prefixes = ("set", "add", "remove", "delabel", "enable", "disable", "change", "create", "rotate",
+                     "increase", "fix", "upgrade", "transform", "replace", "make", "convert", "rename")
+
+## The SkiFile functions that only change the values of labeled properties, and thus preserve the element index
+preserving_functions = ("set_labeled_value", "set_labeled_values", "apply_parameter_vector")
+
+# -----------------------------------------------------------------
+
+## This class provides the element index of a ski file to the SkiFile classes. The index is built in a single pass
+# over the tree the first time it is needed, and consists of a dictionary that maps element types (tags) to the list
+# of elements of that type in document order, and a dictionary that maps labels to the list of (element, property
+# name) tuples of the properties with that label.
+#
+# The index is rebuilt when it is needed after the tree has been changed. The SkiFile functions that can change the
+# structure or the labels of the tree invalidate the index (see invalidate_on_mutation()), as does replacing the root
+# of the tree. When the elements of the tree are changed directly with lxml (e.g. adding or removing an element, or
+# changing a label), invalidate_index() must be called afterwards.
+class SkiFileIndex(object):
+
+    ## This function returns the element index of the ski file
+    def get_index(self):
+        root = self.tree.getroot()
+        if getattr(self, "_index", None) is None or self._index_root is not root:
+            from .skifile import get_label, is_labeled
+            elements = dict()
+            labeled = OrderedDict()
+            for element in root.iter(tag=etree.Element):
+                elements.setdefault(element.tag, []).append(element)
+                for setting_name, setting_value in element.items():
+                    if is_labeled(setting_value): labeled.setdefault(get_label(setting_value), []).append((element, setting_name))
+            self._index = (elements, labeled)
+            self._index_root = root
+        return self._index
+
+    ## This function invalidates the element index, so that it is rebuilt when it is needed again
+    def invalidate_index(self):
+        self._index = None
+        self._index_root = None
+
+    ## This function returns the list of elements of the specified type (tag), in document order
+    def get_elements_of_type(self, element_type):
+        return list(self.get_index()[0].get(element_type, []))
+
+    ## This function returns the state for copying and pickling, without the element index (which would otherwise be
+    # copied element by element, and is rebuilt when it is needed)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_index", None)
+        state.pop("_index_root", None)
+        return state
+
+# -----------------------------------------------------------------
+
+## This function returns a wrapper for the specified SkiFile function that invalidates the element index
+def invalidating(function):
+    @wraps(function)
+    def wrapper(self, *args, **kwargs):
+        try: return function(self, *args, **kwargs)
+        finally: self.invalidate_index()
+    return wrapper
+
+## This function wraps the functions of the specified SkiFile class that can change the structure or the labels of
+# the tree, so that they invalidate the element index
+def invalidate_on_mutation(cls):
+    for name, value in list(cls.__dict__.items()):
+        if not inspect.isfunction(value) or name in preserving_functions: continue
+        if name.startswith(mutating_prefixes): setattr(cls, name, invalidating(value))
+
+# -----------------------------------------------------------------
@@ -25,7 +25,7 @@ from ..basics.log import log
 
 # -----------------------------------------------------------------
 
-tables = introspection.get_arguments_tables()
+tables = introspection.get_scripts_and_tables()[1]
 
 # -----------------------------------------------------------------
 
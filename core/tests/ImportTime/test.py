@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import sys
+import time as _time
+import subprocess
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.core.tools import time
+
+# -----------------------------------------------------------------
+
+description = "benchmarking the start-up time of the pts command"
+
+# -----------------------------------------------------------------
+
+# The subprojects that should not be imported before a command is resolved
+lazy_subprojects = ["modeling", "magic", "evolve", "dustpedia", "eagle"]
+
+# The statement that corresponds to the start-up of the pts command (up to the resolution of the command), with the
+# path of the command index to use
+startup_statement = "import pts.do.run; from pts.core.tools import introspection; introspection.get_scripts_and_tables(%r)"
+
+# The modules of which the import time is measured
+timed_modules = ["pts.core.basics.log", "pts.core.tools.introspection", "pts.core.basics.configuration", "pts.do.run"]
+
+# The script that times a statement and lists the PTS modules that are imported by it (works for any Python version)
+timing_script = """
+import sys, time
+start = time.time()
+exec(sys.argv[1])
+print(repr(time.time() - start))
+print(" ".join(sorted(name for name in sys.modules if name.startswith("pts") and sys.modules[name] is not None)))
+"""
+
+# -----------------------------------------------------------------
+
+class ImportTimeTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(ImportTimeTest, self).__init__(*args, **kwargs)
+
+        # The import times (in seconds, in a new interpreter) of the PTS modules
+        self.import_times = dict()
+
+        # The PTS modules that are imported up to the resolution of a command
+        self.startup_modules = None
+
+        # The wall-clock start-up times
+        self.cold_seconds = None
+        self.warm_seconds = None
+
+        # The command index of the test (the command index of the user is left untouched)
+        self.index_path = None
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Measure the import times
+        self.measure_import_times()
+
+        # 3. Check that no subproject is imported eagerly
+        self.check_lazy_imports()
+
+        # 4. Measure the start-up time with and without the command index
+        self.measure_startup()
+
+        # 5. Write
+        self.write()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(ImportTimeTest, self).setup(**kwargs)
+
+        # Set the path of the command index
+        self.index_path = fs.join(self.path, "commands.pickle")
+
+    # -----------------------------------------------------------------
+
+    def measure_import_times(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Measuring the import times ...")
+
+        # Time the import of each module in a new interpreter
+        for name in timed_modules:
+            self.import_times[name], _ = self.time_statement("import " + name)
+            log.info("Import time of " + name + ": " + time.display_time(self.import_times[name]))
+
+        # Get the modules that are imported on start-up
+        _, self.startup_modules = self.time_statement(startup_statement % self.index_path)
+        log.info(str(len(self.startup_modules)) + " PTS modules are imported before a command is resolved")
+
+    # -----------------------------------------------------------------
+
+    def check_lazy_imports(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Checking that the subprojects are imported lazily ...")
+
+        # Check
+        for subproject in lazy_subprojects:
+            if "pts." + subproject in self.startup_modules: raise RuntimeError("The '" + subproject + "' subproject is imported before a command is resolved")
+
+    # -----------------------------------------------------------------
+
+    def measure_startup(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Measuring the start-up time with and without the command index ...")
+
+        # Without the index
+        if fs.is_file(self.index_path): fs.remove_file(self.index_path)
+        self.cold_seconds = self.time_startup()
+
+        # With the index (written by the previous run)
+        self.warm_seconds = self.time_startup()
+
+        # Show
+        log.info("Start-up time without command index: " + time.display_time(self.cold_seconds))
+        log.info("Start-up time with command index: " + time.display_time(self.warm_seconds))
+
+    # -----------------------------------------------------------------
+
+    def time_startup(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        start = _time.time()
+        subprocess.check_call([sys.executable, "-c", startup_statement % self.index_path])
+        return _time.time() - start
+
+    # -----------------------------------------------------------------
+
+    def time_statement(self, statement):
+
+        """
+        This function executes a statement in a new interpreter
+        :param statement:
+        :return: the time it took (excluding the start-up of the interpreter), and the PTS modules that were imported
+        """
+
+        process = subprocess.Popen([sys.executable, "-c", timing_script, statement], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        output, error = process.communicate()
+        if process.returncode != 0: raise RuntimeError("Executing '" + statement + "' failed:\n" + error)
+
+        # The last two lines are the time and the modules (anything before is output of the statement)
+        lines = output.rstrip("\n").split("\n")
+        return float(lines[-2]), lines[-1].split()
+
+    # -----------------------------------------------------------------
+
+    def write(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Writing the import times ...")
+
+        # Determine the path
+        path = fs.join(self.path, "import_times.txt")
+
+        # Write
+        with open(path, 'w') as outfile:
+            outfile.write("Start-up without command index: " + repr(self.cold_seconds) + " s\n")
+            outfile.write("Start-up with command index: " + repr(self.warm_seconds) + " s\n")
+            for name in sorted(self.import_times, key=self.import_times.get, reverse=True): outfile.write(name + ": " + repr(self.import_times[name]) + " s\n")
+            outfile.write("Modules imported before a command is resolved:\n")
+            for name in self.startup_modules: outfile.write("  " + name + "\n")
+
+# -----------------------------------------------------------------
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import time
+import shutil
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.core.remote.metadata import RemoteMetadata, local_execute
+from pts.core.remote.blobstore import RemoteBlobStore, DigestCache, file_digest
+
+# -----------------------------------------------------------------
+
+description = "testing the store of input files, with a local directory and the local shell as a stand-in for the remote host"
+
+# -----------------------------------------------------------------
+
+class LocalRemote(object):
+
+    """
+    This class has the functions of the Remote class that are used by the store, for a local directory
+    """
+
+    def __init__(self, path):
+
+        """
+        The constructor ...
+        :param path:
+        """
+
+        self.pts_root_path = path
+        self.metadata = RemoteMetadata(local_execute)
+
+        # The names of the uploaded files
+        self.uploaded = []
+
+        # Flag to corrupt the uploaded files
+        self.corrupt = False
+
+    # -----------------------------------------------------------------
+
+    def execute(self, command, output=True, read_only=False):
+
+        """
+        This function ...
+        :param command:
+        :param output:
+        :param read_only:
+        :return:
+        """
+
+        if not read_only: self.metadata.invalidate()
+        lines = local_execute(command)
+        return lines if output else None
+
+    # -----------------------------------------------------------------
+
+    def create_directory(self, path, recursive=False):
+
+        """
+        This function ...
+        :param path:
+        :param recursive:
+        :return:
+        """
+
+        self.metadata.invalidate()
+        fs.create_directory(path, recursive=recursive)
+
+    # -----------------------------------------------------------------
+
+    def upload(self, origin, destination, compress=False):
+
+        """
+        This function ...
+        :param origin:
+        :param destination:
+        :param compress:
+        :return:
+        """
+
+        self.metadata.invalidate()
+        for path in origin:
+            destination_path = fs.join(destination, fs.name(path))
+            shutil.copyfile(path, destination_path)
+            if self.corrupt:
+                with open(destination_path, 'a') as fh: fh.write("corrupt")
+            self.uploaded.append(fs.name(path))
+        return True
+
+# -----------------------------------------------------------------
+
+class RemoteBlobStoreTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(RemoteBlobStoreTest, self).__init__(*args, **kwargs)
+
+        # The stand-in for the remote host and the store
+        self.remote = None
+        self.store = None
+
+        # The local input files, per name
+        self.files = dict()
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the input files
+        self.create()
+
+        # 3. Test the creation of the input directories
+        self.test_materialize()
+
+        # 4. Test the upload of corrupt files
+        self.test_corrupt()
+
+        # 5. Test the pruning of the store
+        self.test_prune()
+
+        # 6. Test the digest cache
+        self.test_digests()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(RemoteBlobStoreTest, self).setup(**kwargs)
+
+        # Create the stand-in for the remote host, and the store (with a digest cache in the test directory)
+        self.remote = LocalRemote(fs.create_directory_in(self.path, "remote"))
+        self.store = RemoteBlobStore(self.remote, digests=DigestCache(fs.join(self.path, "digests.dat")))
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the input files ...")
+
+        input_path = fs.create_directory_in(self.path, "input")
+
+        # Files with different contents, two files with the same contents, and a file that is not compressed
+        contents = {"stars.dat": "stars " * 100, "gas.dat": "gas " * 100, "dust.dat": "gas " * 100, "wavelengths.npz": "npz"}
+        for name, text in contents.items():
+            self.files[name] = fs.join(input_path, name)
+            fs.write_text(self.files[name], text)
+
+    # -----------------------------------------------------------------
+
+    def check_directory(self, directory):
+
+        """
+        This function ...
+        :param directory:
+        :return:
+        """
+
+        for name, path in self.files.items():
+
+            link_path = fs.join(directory, name)
+            blob_path = self.store.blob_path(file_digest(path))
+            if not os.path.samefile(link_path, blob_path): raise RuntimeError("The file '" + name + "' is not a link to the stored file")
+            if file_digest(link_path) != file_digest(path): raise RuntimeError("The contents of the file '" + name + "' are wrong")
+
+    # -----------------------------------------------------------------
+
+    def test_materialize(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the creation of the input directories ...")
+
+        # Each distinct content is uploaded once
+        self.store.materialize(self.files, fs.join(self.path, "simulation1", "in"))
+        if sorted(self.remote.uploaded) != sorted(set(file_digest(path) for path in self.files.values())): raise RuntimeError("The uploaded files are wrong")
+        self.check_directory(fs.join(self.path, "simulation1", "in"))
+
+        # Nothing is uploaded for a second directory with the same files
+        del self.remote.uploaded[:]
+        self.store.materialize(self.files, fs.join(self.path, "simulation2", "in"))
+        if len(self.remote.uploaded) > 0: raise RuntimeError("Files are uploaded again")
+        self.check_directory(fs.join(self.path, "simulation2", "in"))
+
+        # Hard links
+        if os.stat(self.store.blob_path(file_digest(self.files["stars.dat"]))).st_nlink != 3: raise RuntimeError("The stored files are not hard linked")
+
+    # -----------------------------------------------------------------
+
+    def test_corrupt(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the upload of corrupt files ...")
+
+        path = fs.join(self.path, "input", "corrupt.dat")
+        fs.write_text(path, "corrupt")
+
+        # The upload is rejected
+        self.remote.corrupt = True
+        try: self.store.add([path])
+        except RuntimeError: pass
+        else: raise RuntimeError("The corrupt upload is not rejected")
+        finally: self.remote.corrupt = False
+
+        # The files are not added to the store, and the uploaded files are removed
+        if fs.is_file(self.store.blob_path(file_digest(path))): raise RuntimeError("The corrupt file is added to the store")
+        if len(fs.directories_in_path(self.store.path)) > 0: raise RuntimeError("The uploaded files are not removed")
+
+    # -----------------------------------------------------------------
+
+    def test_prune(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the pruning of the store ...")
+
+        # Add a file without linking it, and make the stored files and an incomplete upload old
+        path = fs.join(self.path, "input", "unused.dat")
+        fs.write_text(path, "unused")
+        self.store.add([path])
+        incoming_path = fs.create_directory_in(self.store.path, "incoming-old")
+        old = time.time() - 60 * 86400
+        for name in os.listdir(self.store.path): os.utime(fs.join(self.store.path, name), (old, old))
+
+        # Remove one of the directories
+        fs.remove_directory(fs.join(self.path, "simulation2"))
+
+        # Only the file that is not linked is removed
+        nremoved = self.store.prune()
+        if nremoved != 1: raise RuntimeError("Expected 1 removed file, but " + str(nremoved) + " were removed")
+        if fs.is_file(self.store.blob_path(file_digest(path))): raise RuntimeError("The file that is not linked is not removed")
+        self.check_directory(fs.join(self.path, "simulation1", "in"))
+        if fs.is_directory(incoming_path): raise RuntimeError("The incomplete upload is not removed")
+
+    # -----------------------------------------------------------------
+
+    def test_digests(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the digest cache ...")
+
+        # Change and remove files, calculate the digests again (the new digests are appended to the cache file)
+        cache = DigestCache(self.store.digests.path)
+        fs.write_text(self.files["stars.dat"], "changed stars")
+        for name in ["unused.dat", "corrupt.dat"]: os.remove(fs.join(self.path, "input", name))
+        for path in self.files.values(): cache.digest(path)
+
+        # The stale entries are removed when the cache is loaded
+        nlines = len(list(fs.read_lines(cache.path)))
+        cache = DigestCache(cache.path)
+        lines = list(fs.read_lines(cache.path))
+        if nlines <= len(self.files) or len(lines) != len(self.files): raise RuntimeError("The stale entries are not removed from the digest cache")
+        for path in self.files.values():
+            if cache.digest(path) != file_digest(path): raise RuntimeError("The digest of '" + path + "' is wrong")
+        if len(list(fs.read_lines(cache.path))) != len(self.files): raise RuntimeError("The digests are calculated again")
+
+# -----------------------------------------------------------------
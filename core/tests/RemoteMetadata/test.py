@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import hashlib
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.core.remote.metadata import RemoteMetadata, local_execute, listing_threshold, max_listing_ratio
+
+# -----------------------------------------------------------------
+
+description = "testing the remote metadata service, with the local shell as a stand-in for the remote shell"
+
+# -----------------------------------------------------------------
+
+class RemoteMetadataTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(RemoteMetadataTest, self).__init__(*args, **kwargs)
+
+        # The directories
+        self.small_path = None
+        self.large_path = None
+
+        # The requested paths
+        self.small_paths = []
+        self.large_paths = []
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the files
+        self.create()
+
+        # 3. Test the metadata of many paths
+        self.test_stat()
+
+        # 4. Test failed commands
+        self.test_failed()
+
+        # 5. Test the listings
+        self.test_listing()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(RemoteMetadataTest, self).setup(**kwargs)
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the files ...")
+
+        nrequested = listing_threshold + 2
+
+        # A directory with a few more entries than the requested paths
+        self.small_path = fs.create_directory_in(self.path, "small")
+        for index in range(2 * nrequested):
+            path = fs.join(self.small_path, "file " + str(index) + ".dat")
+            fs.write_text(path, "x" * index)
+            if index < nrequested: self.small_paths.append(path)
+        fs.write_text(fs.join(self.small_path, ".hidden"), "hidden")
+        subdirectory = fs.create_directory_in(self.small_path, "sub")
+        fs.write_text(fs.join(subdirectory, "nested.dat"), "nested")
+
+        # A directory with many more entries than the requested paths
+        self.large_path = fs.create_directory_in(self.path, "large")
+        for index in range(max_listing_ratio * nrequested + 10):
+            path = fs.join(self.large_path, "file" + str(index) + ".dat")
+            fs.write_text(path, "y" * index)
+            if index < nrequested: self.large_paths.append(path)
+
+    # -----------------------------------------------------------------
+
+    def test_stat(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the metadata of many paths ...")
+
+        metadata = RemoteMetadata(local_execute)
+        not_existing = [fs.join(self.small_path, "missing" + str(index) + ".dat") for index in range(2)]
+        paths = self.small_paths + not_existing + self.large_paths
+        infos = metadata.stat(paths, checksums=True)
+
+        # Check the metadata
+        for path in self.small_paths + self.large_paths:
+            info = infos[path]
+            if not info.is_file: raise RuntimeError("The file '" + path + "' is not found")
+            if info.size != os.path.getsize(path): raise RuntimeError("The size of '" + path + "' is wrong")
+            with open(path, "rb") as handle: checksum = hashlib.md5(handle.read()).hexdigest()
+            if info.checksum != checksum: raise RuntimeError("The checksum of '" + path + "' is wrong")
+        for path in not_existing:
+            if infos[path].exists: raise RuntimeError("The path '" + path + "' should not exist")
+
+        # The small directory is listed, the paths in the large directory are obtained separately
+        if metadata.ncommands != 2: raise RuntimeError("Expected 2 commands, but " + str(metadata.ncommands) + " were executed")
+        if fs.join(self.small_path, "sub") not in metadata.infos: raise RuntimeError("The small directory is not listed")
+        if fs.join(self.large_path, "file" + str(len(self.large_paths) + 1) + ".dat") in metadata.infos: raise RuntimeError("The large directory is listed")
+
+        # Cached
+        metadata.stat(paths)
+        if metadata.ncommands != 2: raise RuntimeError("The cached metadata is not used")
+
+        # Invalidated
+        metadata.invalidate(self.small_paths[0])
+        if not metadata.is_file(self.small_paths[0]): raise RuntimeError("The file '" + self.small_paths[0] + "' is not found")
+        if metadata.ncommands != 3: raise RuntimeError("The metadata is not invalidated")
+
+    # -----------------------------------------------------------------
+
+    def test_failed(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing failed commands ...")
+
+        # Executor of which the first command fails (without output)
+        commands = []
+        def execute(command):
+            commands.append(command)
+            if len(commands) == 1: return []
+            return local_execute(command)
+
+        # The paths are not regarded as not existing after a failed listing
+        metadata = RemoteMetadata(execute)
+        infos = metadata.stat(self.small_paths)
+        if not all(info.is_file for info in infos.values()): raise RuntimeError("The paths do not exist after a failed listing")
+
+        # A failed listing is not cached
+        del commands[:]
+        metadata = RemoteMetadata(execute)
+        if len(metadata.files(self.small_path)) != 0: raise RuntimeError("The failed listing is not empty")
+        if len(metadata.files(self.small_path)) != 2 * len(self.small_paths): raise RuntimeError("The failed listing is cached")
+
+    # -----------------------------------------------------------------
+
+    def test_listing(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the directory listings ...")
+
+        metadata = RemoteMetadata(local_execute)
+
+        # Compare with the local file system
+        for recursive in [False, True]:
+            for ignore_hidden in [True, False]:
+                files = metadata.files(self.small_path, recursive=recursive, ignore_hidden=ignore_hidden)
+                local_files = fs.files_in_path(self.small_path, recursive=recursive, ignore_hidden=ignore_hidden)
+                if sorted(files) != sorted(local_files): raise RuntimeError("The listing of the files differs from the local file system (recursive=" + str(recursive) + ", ignore_hidden=" + str(ignore_hidden) + ")")
+        if metadata.directories(self.small_path) != [fs.join(self.small_path, "sub")]: raise RuntimeError("The listing of the directories is wrong")
+
+        # Not existing directory
+        if len(metadata.listing(fs.join(self.path, "missing"))) != 0: raise RuntimeError("The listing of a directory that does not exist is not empty")
+
+# -----------------------------------------------------------------
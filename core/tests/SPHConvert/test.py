@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import filecmp
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.core.prep.sphconvert import convert_stars_EAGLE, parse_lines
+
+# -----------------------------------------------------------------
+
+description = "testing the streaming conversion of SPH data files against the conversion with np.loadtxt and np.savetxt"
+
+# -----------------------------------------------------------------
+
+def convert_legacy(infile, outfile):
+
+    """
+    This function performs the conversion of EAGLE star particles as it was done before the streaming converter
+    :param infile:
+    :param outfile:
+    :return:
+    """
+
+    x, y, z, t, h, Z, M = np.loadtxt(infile, unpack=True)
+    with open(outfile, 'w') as fid:
+        fid.write('# SPH Star Particles\n')
+        fid.write('# Converted from EAGLE SKIRT5 output format into SKIRT6 format\n')
+        fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)\n')
+        np.savetxt(fid, np.transpose((x*1e3, y*1e3, z*1e3, h*1e3, M, Z, t)), fmt="%1.9g")
+
+# -----------------------------------------------------------------
+
+class SPHConvertTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(SPHConvertTest, self).__init__(*args, **kwargs)
+
+        # The path of the mock particle file
+        self.particles_path = None
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Test the parsing of lines with comments
+        self.test_parse()
+
+        # 3. Create the mock particle file
+        self.create()
+
+        # 4. Compare the conversions
+        self.compare()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(SPHConvertTest, self).setup(**kwargs)
+
+    # -----------------------------------------------------------------
+
+    def test_parse(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the parsing of lines with comments ...")
+
+        lines = ["# header", "1 2 3 # inline comment", "", "  # indented comment", "4 5 6#comment without space", "7 8 9   "]
+        if not np.array_equal(parse_lines(lines), [[1, 2, 3], [4, 5, 6], [7, 8, 9]]): raise RuntimeError("The lines with comments are not parsed correctly")
+        if not np.array_equal(parse_lines(lines, usecols=(0, 2)), [[1, 3], [4, 6], [7, 9]]): raise RuntimeError("The columns of the lines with comments are not parsed correctly")
+        if parse_lines(["# only comments", ""], usecols=(0, 2)).shape != (0, 2): raise RuntimeError("The lines without data are not parsed correctly")
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the mock EAGLE star particle file ...")
+
+        # Create mock star particles: x y z (kpc), t (yr), h (kpc), Z, M (Msun)
+        nparticles = 2000
+        prng = np.random.RandomState(42)
+        data = np.column_stack((prng.normal(0, 10, (nparticles, 3)), prng.uniform(0, 13e9, nparticles),
+                                prng.uniform(0.1, 5, nparticles), prng.uniform(0, 0.04, nparticles),
+                                prng.normal(1.8e6, 2e5, nparticles)))
+
+        # Write, with comment lines, empty lines and trailing comments
+        self.particles_path = fs.join(self.path, "stars.data")
+        with open(self.particles_path, 'w') as fid:
+            fid.write("# mock EAGLE star particles\n")
+            for index, row in enumerate(data):
+                line = " ".join("%1.9g" % value for value in row)
+                if index % 7 == 0: line += "  # particle " + str(index)
+                if index % 11 == 0: fid.write("\n# comment line\n")
+                fid.write(line + "\n")
+
+    # -----------------------------------------------------------------
+
+    def compare(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Comparing the conversions ...")
+
+        legacy_path = fs.join(self.path, "legacy.dat")
+        convert_legacy(self.particles_path, legacy_path)
+
+        # Convert in one chunk, in small chunks, and in small chunks in parallel
+        for name, kwargs in [("single", dict()), ("chunks", dict(chunksize=4096)), ("parallel", dict(chunksize=4096, nprocesses=2))]:
+
+            path = fs.join(self.path, name + ".dat")
+            nparticles = convert_stars_EAGLE(self.particles_path, path, **kwargs)
+            if nparticles != 2000: raise RuntimeError("The number of converted particles is wrong (" + name + ")")
+            if not filecmp.cmp(legacy_path, path, shallow=False): raise RuntimeError("The converted file differs from the legacy conversion (" + name + ")")
+
+# -----------------------------------------------------------------
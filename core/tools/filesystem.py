@@ -21,6 +21,8 @@ import platform
 import subprocess
 import datetime
 import filecmp
+import hashlib
+from contextlib import contextmanager
 from collections import OrderedDict
 
 # Import the relevant PTS classes and modules
@@ -1698,6 +1700,59 @@ def move_file(file_path, directory_path, new_name=None):
 
 # -----------------------------------------------------------------
 
+def temporary_path_for(path):
+
+    """
+    This function returns the path of a temporary file next to the specified file: hidden, unique for the process,
+    marked with '.part', and with the same extension (so that e.g. numpy and FITS writers don't append another one)
+    :param path:
+    :return:
+    """
+
+    directory_path, filename = os.path.split(path)
+    base, extension = os.path.splitext(filename)
+    return os.path.join(directory_path, "." + base + "." + str(os.getpid()) + ".part" + extension)
+
+# -----------------------------------------------------------------
+
+@contextmanager
+def atomic_write(path):
+
+    """
+    This function (a context manager) provides a temporary path to write a file to. At the end of the block, the
+    temporary file is renamed to the specified path (replacing an existing file), so that concurrent readers never
+    see a partially written file. If the block raises an exception, the temporary file is removed.
+    :param path:
+    :return:
+    """
+
+    temp_path = temporary_path_for(path)
+    try:
+        yield temp_path
+        os.rename(temp_path, path)
+    except:
+        if os.path.isfile(temp_path): os.remove(temp_path)
+        raise
+
+# -----------------------------------------------------------------
+
+def files_signature(paths):
+
+    """
+    This function returns a signature of a number of files, based on their names, sizes and modification times
+    :param paths:
+    :return:
+    """
+
+    sha = hashlib.sha1()
+    for path in paths:
+        if not is_file(path): raise IOError("The file '" + path + "' does not exist")
+        stat = os.stat(path)
+        sha.update((name(path) + ":" + str(stat.st_size) + ":" + repr(stat.st_mtime) + "\n").encode("utf8"))
+    return sha.hexdigest()
+
+# -----------------------------------------------------------------
+
 def move_files(file_paths, directory_path):
 
     """
@@ -14,6 +14,7 @@
 from __future__ import absolute_import, division, print_function
 
 # Import standard modules
+import os
 import getpass
 import traceback
 from os import devnull
@@ -99,6 +100,9 @@ pts_user_accounts_dir = fs.create_directory_in(pts_user_dir, "accounts")
 # The path to the PTS user/config directory
 pts_user_config_dir = fs.create_directory_in(pts_user_dir, "config")
 
+# The path to the command index (the scripts and commands tables of all subprojects)
+pts_command_index_path = fs.join(pts_temp_dir, "commands.pickle")
+
 # -----------------------------------------------------------------
 
 temp_dirs = []
@@ -2215,6 +2219,105 @@ def get_arguments_tables():
 
 # -----------------------------------------------------------------
 
+def command_index_stamps():
+
+    """
+    This function returns the modification times of the files and directories that define the PTS commands:
+    the 'do' directories (of which the mtime changes when scripts are added or removed) and the commands.dat files
+    :return:
+    """
+
+    stamps = dict()
+
+    # The do directories
+    stamps[pts_do_dir] = os.stat(pts_do_dir).st_mtime
+    for name in os.listdir(pts_do_dir):
+        path = fs.join(pts_do_dir, name)
+        if name.startswith(".") or name == "__pycache__" or not os.path.isdir(path): continue
+        stamps[path] = os.stat(path).st_mtime
+
+    # The commands tables
+    for subproject in subprojects:
+        path = fs.join(pts_subproject_dir(subproject), "commands.dat")
+        stamps[path] = os.stat(path).st_mtime if os.path.isfile(path) else None
+
+    # Return the stamps
+    return stamps
+
+# -----------------------------------------------------------------
+
+def load_command_index(path=pts_command_index_path):
+
+    """
+    This function loads the scripts and the commands tables from the command index, if it is still up-to-date
+    :param path:
+    :return: the scripts and the tables, or None if the index is missing or outdated
+    """
+
+    import pickle
+
+    # No index yet
+    if not os.path.isfile(path): return None
+
+    # Load
+    try:
+        with open(path, 'rb') as index_file: index = pickle.load(index_file)
+    except Exception: return None
+
+    # Check the stamps
+    if index.get("stamps") != command_index_stamps(): return None
+
+    # Return the scripts and the tables
+    return index["scripts"], index["tables"]
+
+# -----------------------------------------------------------------
+
+def write_command_index(scripts, tables, path=pts_command_index_path):
+
+    """
+    This function writes the scripts and the commands tables to the command index
+    :param scripts:
+    :param tables:
+    :param path:
+    :return:
+    """
+
+    import pickle
+
+    index = {"stamps": command_index_stamps(), "scripts": scripts, "tables": tables}
+
+    # Write to a temporary file first, and then move it into place (so that concurrent PTS commands never read
+    # an incomplete index)
+    try:
+        with fs.atomic_write(path) as temp_path:
+            with open(temp_path, 'wb') as index_file: pickle.dump(index, index_file, protocol=2)
+    except (IOError, OSError): pass # e.g. a read-only installation: just don't use the index
+
+# -----------------------------------------------------------------
+
+def get_scripts_and_tables(path=pts_command_index_path):
+
+    """
+    This function returns the scripts and the commands tables of all subprojects, from the command index if it is
+    still up-to-date, or otherwise by scanning the 'do' directories and the commands.dat files (and regenerating the index)
+    :param path: the path of the command index
+    :return:
+    """
+
+    # Try loading the index
+    index = load_command_index(path)
+    if index is not None: return index
+
+    # Create the index
+    scripts = get_scripts()
+    tables = get_arguments_tables()
+    write_command_index(scripts, tables, path)
+
+    # Return
+    return scripts, tables
+
+# -----------------------------------------------------------------
+
 def skip_module(name, path=None):
 
     """
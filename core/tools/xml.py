@@ -14,6 +14,41 @@ from __future__ import absolute_import, division, print_function
 
 # -----------------------------------------------------------------
 
+# The compiled XPath expressions
+_xpaths = dict()
+
+# -----------------------------------------------------------------
+
+def compiled_xpath(expression):
+
+    """
+    This function returns the compiled version (an lxml XPath object) of the specified XPath expression, which is
+    compiled only the first time it is requested
+    :param expression:
+    :return:
+    """
+
+    if expression not in _xpaths:
+        from lxml import etree
+        _xpaths[expression] = etree.XPath(expression)
+    return _xpaths[expression]
+
+# -----------------------------------------------------------------
+
+def xpath(element, expression):
+
+    """
+    This function evaluates the specified XPath expression on the specified element or tree, using the compiled
+    version of the expression
+    :param element:
+    :param expression:
+    :return:
+    """
+
+    return compiled_xpath(expression)(element)
+
+# -----------------------------------------------------------------
+
 def get_unique_element(element, name):
 
     """
@@ -24,7 +59,7 @@ def get_unique_element(element, name):
     """
 
     # Get child element of the given element
-    parents = element.xpath(name)
+    parents = xpath(element, name)
 
     # Check if only one child element is present
     if len(parents) == 0: raise ValueError("Invalid ski file: no '" + name + "' elements within '" + element.tag + "'")
@@ -51,7 +86,7 @@ def get_unique_element_direct(element, name):
     """
 
     # Get child element of the given element
-    parents = element.xpath(name)
+    parents = xpath(element, name)
 
     # Check if only one child element is present
     if len(parents) == 0: raise ValueError("Invalid ski file: no '" + name + "' elements within '" + element.tag + "'")
@@ -71,7 +106,7 @@ def get_list(element, name):
     """
 
     # Get the private properties
-    properties = element.xpath(name)
+    properties = xpath(element, name)
 
     if len(properties) == 0: return []
     elif len(properties) == 1: return properties[0].getchildren()
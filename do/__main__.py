@@ -57,9 +57,8 @@ parser.add_argument("options", nargs=argparse.REMAINDER, help="options for the s
 
 # -----------------------------------------------------------------
 
-# Find possible PTS commands
-scripts = introspection.get_scripts()
-tables = introspection.get_arguments_tables()
+# Find possible PTS commands (from the command index, if it is up-to-date)
+scripts, tables = introspection.get_scripts_and_tables()
 
 # -----------------------------------------------------------------
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.core.benchmark_dustgrids Measure the time needed to predict the structure of tree dust grids.
+#
+# This script predicts the number of cells, the memory footprint and the cell mass fractions of a family of binary
+# tree and octtree dust grids (for a range of smallest scales, minimum levels and maximum mass fractions) for an
+# exponential disk, without running SKIRT. For the first grid of each type, it also constructs the tree cell by cell
+# (as SKIRT does) and compares the number of cells with the prediction, which should agree to within a few percent
+# (both are based on random positions). The script reports the timings and the predicted properties.
+#
+# The script takes one optional command-line argument: the number of grids of each type (default 5).
+#
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import sys
+import time
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.modeling.basics.models import ExponentialDiskModel3D
+from pts.core.units.parsing import parse_quantity as q
+from pts.core.prep.dustgrids import predict_tree_dust_grid, cell_masses, max_level_for_smallest_scale_bintree, max_level_for_smallest_scale_octtree
+
+# -----------------------------------------------------------------
+
+# get the command line arguments
+ngrids = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+# the dust disk and the grid domain (in pc)
+disk = ExponentialDiskModel3D(radial_scale=q("4000 pc"), axial_scale=q("250 pc"))
+density = disk.density_function(unit="pc")
+radius = 20000.
+height = 2500.
+
+# the grid family settings (from coarse to fine)
+scales = np.linspace(400., 100., ngrids)
+fractions = np.logspace(-5, -6, ngrids)
+levels = dict(bintree=np.linspace(6, 9, ngrids).astype(int), octtree=np.linspace(2, 3, ngrids).astype(int))
+max_level_functions = dict(bintree=max_level_for_smallest_scale_bintree, octtree=max_level_for_smallest_scale_octtree)
+
+# -----------------------------------------------------------------
+
+## This function constructs the tree cell by cell, as SKIRT does, and returns the number of cells.
+def count_cells_recursively(grid_type, cell, level, min_level, max_level, max_mass_fraction, total_mass, prng):
+    if level < min_level: divide = True
+    elif level < max_level: divide = cell_masses(density, cell[np.newaxis, :], 100, prng)[0] / total_mass > max_mass_fraction
+    else: divide = False
+    if not divide: return 1
+    children = [cell]
+    for direction in ([level % 3] if grid_type == "bintree" else [0, 1, 2]):
+        divided = []
+        for child in children:
+            middle = 0.5 * (child[direction] + child[direction + 3])
+            lower = child.copy()
+            lower[direction + 3] = middle
+            upper = child.copy()
+            upper[direction] = middle
+            divided += [lower, upper]
+        children = divided
+    return sum(count_cells_recursively(grid_type, child, level+1, min_level, max_level, max_mass_fraction, total_mass, prng) for child in children)
+
+# -----------------------------------------------------------------
+
+agree = True
+for grid_type in ("bintree", "octtree"):
+
+    print("Predicting {} {} dust grids...".format(ngrids, grid_type))
+    total_mass = None
+    start = time.time()
+    predictions = []
+    for scale, min_level, max_mass_fraction in zip(scales, levels[grid_type], fractions):
+        grid_start = time.time()
+        max_level = max_level_functions[grid_type](2 * radius, scale)
+        prediction = predict_tree_dust_grid(density, grid_type, -radius, radius, -radius, radius, -height, height,
+                                            min_level, max_level, max_mass_fraction, total_mass=total_mass, seed=42)
+        total_mass = prediction.total_mass
+        predictions.append(prediction)
+        print("  scale {:6.1f} pc; min level {}; max mass fraction {:.1e}: {:8d} cells; {:6.3f}; "
+              "max cell mass fraction {:.2e}; {} unresolved cells; {:6.2f} s".format(scale, min_level,
+               max_mass_fraction, prediction.ncells, prediction.memory, prediction.max_mass_fraction,
+               prediction.nunresolved, time.time() - grid_start))
+    seconds = time.time() - start
+    print("predicted: {:7.3f} s; {:7.3f} s per grid".format(seconds, seconds/ngrids))
+
+    # construct the first (coarsest) grid cell by cell
+    start = time.time()
+    domain = np.array([-radius, -radius, -height, radius, radius, height])
+    max_level = max_level_functions[grid_type](2 * radius, scales[0])
+    ncells = count_cells_recursively(grid_type, domain, 0, levels[grid_type][0], max_level, fractions[0], total_mass, np.random.RandomState(42))
+    seconds = time.time() - start
+    print("cell by cell: {:7.3f} s for the first grid; {} cells (predicted {})".format(seconds, ncells, predictions[0].ncells))
+    if abs(ncells - predictions[0].ncells) > 0.05 * ncells: agree = False
+
+print("Cell counts agree" if agree else "Cell counts do NOT agree")
+if not agree: sys.exit(1)
+
+# -----------------------------------------------------------------
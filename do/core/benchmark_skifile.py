@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.core.benchmark_skifile Measure the throughput of generating ski files for a generation of models.
+#
+# This script mimics the generation of the ski files for one generation of a fitting run: starting from the labeled
+# ski file template in the modeling data directory, it sets random values for all labeled parameters, queries the
+# stellar and dust components, the instruments and the wavelength grid (as the model generators and launchers do),
+# and saves the ski file, for each model. It does so:
+#  - legacy: with XPath expressions evaluated from strings, and a traversal of the tree for each label
+#  - indexed: with the compiled XPath expressions, the element index and the parameter vector API
+#
+# For each method, the script reports the time spent on setting the parameters, querying and saving, and the number
+# of models per second, and verifies that both methods produce identical ski files.
+#
+# The script takes one optional command-line argument: the number of models (default 1000).
+#
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.simulation.skifile7 import LabeledSkiFile7
+from pts.core.tools import xml
+from pts.core.tools import introspection
+from pts.core.tools import filesystem as fs
+from pts.core.tools.stringify import stringify_not_list
+
+# -----------------------------------------------------------------
+
+# get the command line arguments
+nmodels = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+# the labeled ski file template
+template_path = fs.join(introspection.pts_dat_dir("modeling"), "ski7", "labeled_template.ski")
+
+# -----------------------------------------------------------------
+
+## This function sets the labeled values as it was done before the element index, traversing the tree for each label.
+def set_labeled_values_legacy(ski, values):
+    from pts.core.simulation.skifile import get_label, is_labeled
+    existing_labels = set(get_label(value) for element in ski.tree.getiterator() for name, value in element.items() if is_labeled(value))
+    for label in values:
+        if label not in existing_labels: raise ValueError("The label '" + label + "' is not present in the ski file")
+        for element in ski.tree.getiterator():
+            for name, value in element.items():
+                if is_labeled(value) and get_label(value) == label:
+                    element.set(name, "[" + label + ":" + stringify_not_list(values[label])[1] + "]")
+
+## This function generates the ski files for all models, and returns the times spent on setting the parameters,
+# querying and saving.
+def generate(ski, labels, vectors, outpath, legacy):
+    times = np.zeros(3)
+    for index, vector in enumerate(vectors):
+        start = time.time()
+        if legacy: set_labeled_values_legacy(ski, dict(zip(labels, vector)))
+        else: ski.apply_parameter_vector(labels, vector)
+        times[0] += time.time() - start
+
+        start = time.time()
+        ski.get_stellar_components()
+        ski.get_dust_components()
+        ski.get_instruments()
+        ski.get_wavelength_grid()
+        ski.get_dust_distribution()
+        ski.treegrid()
+        times[1] += time.time() - start
+
+        start = time.time()
+        ski.saveto(fs.join(outpath, "model" + str(index) + ".ski"))
+        times[2] += time.time() - start
+    return times
+
+# -----------------------------------------------------------------
+
+# load the template, and draw the parameter vectors (within 20 percent of the template values)
+ski = LabeledSkiFile7(template_path)
+values = ski.get_labeled_values()
+labels = sorted(values.keys())
+prng = np.random.RandomState(42)
+vectors = [ [ values[label] * prng.uniform(0.8, 1.2) for label in labels ] for index in range(nmodels) ]
+
+print("Generating {} ski files with {} labeled parameters...".format(nmodels, len(labels)))
+tempdir = tempfile.mkdtemp()
+try:
+    outpaths = dict()
+    for method in ("legacy", "indexed"):
+        outpaths[method] = fs.create_directory_in(tempdir, method)
+        ski = LabeledSkiFile7(template_path)
+
+        # evaluate the XPath expressions from strings for the legacy method
+        compiled_xpath = xml.xpath
+        if method == "legacy":
+            xml.xpath = lambda element, expression: element.xpath(expression)
+            ski.xpath = lambda expression, element=None: (ski.tree if element is None else element).xpath(expression)
+        try:
+            start = time.time()
+            times = generate(ski, labels, vectors, outpaths[method], method == "legacy")
+            seconds = time.time() - start
+        finally:
+            xml.xpath = compiled_xpath
+
+        print("{:8s}: parameters {:6.2f} s; queries {:6.2f} s; saving {:6.2f} s; {:7.1f} models/s".format(method, times[0], times[1], times[2], nmodels/seconds))
+
+    # compare the ski files, except for the time attribute
+    identical = True
+    for index in range(nmodels):
+        name = "model" + str(index) + ".ski"
+        lines = [ [ line for line in fs.read_lines(fs.join(outpaths[method], name)) if "time=" not in line ] for method in ("legacy", "indexed") ]
+        if lines[0] != lines[1]: identical = False
+    print("Ski files are identical" if identical else "Ski files are NOT identical")
+    if not identical: sys.exit(1)
+finally:
+    shutil.rmtree(tempdir)
+
+# -----------------------------------------------------------------
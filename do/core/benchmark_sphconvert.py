@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.core.benchmark_sphconvert Measure the throughput of the SPH data file converter.
+#
+# This script creates a temporary mock EAGLE star particle file (in the old EAGLE column text format) and converts it
+# to SKIRT format with:
+#  - legacy: the former in-memory conversion with np.loadtxt and np.savetxt
+#  - text: the streaming conversion to text
+#  - parallel: the streaming conversion to text using a number of processes
+#
+# For each method, the script reports the time and the throughput (in MB of input per second), and verifies that
+# the outputs are identical to the legacy output.
+#
+# The script takes two optional command-line arguments: the number of particles (default 1000000) and the
+# number of processes for the parallel conversion (default 4).
+#
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import sys
+import time
+import shutil
+import filecmp
+import tempfile
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.prep.sphconvert import convert_stars_EAGLE
+
+# -----------------------------------------------------------------
+
+# get the command line arguments
+nparticles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+nprocesses = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+# -----------------------------------------------------------------
+
+## This function performs the conversion as it was done before the streaming converter.
+def convert_legacy(infile, outfile):
+    x,y,z,t,h,Z,M = np.loadtxt(infile, unpack=True)
+    fid = open(outfile, 'w')
+    fid.write('# SPH Star Particles\n')
+    fid.write('# Converted from EAGLE SKIRT5 output format into SKIRT6 format\n')
+    fid.write('# Columns contain: x(pc) y(pc) z(pc) h(pc) M(Msun) Z(0-1) t(yr)\n')
+    np.savetxt(fid, np.transpose((x*1e3,y*1e3,z*1e3,h*1e3,M,Z,t)), fmt="%1.9g")
+    fid.close()
+
+# -----------------------------------------------------------------
+
+tempdir = tempfile.mkdtemp()
+try:
+    # create mock star particles: x y z (kpc), t (yr), h (kpc), Z, M (Msun)
+    print("Creating a mock EAGLE star particle file with {} particles...".format(nparticles))
+    prng = np.random.RandomState(42)
+    data = np.column_stack((prng.normal(0, 10, (nparticles,3)), prng.uniform(0, 13e9, nparticles),
+                            prng.uniform(0.1, 5, nparticles), prng.uniform(0, 0.04, nparticles),
+                            prng.normal(1.8e6, 2e5, nparticles)))
+    infile = os.path.join(tempdir, "stars.data")
+    np.savetxt(infile, data, fmt="%1.9g", header="mock EAGLE star particles")
+    megabytes = os.path.getsize(infile) / 1e6
+
+    # perform the conversions
+    methods = [("legacy", lambda outfile: convert_legacy(infile, outfile)),
+               ("text", lambda outfile: convert_stars_EAGLE(infile, outfile)),
+               ("parallel", lambda outfile: convert_stars_EAGLE(infile, outfile, nprocesses=nprocesses))]
+    outfiles = {}
+    for name, method in methods:
+        outfiles[name] = os.path.join(tempdir, name + ".dat")
+        start = time.time()
+        method(outfiles[name])
+        seconds = time.time() - start
+        print("{:8s}: {:7.2f} s; {:7.1f} MB/s".format(name, seconds, megabytes/seconds))
+
+    # verify the outputs
+    identical = filecmp.cmp(outfiles["legacy"], outfiles["text"], shallow=False) and \
+                filecmp.cmp(outfiles["legacy"], outfiles["parallel"], shallow=False)
+    print("Outputs are identical" if identical else "Outputs are NOT identical")
+    if not identical: sys.exit(1)
+finally:
+    shutil.rmtree(tempdir)
+
+# -----------------------------------------------------------------
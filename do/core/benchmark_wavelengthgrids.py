@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.core.benchmark_wavelengthgrids Measure the time needed to generate a family of wavelength grids.
+#
+# This script generates a family of subgrid wavelength grids (for a range of target numbers of points), with a set of
+# broad and narrow band filters, all emission lines, some fixed wavelengths and some wavelengths to adjust to, as
+# the WavelengthGridGenerator does for the modeling. It reports the time for:
+#  - family: creating all grids in one call (create_subgrid_wavelength_grids)
+#  - single: creating each grid separately (create_one_subgrid_wavelength_grid)
+#  - values: creating only the wavelength values of all grids (without the WavelengthGrid objects and the units)
+#
+# The script takes three optional command-line arguments: the number of grids (default 20), and the minimum and
+# maximum target number of points (default 100 and 2000).
+#
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import sys
+import time
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.filter.filter import parse_filter
+from pts.core.basics.emissionlines import EmissionLines
+from pts.core.units.parsing import parse_unit as u
+from pts.core.prep.wavelengthgrids import create_subgrid_wavelength_grids, create_one_subgrid_wavelength_grid, WavelengthGridEngine
+
+# -----------------------------------------------------------------
+
+# get the command line arguments
+ngrids = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+min_npoints = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+max_npoints = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+# the grid family settings
+npoints_range = [int(npoints) for npoints in np.linspace(min_npoints, max_npoints, ngrids)]
+filters = [parse_filter(name) for name in ["GALEX FUV", "GALEX NUV", "SDSS u", "SDSS g", "SDSS r", "SDSS i", "SDSS z",
+                                           "2MASS J", "2MASS H", "2MASS Ks", "IRAC I1", "IRAC I2", "IRAC I3", "IRAC I4",
+                                           "WISE W3", "WISE W4", "MIPS 24mu", "Pacs blue", "Pacs red", "SPIRE 250",
+                                           "SPIRE 350", "SPIRE 500", "Halpha"]]
+settings = dict(emission_lines=EmissionLines(), fixed=[0.55 * u("micron"), 500. * u("micron")],
+                min_wavelength=0.05 * u("micron"), max_wavelength=1800. * u("micron"), filters=filters,
+                adjust_to=[0.3543 * u("micron"), 160. * u("micron")])
+
+# -----------------------------------------------------------------
+
+print("Generating {} wavelength grids with {} to {} points...".format(ngrids, min_npoints, max_npoints))
+
+start = time.time()
+family = create_subgrid_wavelength_grids(npoints_range, return_elements=True, **settings)
+family_seconds = time.time() - start
+
+start = time.time()
+single = [create_one_subgrid_wavelength_grid(npoints, return_elements=True, **settings) for npoints in npoints_range]
+single_seconds = time.time() - start
+
+start = time.time()
+engine = WavelengthGridEngine(**settings)
+values = [engine.create_values(npoints)[0] for npoints in npoints_range]
+values_seconds = time.time() - start
+
+print("family: {:7.3f} s; {:7.2f} ms per grid".format(family_seconds, 1e3*family_seconds/ngrids))
+print("single: {:7.3f} s; {:7.2f} ms per grid".format(single_seconds, 1e3*single_seconds/ngrids))
+print("values: {:7.3f} s; {:7.2f} ms per grid".format(values_seconds, 1e3*values_seconds/ngrids))
+print("Number of points: " + ", ".join(str(len(grid_values)) for grid_values in values))
+
+# -----------------------------------------------------------------
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.core.prune_input_store Remove the simulation input files that are no longer used from the store
+#  on remote hosts.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import the relevant PTS classes and modules
+from pts.core.basics.configuration import ConfigurationDefinition, parse_arguments
+from pts.core.remote.host import find_host_ids
+from pts.core.remote.remote import Remote
+from pts.core.remote.blobstore import RemoteBlobStore, default_prune_days
+from pts.core.basics.log import log
+
+# -----------------------------------------------------------------
+
+# Create the configuration definition
+definition = ConfigurationDefinition()
+
+# Add settings
+definition.add_positional_optional("remotes", "string_list", "the IDs of the remote hosts for which to prune the store", choices=find_host_ids(), default=find_host_ids())
+definition.add_optional("days", "positive_integer", "remove the files that are not linked anymore and were not used for this number of days", default_prune_days)
+
+# -----------------------------------------------------------------
+
+# Parse the arguments into a configuration
+config = parse_arguments("prune_input_store", definition, description="Remove the simulation input files that are no longer used from the store on remote hosts")
+
+# -----------------------------------------------------------------
+
+# Loop over the remotes
+for host_id in config.remotes:
+
+    # Check whether the remote is available
+    remote = Remote()
+    if not remote.setup(host_id):
+        log.warning("The remote host '" + host_id + "' is not available: skipping ...")
+        continue
+
+    # Check whether there is a store
+    store = RemoteBlobStore(remote)
+    if not remote.is_directory(store.path):
+        log.debug("No store of input files on host '" + host_id + "'")
+        continue
+
+    # Prune
+    nremoved = store.prune(days=config.days)
+
+    # Success
+    log.success("Removed " + str(nremoved) + " files from the store on host '" + host_id + "'")
+
+# -----------------------------------------------------------------
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.eagle.benchmark_database Measure the contention on the SKIRT-runs database for concurrent performers.
+#
+# This script creates a temporary SKIRT-runs database with a number of records scheduled for the extract stage,
+# and lets a number of local processes concurrently claim chunks of records (and mark them as succeeded) until
+# no records are left, mimicking a set of performer processes. It does so for the following configurations:
+#  - legacy: select and update per run-id under a file lock, with the rollback journal (the former performer code)
+#  - journal: atomic claims (Database.claim()) with the rollback journal
+#  - wal: atomic claims with write-ahead logging
+#
+# For each configuration, the script reports the number of claims per second, the mean and maximum time spent
+# waiting for a claim, and verifies that no record was claimed twice.
+#
+# The script takes three optional command-line arguments: the number of processes (default 8), the number of
+# records (default 20000), and the number of records per claim (default 5).
+#
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+# Import the relevant PTS classes and modules
+from pts.eagle.database import Database
+from pts.eagle.filelock import FileLock
+
+# -----------------------------------------------------------------
+
+# get the command line arguments
+nprocesses = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+nrecords = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+chunksize = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+# -----------------------------------------------------------------
+
+## This function creates a SKIRT-runs database with the specified number of records scheduled for extraction.
+def createdatabase(filepath, wal):
+    db = Database(filepath, wal=wal)
+    db.createtable()
+    with db.transaction():
+        for index in range(nrecords):
+            db.insert("bench", "RefL0100N1504", 28, index, index, 0, 1e10, 0., 0., 0., "template", 1e6, 1e-6)
+    with db.transaction():
+        db.updatestage(range(1, nrecords+1), "extract")
+    db.close()
+
+## This function claims chunks of records until there are none left, and returns the claimed run-ids and the
+# time spent waiting for each claim.
+def perform(arguments):
+    filepath, mode = arguments
+    runids = []
+    waits = []
+    while True:
+        start = time.time()
+        db = Database(filepath, wal=(mode == "wal"))
+        if mode == "legacy":
+            with FileLock(filepath + ".lock", timeout=500, delay=0.01):
+                with db.transaction():
+                    records = db.select("stage = ? and status='scheduled'", ("extract",))[:chunksize]
+                    for record in records:
+                        db.execute("update skirtruns set status = 'running' where runid = ?", (record['runid'],))
+        else:
+            records = db.claim("extract", chunksize)
+        waits.append(time.time() - start)
+        if len(records) == 0:
+            db.close()
+            return runids, waits
+
+        # mark the records as succeeded
+        with db.transaction():
+            db.updatestatus(records, "succeeded")
+        db.close()
+        runids += [ record['runid'] for record in records ]
+
+# -----------------------------------------------------------------
+
+print("Benchmarking {} processes claiming {} records in chunks of {}...".format(nprocesses, nrecords, chunksize))
+tempdir = tempfile.mkdtemp()
+try:
+    for mode in ("legacy", "journal", "wal"):
+        filepath = os.path.join(tempdir, mode + ".db")
+        createdatabase(filepath, wal=(mode == "wal"))
+
+        # claim all records concurrently
+        pool = multiprocessing.Pool(nprocesses)
+        start = time.time()
+        results = pool.map(perform, [(filepath, mode)] * nprocesses)
+        seconds = time.time() - start
+        pool.close()
+        pool.join()
+
+        # gather the results
+        runids = [ runid for result in results for runid in result[0] ]
+        waits = [ wait for result in results for wait in result[1] ]
+        nclaims = len(waits)
+        duplicates = len(runids) - len(set(runids))
+
+        print("{:8s}: {:8.1f} claims/s; {:8.1f} records/s; mean wait {:7.2f} ms; max wait {:7.2f} ms; "
+              "{} records claimed; {} duplicates".format(mode, nclaims/seconds, len(runids)/seconds,
+               1e3*sum(waits)/nclaims, 1e3*max(waits), len(runids), duplicates))
+finally:
+    shutil.rmtree(tempdir)
+
+# -----------------------------------------------------------------
@@ -74,7 +74,11 @@ if stage == "store":
 
 # Perform according to requested mode
 log.info("Performing {} in {} mode ...".format(stage, mode))
-if mode == "loop":
+if mode == "loop" and stage == "extract":
+    # extract nearby galaxies together, reading each snapshot region only once
+    from pts.eagle.extractor import extractbatch, recordKey
+    performer.loopbatch(extractbatch, stage, float(eval(argum)), chunksize, key=recordKey)
+elif mode == "loop":
     performer.loop(callback, stage, float(eval(argum)), chunksize)
 if mode == "force":
     performer.force(callback, stage, argum)
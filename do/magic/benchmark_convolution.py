@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.magic.benchmark_convolution Compare the convolution service with frame-by-frame convolution
+#  for a mock observation with many filters.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import time as _time
+import numpy as np
+
+# Import astronomical modules
+from astropy.convolution import convolve_fft
+
+# Import the relevant PTS classes and modules
+from pts.core.basics.configuration import ConfigurationDefinition, parse_arguments
+from pts.core.basics.log import log
+from pts.core.tools import time
+from pts.magic.core.frame import Frame
+from pts.magic.core.kernel import ConvolutionKernel
+from pts.magic.basics.pixelscale import Pixelscale
+from pts.core.units.parsing import parse_unit as u
+from pts.magic.convolution.service import ConvolutionService, fft_backend
+
+# -----------------------------------------------------------------
+
+# Create the definition
+definition = ConfigurationDefinition()
+
+# Settings
+definition.add_optional("nfilters", "positive_integer", "number of filters (images)", 30)
+definition.add_optional("nkernels", "positive_integer", "number of different kernels", 10)
+definition.add_optional("ninstruments", "positive_integer", "number of instruments", 1)
+definition.add_optional("size", "positive_integer", "number of pixels along each axis of the images", 1000)
+definition.add_optional("nthreads", "positive_integer", "number of threads for the convolution service")
+definition.add_optional("nan_fraction", "real", "fraction of pixels that are NaN", 0.01)
+
+# Parse the command line arguments
+config = parse_arguments("benchmark_convolution", definition)
+
+# -----------------------------------------------------------------
+
+# Create the mock images
+log.info("Creating " + str(config.nfilters * config.ninstruments) + " mock images of " + str(config.size) + "x" + str(config.size) + " pixels ...")
+np.random.seed(42)
+arrays = []
+for index in range(config.nfilters * config.ninstruments):
+    data = np.random.lognormal(size=(config.size, config.size))
+    data[np.random.random(data.shape) < config.nan_fraction] = np.nan
+    arrays.append(data)
+
+# Create the kernels: Gaussian PSFs with FWHMs between 3 and 25 pixels, shared by several filters
+pixelscale = Pixelscale(1.0 * u("arcsec"))
+fwhms = np.linspace(3., 25., config.nkernels)
+kernels = []
+for index in range(config.nfilters * config.ninstruments):
+    fwhm = fwhms[(index % config.nfilters) % config.nkernels] * u("arcsec")
+    kernels.append(ConvolutionKernel.gaussian(fwhm, pixelscale))
+
+# -----------------------------------------------------------------
+
+# Frame-by-frame convolution with astropy
+log.info("Convolving frame by frame with astropy's convolve_fft ...")
+start = _time.time()
+reference = []
+for data, kernel in zip(arrays, kernels):
+    new_data = convolve_fft(data, kernel.data, boundary='fill', nan_treatment="interpolate", normalize_kernel=False, allow_huge=True)
+    new_data[np.isnan(data)] = np.nan
+    np.clip(new_data, np.nanmin(data), np.nanmax(data), out=new_data)
+    reference.append(new_data)
+reference_seconds = _time.time() - start
+
+# -----------------------------------------------------------------
+
+# Batched convolution with the convolution service
+log.info("Convolving in batches with the convolution service (" + fft_backend + " FFT backend) ...")
+frames = [Frame(data.copy()) for data in arrays]
+service = ConvolutionService(nthreads=config.nthreads)
+start = _time.time()
+service.convolve_frames(frames, kernels)
+service_seconds = _time.time() - start
+
+# Again, with the kernel transforms cached
+frames = [Frame(data.copy()) for data in arrays]
+start = _time.time()
+service.convolve_frames(frames, kernels)
+cached_seconds = _time.time() - start
+
+# -----------------------------------------------------------------
+
+# Compare
+max_difference = max(np.nanmax(np.abs(frame.data - ref) / np.abs(ref)) for frame, ref in zip(frames, reference))
+
+# Show
+print("")
+print("FFT backend: " + fft_backend)
+print("Number of threads: " + str(service.nthreads))
+print("Frame-by-frame (astropy): " + time.display_time(reference_seconds))
+print("Convolution service: " + time.display_time(service_seconds) + " (speedup " + "{:.1f}".format(reference_seconds / service_seconds) + "x)")
+print("Convolution service, cached kernels: " + time.display_time(cached_seconds) + " (speedup " + "{:.1f}".format(reference_seconds / cached_seconds) + "x)")
+print("Maximum relative difference: " + repr(max_difference))
+print("")
+
+# -----------------------------------------------------------------
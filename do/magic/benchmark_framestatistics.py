@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.magic.benchmark_framestatistics Compare the fused frame statistics with separate passes over the
+#  data for each statistic.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import time as _time
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.basics.configuration import ConfigurationDefinition, parse_arguments
+from pts.core.basics.log import log
+from pts.core.tools import time
+from pts.magic.core.frame import Frame
+from pts.magic.core.framestats import FrameStatistics
+
+# -----------------------------------------------------------------
+
+# Create the definition
+definition = ConfigurationDefinition()
+
+# Settings
+definition.add_optional("size", "positive_integer", "number of pixels along each axis of the frame", 3162)
+definition.add_optional("nrepeats", "positive_integer", "number of repetitions", 3)
+definition.add_optional("nan_fraction", "real", "fraction of pixels that are NaN", 0.05)
+definition.add_flag("median", "also calculate the median", True)
+
+# Parse the command line arguments
+config = parse_arguments("benchmark_framestatistics", definition)
+
+# -----------------------------------------------------------------
+
+# Create the mock frame
+log.info("Creating a mock frame of " + str(config.size) + "x" + str(config.size) + " pixels ...")
+np.random.seed(42)
+data = np.random.normal(size=(config.size, config.size))
+data[np.random.random(data.shape) < config.nan_fraction] = np.nan
+data[::50, ::50] = 0.0
+
+# -----------------------------------------------------------------
+
+def separate_passes(data):
+
+    """
+    This function calculates the statistics with a separate pass for each of them (as the frame properties did)
+    :param data:
+    :return:
+    """
+
+    nnans = np.sum(np.isnan(data))
+    ninfs = np.sum(np.isinf(data))
+    with np.errstate(invalid="ignore"):
+        nzeroes = np.sum(np.equal(data, 0.0))
+        nnegatives = np.sum(np.less(data, 0.0))
+        npositives = np.sum(np.greater(data, 0.0))
+    minimum = np.nanmin(data)
+    maximum = np.nanmax(data)
+    total = np.nansum(data)
+    median = np.nanmedian(data) if config.median else None
+    return nnans, ninfs, nzeroes, nnegatives, npositives, minimum, maximum, total, median
+
+# -----------------------------------------------------------------
+
+def fused(data):
+
+    """
+    This function calculates the statistics in one pass
+    :param data:
+    :return:
+    """
+
+    stats = FrameStatistics(data)
+    median = stats.median if config.median else None
+    return stats.nnans, stats.ninfs, stats.nzeroes, stats.nnegatives, stats.npositives, stats.min, stats.max, stats.sum, median
+
+# -----------------------------------------------------------------
+
+def timed(function, *args):
+
+    """
+    This function returns the result and the best time of a number of repetitions
+    :param function:
+    :param args:
+    :return:
+    """
+
+    seconds = []
+    for _ in range(config.nrepeats):
+        start = _time.time()
+        result = function(*args)
+        seconds.append(_time.time() - start)
+    return result, min(seconds)
+
+# -----------------------------------------------------------------
+
+# Separate passes
+log.info("Calculating the statistics with separate passes ...")
+reference, reference_seconds = timed(separate_passes, data)
+
+# Fused
+log.info("Calculating the statistics in one pass ...")
+single, single_seconds = timed(fused, data)
+
+# Memoized on the frame: the properties after the first
+frame = Frame(data)
+frame.nnans
+start = _time.time()
+properties = (frame.nnans, frame.ninfs, frame.nzeroes, frame.nnegatives, frame.npositives, frame.min, frame.max, frame.sum())
+memoized_seconds = _time.time() - start
+
+# -----------------------------------------------------------------
+
+# Compare
+max_difference = max(abs(a - b) / abs(a) if a != 0 else abs(b) for a, b in zip(reference[:-1], single[:-1]))
+if config.median: max_difference = max(max_difference, abs(reference[-1] - single[-1]))
+
+# Show
+print("")
+print("Separate passes: " + time.display_time(reference_seconds))
+print("Fused: " + time.display_time(single_seconds) + " (speedup " + "{:.1f}".format(reference_seconds / single_seconds) + "x)")
+print("Memoized frame properties: " + time.display_time(memoized_seconds))
+print("Maximum relative difference: " + repr(max_difference))
+print("")
+
+# -----------------------------------------------------------------
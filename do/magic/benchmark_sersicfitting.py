@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.do.magic.benchmark_sersicfitting Compare the Sérsic fitting engine with the former fitting procedure
+#  of the aperture corrector, for a set of mock galaxy cutouts of DustPedia size.
+#
+# The mock cutouts are PSF-convolved Sérsic profiles with noise, with Gaussian PSFs with the FWHMs (in pixels) of the
+# bands from GALEX to SPIRE. The script reports the time for:
+#  - legacy: lmfit with chi_squared_sersic (astropy Sersic2D and convolve_fft in every evaluation)
+#  - engine: the SersicFitter, one cutout after the other
+#  - parallel: the SersicFitter, with the cutouts distributed over a process pool
+#
+# and the maximum relative difference between the best-fit parameters of the legacy and engine fits.
+#
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import time as _time
+import numpy as np
+import lmfit
+
+# Import astronomical modules
+import astropy.modeling
+from astropy.convolution import convolve_fft
+
+# Import the relevant PTS classes and modules
+from pts.core.basics.configuration import ConfigurationDefinition, parse_arguments
+from pts.core.basics.log import log
+from pts.core.tools import time
+from pts.magic.misc import chrisfuncs
+from pts.magic.photometry.aperturecorrector import chi_squared_sersic
+from pts.magic.photometry.sersicfitter import fit_sersic_models, crop_psf
+
+# -----------------------------------------------------------------
+
+# Create the definition
+definition = ConfigurationDefinition()
+
+# Settings
+definition.add_optional("ncutouts", "positive_integer", "number of cutouts (galaxies or bands)", 12)
+definition.add_optional("size", "positive_integer", "number of pixels along each axis of the cutouts", 300)
+definition.add_optional("nprocesses", "positive_integer", "number of processes for the parallel fits", 4)
+
+# Parse the command line arguments
+config = parse_arguments("benchmark_sersicfitting", definition)
+
+# -----------------------------------------------------------------
+
+# The FWHMs of the PSFs (in pixels)
+fwhms = [2.5, 3.0, 2.0, 2.0, 3.5, 3.0, 4.0, 6.0, 3.5, 4.0, 5.0, 4.0]
+
+# Create the mock cutouts
+log.info("Creating " + str(config.ncutouts) + " mock cutouts of " + str(config.size) + "x" + str(config.size) + " pixels ...")
+prng = np.random.RandomState(42)
+y, x = np.indices((config.size, config.size))
+arguments = []
+for index in range(config.ncutouts):
+
+    # The PSF
+    fwhm = fwhms[index % len(fwhms)]
+    half = int(np.ceil(4 * fwhm))
+    psf_y, psf_x = np.indices((2 * half + 1, 2 * half + 1))
+    psf = np.exp(-((psf_x - half)**2 + (psf_y - half)**2) / (2. * (fwhm / 2.3548)**2))
+
+    # The galaxy
+    centre = 0.5 * config.size + prng.uniform(-2, 2, 2)
+    semimaj_pix = 0.35 * config.size
+    axial_ratio = prng.uniform(1.2, 3.0)
+    angle = prng.uniform(0, 180)
+    sersic = astropy.modeling.models.Sersic2D(amplitude=1.0, r_eff=prng.uniform(0.05, 0.2) * config.size, n=prng.uniform(0.7, 3.0),
+                                              x_0=centre[0], y_0=centre[1], ellip=prng.uniform(0.2, 0.6), theta=np.deg2rad(angle))
+    cutout = convolve_fft(sersic(x, y), psf, normalize_kernel=True) + prng.normal(0, 0.02, (config.size, config.size))
+
+    # The fitting mask and the initial values (as in the aperture corrector)
+    mask = chrisfuncs.EllipseMask(cutout, semimaj_pix, axial_ratio, angle, centre[1], centre[0])
+    initial = dict(amplitude=cutout[int(round(centre[1])), int(round(centre[0]))], r_eff=semimaj_pix / 10.0, n=1.0,
+                   x_0=centre[0], y_0=centre[1], ellip=(axial_ratio - 1.0) / axial_ratio, theta=np.deg2rad(angle))
+    arguments.append((cutout, psf, mask, initial, semimaj_pix))
+
+# -----------------------------------------------------------------
+
+## This function fits a cutout as the aperture corrector did before the fitting engine.
+def fit_legacy(cutout, psf, mask, initial, max_r_eff):
+    psf = crop_psf(psf, cutout.shape)
+    params = lmfit.Parameters()
+    params.add('sersic_amplitide', value=initial["amplitude"], vary=True)
+    params.add('sersic_r_eff', value=initial["r_eff"], vary=True, min=0.0, max=max_r_eff)
+    params.add('sersic_n', value=initial["n"], vary=True, min=0.1, max=10)
+    params.add('sersic_x_0', value=initial["x_0"], vary=False)
+    params.add('sersic_y_0', value=initial["y_0"], vary=False)
+    params.add('sersic_ellip', value=initial["ellip"], vary=True, min=0.5 * initial["ellip"], max=0.5 * (1.0 - initial["ellip"]) + initial["ellip"])
+    params.add('sersic_theta', value=initial["theta"], vary=False)
+    result = lmfit.minimize(chi_squared_sersic, params, args=(cutout, psf, mask.copy(), True), method='leastsq', ftol=1E-5, xtol=1E-5, maxfev=200)
+    return dict(amplitude=result.params['sersic_amplitide'].value, r_eff=result.params['sersic_r_eff'].value,
+                n=result.params['sersic_n'].value, ellip=result.params['sersic_ellip'].value)
+
+# -----------------------------------------------------------------
+
+# Legacy fits
+log.info("Fitting with the legacy procedure ...")
+start = _time.time()
+legacy = [fit_legacy(*args) for args in arguments]
+legacy_seconds = _time.time() - start
+
+# Engine, serial
+log.info("Fitting with the Sérsic fitting engine ...")
+start = _time.time()
+engine = fit_sersic_models(arguments)
+engine_seconds = _time.time() - start
+
+# Engine, parallel
+log.info("Fitting with the Sérsic fitting engine in " + str(config.nprocesses) + " processes ...")
+start = _time.time()
+parallel = fit_sersic_models(arguments, nprocesses=config.nprocesses)
+parallel_seconds = _time.time() - start
+
+# -----------------------------------------------------------------
+
+# Compare
+max_difference = max(abs(result[key] - reference[key]) / abs(reference[key]) for reference, result in zip(legacy, engine) for key in reference)
+identical = all(result == other for result, other in zip(engine, parallel))
+
+# Show
+print("")
+print("Number of cutouts: " + str(config.ncutouts))
+print("Legacy: " + time.display_time(legacy_seconds))
+print("Engine: " + time.display_time(engine_seconds) + " (speedup " + "{:.1f}".format(legacy_seconds / engine_seconds) + "x)")
+print("Engine, parallel: " + time.display_time(parallel_seconds) + " (speedup " + "{:.1f}".format(legacy_seconds / parallel_seconds) + "x)")
+print("Maximum relative difference of the best-fit parameters: " + repr(max_difference))
+print("Serial and parallel fits are identical" if identical else "Serial and parallel fits are NOT identical")
+print("")
+
+# -----------------------------------------------------------------
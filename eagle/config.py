@@ -18,6 +18,8 @@
 #<TR><TD>eagledata_path</TD>        <TD>A dictionary containing key-value pairs providing the absolute path to the
 #                                       eagle data directory (value) for each relevant eagle simulation (key)</TD></TR>
 #<TR><TD>database_path</TD>         <TD>The absolute path to the directory containing the SKIRT-runs database</TD></TR>
+#<TR><TD>database_wal</TD>          <TD>True if the SKIRT-runs database resides on a local disk, so that it can use
+#                                       write-ahead logging when it is accessed by multiple processes</TD></TR>
 #<TR><TD>backup_path</TD>           <TD>The absolute path to the directory containing backups of the database</TD></TR>
 #<TR><TD>templates_path</TD>        <TD>The absolute path to the directory containing ski file templates</TD></TR>
 #<TR><TD>jobs_path</TD>             <TD>The absolute path to the directory containing batch job scripts and logs</TD></TR>
@@ -65,6 +67,7 @@ configuration = {
         'RecalL0025N0752':  "/cosma5/data/Eagle/ScienceRuns/Planck1/L0025N0752/PE/RECALIBRATED/data",
     },
     'database_path':    "/cosma6/data/dp004/pcamps/Eagle/Database",
+    'database_wal':     False,      # the database resides on a network file system
     'backup_path':      "/cosma6/data/dp004/pcamps/Eagle/Backup",
     'templates_path':   "/cosma6/data/dp004/pcamps/Eagle/Templates",
     'jobs_path':        "/cosma6/data/dp004/pcamps/Eagle/Jobs",
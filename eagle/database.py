@@ -136,12 +136,27 @@ class Database:
     #
     # The optional filepath argument allows opening a SKIRT-runs database with a nonstandard location and name.
     # In almost all cases this argument should be omitted so that the constructor opens the standard database.
-    def __init__(self, filepath=None):
+    #
+    # If the \em wal argument is True, the database is switched to write-ahead logging, so that readers no longer
+    # block the writer (and vice versa) when multiple processes access the database. Write-ahead logging requires
+    # all processes to run on the same host and does not work reliably on a network file system, so it should only
+    # be enabled for a database on a local disk (see the database_wal configuration setting). If the argument is
+    # False (the default), a database that was left in write-ahead logging mode is switched back to the default
+    # rollback journal. The journal mode is only written when it differs from the requested mode. The constructor
+    # also creates the indexes used for selecting work if they do not yet exist.
+    def __init__(self, filepath=None, wal=False, timeout=60):
         if filepath==None:
             filepath = os.path.join(config.database_path, "SKIRT-runs.db")
-        self._con = sqlite3.connect(filepath, timeout=60)
+        self._con = sqlite3.connect(filepath, timeout=timeout)
         self._con.row_factory = sqlite3.Row
         self._con.text_factory = sqlite3.OptimizedUnicode
+        try:
+            mode = self._con.execute("pragma journal_mode").fetchone()[0].lower()
+            if wal and mode != "wal": self._con.execute("pragma journal_mode=wal")
+            elif not wal and mode == "wal": self._con.execute("pragma journal_mode=delete")
+            self.createindexes()
+        except sqlite3.OperationalError:
+            pass    # e.g. a read-only database, or a database without skirtruns table
 
     ## This function closes the connection to the database. Any uncommited changes are lost.
     # You can no longer use the database after calling this function.
@@ -262,8 +277,8 @@ class Database:
     def updatefield(self, runids, fieldname, value):
         if fieldname in ('stage','status'):
             raise ValueError("Use the updatestage() or updatestatus() functions to update these fields")
-        for runid in runids:
-            self._con.execute("update skirtruns set " + fieldname + " = ? where runid = ?", (value,cleanrunid(runid)))
+        self._con.executemany("update skirtruns set " + fieldname + " = ? where runid = ?",
+                              [(value,cleanrunid(runid)) for runid in runids])
 
     ## This function updates the value of the stage and status fields, and stores a new timestamp in the statusdate
     # field, for the specified records. The default new value for the status field is 'scheduled', but another value
@@ -274,9 +289,8 @@ class Database:
         if not stage in stage_enum: raise ValueError("Unsupported stage value: " + stage)
         if not status in status_enum: raise ValueError("Unsupported status value: " + status)
         statusdate = config.timestamp()
-        for runid in runids:
-            self._con.execute("update skirtruns set stage = ?, status = ?, statusdate = ? where runid = ?",
-                               (stage,status,statusdate,cleanrunid(runid)))
+        self._con.executemany("update skirtruns set stage = ?, status = ?, statusdate = ? where runid = ?",
+                              [(stage,status,statusdate,cleanrunid(runid)) for runid in runids])
 
     ## This function updates the value of the status field (without touching the stage field), and stores a new
     # timestamp in the statusdate field, for the specified records. The change is \em not committed.
@@ -285,9 +299,8 @@ class Database:
     def updatestatus(self, runids, status):
         if not status in status_enum: raise ValueError("Unsupported status value: " + status)
         statusdate = config.timestamp()
-        for runid in runids:
-            self._con.execute("update skirtruns set status = ?, statusdate = ? where runid = ?",
-                               (status,statusdate,cleanrunid(runid)))
+        self._con.executemany("update skirtruns set status = ?, statusdate = ? where runid = ?",
+                              [(status,statusdate,cleanrunid(runid)) for runid in runids])
 
     ## This function updates all fields of the database record for the specified run-id to the values contained
     # in the specified row object. The row object should be obtained through the select() function from a database
@@ -301,14 +314,53 @@ class Database:
         if len(oldrows) != 1: raise ValueError("The specified run-id does not match a database record: " + str(runid))
         oldrow = oldrows[0]
 
-        # update each field if needed
-        modified = False
-        for fieldname in oldrow.keys():
-            if fieldname != 'runid' and oldrow[fieldname] != newrow[fieldname]:
-                self._con.execute("update skirtruns set " + fieldname + " = ? where runid = ?",
-                                  (newrow[fieldname],runid))
-                modified = True
-        return modified
+        # update the modified fields in a single statement
+        fieldnames = [ fieldname for fieldname in oldrow.keys()
+                       if fieldname != 'runid' and oldrow[fieldname] != newrow[fieldname] ]
+        if len(fieldnames) == 0: return False
+        self._con.execute("update skirtruns set " + ", ".join(fieldname + " = ?" for fieldname in fieldnames) +
+                          " where runid = ?", [newrow[fieldname] for fieldname in fieldnames] + [runid])
+        return True
+
+    # -------- queue operations --------
+
+    ## This function atomically claims (at most) the specified number of records that are at the specified stage
+    # and have the 'scheduled' status: the status of the claimed records is updated to 'running', and the function
+    # returns a list of row objects for these records (reflecting their updated status). The select and the update
+    # occur in a single immediate transaction, so that no two processes can claim the same record; no additional
+    # locking is needed. The records are taken in order of run-id, unless a \em key function is specified, in which
+    # case the eligible records are sorted on the value returned by this function for each record. Any uncommitted
+    # changes are committed first.
+    #
+    # The function returns an empty list if there are no eligible records.
+    def claim(self, stage, count=1, key=None):
+        self._con.commit()
+        isolation = self._con.isolation_level
+        self._con.isolation_level = None    # manage the transaction explicitly
+        try:
+            self._con.execute("begin immediate")
+            try:
+                if key is None:
+                    records = self._con.execute("select * from skirtruns where stage = ? and status = 'scheduled' "
+                                                "order by runid limit ?", (stage,count)).fetchall()
+                else:
+                    records = self._con.execute("select * from skirtruns where stage = ? and status = 'scheduled'",
+                                                (stage,)).fetchall()
+                    records = sorted(records, key=key)[:count]
+                self.updatestatus(records, 'running')
+                self._con.execute("commit")
+            except:
+                self._con.execute("rollback")
+                raise
+        finally:
+            self._con.isolation_level = isolation
+
+        # return the claimed records with their updated status
+        if len(records) == 0: return []
+        runids = [ record['runid'] for record in records ]
+        claimed = dict((record['runid'], record) for record in self._con.execute(
+                        "select * from skirtruns where runid in (" + ",".join("?"*len(runids)) + ")", runids))
+        return [ claimed[runid] for runid in runids ]
 
     # -------- maintaining --------
 
@@ -337,6 +389,17 @@ class Database:
                              numpp numeric,
                              deltamax numeric
                           )''')
+        self.createindexes()
+
+    ## This function creates the indexes on the skirtruns table (if they do not yet exist): an index on the stage and
+    # status fields, used for selecting and claiming work, and an index on the label field.
+    # The change is automatically committed.
+    def createindexes(self):
+        existing = set(row[0] for row in self._con.execute("select name from sqlite_master where type='index'"))
+        if "skirtruns_stage_status" in existing and "skirtruns_label" in existing: return
+        self._con.execute("create index if not exists skirtruns_stage_status on skirtruns (stage, status)")
+        self._con.execute("create index if not exists skirtruns_label on skirtruns (label)")
+        self._con.commit()
 
     ## This function adds a field to the main table in the SKIRT-runs database. It is \em not intended for use in
     # production code. The change is automatically committed. The field type should be 'text' for strings and dates,
@@ -39,8 +39,10 @@ import os.path
 import numpy as np
 import h5py
 import read_eagle       # EAGLE-specific package by must be seperately installed
+from collections import OrderedDict
 
 from ..core.tools.geometry import Transform
+from ..core.basics.log import log
 from . import config as config
 from .skirtrun import SkirtRun
 
@@ -60,21 +62,145 @@ def extract(record):
 
     # ---- get the particle data
 
-    # initialise star and gas dictionaries
-    sdat        = {}
-    gdat        = {}
-    yngstars    = {}
-    hiiregions  = {}
-
     # open snapshot and read relevant field attributes
     sfn = snapfilename(record["eaglesim"], record["snaptag"])
-    snapshot = read_eagle.EagleSnapshot(sfn)
-    params = fieldAttrs(sfn, "Header")
-    params.update(fieldAttrs(sfn, "Constants"))
-    params.update(fieldAttrs(sfn, "RuntimePars"))
+    params = snapshotParams(sfn)
+
+    # read the particle data in a (2*250kpc)^3 physical volume about galaxy centre
+    region = readRegion(sfn, galaxyRegion(record, params))
+    sdat, gdat = selectGalaxy(region, record, params)
+
+    # process the particle data and write the output files
+    exportGalaxy(record, params, sdat, gdat)
+
+# -----------------------------------------------------------------
+
+## This function extracts information relevant for SKIRT from the EAGLE output for all galaxies described by the
+# specified SKIRT-runs database records, with the same results as calling extract() for each of the records.
+# The records are grouped by EAGLE simulation, snapshot and spatial hash cell (with the specified size in cMpc),
+# and the particle data for the region enclosing the galaxies in each group is read from the snapshot only once.
+# The data is passed to the worker processes of a process pool when they are started (so that each worker receives
+# it once, rather than once per galaxy).
+# The per-galaxy processing (centroiding, rotation, resampling and writing the output files) is performed in
+# parallel by the specified number of processes (by default, the number of cores).
+#
+# The function returns a list with the records for which the extraction failed (the error is logged),
+# and logs the time spent in each of the stages.
+def extractbatch(records, nprocesses=None, cellsize=2.):
+    import multiprocessing
+    import time
+
+    timings = OrderedDict((stage, 0.) for stage in ("read", "select", "convert", "orient", "resample", "write"))
+    failed = []
+
+    # loop over the groups of nearby galaxies
+    for (eaglesim, snaptag, cell), group in groupRecords(records, cellsize).items():
+        log.info("Extracting {} galaxies from {} snapshot {} in cell {}...".format(len(group), eaglesim, snaptag, cell))
+
+        # read the particle data for the region enclosing all galaxies in the group
+        start = time.time()
+        sfn = snapfilename(eaglesim, snaptag)
+        params = snapshotParams(sfn)
+        bounds = np.array([galaxyRegion(record, params) for record in group])
+        bounds = np.column_stack((bounds[:,0::2].min(axis=0), bounds[:,1::2].max(axis=0))).flatten()
+        region = (params, readRegion(sfn, tuple(bounds)))
+        timings["read"] += time.time() - start
+
+        # process the galaxies in parallel (the workers are initialized with the data of the region)
+        arguments = [dict((key, record[key]) for key in record.keys()) for record in group]
+        if nprocesses == 1:
+            _initRegion(region)
+            try: results = list(map(_exportFromRegion, arguments))
+            finally: _initRegion(None)
+        else:
+            pool = multiprocessing.Pool(nprocesses, initializer=_initRegion, initargs=(region,))
+            try: results = pool.map(_exportFromRegion, arguments, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        del region
+
+        # gather the timings and the failures
+        for record, (result, message) in zip(group, results):
+            if message is not None:
+                log.error("Extraction failed for SKIRT-run {}: {}".format(record["runid"], message))
+                failed.append(record)
+            for stage, seconds in result.items(): timings[stage] += seconds
+
+    # report the timings
+    for stage, seconds in timings.items(): log.info("Time spent in stage {}: {:.1f} s".format(stage, seconds))
+    return failed
+
+## This private variable holds the simulation parameters and the particle data for the snapshot region that is
+# currently being processed by extractbatch(), in the worker processes (or in the main process if there are no workers)
+_region = None
+
+## This private helper function sets the snapshot region that is processed by _exportFromRegion(); it is the
+# initializer of the worker processes of extractbatch().
+def _initRegion(region):
+    global _region
+    _region = region
+
+## This private helper function extracts a galaxy from the snapshot region held by the _region variable,
+# returning the timings of the stages and an error message (or None if the extraction succeeded).
+def _exportFromRegion(record):
+    import time
+    import traceback
+    timings = {}
+    try:
+        start = time.time()
+        params, region = _region
+        sdat, gdat = selectGalaxy(region, record, params)
+        timings["select"] = time.time() - start
+        exportGalaxy(record, params, sdat, gdat, timings)
+        return timings, None
+    except Exception:
+        return timings, traceback.format_exc()
+
+# -----------------------------------------------------------------
+
+## This function returns the key (eaglesim, snaptag, cell) of the specified SKIRT-runs database record, where cell
+# is the index tuple of the cell (with the specified size in cMpc) of a spatial hash grid that contains the galaxy's
+# center of potential. Records with the same key are extracted together by extractbatch().
+def recordKey(record, cellsize=2.):
+    cell = tuple(int(np.floor(record[c] / cellsize)) for c in ("copx", "copy", "copz"))
+    return (record["eaglesim"], record["snaptag"], cell)
+
+## This function groups the specified SKIRT-runs database records by their key (see recordKey()).
+# It returns an ordered dictionary with the keys and lists of records as values.
+def groupRecords(records, cellsize=2.):
+    groups = OrderedDict()
+    for record in records:
+        groups.setdefault(recordKey(record, cellsize), []).append(record)
+    return groups
+
+# -----------------------------------------------------------------
+
+## These variables hold the names of the datasets that are read for each particle type, and the corresponding
+# keys in the particle data dictionaries
+stardatasets = (("r","Coordinates"), ("h","SmoothingLength"), ("im","InitialMass"), ("m","Mass"), ("v","Velocity"),
+                ("Z","SmoothedMetallicity"), ("born","StellarFormationTime"), ("rho_born","BirthDensity"))
+gasdatasets = (("r","Coordinates"), ("h","SmoothingLength"), ("m","Mass"), ("v","Velocity"),
+               ("Z","SmoothedMetallicity"), ("T","Temperature"), ("rho","Density"), ("sfr","StarFormationRate"))
+
+## This private variable caches the field attributes read by snapshotParams() for each snapshot file
+_paramscache = {}
+
+## This function returns a dictionary with the Header, Constants and RuntimePars attributes of the specified
+# snapshot file. The attributes are read only once for each snapshot file.
+def snapshotParams(sfn):
+    if sfn not in _paramscache:
+        params = fieldAttrs(sfn, "Header")
+        params.update(fieldAttrs(sfn, "Constants"))
+        params.update(fieldAttrs(sfn, "RuntimePars"))
+        _paramscache[sfn] = params
+    return _paramscache[sfn]
+
+## This function returns the (2*250kpc)^3 physical volume about the galaxy centre of the specified SKIRT-runs
+# database record, in snapshot units, as a tuple (xmin, xmax, ymin, ymax, zmin, zmax).
+def galaxyRegion(record, params):
     hubbleparam = params["HubbleParam"]
     expansionfactor = params["ExpansionFactor"]
-    schmidtparams = schmidtParameters(params)
 
     # convert center of potential to snapshot units
     copx = record["copx"] * hubbleparam
@@ -83,31 +209,59 @@ def extract(record):
 
     # specify (2*250kpc)^3 physical volume about galaxy centre
     delta = 0.25 * hubbleparam / expansionfactor
-    snapshot.select_region(copx-delta, copx+delta, copy-delta, copy+delta, copz-delta, copz+delta)
-
-    # read star particle informaton
-    insubhalo = (snapshot.read_dataset(4, "GroupNumber") == record["groupnr"]) & \
-                (snapshot.read_dataset(4, "SubGroupNumber") == record["subgroupnr"])
-    sdat['r']        = snapshot.read_dataset(4, "Coordinates") [insubhalo]
-    sdat['h']        = snapshot.read_dataset(4, "SmoothingLength") [insubhalo]
-    sdat['im']       = snapshot.read_dataset(4, "InitialMass") [insubhalo]
-    sdat['m']        = snapshot.read_dataset(4, "Mass") [insubhalo]
-    sdat['v']        = snapshot.read_dataset(4, "Velocity") [insubhalo]
-    sdat['Z']        = snapshot.read_dataset(4, "SmoothedMetallicity") [insubhalo]
-    sdat['born']     = snapshot.read_dataset(4, "StellarFormationTime") [insubhalo]
-    sdat['rho_born'] = snapshot.read_dataset(4, "BirthDensity") [insubhalo]
-
-    # read gas particle informaton
-    insubhalo = (snapshot.read_dataset(0, "GroupNumber") == record["groupnr"]) & \
-                (snapshot.read_dataset(0, "SubGroupNumber") == record["subgroupnr"])
-    gdat['r']        = snapshot.read_dataset(0, "Coordinates") [insubhalo]
-    gdat['h']        = snapshot.read_dataset(0, "SmoothingLength") [insubhalo]
-    gdat['m']        = snapshot.read_dataset(0, "Mass") [insubhalo]
-    gdat['v']        = snapshot.read_dataset(0, "Velocity") [insubhalo]
-    gdat['Z']        = snapshot.read_dataset(0, "SmoothedMetallicity") [insubhalo]
-    gdat['T']        = snapshot.read_dataset(0, "Temperature") [insubhalo]
-    gdat['rho']      = snapshot.read_dataset(0, "Density") [insubhalo]
-    gdat['sfr']      = snapshot.read_dataset(0, "StarFormationRate") [insubhalo]
+    return (copx-delta, copx+delta, copy-delta, copy+delta, copz-delta, copz+delta)
+
+## This function reads the particle data in the specified region, given as a tuple (xmin, xmax, ymin, ymax, zmin,
+# zmax) in snapshot units, from the specified snapshot file. It returns a dictionary with for each particle type
+# (4 for stars, 0 for gas) a dictionary with the group and subgroup numbers and the needed datasets.
+def readRegion(sfn, bounds):
+    snapshot = read_eagle.EagleSnapshot(sfn)
+    snapshot.select_region(*bounds)
+    region = {}
+    for ptype, datasets in ((4, stardatasets), (0, gasdatasets)):
+        region[ptype] = {}
+        for name in ("GroupNumber", "SubGroupNumber") + tuple(dataset for key, dataset in datasets):
+            region[ptype][name] = snapshot.read_dataset(ptype, name)
+    return region
+
+## This function returns the star and gas particle data dictionaries for the galaxy described by the specified
+# SKIRT-runs database record, from the particle data in a region read by readRegion(). Only the particles of the
+# subhalo within the (2*250kpc)^3 physical volume about the galaxy centre (see galaxyRegion()) are selected, taking
+# into account the periodic boundaries of the simulation box, so that the selection does not depend on the extent
+# of the region that was read.
+def selectGalaxy(region, record, params):
+    bounds = np.array(galaxyRegion(record, params))
+    centre = 0.5 * (bounds[0::2] + bounds[1::2])
+    delta = 0.5 * (bounds[1::2] - bounds[0::2])
+    boxsize = params["BoxSize"]
+    sdat = {}
+    gdat = {}
+    for dat, ptype, datasets in ((sdat, 4, stardatasets), (gdat, 0, gasdatasets)):
+        offsets = (region[ptype]["Coordinates"] - centre + 0.5*boxsize) % boxsize - 0.5*boxsize
+        insubhalo = (region[ptype]["GroupNumber"] == record["groupnr"]) & \
+                    (region[ptype]["SubGroupNumber"] == record["subgroupnr"]) & \
+                    np.all(np.abs(offsets) <= delta, axis=1)
+        for key, dataset in datasets:
+            dat[key] = region[ptype][dataset][insubhalo]
+    return sdat, gdat
+
+# -----------------------------------------------------------------
+
+## This function processes the star and gas particle data of the galaxy described by the specified SKIRT-runs
+# database record, and writes the resulting files (see the extract() function). If a dictionary is specified
+# for the \em timings argument, the time spent in each of the stages is added to it.
+def exportGalaxy(record, params, sdat, gdat, timings=None):
+    import time
+    start = time.time()
+
+    # initialise dictionaries
+    yngstars    = {}
+    hiiregions  = {}
+
+    # get relevant field attributes
+    hubbleparam = params["HubbleParam"]
+    expansionfactor = params["ExpansionFactor"]
+    schmidtparams = schmidtParameters(params)
 
     # convert units
     sdat['r']        = periodicCorrec(sdat['r'], params["BoxSize"])
@@ -130,6 +284,9 @@ def extract(record):
     sdat['P']        = getPtot(sdat['rho_born'], schmidtparams)
     gdat['P']        = getPtot(gdat['rho'], schmidtparams)
 
+    if timings is not None: timings["convert"] = time.time() - start
+    start = time.time()
+
     # calculate stellar center of mass and translational velocity using shrinking aperture technique
     com, v_bar = shrinkingCentroid(sdat['r'], sdat['m'], sdat['v'])
 
@@ -211,6 +368,9 @@ def extract(record):
     info["exported_particles_unspent_gas_from_gas"] = 0
     info["exported_mass_unspent_gas_from_gas"] = 0
 
+    if timings is not None: timings["orient"] = time.time() - start
+    start = time.time()
+
     # ---- resample star forming regions
 
     # set the "standard" constant covering fraction (see Camps+ 2016)
@@ -392,6 +552,9 @@ def extract(record):
     info["exported_mass_gas"] = info["exported_mass_non_star_forming_gas"] + info["exported_mass_unspent_gas"] # - info["exported_mass_negative_gas"]
     info["exported_mass_baryons"] = info["exported_mass_stars"] + info["exported_mass_hii_regions"] + info["exported_mass_gas"]
 
+    if timings is not None: timings["resample"] = time.time() - start
+    start = time.time()
+
     # create the appropriate SKIRT-run directories
     skirtrun = SkirtRun(record["runid"], create=True)
     filepathprefix = os.path.join(skirtrun.inpath(), "{}_{}_".format(record["eaglesim"], record["galaxyid"]))
@@ -432,6 +595,8 @@ def extract(record):
     gasfile.close()
     hiifile.close()
 
+    if timings is not None: timings["write"] = time.time() - start
+
 # -----------------------------------------------------------------
 
 ## This private helper function returns the absolute path to the first EAGLE snapshot file
@@ -714,11 +879,26 @@ def getPtot(rho, schmidtpars):
 
 # -----------------------------------------------------------------
 
+# mass resampling parameters (see Kennicutt & Evans 2012 section 2.5)
+m_min_resamp = 700         # minimum mass of sub-particle in M_solar
+m_max_resamp = 1e6         # maximum mass of sub-particle in M_solar
+alpha_resamp = 1.8         # exponent of power-law mass function
+
+# mean mass of the sub-particles for this mass function
+m_mean_resamp = (alpha_resamp-1.)/(2.-alpha_resamp) * (m_max_resamp**(2.-alpha_resamp) - m_min_resamp**(2.-alpha_resamp)) \
+                / (m_min_resamp**(1.-alpha_resamp) - m_max_resamp**(1.-alpha_resamp))
+
+# age resampling parameters
+thresh_age_resamp = 1e8    # period over which to resample in yr (100 Myr)
+
 ## This private helper function samples star forming gas particles into a number of sub-particles.
 #
 # Inputs:
 #  - sfr: star formation rate in solar masses per yr
 #  - m_gas: particle mass in solar masses
+#  - rng: numpy RandomState (or seed) used to draw the sub-particle masses and ages; if None, the global
+#         numpy random state is used
+#  - chunksize: approximate maximum number of candidate sub-particles that is processed at once
 #
 # Outputs:
 #  - nested arrays with a list of subparticles for each parent input particle:
@@ -728,62 +908,123 @@ def getPtot(rho, schmidtpars):
 #  - mdiffs: mass of parent particles locked up in new stars; this can be subtracted from the parent gas
 #            particles for mass conservation
 #
-def stochResamp(sfr, m_gas):
-
-    # mass resampling parameters (see Kennicutt & Evans 2012 section 2.5)
-    m_min = 700         # minimum mass of sub-particle in M_solar
-    m_max = 1e6         # maximum mass of sub-particle in M_solar
-    alpha = 1.8         # exponent of power-law mass function
-    alpha1 = 1. - alpha
-
-    # age resampling parameters
-    thresh_age = 1e8    # period over which to resample in yr (100 Myr)
-
-    # initialise lists for output
-    ms   = [[]]
-    ts   = [[]]
+# The parent particles are processed in chunks, and the random numbers for a chunk are drawn in a few batches. The
+# random sequence is the same as for the original loop that, for each parent, draws the deviates for its N candidate
+# sub-particle masses, keeps the sub-particles that fit within the mass of the parent, and then draws the deviates for
+# the decay times of the retained sub-particles. The result is therefore the same as that of the loop (up to the
+# round-off of the sums over the sub-particles of each parent), and the random state is advanced by the same number of
+# deviates. Only the search for the number of retained sub-particles (which determines where the random numbers of the
+# next parent start) is done parent by parent, on a short prefix of the candidates.
+#
+def stochResamp(sfr, m_gas, rng=None, chunksize=2**22):
+    if rng is None: rng = np.random
+    elif not isinstance(rng, np.random.RandomState): rng = np.random.RandomState(rng)
+    sfr = np.asarray(sfr, dtype=float)
+    m_gas = np.asarray(m_gas, dtype=float)
+
+    # determine the maximum number of sub-particles for each parent based on the minimum sub-particle mass
+    N = np.maximum(1, np.ceil(m_gas/m_min_resamp)).astype(np.int64)
+
+    # split the parents in chunks with about 'chunksize' candidate sub-particles
+    chunks = np.searchsorted(np.cumsum(N), np.arange(chunksize, N.sum(), chunksize), side="right")
+    bounds = np.unique(np.concatenate(([0], chunks, [sfr.size])))
+
+    # resample the parents in each chunk
+    ms = [[]]
+    ts = [[]]
     idxs = [[]]
-    mdiffs = []
-
-    # for each parent particle, determine the star-forming sub-particles
-    for i in range(sfr.size):
-        sfri = sfr[i]
-        mi = m_gas[i]
-
-        # determine the maximum number of sub-particles based on the minimum sub-particle mass
-        N = int(max(1,np.ceil(mi/m_min)))
-
-        # generate random sub-particle masses from a power-law distribution between min and max values
-        X = np.random.random(N)
-        m = (m_min**alpha1 + X*(m_max**alpha1-m_min**alpha1))**(1./alpha1)
-
-        # limit and normalize the list of sub-particles to the total mass of the parent
-        mlim = m[np.cumsum(m)<=mi]
-        if len(mlim)<1: mlim = m[:1]
-        m = mi/mlim.sum() * mlim
-        N = len(m)
-
-        # generate random decay lookback time for each sub-particle
-        X = np.random.random(N)               # X in range (0,1]
-        t = thresh_age + mi/sfri * np.log(1-X)
-
-        # determine mask for sub-particles that form stars by present day
-        issf = t > 0.
-
-        # add star-forming sub-particles to the output lists
-        ms.append(m[issf])
-        ts.append(t[issf])
-        idxs.append([i]*np.count_nonzero(issf))
-        mdiffs.append(m[issf].sum())
+    mdiffs = [[]]
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        m, t, idx, mdiff = _stochResampChunk(sfr[first:last], m_gas[first:last], N[first:last], rng)
+        ms.append(m)
+        ts.append(t)
+        idxs.append(idx + first)
+        mdiffs.append(mdiff)
 
     # convert sub-particle lists into numpy arrays
     ms     = np.hstack(ms)
     ts     = np.hstack(ts)
     idxs   = np.hstack(idxs).astype(int)
-    mdiffs = np.array(mdiffs)
+    mdiffs = np.hstack(mdiffs)
 
     return ms, ts, idxs, mdiffs
 
+## This private helper function returns, for segments with the specified lengths, the start index of each segment,
+# and for each element the index of its segment and its position within the segment.
+def _segments(counts):
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    segment = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(ends[-1] if len(counts) > 0 else 0) - np.repeat(starts, counts)
+    return starts, segment, position
+
+## This private helper function returns the sums of the consecutive segments (with the specified lengths) of an array.
+def _segmentSums(values, counts):
+    sums = np.zeros(len(counts))
+    nonempty = counts > 0
+    if np.any(nonempty): sums[nonempty] = np.add.reduceat(values, (np.cumsum(counts) - counts)[nonempty])
+    return sums
+
+## This private helper function resamples a chunk of parent particles for stochResamp().
+def _stochResampChunk(sfr, m_gas, N, rng):
+    alpha1 = 1. - alpha_resamp
+    a = m_min_resamp**alpha1
+    b = m_max_resamp**alpha1 - a
+
+    # determine where the random numbers of each parent start, and the number of sub-particles that fit within its
+    # mass (but at least one); because the mass deviates of a parent are followed by the time deviates of its retained
+    # sub-particles, this is done parent by parent, but only for a prefix of the candidates (the retained sub-particles
+    # are a small fraction) that is doubled in length as long as the parent is not full
+    starts = []
+    K = []
+    start = 0
+
+    # the random numbers are drawn in batches (into an array for at most 2N per parent), but never more than are
+    # used: each parent uses at least its N mass deviates and one time deviate
+    minimum = np.cumsum((N + 1)[::-1])[::-1].tolist()
+    X = np.empty(2*N.sum())
+    ndrawn = minimum[0] if len(N) > 0 else 0
+    X[:ndrawn] = rng.random_sample(ndrawn)
+
+    # the initial length of the prefix, twice the expected number of retained sub-particles
+    prefix = np.minimum(N, (2.*m_gas/m_mean_resamp).astype(np.int64) + 16).tolist()
+
+    exponent = 1./alpha1
+    for i, (mi, Ni, L) in enumerate(zip(m_gas.tolist(), N.tolist(), prefix)):
+        if start + Ni > ndrawn:
+            X[ndrawn:start+minimum[i]] = rng.random_sample(start + minimum[i] - ndrawn)
+            ndrawn = start + minimum[i]
+        while True:
+            k = int(((a + X[start:start+L]*b)**exponent).cumsum().searchsorted(mi, side="right"))
+            if k < L or L == Ni: break
+            L = min(Ni, 2*L)
+        k = max(1, k)
+        starts.append(start)
+        K.append(k)
+        start += Ni + k
+    if start > ndrawn: X[ndrawn:start] = rng.random_sample(start - ndrawn)
+    starts = np.array(starts, dtype=np.int64)
+    K = np.array(K, dtype=np.int64)
+
+    # generate the retained sub-particle masses from a power-law distribution between min and max values,
+    # and normalize them to the total mass of the parent
+    _, parent, position = _segments(K)
+    m = (a + X[np.repeat(starts, K) + position]*b)**(1./alpha1)
+    m = (m_gas/_segmentSums(m, K))[parent] * m
+
+    # generate random decay lookback time for each sub-particle
+    t = thresh_age_resamp + (m_gas/sfr)[parent] * np.log(1-X[np.repeat(starts + N, K) + position])
+
+    # determine mask for sub-particles that form stars by present day
+    issf = t > 0.
+    m = m[issf]
+    t = t[issf]
+    parent = parent[issf]
+    counts = np.bincount(parent, minlength=len(N))
+    mdiffs = _segmentSums(m, counts)
+
+    return m, t, parent, mdiffs
+
 # -----------------------------------------------------------------
 
 ## This private helper function randomly shifts the positions of HII region sub-particles
@@ -14,13 +14,11 @@
 # -----------------------------------------------------------------
 
 # Import standard modules
-import os.path
 import time
 
 # Import the relevant PTS classes and modules
 from ..core.basics.log import log
 from . import config as config
-from .filelock import FileLock
 from .database import Database
 from .skirtrun import runids_in_range
 
@@ -30,7 +28,8 @@ from .skirtrun import runids_in_range
 # at the given workflow stage and has the 'scheduled' status, until there are no more such records,
 # or until the specified run time (given in seconds) has been surpassed.
 # Each new record is selected arbitrarily from the eligible records after the previous invocation
-# completes. Access to the database is locked so that multiple processes can "pull" work simultaneously.
+# completes. The records are claimed atomically (see Database.claim()) so that multiple processes can "pull"
+# work simultaneously.
 # Before invoking the callback function, the status of the SKIRT-run record is set to 'running'.
 # If the callback function returns normally, the status is updated to 'succeeded'; if an exception
 # is raised; the status is updated to 'failed'.
@@ -43,14 +42,10 @@ def loop(callback, stage, runtime, chunksize=1):
     starttime = time.time()
     while (time.time()-starttime)<runtime:
         # get a chunk of records to be processed; return if none are available
-        db = Database()
-        with FileLock(os.path.join(config.database_path, "database_lock_file.txt"), timeout=500, delay=5):
-            with db.transaction():
-                allrecords = db.select("stage = ? and status='scheduled'", (stage,))
-                if len(allrecords) < 1: return
-                chunkrecords = allrecords[:chunksize]
-                db.updatestatus(chunkrecords, 'running')
+        db = Database(wal=config.database_wal)
+        chunkrecords = db.claim(stage, chunksize)
         db.close()
+        if len(chunkrecords) < 1: return
 
         try:
             # invoke the callback function
@@ -59,14 +54,58 @@ def loop(callback, stage, runtime, chunksize=1):
                 callback(record)
 
             # set the runstatus of the database records to 'succeeded'
-            db = Database()
+            db = Database(wal=config.database_wal)
             with db.transaction():
                 db.updatestatus(chunkrecords, 'succeeded')
             db.close()
 
         except:
             # set the runstatus of the database records to 'failed'
-            db = Database()
+            db = Database(wal=config.database_wal)
+            with db.transaction():
+                db.updatestatus(chunkrecords, 'failed')
+            db.close()
+            raise
+
+# -----------------------------------------------------------------
+
+## This function is similar to the loop() function, but it invokes the provided callback function for a chunk
+# of SKIRT-run records at once, so that the callback can share work between the records (e.g. reading a snapshot
+# region only once for a number of nearby galaxies). If a \em key function is specified, the eligible records are
+# sorted on the value returned by this function for each record before a chunk is taken, so that records with the
+# same key end up in the same chunk.
+#
+# The callback function is passed a single argument containing the list of SKIRT-run database records to be
+# handled, and it should return a list with the records that failed. The status of the other records is updated
+# to 'succeeded', and that of the failed records to 'failed'. If the callback raises an exception, the status of
+# all records in the chunk is updated to 'failed'.
+#
+def loopbatch(callback, stage, runtime, chunksize=100, key=None):
+    # loop until runtime has been surpassed
+    starttime = time.time()
+    while (time.time()-starttime)<runtime:
+        # get a chunk of records to be processed; return if none are available
+        db = Database(wal=config.database_wal)
+        chunkrecords = db.claim(stage, chunksize, key=key)
+        db.close()
+        if len(chunkrecords) < 1: return
+
+        try:
+            # invoke the callback function
+            log.info("Processing {} for {} SKIRT-runs...".format(stage, len(chunkrecords)))
+            failedrecords = callback(chunkrecords)
+            failedrunids = set(record['runid'] for record in failedrecords)
+
+            # set the runstatus of the database records to 'succeeded' or 'failed'
+            db = Database(wal=config.database_wal)
+            with db.transaction():
+                db.updatestatus([record for record in chunkrecords if record['runid'] not in failedrunids], 'succeeded')
+                db.updatestatus([record for record in chunkrecords if record['runid'] in failedrunids], 'failed')
+            db.close()
+
+        except:
+            # set the runstatus of the database records to 'failed'
+            db = Database(wal=config.database_wal)
             with db.transaction():
                 db.updatestatus(chunkrecords, 'failed')
             db.close()
@@ -88,7 +127,7 @@ def force(callback, stage, runidspec):
 
     for runid in runids_in_range(runidspec):
         # get a record to be processed; return if none are available
-        db = Database()
+        db = Database(wal=config.database_wal)
         with db.transaction():
             records = db.select("runid = ?", (runid,))
             if len(records) != 1: raise ValueError("Runid {} is not in database".format(runid))
@@ -102,14 +141,14 @@ def force(callback, stage, runidspec):
             callback(record)
 
             # set the runstatus of the database record to 'succeeded'
-            db = Database()
+            db = Database(wal=config.database_wal)
             with db.transaction():
                 db.updatestatus((runid,), 'succeeded')
             db.close()
 
         except:
             # set the runstatus of the database record to 'failed'
-            db = Database()
+            db = Database(wal=config.database_wal)
             with db.transaction():
                 db.updatestatus((runid,), 'failed')
             db.close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import time
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.eagle.extractor import stochResamp
+
+# -----------------------------------------------------------------
+
+description = "testing the vectorized resampling of star forming particles against the original per-particle loop"
+
+# -----------------------------------------------------------------
+
+# The seed
+seed = 42
+
+# -----------------------------------------------------------------
+
+def stochResampLoop(sfr, m_gas):
+
+    """
+    This function is the original per-particle implementation of the resampling (drawing from the global random state)
+    :param sfr:
+    :param m_gas:
+    :return:
+    """
+
+    # mass resampling parameters (see Kennicutt & Evans 2012 section 2.5)
+    m_min = 700         # minimum mass of sub-particle in M_solar
+    m_max = 1e6         # maximum mass of sub-particle in M_solar
+    alpha = 1.8         # exponent of power-law mass function
+    alpha1 = 1. - alpha
+
+    # age resampling parameters
+    thresh_age = 1e8    # period over which to resample in yr (100 Myr)
+
+    # initialise lists for output
+    ms   = [[]]
+    ts   = [[]]
+    idxs = [[]]
+    mdiffs = []
+
+    # for each parent particle, determine the star-forming sub-particles
+    for i in range(sfr.size):
+        sfri = sfr[i]
+        mi = m_gas[i]
+
+        # determine the maximum number of sub-particles based on the minimum sub-particle mass
+        N = int(max(1,np.ceil(mi/m_min)))
+
+        # generate random sub-particle masses from a power-law distribution between min and max values
+        X = np.random.random(N)
+        m = (m_min**alpha1 + X*(m_max**alpha1-m_min**alpha1))**(1./alpha1)
+
+        # limit and normalize the list of sub-particles to the total mass of the parent
+        mlim = m[np.cumsum(m)<=mi]
+        if len(mlim)<1: mlim = m[:1]
+        m = mi/mlim.sum() * mlim
+        N = len(m)
+
+        # generate random decay lookback time for each sub-particle
+        X = np.random.random(N)               # X in range (0,1]
+        t = thresh_age + mi/sfri * np.log(1-X)
+
+        # determine mask for sub-particles that form stars by present day
+        issf = t > 0.
+
+        # add star-forming sub-particles to the output lists
+        ms.append(m[issf])
+        ts.append(t[issf])
+        idxs.append([i]*np.count_nonzero(issf))
+        mdiffs.append(m[issf].sum())
+
+    # convert sub-particle lists into numpy arrays
+    ms     = np.hstack(ms)
+    ts     = np.hstack(ts)
+    idxs   = np.hstack(idxs).astype(int)
+    mdiffs = np.array(mdiffs)
+
+    return ms, ts, idxs, mdiffs
+
+# -----------------------------------------------------------------
+
+class ResamplingTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(ResamplingTest, self).__init__(*args, **kwargs)
+
+        # The mock particles
+        self.sfr = None
+        self.m_gas = None
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the mock particles
+        self.create()
+
+        # 3. Compare with the original implementation
+        self.compare()
+
+        # 4. Compare with the original implementation, in small chunks
+        self.compare_chunks()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(ResamplingTest, self).setup(**kwargs)
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the mock star forming particles ...")
+
+        # Initial gas particle masses around 1.8e6 solar masses, with some lighter particles (and a few below the
+        # minimum sub-particle mass), and log-normally distributed star formation rates
+        nparticles = 5000
+        prng = np.random.RandomState(seed)
+        self.m_gas = prng.normal(1.8e6, 2e5, nparticles)
+        light = prng.random_sample(nparticles) < 0.1
+        self.m_gas[light] = prng.uniform(1e3, 1e5, np.count_nonzero(light))
+        self.m_gas[:10] = prng.uniform(10., 700., 10)
+        self.sfr = prng.lognormal(-3., 1.5, nparticles)
+
+    # -----------------------------------------------------------------
+
+    def compare(self, chunksize=None):
+
+        """
+        This function ...
+        :param chunksize:
+        :return:
+        """
+
+        # Inform the user
+        if chunksize is None: log.info("Comparing the vectorized resampling with the original implementation ...")
+        else: log.info("Comparing the vectorized resampling with the original implementation for chunks of " + str(chunksize) + " candidates ...")
+
+        kwargs = dict(chunksize=chunksize) if chunksize is not None else dict()
+
+        # Resample with the vectorized implementation, from the global random state
+        np.random.seed(seed)
+        start = time.time()
+        vectorized = stochResamp(self.sfr, self.m_gas, **kwargs)
+        vectorized_seconds = time.time() - start
+        vectorized_next = np.random.random_sample()
+
+        # Resample with the original implementation
+        np.random.seed(seed)
+        start = time.time()
+        reference = stochResampLoop(self.sfr, self.m_gas)
+        reference_seconds = time.time() - start
+        reference_next = np.random.random_sample()
+
+        # Show the timings
+        log.info("Number of sub-particles: " + str(len(reference[0])))
+        log.info("Vectorized: " + str(vectorized_seconds) + " s; original: " + str(reference_seconds) + " s")
+
+        # Compare (the sums over the sub-particles of a parent can differ in round-off)
+        for name, new, old in zip(("ms", "ts", "idxs", "mdiffs"), vectorized, reference):
+            if new.shape != old.shape or not np.allclose(new, old, rtol=1e-12, atol=0.): raise RuntimeError("The resampled '" + name + "' differ from those of the original implementation")
+
+        # Check that the random state is advanced in the same way
+        if vectorized_next != reference_next: raise RuntimeError("The random state is not advanced in the same way as by the original implementation")
+
+        # Check that a random state or a seed can be passed
+        if not np.array_equal(stochResamp(self.sfr, self.m_gas, np.random.RandomState(seed), **kwargs)[0], vectorized[0]): raise RuntimeError("The resampling with a random state differs")
+        if not np.array_equal(stochResamp(self.sfr, self.m_gas, seed, **kwargs)[0], vectorized[0]): raise RuntimeError("The resampling with a seed differs")
+
+    # -----------------------------------------------------------------
+
+    def compare_chunks(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        self.compare(chunksize=100000)
+
+# -----------------------------------------------------------------
@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.convolution.service Contains the ConvolutionService class, which convolves frames with
+#  FFTs, caching the prepared kernels and their Fourier transforms and convolving frames of equal shape in batches.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import hashlib
+import numpy as np
+from collections import OrderedDict, defaultdict
+from multiprocessing.pool import ThreadPool
+
+# Import the relevant PTS classes and modules
+from ...core.basics.log import log
+from ...core.tools import parallelization
+
+# -----------------------------------------------------------------
+
+# Choose the FFT backend: pyFFTW and scipy.fft are multithreaded, numpy.fft is the fallback
+try:
+    import pyfftw
+    from pyfftw.interfaces import numpy_fft as _fft
+    pyfftw.interfaces.cache.enable()
+    fft_backend = "pyfftw"
+except ImportError:
+    try:
+        import scipy.fft as _fft
+        fft_backend = "scipy"
+    except ImportError:
+        import numpy.fft as _fft
+        fft_backend = "numpy"
+
+# -----------------------------------------------------------------
+
+def next_fast_length(n):
+
+    """
+    This function returns the smallest 5-smooth number (only factors 2, 3 and 5) that is not smaller than n
+    :param n:
+    :return:
+    """
+
+    if fft_backend == "scipy": return _fft.next_fast_len(n, real=True)
+
+    best = 2 * n
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            quotient = -(-n // p35)
+            p2 = 1
+            while p2 < quotient: p2 *= 2
+            best = min(best, p2 * p35)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+# -----------------------------------------------------------------
+
+def rfft2(data, shape, nthreads=1):
+
+    """
+    This function ...
+    :param data:
+    :param shape:
+    :param nthreads:
+    :return:
+    """
+
+    if fft_backend == "pyfftw": return _fft.rfft2(data, s=shape, axes=(-2, -1), threads=nthreads)
+    elif fft_backend == "scipy": return _fft.rfft2(data, s=shape, axes=(-2, -1), workers=nthreads)
+    else: return _fft.rfft2(data, s=shape, axes=(-2, -1))
+
+# -----------------------------------------------------------------
+
+def irfft2(data, shape, nthreads=1):
+
+    """
+    This function ...
+    :param data:
+    :param shape:
+    :param nthreads:
+    :return:
+    """
+
+    if fft_backend == "pyfftw": return _fft.irfft2(data, s=shape, axes=(-2, -1), threads=nthreads)
+    elif fft_backend == "scipy": return _fft.irfft2(data, s=shape, axes=(-2, -1), workers=nthreads)
+    else: return _fft.irfft2(data, s=shape, axes=(-2, -1))
+
+# -----------------------------------------------------------------
+
+def padded_shape(shape, kernel_shape):
+
+    """
+    This function returns the shape to which frames are padded for the convolution, to avoid wrap-around ('fill'
+    boundary), with sizes that are fast for the FFT
+    :param shape:
+    :param kernel_shape:
+    :return:
+    """
+
+    return tuple(next_fast_length(n + k - 1) for n, k in zip(shape, kernel_shape))
+
+# -----------------------------------------------------------------
+
+def padded_nbytes(shape, kernel_shape):
+
+    """
+    This function returns the size of a complex array of the padded shape (as checked by astropy's convolve_fft)
+    :param shape:
+    :param kernel_shape:
+    :return:
+    """
+
+    return int(np.prod(padded_shape(shape, kernel_shape), dtype=np.int64)) * np.dtype(np.complex128).itemsize
+
+# -----------------------------------------------------------------
+
+def kernel_hash(kernel):
+
+    """
+    This function returns a hash of the kernel data
+    :param kernel:
+    :return:
+    """
+
+    data = np.ascontiguousarray(kernel.data, dtype=np.float64)
+    return hashlib.md5(str(data.shape).encode("utf-8") + data.tobytes()).hexdigest()
+
+# -----------------------------------------------------------------
+
+class KernelTransform(object):
+
+    """
+    This class holds the Fourier transform of a kernel, padded for the convolution of frames of a certain shape
+    """
+
+    def __init__(self, kernel_data, shape, nthreads=1):
+
+        """
+        The constructor ...
+        :param kernel_data:
+        :param shape:
+        :param nthreads:
+        """
+
+        # The shape of the frames and the kernel
+        self.shape = shape
+        self.kernel_shape = kernel_data.shape
+
+        # Pad to avoid wrap-around ('fill' boundary), choose fast sizes
+        self.padded_shape = padded_shape(shape, self.kernel_shape)
+
+        # The Fourier transform of the kernel
+        self.transform = rfft2(np.asarray(kernel_data, dtype=np.float64), self.padded_shape, nthreads=nthreads)
+
+        # The sum of the kernel (the weights are convolved with the normalized kernel)
+        self.kernel_sum = float(np.sum(kernel_data))
+        if abs(self.kernel_sum) < 1e-8: self.kernel_sum = 1.0
+
+        # The slices that crop the padded result to the frame, taking the kernel center into account
+        self.slices = tuple(slice(k // 2, k // 2 + n) for n, k in zip(shape, self.kernel_shape))
+
+    # -----------------------------------------------------------------
+
+    def convolve(self, data, nthreads=1):
+
+        """
+        This function convolves a stack of arrays (the last two axes are the frame axes)
+        :param data:
+        :param nthreads:
+        :return:
+        """
+
+        transform = rfft2(data, self.padded_shape, nthreads=nthreads)
+        transform *= self.transform
+        result = irfft2(transform, self.padded_shape, nthreads=nthreads)
+        return result[(Ellipsis,) + self.slices]
+
+# -----------------------------------------------------------------
+
+class ConvolutionService(object):
+
+    """
+    This class convolves frames with kernels using FFTs. Prepared kernels and kernel transforms are cached, and
+    frames of equal shape that are convolved with the same kernel are transformed together in batches.
+    The result is equivalent to astropy's convolve_fft with boundary='fill' (with zero), nan_treatment='interpolate'
+    and normalize_kernel=False: only the NaN (and infinite) pixels are interpolated, the pixels outside the frame
+    count as zero values and not as missing values.
+    """
+
+    def __init__(self, nthreads=None, batch_size=8, max_kernels=32, max_transforms=16):
+
+        """
+        The constructor ...
+        :param nthreads: the number of threads (None means the number of cores)
+        :param batch_size: the maximum number of frames in one FFT batch
+        :param max_kernels: the maximum number of prepared kernels that are kept
+        :param max_transforms: the maximum number of kernel transforms that are kept
+        """
+
+        # Settings
+        if nthreads is None: nthreads = parallelization.ncores()
+        self.nthreads = max(1, nthreads)
+        self.batch_size = batch_size
+        self.max_kernels = max_kernels
+        self.max_transforms = max_transforms
+
+        # The caches
+        self.kernels = OrderedDict()
+        self.transforms = OrderedDict()
+
+    # -----------------------------------------------------------------
+
+    def clear(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        self.kernels.clear()
+        self.transforms.clear()
+
+    # -----------------------------------------------------------------
+
+    def prepared_kernel(self, kernel, pixelscale):
+
+        """
+        This function returns a prepared copy of the kernel for the given pixelscale, from the cache if possible
+        :param kernel:
+        :param pixelscale:
+        :return:
+        """
+
+        # Already prepared
+        if kernel.prepared: return kernel
+
+        # Check the cache
+        key = (kernel_hash(kernel), str(pixelscale))
+        if key in self.kernels:
+            prepared = self.kernels.pop(key)
+            self.kernels[key] = prepared
+            return prepared
+
+        # Prepare a copy
+        log.warning("The convolution kernel is not prepared, creating a prepared copy ...")
+        prepared = kernel.copy()
+        prepared.prepare(pixelscale)
+
+        # Add to the cache
+        self.kernels[key] = prepared
+        if len(self.kernels) > self.max_kernels: self.kernels.popitem(last=False)
+
+        # Return
+        return prepared
+
+    # -----------------------------------------------------------------
+
+    def kernel_transform(self, kernel, shape, key=None):
+
+        """
+        This function returns the transform of a (prepared) kernel for frames of the given shape
+        :param kernel:
+        :param shape:
+        :param key: the kernel hash, if already computed
+        :return:
+        """
+
+        if key is None: key = kernel_hash(kernel)
+        key = (key, tuple(shape))
+
+        # Check the cache
+        if key in self.transforms:
+            transform = self.transforms.pop(key)
+            self.transforms[key] = transform
+            return transform
+
+        # Create
+        transform = KernelTransform(kernel.data, tuple(shape), nthreads=self.nthreads)
+
+        # Add to the cache
+        self.transforms[key] = transform
+        if len(self.transforms) > self.max_transforms: self.transforms.popitem(last=False)
+
+        # Return
+        return transform
+
+    # -----------------------------------------------------------------
+
+    def convolve_arrays(self, arrays, transform, nthreads=1):
+
+        """
+        This function convolves a list of arrays of equal shape with the same kernel, treating NaNs (and infinities)
+        by interpolation
+        :param arrays:
+        :param transform:
+        :param nthreads:
+        :return:
+        """
+
+        # Stack the data, replace NaNs and infinities by zero
+        stack = np.array(arrays, dtype=np.float64)
+        nans = np.isnan(stack)
+        invalid = ~np.isfinite(stack)
+        has_invalid = invalid.any(axis=(1, 2))
+        stack[invalid] = 0.0
+
+        # Convolve the data
+        convolved = transform.convolve(stack, nthreads=nthreads)
+
+        # Normalize by the convolved weights, only for the arrays with invalid pixels. As in astropy, the pixels outside
+        # the array have unit weight, so the weights are one minus the convolved mask of the invalid pixels
+        if np.any(has_invalid):
+
+            indices = np.where(has_invalid)[0]
+            weights = 1.0 - transform.convolve(invalid[indices].astype(np.float64), nthreads=nthreads) / transform.kernel_sum
+
+            # Set anything with no weight to zero (as astropy does)
+            no_weight = weights < 10 * np.finfo(np.float64).eps
+            weights[no_weight] = 1.0
+            convolved[indices] /= weights
+            convolved[indices] *= ~no_weight
+
+        # Return the convolved arrays and the NaN masks
+        return convolved, nans
+
+    # -----------------------------------------------------------------
+
+    def convolve_frames(self, frames, kernels, preserve_nans=True, allow_huge=True):
+
+        """
+        This function convolves the frames (in place) with the kernels
+        :param frames: a list of frames
+        :param kernels: a list of kernels (one for each frame), or one kernel for all frames
+        :param preserve_nans:
+        :param allow_huge: allow FFT arrays larger than 1 GB (otherwise a ValueError is raised, as in astropy)
+        :return:
+        """
+
+        # One kernel for all frames
+        if not isinstance(kernels, (list, tuple)): kernels = [kernels] * len(frames)
+        if len(kernels) != len(frames): raise ValueError("The number of kernels must be equal to the number of frames")
+
+        # Group the frames by kernel and shape
+        groups = defaultdict(list)
+        prepared_kernels = dict()
+        extrema = dict()
+        for index, (frame, kernel) in enumerate(zip(frames, kernels)):
+
+            # Get the current minimum and maximum of the frame
+            min_value = np.nanmin(frame.data)
+            max_value = np.nanmax(frame.data)
+
+            # Skip the calculation for a constant frame
+            if min_value == max_value:
+                frame._fwhm = kernel.fwhm
+                frame._psf_filter = kernel.psf_filter
+                continue
+
+            # Debugging
+            log.debug("The minimum and maximum value of the frame before convolution is " + repr(min_value) + " and " + repr(max_value))
+            extrema[index] = (min_value, max_value)
+
+            # Get the prepared kernel
+            prepared = self.prepared_kernel(kernel, frame.pixelscale)
+
+            # Assert that the kernel is normalized
+            if not prepared.normalized: raise RuntimeError("The kernel is not properly normalized: sum is " + repr(prepared.sum()) + " , difference from unity is " + repr(prepared.sum() - 1.0))
+
+            # Check the size of the FFT arrays
+            if not allow_huge:
+                nbytes = padded_nbytes(frame.shape, prepared.shape)
+                if nbytes > 1e9: raise ValueError("Size Error: Arrays will be " + str(nbytes) + " bytes. Use allow_huge=True to override this exception.")
+
+            # Add to the group
+            key = kernel_hash(prepared)
+            prepared_kernels[key] = prepared
+            groups[(key, frame.shape)].append(index)
+
+        # Create the batches
+        batches = []
+        for (key, shape), indices in groups.items():
+            transform = self.kernel_transform(prepared_kernels[key], shape, key=key)
+            for start in range(0, len(indices), self.batch_size): batches.append((transform, indices[start:start+self.batch_size]))
+
+        # Nothing to do
+        if len(batches) == 0: return
+
+        # Debugging
+        log.debug("Convolving " + str(len(extrema)) + " frames in " + str(len(batches)) + " batches using " + str(self.nthreads) + " threads ...")
+
+        # Divide the threads over the concurrent batches and FFTs
+        nconcurrent = min(len(batches), self.nthreads)
+        nfft_threads = max(1, self.nthreads // nconcurrent)
+
+        def convolve_batch(batch):
+
+            transform, indices = batch
+            convolved, nans = self.convolve_arrays([frames[index].data for index in indices], transform, nthreads=nfft_threads)
+
+            # Set the new data
+            for i, index in enumerate(indices):
+
+                frame = frames[index]
+                kernel = kernels[index]
+                new_data = convolved[i]
+
+                # Put back NaNs
+                if preserve_nans: new_data[nans[i]] = np.nan
+
+                # Don't mess up the scale: clip to the original minimum and maximum value
+                min_value, max_value = extrema[index]
+                np.clip(new_data, min_value, max_value, out=new_data)
+
+                # Replace the data and FWHM
+                frame._data = new_data
+                frame._fwhm = kernel.fwhm
+                frame._psf_filter = kernel.psf_filter
+
+        # Run the batches
+        if nconcurrent == 1:
+            for batch in batches: convolve_batch(batch)
+        else:
+            pool = ThreadPool(nconcurrent)
+            try: pool.map(convolve_batch, batches)
+            finally:
+                pool.close()
+                pool.join()
+
+# -----------------------------------------------------------------
+
+# The shared convolution service
+_service = None
+
+# -----------------------------------------------------------------
+
+def get_convolution_service():
+
+    """
+    This function returns the shared convolution service
+    :return:
+    """
+
+    global _service
+    if _service is None: _service = ConvolutionService()
+    return _service
+
+# -----------------------------------------------------------------
+
+def convolve_frames(frames, kernels, preserve_nans=True, allow_huge=True):
+
+    """
+    This function ...
+    :param frames:
+    :param kernels:
+    :param preserve_nans:
+    :param allow_huge:
+    :return:
+    """
+
+    get_convolution_service().convolve_frames(frames, kernels, preserve_nans=preserve_nans, allow_huge=allow_huge)
+
+# -----------------------------------------------------------------
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.core.convolutionstore Contains the ConvolutionStore class, a content-addressed store of the
+#  frames obtained by spectral convolution of datacubes with filters.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 functionality
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import time
+import pickle
+import hashlib
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from ...core.basics.log import log
+from ...core.tools import introspection
+from ...core.tools import filesystem as fs
+from ...core.tools.filelock import FileLock
+
+# -----------------------------------------------------------------
+
+# The path of the global store of convolved frames
+default_store_path = fs.join(introspection.pts_temp_dir, "filter-convolution-store")
+
+# The default size budget of the store (in bytes): the least recently used frames are removed above this size
+default_max_size = 10 * 1024**3
+
+# The name of the index file
+index_filename = "index.pickle"
+
+# -----------------------------------------------------------------
+
+def hash_arrays(*items):
+
+    """
+    This function returns a hash of the specified arrays (or strings)
+    :param items:
+    :return:
+    """
+
+    sha = hashlib.sha1()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            sha.update(str(item.dtype).encode("utf8"))
+            sha.update(str(item.shape).encode("utf8"))
+            sha.update(np.ascontiguousarray(item).tobytes())
+        else: sha.update(str(item).encode("utf8"))
+    return sha.hexdigest()
+
+# -----------------------------------------------------------------
+
+def datacube_hash(datacube):
+
+    """
+    This function returns a hash of the data of a datacube, with its unit and coordinate system
+    :param datacube:
+    :return:
+    """
+
+    wcs = datacube.wcs.to_header_string() if datacube.wcs is not None else ""
+    planes = [datacube.frames[name].data for name in datacube.frames]
+    return hash_arrays(str(datacube.unit), wcs, *planes)
+
+# -----------------------------------------------------------------
+
+def wavelengths_hash(wavelengths):
+
+    """
+    This function returns a hash of a wavelength grid
+    :param wavelengths: array of wavelengths in micron
+    :return:
+    """
+
+    return hash_arrays(np.asarray(wavelengths, dtype=float))
+
+# -----------------------------------------------------------------
+
+def filter_hash(fltr):
+
+    """
+    This function returns a hash of the specification of a filter (its name, transmission curve and type)
+    :param fltr:
+    :return:
+    """
+
+    wavelengths = getattr(fltr, "_Wavelengths", None)
+    transmission = getattr(fltr, "_Transmission", None)
+    items = [type(fltr).__name__, str(fltr), getattr(fltr, "_PhotonCounter", None)]
+    if wavelengths is not None: items.append(np.asarray(wavelengths, dtype=float))
+    if transmission is not None: items.append(np.asarray(transmission, dtype=float))
+    return hash_arrays(*items)
+
+# -----------------------------------------------------------------
+
+class ConvolutionStore(object):
+
+    """
+    This class stores the frames obtained by spectral convolution of a datacube with a filter, in one directory shared
+    by all PTS processes. The frames are stored under a key that combines the hashes of the datacube, its wavelength
+    grid and the filter. A small index file keeps the size and the time of last access of each frame, so that the
+    least recently used frames can be removed when the store exceeds its size budget (max_size, 10 GB by default for
+    the global store). The index is only read and written under a file lock, and frames are written to a temporary
+    file first and then renamed. The store is not used unless it is enabled explicitly (with the use_store or store
+    arguments of DataCube.convolve_with_filters).
+    """
+
+    def __init__(self, path=None, max_size=None):
+
+        """
+        The constructor ...
+        :param path:
+        :param max_size: the size budget in bytes
+        """
+
+        # The path of the store directory
+        self.path = path if path is not None else default_store_path
+        if not fs.is_directory(self.path): fs.create_directory(self.path, recursive=True)
+
+        # The size budget
+        self.max_size = max_size if max_size is not None else default_max_size
+
+    # -----------------------------------------------------------------
+
+    @property
+    def index_path(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.join(self.path, index_filename)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def lock(self):
+
+        """
+        This function returns the file lock that protects the index
+        :return:
+        """
+
+        return FileLock(self.index_path + ".lock")
+
+    # -----------------------------------------------------------------
+
+    @staticmethod
+    def key(datacube_hash, wavelengths_hash, filter_hash):
+
+        """
+        This function ...
+        :param datacube_hash:
+        :param wavelengths_hash:
+        :param filter_hash:
+        :return:
+        """
+
+        return hash_arrays(datacube_hash, wavelengths_hash, filter_hash)
+
+    # -----------------------------------------------------------------
+
+    def path_for_key(self, key):
+
+        """
+        This function ...
+        :param key:
+        :return:
+        """
+
+        return fs.join(self.path, key + ".fits")
+
+    # -----------------------------------------------------------------
+
+    def load_index(self):
+
+        """
+        This function loads the index (a dictionary of key -> [size, time of last access]), without locking
+        :return:
+        """
+
+        if not fs.is_file(self.index_path): return dict()
+        try:
+            with open(self.index_path, "rb") as indexfile: return pickle.load(indexfile)
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            log.warning("The index of the filter convolution store is corrupt: starting a new index")
+            return dict()
+
+    # -----------------------------------------------------------------
+
+    def save_index(self, index):
+
+        """
+        This function saves the index atomically, without locking
+        :param index:
+        :return:
+        """
+
+        with fs.atomic_write(self.index_path) as temp_path:
+            with open(temp_path, "wb") as indexfile: pickle.dump(index, indexfile, protocol=2)
+
+    # -----------------------------------------------------------------
+
+    def find(self, keys):
+
+        """
+        This function returns the paths of the stored frames for those of the specified keys that are present, and
+        marks them as used
+        :param keys:
+        :return: a dictionary of key -> path
+        """
+
+        paths = dict()
+        with self.lock:
+
+            index = self.load_index()
+            present = [key for key in keys if key in index]
+            if len(present) == 0: return paths
+
+            # Get the paths, and set the time of last access
+            now = time.time()
+            for key in present:
+                path = self.path_for_key(key)
+                if fs.is_file(path):
+                    index[key][1] = now
+                    paths[key] = path
+                else: del index[key]
+            self.save_index(index)
+
+        # Return the paths
+        return paths
+
+    # -----------------------------------------------------------------
+
+    def get_frames(self, keys):
+
+        """
+        This function loads the stored frames for those of the specified keys that are present
+        :param keys:
+        :return: a dictionary of key -> Frame
+        """
+
+        from .frame import Frame
+
+        frames = dict()
+        for key, path in self.find(keys).items():
+
+            # The frame can have been removed by another process in the meantime
+            try: frames[key] = Frame.from_file(path)
+            except IOError: log.warning("The stored frame '" + key + "' could not be loaded")
+
+        # Return the frames
+        return frames
+
+    # -----------------------------------------------------------------
+
+    def add_frame(self, key, frame):
+
+        """
+        This function stores a frame
+        :param key:
+        :param frame:
+        :return:
+        """
+
+        # Write the file (through a temporary file in the store)
+        with fs.atomic_write(self.path_for_key(key)) as temp_path: frame.saveto(temp_path, update_path=False)
+
+        # Add to the index
+        self.add_to_index(key)
+
+    # -----------------------------------------------------------------
+
+    def add_file(self, key, filepath):
+
+        """
+        This function stores a copy of a FITS file with a frame
+        :param key:
+        :param filepath:
+        :return:
+        """
+
+        # Copy the file (through a temporary file in the store)
+        with fs.atomic_write(self.path_for_key(key)) as temp_path: fs.copy_file(filepath, self.path, new_name=fs.name(temp_path))
+
+        # Add to the index
+        self.add_to_index(key)
+
+    # -----------------------------------------------------------------
+
+    def add_to_index(self, key):
+
+        """
+        This function adds a stored file to the index, and removes the least recently used frames if the store
+        exceeds its size budget
+        :param key:
+        :return:
+        """
+
+        with self.lock:
+
+            # Get the file size (the file can already have been evicted by another process)
+            try: size = os.path.getsize(self.path_for_key(key))
+            except OSError: return
+
+            # Add to the index and remove the least recently used frames
+            index = self.load_index()
+            index[key] = [size, time.time()]
+            self.evict(index)
+            self.save_index(index)
+
+    # -----------------------------------------------------------------
+
+    def evict(self, index):
+
+        """
+        This function removes the least recently used frames until the store is within its size budget, without locking
+        :param index:
+        :return:
+        """
+
+        total_size = sum(entry[0] for entry in index.values())
+        for key in sorted(index, key=lambda key: index[key][1]):
+
+            if total_size <= self.max_size: break
+
+            # Debugging
+            log.debug("Removing frame '" + key + "' from the filter convolution store ...")
+
+            # Remove
+            fs.remove_file_if_present(self.path_for_key(key))
+            total_size -= index[key][0]
+            del index[key]
+
+    # -----------------------------------------------------------------
+
+    @property
+    def size(self):
+
+        """
+        This function returns the total size of the stored frames (in bytes)
+        :return:
+        """
+
+        with self.lock: return sum(entry[0] for entry in self.load_index().values())
+
+    # -----------------------------------------------------------------
+
+    def clear(self):
+
+        """
+        This function removes all stored frames
+        :return:
+        """
+
+        with self.lock:
+            for key in self.load_index(): fs.remove_file_if_present(self.path_for_key(key))
+            self.save_index(dict())
+
+# -----------------------------------------------------------------
@@ -30,7 +30,7 @@ from ..basics.mask import MaskBase
 
 # -----------------------------------------------------------------
 
-interpolation_methods = ["polynomial", "local_mean", "idw", "mean", "median", "biharmonic", "pts", "kernel"]
+interpolation_methods = ["polynomial", "local_mean", "idw", "mean", "median", "harmonic", "biharmonic", "pts", "kernel"]
 
 # -----------------------------------------------------------------
 
@@ -661,22 +661,19 @@ class Cutout(np.ndarray):
             data = np.full(self.shape, median)
             return Cutout(data, self.x_min, self.x_max, self.y_min, self.y_max)
 
-        # Use the biharmonic method of the Scikit-image package
-        elif method == "biharmonic":
+        # Solve the (bi)harmonic equation for the masked areas
+        elif method == "harmonic" or method == "biharmonic":
 
-            data = interpolation.inpaint_biharmonic(self, mask)
+            from ..tools.inpainting import inpaint
 
-            # Check whether the data is NaN-free, because this method will sometimes fail to interpolate and
-            # just put NaNs for the pixels that are covered by the mask. (I still have to check under which
-            # conditions but it has something to do with being close to the boundary)
-            if np.any(np.isnan(data)):
+            data, unsolved = inpaint(np.asarray(self), mask, method=method)
 
-                #from ..tools import plotting
-                #plotting.plot_box(normalized)
-                #plotting.plot_box(mask)
+            # Masked areas that are not bordered by valid pixels cannot be filled in this way
+            if np.any(unsolved):
 
                 # Interpolate by local_mean, this does not leave nans
-                data = interpolation.in_paint(data, mask)
+                data[unsolved] = np.nan
+                data = interpolation.in_paint(data, unsolved)
 
             return Cutout(data, self.x_min, self.x_max, self.y_min, self.y_max)
 
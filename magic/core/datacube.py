@@ -18,6 +18,7 @@ import numpy as np
 
 # Import astronomical modules
 from astropy.units import Unit
+from scipy import sparse
 
 # Import the relevant PTS classes and modules
 from .image import Image
@@ -34,6 +35,7 @@ from ...core.filter.broad import BroadBandFilter
 from ..basics.vector import Pixel
 from ...core.tools.parallelization import ParallelTarget
 from ...core.tools import types
+from .convolutionstore import ConvolutionStore, datacube_hash, wavelengths_hash, filter_hash
 
 # -----------------------------------------------------------------
 
@@ -316,6 +318,40 @@ class DataCube(Image):
 
     # -----------------------------------------------------------------
 
+    @classmethod
+    def iterate_from_file(cls, image_path, wavelength_grid):
+
+        """
+        This function yields the wavelength and the frame for each plane of the datacube in a FITS file,
+        one at a time, so that the complete datacube never has to be in memory
+        :param image_path:
+        :param wavelength_grid:
+        :return:
+        """
+
+        from .fits import FITSImageHandle
+
+        # Open the datacube lazily, don't keep the frames that have been yielded
+        # IMPORTANT: ASSUME THAT DATACUBES ARE ALWAYS DEFINED IN SPECTRAL DENSITY UNITS!
+        with FITSImageHandle(image_path, always_call_first_primary=False, no_filter=True, density=True,
+                             density_strict=True, memoize=False) as handle:
+
+            # Check wavelength grid size
+            assert len(wavelength_grid) == handle.nplanes
+
+            # Loop over the frames
+            for index in range(handle.nplanes):
+
+                # Get the frame and set its wavelength
+                frame = handle.get_plane(index)
+                wavelength = wavelength_grid[index]
+                frame.wavelength = wavelength
+
+                # Yield
+                yield wavelength, frame
+
+    # -----------------------------------------------------------------
+
     @classmethod
     def from_files(cls, paths):
 
@@ -503,6 +539,63 @@ class DataCube(Image):
 
     # -----------------------------------------------------------------
 
+    def planes(self, min_wavelength=None, max_wavelength=None):
+
+        """
+        This function returns the data arrays of the frames within the wavelength range (without copying them)
+        :param min_wavelength:
+        :param max_wavelength:
+        :return:
+        """
+
+        return [self.frames["frame" + str(index)].data for index in self.wavelength_indices(min_wavelength, max_wavelength)]
+
+    # -----------------------------------------------------------------
+
+    def local_sed_values(self, regions, min_wavelength=None, max_wavelength=None, errorcube=None):
+
+        """
+        This function calculates the total flux in each of the specified regions, for all wavelengths at once
+        :param regions: a list of regions, shapes or masks
+        :param min_wavelength:
+        :param max_wavelength:
+        :param errorcube:
+        :return: the fluxes and the errors (or None), as arrays of shape (nregions, nwavelengths) in the unit of the datacube
+        """
+
+        # Create the pixel membership matrix of the regions
+        masks = [region_mask_data(region, self.xsize, self.ysize) for region in regions]
+        membership = membership_matrix(masks, (self.ysize, self.xsize))
+
+        # Get the planes
+        planes = self.planes(min_wavelength, max_wavelength)
+        error_planes = errorcube.planes(min_wavelength, max_wavelength) if errorcube is not None else None
+
+        # Calculate the sums
+        return masked_sums(planes, membership, error_planes)
+
+    # -----------------------------------------------------------------
+
+    def local_seds(self, regions, min_wavelength=None, max_wavelength=None, errorcube=None):
+
+        """
+        This function ...
+        :param regions: a list of regions, shapes or masks
+        :param min_wavelength:
+        :param max_wavelength:
+        :param errorcube:
+        :return:
+        """
+
+        # Calculate the fluxes
+        fluxes, errors = self.local_sed_values(regions, min_wavelength, max_wavelength, errorcube=errorcube)
+
+        # Create the SEDs
+        indices = self.wavelength_indices(min_wavelength, max_wavelength)
+        return [self.create_observed_sed(indices, fluxes[index], errors[index] if errors is not None else None) for index in range(len(regions))]
+
+    # -----------------------------------------------------------------
+
     def local_sed(self, region, min_wavelength=None, max_wavelength=None, errorcube=None):
 
         """
@@ -514,39 +607,52 @@ class DataCube(Image):
         :return:
         """
 
-        # Initialize the SED
-        sed = ObservedSED(photometry_unit=self.unit)
+        return self.local_seds([region], min_wavelength, max_wavelength, errorcube=errorcube)[0]
+
+    # -----------------------------------------------------------------
 
-        # Create a mask from the region (or shape)
-        mask = region.to_mask(self.xsize, self.ysize)
+    def pixel_sed_values(self, x, y, min_wavelength=None, max_wavelength=None, errorcube=None):
 
-        # Loop over the wavelengths
-        for index in self.wavelength_indices(min_wavelength, max_wavelength):
+        """
+        This function gets the values of the specified pixels, for all wavelengths at once
+        :param x: array of x indices
+        :param y: array of y indices
+        :param min_wavelength:
+        :param max_wavelength:
+        :param errorcube:
+        :return: the values and the errors (or None), as arrays of shape (npixels, nwavelengths) in the unit of the datacube
+        """
 
-            # Determine the name of the frame in the datacube
-            frame_name = "frame" + str(index)
+        # Get the values
+        values = np.stack([plane[y, x] for plane in self.planes(min_wavelength, max_wavelength)], axis=-1)
 
-            # Get the flux in the pixels that belong to the region
-            flux = np.sum(self.frames[frame_name][mask]) * self.unit
+        # Get the errors
+        if errorcube is not None: errors = np.stack([plane[y, x] for plane in errorcube.planes(min_wavelength, max_wavelength)], axis=-1)
+        else: errors = None
 
-            # Get error
-            if errorcube is not None:
+        # Return
+        return values, errors
 
-                # Get the error in the pixel
-                error = errorcube.frames[frame_name][mask] * self.unit
-                errorbar = ErrorBar(error)
+    # -----------------------------------------------------------------
 
-                # Add an entry to the SED
-                sed.add_point(self.frames[frame_name].filter, flux, errorbar)
+    def pixel_seds(self, x, y, min_wavelength=None, max_wavelength=None, errorcube=None):
 
-            # Add an entry to the SED
-            else: sed.add_point(self.frames[frame_name].filter, flux)
+        """
+        This function ...
+        :param x: array of x indices
+        :param y: array of y indices
+        :param min_wavelength:
+        :param max_wavelength:
+        :param errorcube:
+        :return:
+        """
 
-            # Increment the index
-            index += 1
+        # Get the values
+        values, errors = self.pixel_sed_values(np.asarray(x), np.asarray(y), min_wavelength, max_wavelength, errorcube=errorcube)
 
-        # Return the SED
-        return sed
+        # Create the SEDs
+        indices = self.wavelength_indices(min_wavelength, max_wavelength)
+        return [self.create_observed_sed(indices, values[index], errors[index] if errors is not None else None) for index in range(len(values))]
 
     # -----------------------------------------------------------------
 
@@ -562,33 +668,33 @@ class DataCube(Image):
         :return:
         """
 
-        # Initialize the SED
-        sed = ObservedSED(photometry_unit=self.unit)
+        return self.pixel_seds([x], [y], min_wavelength, max_wavelength, errorcube=errorcube)[0]
 
-        # Loop over the wavelengths
-        for index in self.wavelength_indices(min_wavelength, max_wavelength):
+    # -----------------------------------------------------------------
 
-            # Determine the name of the frame in the datacube
-            frame_name = "frame" + str(index)
+    def create_observed_sed(self, indices, values, errors=None):
 
-            # Get the flux in the pixel
-            flux = self.frames[frame_name][y, x] * self.unit
+        """
+        This function creates an SED from the values for the specified wavelength indices
+        :param indices:
+        :param values:
+        :param errors:
+        :return:
+        """
 
-            # Get error
-            if errorcube is not None:
+        # Initialize the SED
+        sed = ObservedSED(photometry_unit=self.unit)
 
-                # Get the error in the pixel
-                error = errorcube.frames[frame_name][y, x] * self.unit
-                errorbar = ErrorBar(error)
+        # Loop over the wavelengths
+        for position, index in enumerate(indices):
 
-                # Add an entry to the SED
-                sed.add_point(self.frames[frame_name].filter, flux, errorbar)
+            # Get the frame
+            frame = self.frames["frame" + str(index)]
 
             # Add an entry to the SED
-            else: sed.add_point(self.frames[frame_name].filter, flux)
-
-            # Increment the index
-            index += 1
+            flux = values[position] * self.unit
+            if errors is not None: sed.add_point(frame.filter, flux, ErrorBar(errors[position] * self.unit))
+            else: sed.add_point(frame.filter, flux)
 
         # Return the SED
         return sed
@@ -608,30 +714,24 @@ class DataCube(Image):
         # Determine the mask
         if isinstance(mask, basestring): inverse_mask = self.masks[mask].inverse()
         elif isinstance(mask, Mask): inverse_mask = mask.inverse()
-        elif mask is None: inverse_mask = None
+        elif mask is None: inverse_mask = np.ones((self.ysize, self.xsize), dtype=bool)
         else: raise ValueError("Mask must be string or Mask (or None) instead of " + str(type(mask)))
 
+        # Calculate the total fluxes of the unmasked pixels
+        membership = membership_matrix([region_mask_data(inverse_mask, self.xsize, self.ysize)], (self.ysize, self.xsize))
+        fluxes = masked_sums(self.planes(min_wavelength, max_wavelength), membership)[0][0]
+
         # Initialize the SED
         sed = SED(photometry_unit=self.unit)
 
         # Loop over the wavelengths
-        for index in self.wavelength_indices(min_wavelength, max_wavelength):
+        for position, index in enumerate(self.wavelength_indices(min_wavelength, max_wavelength)):
 
             # Get the wavelength
             wavelength = self.wavelength_grid[index]
 
-            # Determine the name of the frame in the datacube
-            frame_name = "frame" + str(index)
-
-            # Calculate the total flux
-            if mask is not None: total_flux = self.frames[frame_name].sum() * self.unit
-            else: total_flux = np.sum(self.frames[frame_name][inverse_mask]) * self.unit
-
             # Add an entry to the SED
-            sed.add_point(wavelength, total_flux)
-
-            # Increment the index
-            index += 1
+            sed.add_point(wavelength, fluxes[position] * self.unit)
 
         # Return the SED
         return sed
@@ -726,7 +826,7 @@ class DataCube(Image):
 
     # -----------------------------------------------------------------
 
-    def frames_for_filters(self, filters, convolve=False, nprocesses=8, check_previous_sessions=False, as_dict=False):
+    def frames_for_filters(self, filters, convolve=False, nprocesses=8, check_previous_sessions=False, as_dict=False, use_store=False):
 
         """
         This function ...
@@ -735,6 +835,7 @@ class DataCube(Image):
         :param nprocesses:
         :param check_previous_sessions:
         :param as_dict:
+        :param use_store: reuse (and store) the convolved frames from the filter convolution store (see convolve_with_filters)
         :return:
         """
 
@@ -815,7 +916,7 @@ class DataCube(Image):
             log.debug(str(len(for_convolution)) + " filters require spectral convolution")
 
             # Make the frames by convolution
-            convolved_frames, wavelengths_for_filters = self.convolve_with_filters(for_convolution, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions, return_wavelengths=True)
+            convolved_frames, wavelengths_for_filters = self.convolve_with_filters(for_convolution, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions, return_wavelengths=True, use_store=use_store)
 
             # Show which wavelengths are used to create filter frames
             log.debug("Used the following wavelengths for the spectral convolution for the other filters:")
@@ -848,7 +949,7 @@ class DataCube(Image):
 
     # -----------------------------------------------------------------
 
-    def convolve_with_filters(self, filters, nprocesses=8, check_previous_sessions=False, return_wavelengths=False):
+    def convolve_with_filters(self, filters, nprocesses=8, check_previous_sessions=False, return_wavelengths=False, use_store=False, store=None):
 
         """
         This function ...
@@ -856,29 +957,86 @@ class DataCube(Image):
         :param nprocesses:
         :param check_previous_sessions:
         :param return_wavelengths:
+        :param use_store: reuse (and store) the convolved frames from the filter convolution store. This is disabled by
+        default: all planes of the datacube are hashed to look up the frames, and the frames are written to a directory
+        that is shared by all PTS processes, with a size budget of 10 GB for the global store (see
+        convolutionstore.default_max_size) above which the least recently used frames are removed
+        :param store: the filter convolution store (a ConvolutionStore, with its own path and size budget) to use;
+        passing a store enables it
         :return:
         """
 
         # Inform the user
         log.info("Convolving the datacube with " + str(len(filters)) + " different filters ...")
 
+        # Without the store
+        if not use_store and store is None: return self.convolve_with_filters_nostore(filters, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions, return_wavelengths=return_wavelengths)
+
+        # Determine the keys of the frames in the store
+        if store is None: store = ConvolutionStore()
+        wavelengths = self.wavelengths(asarray=True, unit="micron")
+        cube_hash = datacube_hash(self)
+        grid_hash = wavelengths_hash(wavelengths)
+        keys = [store.key(cube_hash, grid_hash, filter_hash(fltr)) for fltr in filters]
+
+        # Get the frames that are already present
+        stored_frames = store.get_frames(keys)
+        frames = [stored_frames.get(key) for key in keys]
+        missing = [index for index in range(len(filters)) if frames[index] is None]
+        if len(stored_frames) > 0: log.success("The convolved frames for " + str(len(stored_frames)) + " filters were found in the filter convolution store")
+
+        # Convolve for the other filters (these frames are added to the store as soon as they are created, so the
+        # store also takes over the role of the previous sessions)
+        if len(missing) > 0:
+            missing_filters = [filters[index] for index in missing]
+            missing_keys = [keys[index] for index in missing]
+            convolved_frames = self.convolve_with_filters_nostore(missing_filters, nprocesses=nprocesses, store=store, store_keys=missing_keys)
+            for index, frame in zip(missing, convolved_frames): frames[index] = frame
+
+        # Set the filters
+        for fltr, frame in zip(filters, frames): frame.filter = fltr
+
+        # Return the list of resulting frames
+        if return_wavelengths:
+            wavelengths_for_filters = OrderedDict()
+            for fltr in filters: wavelengths_for_filters[fltr] = [value * Unit("micron") for value in filter_convolution_wavelengths(fltr, wavelengths)]
+            return frames, wavelengths_for_filters
+        else: return frames
+
+    # -----------------------------------------------------------------
+
+    def convolve_with_filters_nostore(self, filters, nprocesses=8, check_previous_sessions=False, return_wavelengths=False, store=None, store_keys=None):
+
+        """
+        This function ...
+        :param filters:
+        :param nprocesses:
+        :param check_previous_sessions:
+        :param return_wavelengths:
+        :param store: the filter convolution store to which the frames are added (if store_keys are given)
+        :param store_keys: the keys under which the frames are added to the filter convolution store
+        :return:
+        """
+
         # Limit the number of processes to the number of filters
         nprocesses = min(nprocesses, len(filters))
 
         # PARALLEL EXECUTION
-        if nprocesses > 1: return self.convolve_with_filters_parallel(filters, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions, return_wavelengths=return_wavelengths)
+        if nprocesses > 1: return self.convolve_with_filters_parallel(filters, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions, return_wavelengths=return_wavelengths, store=store, store_keys=store_keys)
 
         # SERIAL EXECUTION
-        else: return self.convolve_with_filters_serial(filters, return_wavelengths=return_wavelengths)
+        else: return self.convolve_with_filters_serial(filters, return_wavelengths=return_wavelengths, store=store, store_keys=store_keys)
 
     # -----------------------------------------------------------------
 
-    def convolve_with_filters_serial(self, filters, return_wavelengths=False):
+    def convolve_with_filters_serial(self, filters, return_wavelengths=False, store=None, store_keys=None):
 
         """
         Thisj function ...
         :param filters:
         :param return_wavelengths:
+        :param store:
+        :param store_keys:
         :return:
         """
 
@@ -910,6 +1068,9 @@ class DataCube(Image):
             # Do the filter convolution, put frame in the frames list
             filter_wavelengths = _do_one_filter_convolution(fltr, wavelengths, array, frames, index, self.unit, self.wcs)
 
+            # Add the frame to the store
+            if store_keys is not None: (store if store is not None else ConvolutionStore()).add_frame(store_keys[index], frames[index])
+
             # Add the wavelengths
             filter_wavelengths = [value * Unit("micron") for value in filter_wavelengths]
             wavelengths_for_filters[fltr] = filter_wavelengths
@@ -959,7 +1120,7 @@ class DataCube(Image):
 
     # -----------------------------------------------------------------
 
-    def convolve_with_filters_parallel(self, filters, nprocesses=8, check_previous_sessions=False, return_wavelengths=False):
+    def convolve_with_filters_parallel(self, filters, nprocesses=8, check_previous_sessions=False, return_wavelengths=False, store=None, store_keys=None):
 
         """
         This function ...
@@ -967,6 +1128,8 @@ class DataCube(Image):
         :param nprocesses:
         :param check_previous_sessions:
         :param return_wavelengths:
+        :param store:
+        :param store_keys:
         :return:
         """
 
@@ -977,6 +1140,10 @@ class DataCube(Image):
         nfilters = len(filters)
         frames = [None] * nfilters
 
+        # The filter convolution store to which the processes add the frames
+        store_path = store.path if store is not None else None
+        store_max_size = store.max_size if store is not None else None
+
         # Find (intermediate) results from previous filter convolution
         if check_previous_sessions: temp_dir_path, temp_datacube_path, temp_wavelengthgrid_path = self.find_previous_filter_convolution()
         else: temp_dir_path = temp_datacube_path = temp_wavelengthgrid_path = None
@@ -1043,7 +1210,7 @@ class DataCube(Image):
                 #pool.apply_async(_do_one_filter_convolution_from_file, args=(temp_datacube_path, temp_wavelengthgrid_path, result_path, unitstring, fltrname,))  # All simple types (strings)
 
                 # Call the target function
-                target(temp_datacube_path, temp_wavelengthgrid_path, result_path, unitstring, fltrname)
+                target(temp_datacube_path, temp_wavelengthgrid_path, result_path, unitstring, fltrname, store_keys[index] if store_keys is not None else None, store_path, store_max_size)
 
         # CLOSE AND JOIN THE PROCESS POOL
         #pool.close()
@@ -1089,7 +1256,7 @@ class DataCube(Image):
                 result_path = fs.join(temp_dir_path, str(index) + ".fits")
 
                 # Call the target function
-                target(temp_datacube_path, temp_wavelengthgrid_path, result_path, unitstring, fltrname)
+                target(temp_datacube_path, temp_wavelengthgrid_path, result_path, unitstring, fltrname, store_keys[index] if store_keys is not None else None, store_path, store_max_size)
 
         # Load the resulting frames
         for index in range(nfilters):
@@ -1113,15 +1280,8 @@ class DataCube(Image):
             # Loop over the filters, set the wavelength grid used for convolution
             for fltr in filters:
 
-                # Get the array of wavelengths
-                wa = self.wavelengths(asarray=True, unit="micron")
-                wb = fltr._Wavelengths
-
-                # create a combined wavelength grid, restricted to the overlapping interval
-                w1 = wa[(wa >= wb[0]) & (wa <= wb[-1])]
-                w2 = wb[(wb >= wa[0]) & (wb <= wa[-1])]
-                w = np.unique(np.hstack((w1, w2)))
-                filter_wavelengths = w
+                # Get the combined wavelength grid
+                filter_wavelengths = filter_convolution_wavelengths(fltr, self.wavelengths(asarray=True, unit="micron"))
 
                 # Add the list of wavelengths
                 filter_wavelengths = [value * Unit("micron") for value in filter_wavelengths]
@@ -1800,7 +1960,25 @@ class DataCube(Image):
 
 # -----------------------------------------------------------------
 
-def _do_one_filter_convolution_from_file(datacube_path, wavelengthgrid_path, result_path, unit, fltrname):
+def filter_convolution_wavelengths(fltr, wavelengths):
+
+    """
+    This function returns the wavelength grid used for the convolution of a datacube with a filter: the combined
+    wavelength grid of the datacube and the filter, restricted to the overlapping interval
+    :param fltr:
+    :param wavelengths: the wavelengths of the datacube in micron
+    :return:
+    """
+
+    wa = wavelengths
+    wb = fltr._Wavelengths
+    w1 = wa[(wa >= wb[0]) & (wa <= wb[-1])]
+    w2 = wb[(wb >= wa[0]) & (wb <= wa[-1])]
+    return np.unique(np.hstack((w1, w2)))
+
+# -----------------------------------------------------------------
+
+def _do_one_filter_convolution_from_file(datacube_path, wavelengthgrid_path, result_path, unit, fltrname, store_key=None, store_path=None, store_max_size=None):
 
     """
     This function ...
@@ -1809,6 +1987,9 @@ def _do_one_filter_convolution_from_file(datacube_path, wavelengthgrid_path, res
     :param result_path:
     :param unit:
     :param fltrname:
+    :param store_key:
+    :param store_path: the path of the filter convolution store (the global store if None)
+    :param store_max_size: the size budget of the filter convolution store
     :return:
     """
 
@@ -1869,6 +2050,9 @@ def _do_one_filter_convolution_from_file(datacube_path, wavelengthgrid_path, res
     if fs.is_file(result_path): log.success(message_prefix + "Succesfully saved the convolved frame for the '" + fltrname + "' filter to '" + result_path + "'")
     else: raise RuntimeError("Something went wrong saving the resulting frame")
 
+    # Add the frame to the filter convolution store
+    if store_key is not None: ConvolutionStore(store_path, max_size=store_max_size).add_file(store_key, result_path)
+
 # -----------------------------------------------------------------
 
 def _do_one_filter_convolution(fltr, wavelengths, array, frames, index, unit, wcs):
@@ -1935,3 +2119,75 @@ def needs_spectral_convolution(fltr, spectral_convolution):
     else: return False
 
 # -----------------------------------------------------------------
+
+def region_mask_data(region, xsize, ysize):
+
+    """
+    This function returns the boolean array of the pixels that belong to a region
+    :param region: a region, shape, mask or boolean array
+    :param xsize:
+    :param ysize:
+    :return:
+    """
+
+    if isinstance(region, MaskBase) or isinstance(region, Mask): return np.asarray(region.data, dtype=bool)
+    elif isinstance(region, np.ndarray): return region.astype(bool, copy=False)
+    else: return np.asarray(region.to_mask(xsize, ysize).data, dtype=bool)
+
+# -----------------------------------------------------------------
+
+def membership_matrix(masks, shape):
+
+    """
+    This function creates the sparse pixel membership matrix for a list of masks: element (i, j) is one if the
+    (flattened) pixel j belongs to mask i
+    :param masks: list of boolean arrays
+    :param shape: the shape (ny, nx) of the frames
+    :return:
+    """
+
+    # Get the flattened pixel indices of each mask
+    columns = [np.flatnonzero(mask) for mask in masks]
+    rows = [np.full(len(indices), index, dtype=int) for index, indices in enumerate(columns)]
+    columns = np.concatenate(columns) if len(columns) > 0 else np.zeros(0, dtype=int)
+    rows = np.concatenate(rows) if len(rows) > 0 else np.zeros(0, dtype=int)
+
+    # Create the matrix
+    return sparse.csr_matrix((np.ones(len(columns)), (rows, columns)), shape=(len(masks), shape[0] * shape[1]))
+
+# -----------------------------------------------------------------
+
+def masked_sums(planes, membership, error_planes=None, chunk_size=16):
+
+    """
+    This function calculates the sums of the pixel values in each mask of the membership matrix, for all planes.
+    The planes are processed in chunks, with one sparse matrix product per chunk. The errors are added in quadrature.
+    :param planes: the 2D arrays (or a 3D array)
+    :param membership: the sparse membership matrix (see membership_matrix)
+    :param error_planes: the 2D arrays with the errors (or None)
+    :param chunk_size: the number of planes per chunk
+    :return: the sums and the errors (or None), as arrays of shape (nmasks, nplanes)
+    """
+
+    nplanes = len(planes)
+    sums = np.empty((membership.shape[0], nplanes))
+    errors = np.empty((membership.shape[0], nplanes)) if error_planes is not None else None
+
+    # Loop over the chunks of planes
+    for start in range(0, nplanes, chunk_size):
+
+        end = min(start + chunk_size, nplanes)
+
+        # Sum the values
+        chunk = np.stack([np.ravel(planes[index]) for index in range(start, end)], axis=-1)
+        sums[:, start:end] = membership.dot(chunk)
+
+        # Sum the squared errors
+        if error_planes is not None:
+            chunk = np.stack([np.ravel(error_planes[index])**2 for index in range(start, end)], axis=-1)
+            errors[:, start:end] = np.sqrt(membership.dot(chunk))
+
+    # Return the sums and errors
+    return sums, errors
+
+# -----------------------------------------------------------------
@@ -13,6 +13,7 @@
 from __future__ import absolute_import, division, print_function
 
 # Import standard modules
+import os
 import numpy as np
 from collections import OrderedDict
 
@@ -28,6 +29,7 @@ from ..tools import headers
 from .frame import Frame
 from .segmentationmap import SegmentationMap
 from ...core.tools import strings
+from ...core.tools.utils import lazyproperty
 from .mask import Mask
 
 # -----------------------------------------------------------------
@@ -178,256 +180,835 @@ def get_info(path):
 
 # -----------------------------------------------------------------
 
-def load_frames(path, index=None, name=None, description=None, always_call_first_primary=True, rebin_to_wcs=False,
-                hdulist_index=0, no_filter=False, no_wcs=False, density=False, brightness=False, density_strict=False,
-                brightness_strict=False):
+# The maximum number of header descriptions that are kept in memory
+header_cache_size = 64
+
+# The cache of parsed FITS headers, keyed on the (absolute) path and HDU index
+_header_cache = OrderedDict()
+
+# -----------------------------------------------------------------
+
+def file_stamp(path):
 
     """
-    This function ...
+    This function returns a stamp that changes whenever the file is modified
+    :param path:
+    :return:
+    """
+
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+# -----------------------------------------------------------------
+
+def is_scaled(header):
+
+    """
+    This function checks whether the data in the HDU with this header is scaled (BSCALE or BZERO)
+    :param header:
+    :return:
+    """
+
+    bscale = header.get("BSCALE", 1)
+    bzero = header.get("BZERO", 0)
+    return bscale != 1 or bzero != 0
+
+# -----------------------------------------------------------------
+
+def find_data_hdu_index(path):
+
+    """
+    This function returns the index of the first HDU that contains data, based on the headers only
+    :param path:
+    :return:
+    """
+
+    hdulist = fits.open(path, memmap=True)
+    try:
+        for index, hdu in enumerate(hdulist):
+            if hdu.header.get("NAXIS", 0) > 0: return index
+    finally: hdulist.close()
+
+    # No data found
+    raise ValueError("The FITS file does not contain any data")
+
+# -----------------------------------------------------------------
+
+def get_header_info(path, hdulist_index=0):
+
+    """
+    This function returns the (cached) header information of a FITS file
     :param path:
-    :param index:
-    :param name:
-    :param description:
-    :param always_call_first_primary:
-    :param rebin_to_wcs:
     :param hdulist_index:
-    :param no_filter:
-    :param no_wcs:
-    :param density:
-    :param brightness:
-    :param density_strict:
-    :param brightness_strict:
     :return:
     """
 
-    frames = OrderedDict()
-    masks = OrderedDict()
-    segments = OrderedDict()
+    # Determine the key and the stamp
+    key = (fs.absolute_path(path), hdulist_index)
+    stamp = file_stamp(path)
 
-    metadata = dict()
+    # Check the cache
+    if key in _header_cache:
 
-    filename = fs.strip_extension(fs.name(path))
+        info = _header_cache.pop(key)
 
-    # Check if the file exists
-    if not fs.is_file(path): raise IOError("File '" + path + "' does not exist")
+        # Still up-to-date: put it back as the most recently used
+        if info.stamp == stamp:
+            _header_cache[key] = info
+            return info
 
-    # Show which image we are importing
-    log.debug("Reading in file '" + path + "' ...")
+    # Create new header info
+    info = FITSHeaderInfo(fits.getheader(path, hdulist_index), stamp=stamp)
 
-    # Open the HDU list for the FITS file
-    hdulist = fits.open(path)
+    # Add to the cache, remove the least recently used entry if the cache is full
+    _header_cache[key] = info
+    if len(_header_cache) > header_cache_size: _header_cache.popitem(last=False)
 
-    # Get the primary HDU
-    hdu = hdulist[hdulist_index]
+    # Return
+    return info
 
-    # Check whether the data can be read
-    try: first_plane = hdu.data[0]
-    except TypeError: raise DamagedFITSFileError("The FITS file is damaged", path=path)
+# -----------------------------------------------------------------
 
-    # Get the image header
-    original_header = hdu.header
+def clear_header_cache():
 
-    # Get flattened form of the header
-    flattened_header = headers.flattened(original_header)
+    """
+    This function ...
+    :return:
+    """
 
-    # Clean the header
-    clean_header(flattened_header)
+    _header_cache.clear()
 
-    # Simplify the header
-    simplify_header(flattened_header)
+# -----------------------------------------------------------------
 
-    # Fix
-    fix_ctypes(flattened_header)
+class FITSHeaderInfo(object):
 
-    # If WCS is needed or expected
-    #if not no_wcs:
+    """
+    This class holds a parsed FITS header together with quantities derived from it,
+    which are only computed once when they are first needed
+    """
 
-    # Obtain the world coordinate system
-    try:
-        wcs = CoordinateSystem(flattened_header)
-        pixelscale = None
-    except ValueError:
-        wcs = None
-        #pixelscale = headers.get_pixelscale(original_header)
-        pixelscale = None
+    def __init__(self, header, stamp=None):
 
-    #else: wcs = pixelscale = None
+        """
+        The constructor ...
+        :param header:
+        :param stamp:
+        """
 
-    # Get the pixelscale from the header
-    header_pixelscale = headers.get_pixelscale(original_header)  # NOTE: SOMETIMES PLAIN WRONG IN THE HEADER !!
+        # The original header (should not be modified)
+        self.header = header
 
-    # COMPARE PIXELSCALE AND HEADER PIXELSCALE?
+        # The file stamp
+        self.stamp = stamp
 
-    # Set pixelscale from direct header information
-    if wcs is None: pixelscale = header_pixelscale
+    # -----------------------------------------------------------------
 
-    # WCS IS DEFINED, SO DON'T SPECIFICALLY ADD PIXELSCALE AS AN ATTRIBUTE TO THE FRAME
-    # UNLESS WCS DOESN'T NEED TO BE SET
-    elif not no_wcs: pixelscale = None
+    @lazyproperty
+    def cleaned_header(self):
 
-    # IF NO_WCS, SET TO NONE (BUT STILL GET IT FIRST TO GET THE PIXELSCALE)
-    if no_wcs: wcs = None
+        """
+        This function ...
+        :return:
+        """
 
-    # Set the filter
-    if no_filter: fltr = None
-    else:
+        header = self.header.copy()
+        clean_header(header)
+        return header
 
-        # Obtain the filter for this image
-        fltr = headers.get_filter(filename, original_header)
+    # -----------------------------------------------------------------
 
-        # Inform the user on the filter
-        if fltr is not None: log.debug("The filter for the '" + filename + "' image is " + str(fltr))
-        else: log.warning("Could not determine the filter for the image '" + filename + "'")
+    @lazyproperty
+    def flattened_header(self):
 
-    # Obtain the units of this image
-    unit = headers.get_unit(original_header, density=density, brightness=brightness, density_strict=density_strict, brightness_strict=brightness_strict)
+        """
+        This function returns the flattened header, cleaned after flattening (as for loading all planes)
+        :return:
+        """
 
-    # Obtain the FWHM of this image
-    fwhm = headers.get_fwhm(original_header)
+        flat_header = headers.flattened(self.header)
+        clean_header(flat_header)
+        simplify_header(flat_header)
+        fix_ctypes(flat_header)
+        return flat_header
 
-    # Obtain the distance to the object
-    distance = headers.get_distance(original_header)
+    # -----------------------------------------------------------------
 
-    # Obtain the PSF filter
-    psf_filter = headers.get_psf_filter(original_header)
+    @lazyproperty
+    def cleaned_flattened_header(self):
 
-    # Obtain the smoothing factor
-    smoothing_factor = headers.get_smoothing_factor(original_header)
+        """
+        This function returns the flattened header, cleaned before flattening (as for loading one plane)
+        :return:
+        """
 
-    # Get the magnitude zero-point
-    zero_point = headers.get_zero_point(original_header)
+        flat_header = headers.flattened(self.cleaned_header)
+        simplify_header(flat_header)
+        fix_ctypes(flat_header)
+        return flat_header
 
-    # Check whether the image is sky-subtracted
-    sky_subtracted = headers.is_sky_subtracted(original_header)
+    # -----------------------------------------------------------------
 
-    # Check whether the image is source-extracted
-    source_extracted = headers.is_source_extracted(original_header)
+    @lazyproperty
+    def wcs_and_error(self):
 
-    # Check whether the image is extinction-corrected
-    extinction_corrected = headers.is_extinction_corrected(original_header)
+        """
+        This function ...
+        :return:
+        """
 
-    # Check whether multiple planes are present in the FITS image
-    nframes = headers.get_number_of_frames(original_header)
-    if nframes > 1:
+        try: return CoordinateSystem(self.flattened_header), None
+        except ValueError as e: return None, e
 
-        # For each frame
-        for i in range(nframes):
+    # -----------------------------------------------------------------
 
-            # If only a frame with specific index needs to be imported, skip this frame if it does not correspond
-            if index is not None and i != index: continue
+    @lazyproperty
+    def cleaned_wcs_and_error(self):
 
-            # Get name and description of frame
-            name, description, plane_type = headers.get_frame_name_and_description(original_header, i, always_call_first_primary)
+        """
+        This function ...
+        :return:
+        """
 
-            # The sky-subtracted flag should only be set for the primary frame
-            if i == 0:
+        try: return CoordinateSystem(self.cleaned_flattened_header), None
+        except ValueError as e: return None, e
 
-                subtracted = sky_subtracted
-                extracted = source_extracted
-                corrected = extinction_corrected
+    # -----------------------------------------------------------------
 
-            # Not a primary frame
-            else: subtracted = extracted = corrected = False
+    def get_wcs_error(self, cleaned=False):
 
-            # Add this frame to the frames dictionary
-            if plane_type == "frame":
+        """
+        This function ...
+        :param cleaned:
+        :return:
+        """
 
-                # data, wcs=None, name=None, description=None, unit=None, zero_point=None, filter=None, sky_subtracted=False, fwhm=None
-                frame = Frame(hdu.data[i],
-                              wcs=wcs,
-                              name=name,
-                              description=description,
-                              unit=unit,
-                              zero_point=zero_point,
-                              filter=fltr,
-                              sky_subtracted=subtracted,
-                              source_extracted=extracted,
-                              extinction_corrected=corrected,
-                              fwhm=fwhm,
-                              pixelscale=pixelscale,
-                              distance=distance,
-                              psf_filter=psf_filter,
-                              smoothing_factor=smoothing_factor)
+        if cleaned: return self.cleaned_wcs_and_error[1]
+        else: return self.wcs_and_error[1]
 
-                frames[name] = frame
+    # -----------------------------------------------------------------
 
-            elif plane_type == "mask":
+    def get_wcs(self, cleaned=False):
 
-                #data, name=None, description=None
-                mask = Mask(hdu.data[i], name=name, description=description, wcs=wcs, pixelscale=pixelscale)
-                masks[name] = mask
+        """
+        This function returns a copy of the coordinate system, or None
+        :param cleaned: use the header that is cleaned before flattening
+        :return:
+        """
 
-            elif plane_type == "segments":
+        wcs = self.cleaned_wcs_and_error[0] if cleaned else self.wcs_and_error[0]
+        if wcs is None: return None
+        return wcs.copy()
 
-                segments_map = SegmentationMap(hdu.data[i], wcs=wcs, name=name, description=description)
-                segments[name] = segments_map
+    # -----------------------------------------------------------------
 
-            else: raise ValueError("Unrecognized type (must be frame, mask or segments)")
+    @lazyproperty
+    def header_pixelscale(self):
 
-    else:
+        """
+        This function ...
+        :return:
+        """
 
-        # Sometimes, the 2D frame is embedded in a 3D array with shape (1, xsize, ysize)
-        if len(hdu.data.shape) == 3: hdu.data = hdu.data[0]
+        return headers.get_pixelscale(self.header)
 
-        if name is None: name = "primary"
-        if description is None: description = "the primary signal map"
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def cleaned_header_pixelscale(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return headers.get_pixelscale(self.cleaned_header)
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def nplanes(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return headers.get_number_of_frames(self.header)
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def scaled(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return is_scaled(self.header)
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def planes(self):
+
+        """
+        This function returns the (name, description, plane type) of each plane, not calling the first plane 'primary'
+        :return:
+        """
+
+        return [headers.get_frame_name_and_description(self.header, i, always_call_first_primary=False) for i in range(self.nplanes)]
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def planes_first_primary(self):
+
+        """
+        This function returns the (name, description, plane type) of each plane, always calling the first plane 'primary'
+        :return:
+        """
+
+        return [headers.get_frame_name_and_description(self.header, i, always_call_first_primary=True) for i in range(self.nplanes)]
+
+    # -----------------------------------------------------------------
+
+    def get_planes(self, always_call_first_primary=False):
+
+        """
+        This function ...
+        :param always_call_first_primary:
+        :return:
+        """
+
+        if always_call_first_primary: return self.planes_first_primary
+        else: return self.planes
+
+    # -----------------------------------------------------------------
+
+    def plane_index(self, name, always_call_first_primary=False):
+
+        """
+        This function ...
+        :param name:
+        :param always_call_first_primary:
+        :return:
+        """
+
+        for index, (plane_name, _, _) in enumerate(self.get_planes(always_call_first_primary)):
+            if plane_name == name: return index
+        raise ValueError("Plane with name '" + name + "' not found")
+
+# -----------------------------------------------------------------
+
+class FITSImageHandle(object):
+
+    """
+    This class provides lazy access to the planes of a (multi-plane) FITS image: the data is memory-mapped
+    and the planes are only converted into frames, masks or segmentation maps when they are accessed
+    """
+
+    def __init__(self, path, hdulist_index=0, always_call_first_primary=True, no_filter=False, no_wcs=False,
+                 density=False, brightness=False, density_strict=False, brightness_strict=False, memoize=True):
+
+        """
+        The constructor ...
+        :param path:
+        :param hdulist_index: if None, the first HDU with data is used
+        :param always_call_first_primary:
+        :param no_filter:
+        :param no_wcs:
+        :param density:
+        :param brightness:
+        :param density_strict:
+        :param brightness_strict:
+        :param memoize: keep the planes that have been created
+        """
+
+        # Check if the file exists
+        if not fs.is_file(path): raise IOError("File '" + path + "' does not exist")
+
+        # Set the path
+        self.path = path
+
+        # Determine the HDU index
+        if hdulist_index is None: hdulist_index = find_data_hdu_index(path)
+        self.hdulist_index = hdulist_index
+
+        # Flags
+        self.always_call_first_primary = always_call_first_primary
+        self.no_filter = no_filter
+        self.no_wcs = no_wcs
+        self.density = density
+        self.brightness = brightness
+        self.density_strict = density_strict
+        self.brightness_strict = brightness_strict
+        self.memoize = memoize
+
+        # The HDU list, opened when data is first required
+        self._hdulist = None
+
+        # The complete (scaled) data, for images with BSCALE or BZERO
+        self._scaled_data = None
+
+        # The planes that have already been created
+        self._planes = dict()
+
+    # -----------------------------------------------------------------
+
+    def __enter__(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self
+
+    # -----------------------------------------------------------------
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        """
+        This function ...
+        :param exc_type:
+        :param exc_value:
+        :param traceback:
+        :return:
+        """
+
+        self.close()
+
+    # -----------------------------------------------------------------
+
+    def close(self):
+
+        """
+        This function closes the file (planes that are views of the memory-mapped data remain valid)
+        :return:
+        """
+
+        if self._hdulist is not None: self._hdulist.close()
+        self._hdulist = None
+        self._scaled_data = None
+
+    # -----------------------------------------------------------------
+
+    @property
+    def filename(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.strip_extension(fs.name(self.path))
 
-        dummy_name, dummy_description, plane_type = headers.get_frame_name_and_description(original_header, 0)
+    # -----------------------------------------------------------------
 
-        pts_class_name = original_header["PTSCLS"] if "PTSCLS" in original_header else None
-        if pts_class_name is not None:
+    @lazyproperty
+    def info(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return get_header_info(self.path, self.hdulist_index)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def header(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.info.header
+
+    # -----------------------------------------------------------------
+
+    @property
+    def nplanes(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.info.nplanes
+
+    # -----------------------------------------------------------------
+
+    @property
+    def planes(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.info.get_planes(self.always_call_first_primary)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def plane_names(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return [name for name, _, _ in self.planes]
+
+    # -----------------------------------------------------------------
+
+    def plane_index(self, name):
+
+        """
+        This function ...
+        :param name:
+        :return:
+        """
+
+        return self.info.plane_index(name, self.always_call_first_primary)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def hdu(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        if self._hdulist is None: self._hdulist = fits.open(self.path, memmap=True)
+        return self._hdulist[self.hdulist_index]
+
+    # -----------------------------------------------------------------
+
+    def check(self):
+
+        """
+        This function checks whether the data can be read
+        :return:
+        """
+
+        try: self.get_data(0)
+        except (TypeError, ValueError): raise DamagedFITSFileError("The FITS file is damaged", path=self.path)
+
+    # -----------------------------------------------------------------
+
+    def get_data(self, index=None):
+
+        """
+        This function returns the data of one plane. For unscaled data, this is a (copy-on-write) view of the
+        memory-mapped file. Scaled data (BSCALE/BZERO) cannot be memory-mapped, so the complete data is then read
+        (once) without memory mapping.
+        :param index:
+        :return:
+        """
+
+        # Scaled: read without memory mapping
+        if self.info.scaled:
+            if self._scaled_data is None:
+                hdulist = fits.open(self.path, memmap=False)
+                try: self._scaled_data = hdulist[self.hdulist_index].data
+                finally: hdulist.close()
+            data = self._scaled_data
+
+        # Unscaled: view of the memory map
+        else: data = self.hdu.data
+        if data is None: raise DamagedFITSFileError("The FITS file is damaged", path=self.path)
+        if data.ndim == 3: return data[index if index is not None else 0]
+        else: return data
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def properties(self):
+
+        """
+        This function reads the properties that are shared by all planes from the header
+        :return:
+        """
+
+        original_header = self.header
+        properties = dict()
+
+        # Obtain the world coordinate system
+        wcs = self.info.get_wcs()
+
+        # Set pixelscale from direct header information
+        if wcs is None: pixelscale = self.info.header_pixelscale
+
+        # WCS IS DEFINED, SO DON'T SPECIFICALLY ADD PIXELSCALE AS AN ATTRIBUTE TO THE FRAME
+        # UNLESS WCS DOESN'T NEED TO BE SET
+        elif not self.no_wcs: pixelscale = None
+        else: pixelscale = None
+
+        # IF NO_WCS, SET TO NONE (BUT STILL GET IT FIRST TO GET THE PIXELSCALE)
+        if self.no_wcs: wcs = None
+
+        properties["wcs"] = wcs
+        properties["pixelscale"] = pixelscale
+
+        # Set the filter
+        if self.no_filter: fltr = None
+        else:
+
+            # Obtain the filter for this image
+            fltr = headers.get_filter(self.filename, original_header)
+
+            # Inform the user on the filter
+            if fltr is not None: log.debug("The filter for the '" + self.filename + "' image is " + str(fltr))
+            else: log.warning("Could not determine the filter for the image '" + self.filename + "'")
+
+        properties["filter"] = fltr
+
+        # Obtain the other properties
+        properties["unit"] = headers.get_unit(original_header, density=self.density, brightness=self.brightness,
+                                              density_strict=self.density_strict, brightness_strict=self.brightness_strict)
+        properties["fwhm"] = headers.get_fwhm(original_header)
+        properties["distance"] = headers.get_distance(original_header)
+        properties["psf_filter"] = headers.get_psf_filter(original_header)
+        properties["smoothing_factor"] = headers.get_smoothing_factor(original_header)
+        properties["zero_point"] = headers.get_zero_point(original_header)
+        properties["sky_subtracted"] = headers.is_sky_subtracted(original_header)
+        properties["source_extracted"] = headers.is_source_extracted(original_header)
+        properties["extinction_corrected"] = headers.is_extinction_corrected(original_header)
+
+        # Return the properties
+        return properties
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def metadata(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        metadata = dict()
+        for key in self.header: metadata[key.lower()] = self.header[key]
+        return metadata
+
+    # -----------------------------------------------------------------
+
+    def get_plane_type(self, index):
+
+        """
+        This function ...
+        :param index:
+        :return:
+        """
+
+        # Single plane: the type can be set by the PTS class name
+        if self.nplanes == 1:
+
+            plane_type = self.info.planes_first_primary[0][2]
+            pts_class_name = self.header["PTSCLS"] if "PTSCLS" in self.header else None
             if pts_class_name == "Frame": plane_type = "frame"
             elif pts_class_name == "Mask": plane_type = "mask"
             elif pts_class_name == "SegmentationMap": plane_type = "segments"
+            return plane_type
+
+        # Multiple planes
+        else: return self.planes[index][2]
+
+    # -----------------------------------------------------------------
+
+    def get_plane_name_and_description(self, index, name=None, description=None):
+
+        """
+        This function returns the name and description of a plane, as read from the header
+        :param index:
+        :param name: only for single-plane images
+        :param description: only for single-plane images
+        :return:
+        """
+
+        # Multiple planes
+        if self.nplanes > 1:
+            name, description, _ = self.planes[index]
+            return name, description
+
+        # Single plane
+        if name is None: name = "primary"
+        if description is None: description = "the primary signal map"
+        return name, description
 
+    # -----------------------------------------------------------------
+
+    def get_plane(self, index_or_name, name=None, description=None):
+
+        """
+        This function returns a plane as a Frame, Mask or SegmentationMap, creating it when it is first accessed
+        :param index_or_name:
+        :param name: only for single-plane images
+        :param description: only for single-plane images
+        :return:
+        """
+
+        # Determine the index
+        if isinstance(index_or_name, basestring): index = self.plane_index(index_or_name)
+        else: index = index_or_name
+
+        # Already created
+        if index in self._planes: return self._planes[index]
+
+        properties = self.properties
+        plane_type = self.get_plane_type(index)
+
+        # Determine name and description
+        name, description = self.get_plane_name_and_description(index, name=name, description=description)
+        primary = index == 0
+
+        # Get the data
+        data = self.get_data(index)
+
+        # Create the plane
         if plane_type == "frame":
 
-            # data, wcs=None, name=None, description=None, unit=None, zero_point=None, filter=None, sky_subtracted=False, fwhm=None
-            frame = Frame(hdu.data,
-                          wcs=wcs,
+            # The sky-subtracted flag (and others) should only be set for the primary frame
+            plane = Frame(data,
+                          wcs=properties["wcs"],
                           name=name,
                           description=description,
-                          unit=unit,
-                          zero_point=zero_point,
-                          filter=fltr,
-                          sky_subtracted=sky_subtracted,
-                          source_extracted=source_extracted,
-                          extinction_corrected=extinction_corrected,
-                          fwhm=fwhm,
-                          pixelscale=pixelscale,
-                          distance=distance,
-                          psf_filter=psf_filter,
-                          smoothing_factor=smoothing_factor)
-
-            # Add the primary image frame
-            frames[name] = frame
-
-        # Mask
-        elif plane_type == "mask":
-
-            mask = Mask(hdu.data, name=name, description=description, wcs=wcs, pixelscale=pixelscale)
-            # Add the mask
-            masks[name] = mask
-
-        # Segmentation map
-        elif plane_type == "segments":
-
-            segments_map = SegmentationMap(hdu.data, wcs=wcs, name=name, description=description)
-            # Add the segmentation map
-            segments[name] = segments_map
-
-        # Plane type not recognized
-        else: raise ValueError("Unrecognized type (must be frame or mask)")
+                          unit=properties["unit"],
+                          zero_point=properties["zero_point"],
+                          filter=properties["filter"],
+                          sky_subtracted=properties["sky_subtracted"] if primary else False,
+                          source_extracted=properties["source_extracted"] if primary else False,
+                          extinction_corrected=properties["extinction_corrected"] if primary else False,
+                          fwhm=properties["fwhm"],
+                          pixelscale=properties["pixelscale"],
+                          distance=properties["distance"],
+                          psf_filter=properties["psf_filter"],
+                          smoothing_factor=properties["smoothing_factor"])
 
-    # Add meta information
-    for key in original_header: metadata[key.lower()] = original_header[key]
+        elif plane_type == "mask": plane = Mask(data, name=name, description=description, wcs=properties["wcs"], pixelscale=properties["pixelscale"])
+        elif plane_type == "segments": plane = SegmentationMap(data, wcs=properties["wcs"], name=name, description=description)
+        else: raise ValueError("Unrecognized type (must be frame, mask or segments)")
+
+        # Keep the plane
+        if self.memoize: self._planes[index] = plane
+
+        # Return the plane
+        return plane
+
+    # -----------------------------------------------------------------
+
+    def iterate_planes(self, ptype=None):
+
+        """
+        This function yields the name, type and plane for the planes of the image, one at a time
+        :param ptype:
+        :return:
+        """
+
+        for index in range(self.nplanes):
+
+            plane_type = self.get_plane_type(index)
+            if ptype is not None and plane_type != ptype: continue
+            name, _ = self.get_plane_name_and_description(index)
+            yield name, plane_type, self.get_plane(index)
+
+    # -----------------------------------------------------------------
+
+    def iterate_frames(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        for name, _, frame in self.iterate_planes(ptype="frame"): yield name, frame
+
+# -----------------------------------------------------------------
+
+def open_image(path, **kwargs):
+
+    """
+    This function ...
+    :param path:
+    :param kwargs:
+    :return:
+    """
+
+    return FITSImageHandle(path, **kwargs)
+
+# -----------------------------------------------------------------
+
+def load_frames(path, index=None, name=None, description=None, always_call_first_primary=True, rebin_to_wcs=False,
+                hdulist_index=0, no_filter=False, no_wcs=False, density=False, brightness=False, density_strict=False,
+                brightness_strict=False):
+
+    """
+    This function ...
+    :param path:
+    :param index:
+    :param name:
+    :param description:
+    :param always_call_first_primary:
+    :param rebin_to_wcs:
+    :param hdulist_index:
+    :param no_filter:
+    :param no_wcs:
+    :param density:
+    :param brightness:
+    :param density_strict:
+    :param brightness_strict:
+    :return:
+    """
+
+    frames = OrderedDict()
+    masks = OrderedDict()
+    segments = OrderedDict()
+
+    # Show which image we are importing
+    log.debug("Reading in file '" + path + "' ...")
+
+    # Open the image lazily
+    handle = FITSImageHandle(path, hdulist_index=hdulist_index, always_call_first_primary=always_call_first_primary,
+                             no_filter=no_filter, no_wcs=no_wcs, density=density, brightness=brightness,
+                             density_strict=density_strict, brightness_strict=brightness_strict, memoize=False)
+
+    # Check whether the data can be read
+    handle.check()
+
+    # Only create the planes that are requested
+    if handle.nplanes > 1: indices = range(handle.nplanes) if index is None else [index]
+    else: indices = [0]
+
+    # Loop over the planes
+    for i in indices:
+
+        plane_name, plane_description = handle.get_plane_name_and_description(i, name=name, description=description)
+        plane = handle.get_plane(i, name=plane_name, description=plane_description)
+        plane_type = handle.get_plane_type(i)
+
+        # Add the plane (masks have no name attribute)
+        if plane_type == "frame": frames[plane_name] = plane
+        elif plane_type == "mask": masks[plane_name] = plane
+        elif plane_type == "segments": segments[plane_name] = plane
+
+    # Get meta information
+    metadata = handle.metadata
 
     # Close the FITS file
-    hdulist.close()
+    handle.close()
 
     # Frames, masks and meta data
     return frames, masks, segments, metadata
 
+
 # -----------------------------------------------------------------
 
 wcs_keywords = ["RA", "DEC", "CD1_1", "CD1_2", "CD2_1", "CD2_2", "PC1_1", "PC1_2", "PC2_1", "PC2_2", "EQUINOX", "EPOCH", "WCSDIM", "NAXIS", "CRPIX1", "CRPIX2", "LONPOLE", "CTYPE2", "CTYPE1", "NAXIS1", "NAXIS2", "WCSAXES", "NAXIS3", "RADESYS", "CDELT1", "CDELT2", "LATPOLE", "CUNIT1", "CUNIT2", "CRVAL1", "CRVAL2"]
@@ -478,37 +1059,14 @@ def load_frame(cls, path, index=None, name=None, description=None, plane=None, h
 
     metadata = dict()
 
-    # Open the HDU list for the FITS file
-    hdulist = fits.open(path)
-
-    # Look for the first HDU with data
-    if hdulist_index is None:
-
-        #try:
-        _hdulist_index = 0
-        while True:
-
-            if hdulist[_hdulist_index].data is not None:
-                hdulist_index = _hdulist_index
-                break
-            _hdulist_index += 1
-
-        if hdulist_index is None: raise ValueError("The FITS file does not contain any data")
-        #except TypeError: # TypeError: buffer is too small for requested array
-        #    hdulist_index = 0
-
-    # Get the primary HDU
-    hdu = hdulist[hdulist_index]
+    # Open the image lazily (the data is memory-mapped, the header is cached)
+    handle = FITSImageHandle(path, hdulist_index=hdulist_index)
 
     # Check whether the data can be read
-    try: first_plane = hdu.data[0]
-    except TypeError: raise DamagedFITSFileError("The FITS file is damaged", path=path)
-
-    # Get the image header
-    header = hdu.header
+    handle.check()
 
-    # Check the header for presence of CDELT while PC is also defined
-    clean_header(header)
+    # Get the image header, with CDELT removed when PC is also defined
+    header = handle.info.cleaned_header
 
     # Add meta information
     if add_meta:
@@ -530,46 +1088,20 @@ def load_frame(cls, path, index=None, name=None, description=None, plane=None, h
     # Check whether multiple planes are present in the FITS image
     nframes = headers.get_number_of_frames(header)
 
-    # Remove references to a potential third axis
-    flat_header = headers.flattened(header)
-
     # Get the pixelscale
-    header_pixelscale = headers.get_pixelscale(header)  # NOTE: SOMETIMES PLAIN WRONG IN THE HEADER !!
-
-    # Simplify the header
-    simplify_header(flat_header)
-
-    # Fix
-    fix_ctypes(flat_header)
-
-    #print(flat_header)
-
-    # If the coordinate system is needed or expected
-    #if not no_wcs:
+    header_pixelscale = handle.info.cleaned_header_pixelscale  # NOTE: SOMETIMES PLAIN WRONG IN THE HEADER !!
 
     # Obtain the world coordinate system from the 'flattened' header
-    try:
-        #for key in flat_header: print(key, flat_header[key])
-        #for key in flat_header: print(key)
-        wcs = CoordinateSystem(flat_header)
-        #print(wcs)
-        pixelscale = wcs.pixelscale
-        #print(pixelscale)
-    except ValueError as e:
+    wcs = handle.info.get_wcs(cleaned=True)
+    if wcs is not None: pixelscale = wcs.pixelscale
+    else:
         if not no_wcs:
             log.warning("An error occured while trying to interpret the coordinate system of the image:")
-            for line in e.message.split("\n"):
+            for line in str(handle.info.get_wcs_error(cleaned=True)).split("\n"):
                  if not line.strip(): continue
                  log.warning("  " + line)
-        wcs = None
         pixelscale = None
 
-    #print(wcs)
-    #print(pixelscale)
-
-    # No WCS information
-    #else: wcs = pixelscale = None
-
     # Check whether pixelscale as defined by header keyword and pixelscale derived from WCS match!
     if header_pixelscale is not None and pixelscale is not None:
 
@@ -694,8 +1226,8 @@ def load_frame(cls, path, index=None, name=None, description=None, plane=None, h
         if name is None: name = fs.name(path[:-5])
 
         # Get the data
-        if data_converter is not None: data = data_converter(hdu.data[index])
-        else: data = hdu.data[index]
+        if data_converter is not None: data = data_converter(handle.get_data(index))
+        else: data = handle.get_data(index)
 
         # Get the class
         if class_picker is not None: cls = class_picker(data)
@@ -721,22 +1253,19 @@ def load_frame(cls, path, index=None, name=None, description=None, plane=None, h
                    distance=distance)
 
         # Close the FITS file
-        hdulist.close()
+        handle.close()
 
         # Return the frame
         return frame
 
     else:
 
-        # Sometimes, the 2D frame is embedded in a 3D array with shape (1, xsize, ysize)
-        if len(hdu.data.shape) == 3: hdu.data = hdu.data[0]
-
         # Get the name from the file path
         if name is None: name = fs.name(path[:-5])
 
-        # Get the data
-        if data_converter is not None: data = data_converter(hdu.data)
-        else: data = hdu.data
+        # Get the data (a 2D frame embedded in a 3D array with shape (1, xsize, ysize) is also handled)
+        if data_converter is not None: data = data_converter(handle.get_data())
+        else: data = handle.get_data()
 
         # Get the class
         if class_picker is not None: cls = class_picker(data)
@@ -762,7 +1291,7 @@ def load_frame(cls, path, index=None, name=None, description=None, plane=None, h
                    distance=distance)
 
         # Close the FITS file
-        hdulist.close()
+        handle.close()
 
         # Return
         return frame
@@ -52,6 +52,7 @@ from ...core.units.stringify import represent_unit
 from ..basics.pixelscale import Pixelscale
 from ..basics.vector import Pixel
 from ..region.region import PixelRegion, SkyRegion
+from .framestats import FrameStatistics
 
 # -----------------------------------------------------------------
 
@@ -176,6 +177,9 @@ class Frame(NDDataArray):
         self.path = kwargs.pop("path", None)
         self._from_multiplane = kwargs.pop("from_multiplane", False)
 
+        # The statistics of the data (calculated when needed)
+        self._statistics = None
+
         # Call the constructor of the base class
         super(Frame, self).__init__(data, *args, **kwargs)
 
@@ -193,7 +197,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return PixelShape.from_tuple(super(Frame, self).shape)
+        return PixelShape.from_tuple(self._data.shape)
 
     # -----------------------------------------------------------------
 
@@ -292,17 +296,73 @@ class Frame(NDDataArray):
     # -----------------------------------------------------------------
 
     @property
-    def data(self):
+    def _data(self):
 
         """
         This function ...
         :return:
         """
 
+        return self._frame_data
+
+    # -----------------------------------------------------------------
+
+    @_data.setter
+    def _data(self, value):
+
+        """
+        This function sets the data (also when an operation is applied in place), which invalidates the statistics
+        :param value:
+        :return:
+        """
+
+        self._frame_data = value
+        self._statistics = None
+
+    # -----------------------------------------------------------------
+
+    @property
+    def data(self):
+
+        """
+        This function returns the data array. The statistics are not invalidated when the array is modified in place
+        through the returned reference (e.g. frame.data[mask] = 0.): use item assignment on the frame itself
+        (frame[mask] = 0.) or call invalidate_statistics() afterwards.
+        :return:
+        """
+
         return self._data
 
     # -----------------------------------------------------------------
 
+    @property
+    def statistics(self):
+
+        """
+        This function returns the statistics of the data, which are calculated in one pass and kept until the data
+        is changed
+        :return:
+        """
+
+        if self._statistics is None: self._statistics = FrameStatistics(self._data)
+        return self._statistics
+
+    # -----------------------------------------------------------------
+
+    def invalidate_statistics(self):
+
+        """
+        This function has to be called after the data has been changed in place through a reference to the data
+        array (obtained with the data property), e.g. after frame.data[mask] = 0. or np.log10(frame.data,
+        out=frame.data). Setting the data and the functions of the frame that change it invalidate the statistics
+        themselves.
+        :return:
+        """
+
+        self._statistics = None
+
+    # -----------------------------------------------------------------
+
     @NDDataArray.wcs.setter
     def wcs(self, wcs):
 
@@ -446,6 +506,9 @@ class Frame(NDDataArray):
         elif isinstance(item, tuple): self._data[item[0], item[1]] = value
         else: self._data[item] = value
 
+        # The statistics have changed
+        self._statistics = None
+
     # -----------------------------------------------------------------
 
     def is_identical(self, other):
@@ -1161,7 +1224,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return Mask(np.isnan(self.data), wcs=self.wcs.copy() if self.wcs is not None else None, pixelscale=self.pixelscale)
+        return Mask(self.statistics.nans.copy(), wcs=self.wcs.copy() if self.wcs is not None else None, pixelscale=self.pixelscale)
 
     # -----------------------------------------------------------------
 
@@ -1185,7 +1248,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.sum(self.nans.data)
+        return self.statistics.nnans
 
     # -----------------------------------------------------------------
 
@@ -1209,7 +1272,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.any(self.nans.data)
+        return self.statistics.nnans > 0
 
     # -----------------------------------------------------------------
 
@@ -1220,7 +1283,7 @@ class Frame(NDDataArray):
         This function ...
         """
 
-        return np.all(self.nans.data)
+        return self.statistics.nnans == self.npixels
 
     # -----------------------------------------------------------------
 
@@ -1232,7 +1295,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return Mask(np.isinf(self.data), wcs=self.wcs.copy() if self.wcs is not None else None, pixelscale=self.pixelscale)
+        return Mask(self.statistics.infs.copy(), wcs=self.wcs.copy() if self.wcs is not None else None, pixelscale=self.pixelscale)
 
     # -----------------------------------------------------------------
 
@@ -1256,7 +1319,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.all(self.infs.data)
+        return self.statistics.ninfs == self.npixels
 
     # -----------------------------------------------------------------
 
@@ -1268,7 +1331,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.sum(self.infs.data)
+        return self.statistics.ninfs
 
     # -----------------------------------------------------------------
 
@@ -1292,7 +1355,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.any(self.infs.data)
+        return self.statistics.ninfs > 0
 
     # -----------------------------------------------------------------
 
@@ -1328,7 +1391,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.all(self.zeroes.data)
+        return self.statistics.nzeroes == self.npixels
 
     # -----------------------------------------------------------------
 
@@ -1340,7 +1403,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.sum(self.zeroes.data)
+        return self.statistics.nzeroes
 
     # -----------------------------------------------------------------
 
@@ -1364,7 +1427,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.any(self.zeroes.data)
+        return self.statistics.nzeroes > 0
 
     # -----------------------------------------------------------------
 
@@ -1388,7 +1451,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.all(self.nonzeroes.data)
+        return self.statistics.nzeroes == 0
 
     # -----------------------------------------------------------------
 
@@ -1436,7 +1499,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.sum(self.nonzeroes.data)
+        return self.statistics.nnonzeroes
 
     # -----------------------------------------------------------------
 
@@ -1508,7 +1571,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.sum(self.negatives.data)
+        return self.statistics.nnegatives
 
     # -----------------------------------------------------------------
 
@@ -1532,7 +1595,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.any(self.negatives.data)
+        return self.statistics.nnegatives > 0
 
     # -----------------------------------------------------------------
 
@@ -1543,7 +1606,7 @@ class Frame(NDDataArray):
         This function ...
         """
 
-        return np.all(self.negatives.data)
+        return self.statistics.nnegatives == self.npixels
 
     # -----------------------------------------------------------------
 
@@ -1579,7 +1642,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.sum(self.positives.data)
+        return self.statistics.npositives
 
     # -----------------------------------------------------------------
 
@@ -1603,7 +1666,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.any(self.positives.data)
+        return self.statistics.npositives > 0
 
     # -----------------------------------------------------------------
 
@@ -1615,7 +1678,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.all(self.positives.data)
+        return self.statistics.npositives == self.npixels
 
     # -----------------------------------------------------------------
 
@@ -1717,7 +1780,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.nanmin(self.data)
+        return self.statistics.min
 
     # -----------------------------------------------------------------
 
@@ -1729,7 +1792,31 @@ class Frame(NDDataArray):
         :return:
         """
 
-        return np.nanmax(self.data)
+        return self.statistics.max
+
+    # -----------------------------------------------------------------
+
+    @property
+    def median(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.statistics.median
+
+    # -----------------------------------------------------------------
+
+    def percentile(self, percentage):
+
+        """
+        This function ...
+        :param percentage:
+        :return:
+        """
+
+        return self.statistics.quantile(0.01 * percentage)
 
     # -----------------------------------------------------------------
 
@@ -3051,7 +3138,7 @@ class Frame(NDDataArray):
         :return:
         """
 
-        result = np.nansum(self.data)
+        result = self.statistics.sum
         if add_unit and self.has_unit:
             #if self.unit.is_brightness: log.warning("Unit is a surface brightness: adding all pixel values may not be useful before a conversion to a non-brightness unit")
             if self.is_per_angular_or_intrinsic_area:
@@ -3181,12 +3268,24 @@ class Frame(NDDataArray):
         :return:
         """
 
+        # FFT convolution: use the convolution service, which caches the kernel transforms
+        if fft:
+
+            from ..convolution.service import get_convolution_service
+            log.debug("Convolving ...")
+            get_convolution_service().convolve_frames([self], kernel, preserve_nans=preserve_nans, allow_huge=allow_huge)
+            return
+
         # Get the kernel FWHM and PSF filter
         kernel_fwhm = kernel.fwhm
         kernel_psf_filter = kernel.psf_filter
 
+        # Get the current minimum and maximum of the frame
+        min_value = np.nanmin(self._data)
+        max_value = np.nanmax(self._data)
+
         # Skip the calculation for a constant frame
-        if self.is_constant:
+        if min_value == max_value:
             self._fwhm = kernel_fwhm
             self._psf_filter = kernel_psf_filter
             return
@@ -3203,24 +3302,12 @@ class Frame(NDDataArray):
         # Assert that the kernel is normalized
         if not kernel.normalized: raise RuntimeError("The kernel is not properly normalized: sum is " + repr(kernel.sum()) + " , difference from unity is " + repr(kernel.sum() - 1.0))
 
-        # Get the current minimum and maximum of the frame
-        min_value = self.min
-        max_value = self.max
-
         # Debugging
         log.debug("The minimum and maximum value of the frame before convolution is " + tostr(min_value) + " and " + tostr(max_value))
 
         # Do the convolution on this frame
         log.debug("Convolving ...")
-        if fft: new_data = convolve_fft(self._data, kernel.data, boundary='fill', nan_treatment="interpolate", normalize_kernel=False, allow_huge=allow_huge)
-        else: new_data = convolve(self._data, kernel.data, boundary='fill', nan_treatment="interpolate", normalize_kernel=False)
-
-        # Determine new min and max value
-        new_min_value = np.nanmin(self.min)
-        new_max_value = np.nanmax(self.max)
-
-        # Debugging
-        log.debug("The minimum and maximum value of the frame after convolution is " + tostr(new_min_value) + " and " + tostr(new_max_value))
+        new_data = convolve(self._data, kernel.data, boundary='fill', nan_treatment="interpolate", normalize_kernel=False)
 
         # Put back NaNs
         if preserve_nans: new_data[nans_mask] = nan_value
@@ -3228,8 +3315,7 @@ class Frame(NDDataArray):
         # Don't mess up the scale
         # Set values lower than min to min value
         # and values above max to max value
-        new_data[new_data < min_value] = min_value
-        new_data[new_data > max_value] = max_value
+        np.clip(new_data, min_value, max_value, out=new_data)
 
         # Replace the data and FWHM
         self._data = new_data
@@ -3313,7 +3399,7 @@ class Frame(NDDataArray):
     # -----------------------------------------------------------------
 
     def interpolate(self, region_or_mask, sigma=None, max_iterations=10, plot=False, not_converge="keep",
-                    min_max_in=None, smoothing_factor=None):
+                    min_max_in=None, smoothing_factor=None, method="kernel", nprocesses=1):
 
         """
         Thisfunction ...
@@ -3324,6 +3410,8 @@ class Frame(NDDataArray):
         :param not_converge:
         :param min_max_in:
         :param smoothing_factor:
+        :param method:
+        :param nprocesses:
         :return:
         """
 
@@ -3340,7 +3428,8 @@ class Frame(NDDataArray):
 
         # Interpolate the nans
         try: self.interpolate_nans(sigma=sigma, max_iterations=max_iterations, plot=plot, not_converge=not_converge,
-                                   min_max_in=min_max_in, smoothing_factor=smoothing_factor)
+                                   min_max_in=min_max_in, smoothing_factor=smoothing_factor, method=method,
+                                   nprocesses=nprocesses)
         except RuntimeError as e:
 
             # Reset the original values (e.g. infs)
@@ -3374,7 +3463,8 @@ class Frame(NDDataArray):
 
     # -----------------------------------------------------------------
 
-    def interpolate_nans_if_below(self, threshold=0.7, sigma=None, max_iterations=None, min_max_in=None, smoothing_factor=None):
+    def interpolate_nans_if_below(self, threshold=0.7, sigma=None, max_iterations=None, min_max_in=None, smoothing_factor=None,
+                                  method="kernel", nprocesses=1):
 
         """
         This function ...
@@ -3383,6 +3473,8 @@ class Frame(NDDataArray):
         :param max_iterations:
         :param min_max_in:
         :param smoothing_factor:
+        :param method:
+        :param nprocesses:
         :return:
         """
 
@@ -3396,7 +3488,7 @@ class Frame(NDDataArray):
             log.debug("The relative number of NaN values in the frame is " + str(relnans * 100) + "%")
 
             # Interpolate, returning the nans
-            nans = self.interpolate_nans(sigma=sigma, max_iterations=max_iterations, min_max_in=min_max_in, smoothing_factor=smoothing_factor)
+            nans = self.interpolate_nans(sigma=sigma, max_iterations=max_iterations, min_max_in=min_max_in, smoothing_factor=smoothing_factor, method=method, nprocesses=nprocesses)
 
         # ABOVE THRESHOLD
         else:
@@ -3450,21 +3542,114 @@ class Frame(NDDataArray):
     # -----------------------------------------------------------------
 
     def interpolate_nans(self, sigma=None, max_iterations=10, plot=False, not_converge="keep", min_max_in=None,
-                         smoothing_factor=None):
+                         smoothing_factor=None, method="kernel", nprocesses=1):
 
         """
         This function ...
-        :param sigma:
-        :param max_iterations:
+        :param sigma: the sigma of the kernel (for the 'kernel' method)
+        :param max_iterations: the maximum number of iterations (for the 'kernel' method)
         :param plot:
         :param not_converge: what to do with NaN values when the number of NaN pixels does not converge to zero?
         #                     -> "error', or "keep"
         :param min_max_in:
-        :param smoothing_factor:
+        :param smoothing_factor: (for the 'kernel' method)
+        :param method: 'kernel' (convolve the frame with a Gaussian kernel, repeatedly, until all NaN values are
+        replaced), or 'harmonic' or 'biharmonic' (solve for each area of NaN values). Frames with more than
+        inpainting.max_npixels NaN values are always interpolated with the kernel.
+        :param nprocesses: the number of processes (for the 'harmonic' and 'biharmonic' methods)
         :return:
         """
 
         from ..tools import plotting
+        from ..tools import inpainting
+
+        # Check the method
+        if method != "kernel":
+
+            # Kernel settings
+            if sigma is not None or smoothing_factor is not None: raise ValueError("The sigma and smoothing factor can only be used with the 'kernel' method")
+
+            # Too many NaN values to solve for
+            if self.nnans > inpainting.max_npixels:
+                log.warning("The number of NaN values (" + str(self.nnans) + ") is too large for the " + method + " method: using the 'kernel' method")
+                method = "kernel"
+
+        # Get the current minimum and maximum of the frame
+        if min_max_in is not None:
+            min_value = self.min_in(min_max_in)
+            max_value = self.max_in(min_max_in)
+        else:
+            min_value = self.min
+            max_value = self.max
+
+        # Debugging
+        log.debug("The minimum and maximum value of the frame before interpolation is " + tostr(min_value) + " and " + tostr(max_value))
+
+        # Repeatedly convolve with a kernel
+        if method == "kernel": result = self._interpolate_nans_kernel(sigma=sigma, max_iterations=max_iterations, plot=plot, not_converge=not_converge, smoothing_factor=smoothing_factor)
+
+        # Solve for the areas of NaN values
+        else:
+
+            # Debugging
+            log.debug("Interpolating " + str(self.nnans) + " NaN values with the " + method + " method ...")
+
+            # Inpaint
+            result, unsolved = inpainting.inpaint(self._data, method=method, nprocesses=nprocesses)
+
+            # Plot
+            if plot: plotting.plot_box(result, title="Result")
+
+            # Areas not bordered by any valid pixel
+            nnans = np.count_nonzero(unsolved)
+            if nnans > 0:
+                if not_converge == "keep": log.warning("Some areas of NaN values are not bordered by valid pixels: " + str(nnans) + " NaN values will remain")
+                elif not_converge == "error": raise RuntimeError("Some areas of NaN values are not bordered by valid pixels (nnans = " + str(nnans) + ")")
+                else: raise ValueError("Invalid option for 'not_converge'")
+
+        # Determine new min and max value
+        if min_max_in is not None:
+            mask = self.get_mask(min_max_in)
+            new_min_value = np.nanmin(result[mask])
+            new_max_value = np.nanmax(result[mask])
+        else:
+            new_min_value = np.nanmin(result)
+            new_max_value = np.nanmax(result)
+
+        # Debugging
+        log.debug("The minimum and maximum value of the frame after interpolation is " + tostr(new_min_value) + " and " + tostr(new_max_value))
+
+        # Don't mess up the scale
+        # Set values lower than min to min value
+        # and values above max to max value
+        result[result < min_value] = min_value
+        result[result > max_value] = max_value
+
+        # Get the mask of NaNs
+        original_nans = self.nans
+
+        # Replace the data
+        self._data = result
+
+        # Return the original nans
+        return original_nans
+
+    # -----------------------------------------------------------------
+
+    def _interpolate_nans_kernel(self, sigma=None, max_iterations=10, plot=False, not_converge="keep", smoothing_factor=None):
+
+        """
+        This function replaces the NaN values by repeatedly convolving with a Gaussian kernel
+        :param sigma:
+        :param max_iterations:
+        :param plot:
+        :param not_converge:
+        :param smoothing_factor:
+        :return: the new data
+        """
+
+        from ..tools import plotting
+
 
         # Determine sigma
         if sigma is None:
@@ -3493,17 +3678,6 @@ class Frame(NDDataArray):
         # Create the kernel
         kernel = Gaussian2DKernel(stddev=sigma)
 
-        # Get the current minimum and maximum of the frame
-        if min_max_in is not None:
-            min_value = self.min_in(min_max_in)
-            max_value = self.max_in(min_max_in)
-        else:
-            min_value = self.min
-            max_value = self.max
-
-        # Debugging
-        log.debug("The minimum and maximum value of the frame before interpolation is " + tostr(min_value) + " and " + tostr(max_value))
-
         # Debugging
         log.debug("Interpolation iteration 1 ...")
 
@@ -3556,32 +3730,8 @@ class Frame(NDDataArray):
             if plot: plotting.plot_box(result, title="Result after iteration " + str(niterations))
             if plot: plotting.plot_mask(np.isnan(result), title="NaNs after iteration " + str(niterations))
 
-        # Determine new min and max value
-        if min_max_in is not None:
-            mask = self.get_mask(min_max_in)
-            new_min_value = np.nanmin(result[mask])
-            new_max_value = np.nanmax(result[mask])
-        else:
-            new_min_value = np.nanmin(result)
-            new_max_value = np.nanmax(result)
-
-        # Debugging
-        log.debug("The minimum and maximum value of the frame after interpolation is " + tostr(new_min_value) + " and " + tostr(new_max_value))
-
-        # Don't mess up the scale
-        # Set values lower than min to min value
-        # and values above max to max value
-        result[result < min_value] = min_value
-        result[result > max_value] = max_value
-
-        # Get the mask of NaNs
-        original_nans = self.nans
-
-        # Replace the data
-        self._data = result
-
-        # Return the original nans
-        return original_nans
+        # Return the new data
+        return result
 
     # -----------------------------------------------------------------
 
@@ -3669,23 +3819,24 @@ class Frame(NDDataArray):
 
     # -----------------------------------------------------------------
 
-    def rebinned(self, reference_wcs, exact=False, parallel=True):
+    def rebinned(self, reference_wcs, exact=False, parallel=True, engine=None):
 
         """
         This function ...
         :param reference_wcs:
         :param exact:
         :param parallel:
+        :param engine:
         :return:
         """
 
         new = self.copy()
-        new.rebin(reference_wcs, exact=exact, parallel=parallel)
+        new.rebin(reference_wcs, exact=exact, parallel=parallel, engine=engine)
         return new
 
     # -----------------------------------------------------------------
 
-    def rebin(self, reference_wcs, exact=False, parallel=True, convert=False):
+    def rebin(self, reference_wcs, exact=False, parallel=True, convert=False, engine=None):
 
         """
         This function ...
@@ -3693,6 +3844,7 @@ class Frame(NDDataArray):
         :param exact:
         :param parallel:
         :param convert:
+        :param engine: the reprojection engine, which caches the pixel mappings (for interpolation)
         :return:
         """
 
@@ -3718,6 +3870,7 @@ class Frame(NDDataArray):
 
         # Calculate rebinned data and footprint of the original image
         if exact: new_data, footprint = reproject_exact((self._data, self.wcs), reference_wcs, shape_out=reference_wcs.shape, parallel=parallel)
+        elif engine is not None: new_data, footprint = engine.reproject(self._data, self.wcs, reference_wcs)
         else: new_data, footprint = reproject_interp((self._data, self.wcs), reference_wcs, shape_out=reference_wcs.shape)
 
         # Replace the data and WCS
@@ -4401,6 +4554,7 @@ class Frame(NDDataArray):
         """
 
         self._data.fill(value)
+        self._statistics = None
 
     # -----------------------------------------------------------------
 
@@ -4451,6 +4605,7 @@ class Frame(NDDataArray):
 
         # Fill
         self._data[mask] = value
+        self._statistics = None
 
         # Return the mask
         return mask
@@ -4717,6 +4872,7 @@ class Frame(NDDataArray):
 
         nans = self.nans
         self._data[nans] = value
+        self._statistics = None
         return nans
 
     # -----------------------------------------------------------------
@@ -4753,6 +4909,7 @@ class Frame(NDDataArray):
 
         infs = self.infs
         self._data[infs] = value
+        self._statistics = None
         return infs
 
     # -----------------------------------------------------------------
@@ -4789,6 +4946,7 @@ class Frame(NDDataArray):
 
         zeroes = self.zeroes
         self._data[zeroes] = value
+        self._statistics = None
         return zeroes
 
     # -----------------------------------------------------------------
@@ -4825,6 +4983,7 @@ class Frame(NDDataArray):
 
         negatives = self.negatives
         self._data[negatives] = value
+        self._statistics = None
         return negatives
 
     # -----------------------------------------------------------------
@@ -4875,7 +5034,10 @@ class Frame(NDDataArray):
         mask = self.where_greater_than(value)
 
         # Replace
-        self.data[mask] = replacement
+        self._data[mask] = replacement
+
+        # The statistics have changed
+        self._statistics = None
 
         # Return the mask
         return mask
@@ -4918,7 +5080,10 @@ class Frame(NDDataArray):
         mask = self.where_smaller_than(value)
 
         # Replace
-        self.data[mask] = replacement
+        self._data[mask] = replacement
+
+        # The statistics have changed
+        self._statistics = None
 
         # Return the mask
         return mask
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.core.framestats Contains the FrameStatistics class, which calculates the pixel counts,
+#  extrema, moments and NaN and infinity masks of an image frame in a single pass over the data.
+#
+# The data is processed in blocks that fit in the CPU cache, so that all quantities of a block are obtained while it
+# is loaded from memory once, and the results of the blocks are combined as they are obtained. Quantiles (e.g. the
+# median) are calculated on demand, with one partition of the non-NaN values for any number of quantiles.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+
+# -----------------------------------------------------------------
+
+# The number of pixels in a block (the working set of a block should fit in the cache)
+block_size = 2**15
+
+# -----------------------------------------------------------------
+
+def block_statistics(data, nans, infs):
+
+    """
+    This function calculates the statistics of the pixels, block by block
+    :param data: the (one-dimensional) pixel values
+    :param nans: the output array for the NaN mask of the pixels
+    :param infs: the output array for the infinity mask of the pixels
+    :return: tuple of the results (counts, extrema, mean and second moment of the finite values)
+    """
+
+    size = min(block_size, len(data))
+
+    # Buffers
+    invalid = np.empty(size, dtype=bool)
+    comparison = np.empty(size, dtype=bool)
+    values = np.empty(size, dtype=np.float64)
+
+    # Initialize
+    nnans = ninfs = nzeroes = nnegatives = npositives = nposinfs = nneginfs = 0
+    minimum = maximum = np.nan
+    nfinite = 0
+    mean = 0.0
+    m2 = 0.0
+
+    # Loop over the blocks
+    for start in range(0, len(data), block_size):
+
+        end = min(start + block_size, len(data))
+        n = end - start
+        block = data[start:end]
+
+        # NaNs and infinities
+        block_nans = np.isnan(block, out=nans[start:end])
+        block_infs = np.isinf(block, out=infs[start:end])
+        block_nnans = np.count_nonzero(block_nans)
+        block_ninfs = np.count_nonzero(block_infs)
+        nnans += block_nnans
+        ninfs += block_ninfs
+
+        # Counts (the comparisons with NaNs are false)
+        with np.errstate(invalid="ignore"):
+            nzeroes += np.count_nonzero(np.equal(block, 0, out=comparison[:n]))
+            nnegatives += np.count_nonzero(np.less(block, 0, out=comparison[:n]))
+            npositives += np.count_nonzero(np.greater(block, 0, out=comparison[:n]))
+
+        # Extrema (ignoring NaNs)
+        if block_nnans < n:
+            minimum = np.fmin(minimum, np.fmin.reduce(block))
+            maximum = np.fmax(maximum, np.fmax.reduce(block))
+
+        # Infinities of each sign
+        if block_ninfs > 0:
+            block_nposinfs = np.count_nonzero(np.logical_and(block_infs, comparison[:n], out=comparison[:n]))
+            nposinfs += block_nposinfs
+            nneginfs += block_ninfs - block_nposinfs
+
+        # Moments of the finite values, combined with those of the previous blocks
+        block_invalid = np.logical_or(block_nans, block_infs, out=invalid[:n])
+        block_nfinite = n - block_nnans - block_ninfs
+        if block_nfinite == 0: continue
+        block_values = values[:n]
+        np.copyto(block_values, block)
+        if block_nfinite < n: np.copyto(block_values, 0., where=block_invalid)
+        block_mean = np.sum(block_values) / block_nfinite
+        block_values -= block_mean
+        if block_nfinite < n: np.copyto(block_values, 0., where=block_invalid)
+        block_m2 = np.dot(block_values, block_values)
+        delta = block_mean - mean
+        total = nfinite + block_nfinite
+        mean += delta * block_nfinite / total
+        m2 += block_m2 + delta**2 * nfinite * block_nfinite / total
+        nfinite = total
+
+    # Return the results
+    return nnans, ninfs, nzeroes, nnegatives, npositives, nposinfs, nneginfs, minimum, maximum, nfinite, mean, m2
+
+# -----------------------------------------------------------------
+
+class FrameStatistics(object):
+
+    """
+    This class contains the statistics of the pixel values of a frame
+    """
+
+    def __init__(self, data):
+
+        """
+        The constructor calculates the statistics
+        :param data: the data array
+        """
+
+        # The data (for the quantiles)
+        self.data = data
+
+        # The pixel values, as a one-dimensional array
+        values = np.ravel(data)
+        self.npixels = len(values)
+
+        # The NaN and infinity masks
+        self.nans = np.empty(data.shape, dtype=bool)
+        self.infs = np.empty(data.shape, dtype=bool)
+        nans = self.nans.reshape(-1)
+        infs = self.infs.reshape(-1)
+
+        # Calculate the statistics
+        result = block_statistics(values, nans, infs)
+
+        # Set the statistics
+        self.nnans, self.ninfs, self.nzeroes, self.nnegatives, self.npositives, self.npositive_infs, self.nnegative_infs = [int(count) for count in result[:7]]
+        self.min, self.max = result[7], result[8]
+        self.nfinite, self.finite_mean, self._m2 = result[9], result[10], result[11]
+
+        # The calculated quantiles, and the partitioned non-NaN values
+        self._quantiles = dict()
+        self._partitioned = None
+
+    # -----------------------------------------------------------------
+
+    @property
+    def nvalues(self):
+
+        """
+        This function returns the number of values that are not NaN
+        :return:
+        """
+
+        return self.npixels - self.nnans
+
+    # -----------------------------------------------------------------
+
+    @property
+    def nnonzeroes(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.npixels - self.nzeroes
+
+    # -----------------------------------------------------------------
+
+    @property
+    def finite_sum(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.finite_mean * self.nfinite
+
+    # -----------------------------------------------------------------
+
+    @property
+    def sum(self):
+
+        """
+        This function returns the sum of the values that are not NaN (like numpy.nansum)
+        :return:
+        """
+
+        if self.npositive_infs > 0 and self.nnegative_infs > 0: return np.nan
+        elif self.npositive_infs > 0: return np.inf
+        elif self.nnegative_infs > 0: return -np.inf
+        else: return self.finite_sum
+
+    # -----------------------------------------------------------------
+
+    @property
+    def mean(self):
+
+        """
+        This function returns the mean of the values that are not NaN (like numpy.nanmean)
+        :return:
+        """
+
+        if self.nvalues == 0: return np.nan
+        return self.sum / self.nvalues
+
+    # -----------------------------------------------------------------
+
+    @property
+    def finite_stddev(self):
+
+        """
+        This function returns the (population) standard deviation of the finite values
+        :return:
+        """
+
+        if self.nfinite == 0: return np.nan
+        return np.sqrt(self._m2 / self.nfinite)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def stddev(self):
+
+        """
+        This function returns the standard deviation of the values that are not NaN (like numpy.nanstd)
+        :return:
+        """
+
+        if self.ninfs > 0: return np.nan
+        return self.finite_stddev
+
+    # -----------------------------------------------------------------
+
+    def quantiles(self, fractions):
+
+        """
+        This function returns quantiles of the values that are not NaN, with linear interpolation (like
+        numpy.nanpercentile). The values are partitioned once for all quantiles that were not calculated before.
+        :param fractions: the quantiles, between 0 and 1
+        :return: list of the values
+        """
+
+        # Determine the quantiles that have to be calculated
+        new = [fraction for fraction in fractions if fraction not in self._quantiles]
+        if len(new) > 0:
+
+            # No values
+            if self.nvalues == 0:
+                for fraction in new: self._quantiles[fraction] = np.nan
+
+            else:
+
+                # Get the non-NaN values
+                if self._partitioned is None: self._partitioned = np.ravel(self.data)[~self.nans.reshape(-1)].astype(np.float64)
+
+                # Partition around the indices of the neighbouring values
+                positions = [fraction * (self.nvalues - 1) for fraction in new]
+                indices = sorted(set([int(np.floor(position)) for position in positions] + [int(np.ceil(position)) for position in positions]))
+                self._partitioned.partition(indices)
+
+                # Interpolate
+                for fraction, position in zip(new, positions):
+                    lower = self._partitioned[int(np.floor(position))]
+                    upper = self._partitioned[int(np.ceil(position))]
+                    weight = position - np.floor(position)
+                    self._quantiles[fraction] = lower + weight * (upper - lower) if weight > 0 else lower
+
+        # Return the quantiles
+        return [self._quantiles[fraction] for fraction in fractions]
+
+    # -----------------------------------------------------------------
+
+    def quantile(self, fraction):
+
+        """
+        This function ...
+        :param fraction:
+        :return:
+        """
+
+        return self.quantiles([fraction])[0]
+
+    # -----------------------------------------------------------------
+
+    @property
+    def median(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.quantile(0.5)
+
+# -----------------------------------------------------------------
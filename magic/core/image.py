@@ -14,6 +14,7 @@ from __future__ import absolute_import, division, print_function
 
 # Import standard modules
 import copy
+from collections import OrderedDict
 
 # Import astronomical modules
 from astropy.io.fits import Header
@@ -111,6 +112,37 @@ class Image(object):
 
     # -----------------------------------------------------------------
 
+    @classmethod
+    def iterate_from_file(cls, path, ptype="frame", always_call_first_primary=True, hdulist_index=0, no_filter=False,
+                          density=False, brightness=False, density_strict=False, brightness_strict=False):
+
+        """
+        This function yields the planes of the image in a FITS file one by one, without loading the other planes.
+        The data of the planes are (copy-on-write) views of the memory-mapped file.
+        :param path:
+        :param ptype: 'frame', 'mask', 'segments' or None for all planes
+        :param always_call_first_primary:
+        :param hdulist_index:
+        :param no_filter:
+        :param density:
+        :param brightness:
+        :param density_strict:
+        :param brightness_strict:
+        :return:
+        """
+
+        from .fits import FITSImageHandle
+
+        # Open the image lazily, don't keep the planes that have been yielded
+        with FITSImageHandle(path, hdulist_index=hdulist_index, always_call_first_primary=always_call_first_primary,
+                             no_filter=no_filter, density=density, brightness=brightness, density_strict=density_strict,
+                             brightness_strict=brightness_strict, memoize=False) as handle:
+
+            # Loop over the planes
+            for name, _, plane in handle.iterate_planes(ptype=ptype): yield name, plane
+
+    # -----------------------------------------------------------------
+
     def load_image(self, image, replace=True):
 
         """
@@ -865,6 +897,19 @@ class Image(object):
 
     # -----------------------------------------------------------------
 
+    @property
+    def statistics(self):
+
+        """
+        This function returns the statistics of each frame (calculated in one pass over each frame, and kept by the
+        frames until they are changed)
+        :return:
+        """
+
+        return OrderedDict((frame_name, self.frames[frame_name].statistics) for frame_name in self.frames)
+
+    # -----------------------------------------------------------------
+
     def save(self):
 
         """
@@ -1352,13 +1397,14 @@ class Image(object):
 
     # -----------------------------------------------------------------
 
-    def rebin(self, reference_wcs, exact=False, parallel=True):
+    def rebin(self, reference_wcs, exact=False, parallel=True, engine=None):
 
         """
         This function ...
         :param reference_wcs:
         :param exact:
         :param parallel:
+        :param engine: the reprojection engine (for interpolation, all frames share the same mapping)
         """
 
         # Check whether the image has a WCS
@@ -1369,6 +1415,11 @@ class Image(object):
 
         footprint = None
 
+        # Create the reprojection engine
+        if engine is None and not exact:
+            from ..tools.reprojection import ReprojectionEngine
+            engine = ReprojectionEngine()
+
         # Loop over all currently selected frames
         for frame_name in self.frames:
 
@@ -1376,7 +1427,7 @@ class Image(object):
             log.debug("Rebinning the '" + frame_name + "' frame ...")
 
             # Rebin this frame (the reference wcs is automatically set in the new frame)
-            footprint = self.frames[frame_name].rebin(reference_wcs, exact=exact, parallel=parallel)
+            footprint = self.frames[frame_name].rebin(reference_wcs, exact=exact, parallel=parallel, engine=engine)
 
         # Loop over the masks
         for mask_name in self.masks:
@@ -38,6 +38,7 @@ from ...core.remote.remote import load_remote
 from ...core.tools import introspection
 from ...core.tools import time
 from ...core.tools.stringify import tostr
+from ..tools.reprojection import ReprojectionEngine
 
 # -----------------------------------------------------------------
 
@@ -2646,8 +2647,14 @@ def convolve_rebin_and_convert(*frames, **kwargs):
     :return: 
     """
 
+    # Get the reprojection settings (reuse rebinned frames from previous runs by default)
+    rebin_kwargs = kwargs.copy()
+    rebin_kwargs["engine"] = kwargs.pop("engine", None)
+    rebin_kwargs["cache_rebinned"] = kwargs.pop("cache_rebinned", True)
+    rebin_kwargs["nprocesses"] = kwargs.pop("nprocesses", 1)
+
     # First rebin
-    frames = rebin_to_highest_pixelscale(*frames, **kwargs)
+    frames = rebin_to_highest_pixelscale(*frames, **rebin_kwargs)
 
     # Then convolve
     frames = convolve_to_highest_fwhm(*frames, **kwargs)
@@ -2805,6 +2812,11 @@ def rebin_to_highest_pixelscale(*frames, **kwargs):
     # Ignore?
     ignore = kwargs.pop("ignore", None)
 
+    # Reprojection
+    engine = kwargs.pop("engine", None)
+    cache_rebinned = kwargs.pop("cache_rebinned", False)
+    nprocesses = kwargs.pop("nprocesses", 1)
+
     # Check
     if len(frames) == 1:
 
@@ -2850,7 +2862,8 @@ def rebin_to_highest_pixelscale(*frames, **kwargs):
     # Rebin
     return rebin_to_pixelscale(*frames, names=names, pixelscale=highest_pixelscale, wcs=highest_pixelscale_wcs,
                                remote=remote, rebin_remote_threshold=rebin_remote_threshold, in_place=in_place,
-                               unitless=unitless, ignore=ignore)
+                               unitless=unitless, ignore=ignore, engine=engine, cache_rebinned=cache_rebinned,
+                               nprocesses=nprocesses)
 
 # -----------------------------------------------------------------
 
@@ -3047,6 +3060,11 @@ def rebin_to_pixelscale_local(*frames, **kwargs):
     # Ignore?
     ignore = kwargs.pop("ignore", None)
 
+    # The reprojection engine
+    engine = kwargs.pop("engine", None)
+    cache_rebinned = kwargs.pop("cache_rebinned", False)
+    nprocesses = kwargs.pop("nprocesses", 1)
+
     if rebin_remote_threshold is not None and remote is None:
         log.warning("'rebin_remote_threshold' is defined but 'remote' is not specified: rebinning locally ...")
         rebin_remote_threshold = None
@@ -3068,6 +3086,19 @@ def rebin_to_pixelscale_local(*frames, **kwargs):
     if session is not None and in_place:
         raise ValueError("in_place cannot be enabled when there are frames to be rebinned remotely")
 
+    # Create the reprojection engine
+    if engine is None: engine = ReprojectionEngine(cache_results=cache_rebinned, nprocesses=nprocesses)
+
+    # Compute the mappings for all coordinate systems of the frames that are rebinned locally at once
+    local_systems = []
+    for index, frame in enumerate(frames):
+        name = names[index] if names is not None else ""
+        if ignore is not None and name in ignore: continue
+        if not isinstance(frame, Frame) or frame.wcs is None or frame.wcs == highest_pixelscale_wcs: continue
+        if rebin_remote_threshold is not None and frame.data_size > rebin_remote_threshold: continue
+        local_systems.append(frame.wcs)
+    engine.prepare(local_systems, highest_pixelscale_wcs)
+
     # Initialize list for rebinned frames
     if in_place: new_frames = None
     else: new_frames = []
@@ -3119,16 +3150,19 @@ def rebin_to_pixelscale_local(*frames, **kwargs):
             if unitless is not None: unitless_frame = name in unitless
             else: unitless_frame = False
 
+            # Only frames can be rebinned with the reprojection engine
+            frame_engine = engine if isinstance(frame, Frame) else None
+
             # In place?
             if in_place: rebin_frame(name, frame, highest_pixelscale_wcs, rebin_remote_threshold=rebin_remote_threshold,
-                                     session=session, in_place=True, unitless=unitless_frame)
+                                     session=session, in_place=True, unitless=unitless_frame, engine=frame_engine)
 
             # New frames
             else:
 
                 # Create rebinned frame
                 rebinned = rebin_frame(name, frame, highest_pixelscale_wcs, rebin_remote_threshold=rebin_remote_threshold,
-                                       session=session, unitless=unitless_frame)
+                                       session=session, unitless=unitless_frame, engine=frame_engine)
 
                 # Set the name
                 if names is not None: rebinned.name = names[index]
@@ -3144,7 +3178,7 @@ def rebin_to_pixelscale_local(*frames, **kwargs):
 
 # -----------------------------------------------------------------
 
-def rebin_frame(name, frame, wcs, rebin_remote_threshold=None, session=None, in_place=False, unitless=False):
+def rebin_frame(name, frame, wcs, rebin_remote_threshold=None, session=None, in_place=False, unitless=False, engine=None):
 
     """
     This function ...
@@ -3155,6 +3189,7 @@ def rebin_frame(name, frame, wcs, rebin_remote_threshold=None, session=None, in_
     :param session:
     :param in_place:
     :param unitless:
+    :param engine: reprojection engine for local rebinning
     :return:
     """
 
@@ -3199,10 +3234,13 @@ def rebin_frame(name, frame, wcs, rebin_remote_threshold=None, session=None, in_
         # Debugging
         log.debug("Rebinning frame locally ...")
 
+        # Pass the reprojection engine (only set for frames)
+        rebin_kwargs = dict(engine=engine) if engine is not None else dict()
+
         if in_place:
-            frame.rebin(wcs)
+            frame.rebin(wcs, **rebin_kwargs)
             rebinned = None
-        else: rebinned = frame.rebinned(wcs)
+        else: rebinned = frame.rebinned(wcs, **rebin_kwargs)
 
     # IF THERE WAS AN ORIGINAL UNIT
     if original_unit is not None:
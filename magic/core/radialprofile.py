@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.core.radialprofile Contains the RadialBins class, which computes radial profiles (per-bin sums,
+#  means, signal-to-noise ratios, masked fractions and curves of growth) of images in elliptical annuli.
+#
+# The bin of each pixel is determined only once (with np.digitize on the elliptical distance frame), after which all
+# profiles are obtained in a single pass over the pixels with np.bincount. Images that share a coordinate system can
+# share the same RadialBins instance.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+from multiprocessing import Pool
+
+# Import the relevant PTS classes and modules
+from ..dist_ellipse import distance_ellipse
+from ...core.basics.map import Map
+
+# -----------------------------------------------------------------
+
+measures = ["sum", "mean", "median", "min", "max"]
+
+# -----------------------------------------------------------------
+
+class RadialBins(object):
+
+    """
+    This class divides the pixels of an image in elliptical annuli of equal width. The annuli are [min + i * step,
+    min + (i+1) * step[, for all i for which the inner radius does not exceed the maximum distance. Each annulus is
+    split in two halves internally, so that also cumulative quantities up to the center radius of each annulus can be
+    obtained from the same bin indices.
+    """
+
+    def __init__(self, distances, nbins, min_distance=None, max_distance=None, right=False):
+
+        """
+        The constructor ...
+        :param distances: the frame of the (elliptical) distances of the pixels to the center
+        :param nbins: the number of bins between the minimum and maximum distance
+        :param min_distance: the minimum distance (the minimal pixel distance if None)
+        :param max_distance: the maximum distance (the maximal pixel distance if None)
+        :param right: include the outer radius in each annulus instead of the inner radius
+        """
+
+        distances = np.asarray(distances, dtype=float)
+
+        # The shape of the images
+        self.shape = distances.shape
+
+        # The range of distances
+        self.min_distance = np.min(distances) if min_distance is None else min_distance
+        self.max_distance = np.max(distances) if max_distance is None else max_distance
+        self.step = (self.max_distance - self.min_distance) / float(nbins)
+
+        # The inner radii of the annuli
+        lower = self.min_distance + self.step * np.arange(nbins + 2)
+        self.lower = lower[lower <= self.max_distance]
+        self.nbins = len(self.lower)
+
+        # Determine the half bin of each pixel: index 0 is for the pixels within the minimum distance, index
+        # 2 * nbins + 1 is for the pixels beyond the last annulus
+        edges = self.min_distance + 0.5 * self.step * np.arange(2 * self.nbins + 1)
+        self.indices = np.digitize(distances.ravel(), edges, right=right)
+
+        # The number of pixels in each half bin
+        self.half_counts = self.half_bincount()
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def from_ellipse(cls, shape, center, ratio, angle, nbins, min_distance=None, max_distance=None):
+
+        """
+        This function ...
+        :param shape: the shape of the images
+        :param center: the center (pixel coordinate)
+        :param ratio: the ratio of the semiminor and semimajor axis
+        :param angle: the angle (quantity)
+        :param nbins:
+        :param min_distance:
+        :param max_distance:
+        :return:
+        """
+
+        return cls(distance_ellipse(shape, center, ratio, angle), nbins, min_distance=min_distance, max_distance=max_distance)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def upper(self):
+
+        """
+        This function returns the outer radii of the annuli
+        :return:
+        """
+
+        return self.lower + self.step
+
+    # -----------------------------------------------------------------
+
+    @property
+    def radii(self):
+
+        """
+        This function returns the center radii of the annuli
+        :return:
+        """
+
+        return self.lower + 0.5 * self.step
+
+    # -----------------------------------------------------------------
+
+    @property
+    def nhalf(self):
+
+        """
+        This function returns the number of half bins (including the bins below and beyond the annuli)
+        :return:
+        """
+
+        return 2 * self.nbins + 2
+
+    # -----------------------------------------------------------------
+
+    def half_bincount(self, values=None, where=None):
+
+        """
+        This function sums the values of the pixels in each half bin
+        :param values: the pixel values (the number of pixels is counted if None)
+        :param where: a mask of the pixels to take into account (all pixels if None)
+        :return:
+        """
+
+        indices = self.indices
+        if values is not None: values = np.asarray(values, dtype=float).ravel()
+        if where is not None:
+            where = np.asarray(where, dtype=bool).ravel()
+            indices = indices[where]
+            if values is not None: values = values[where]
+        return np.bincount(indices, weights=values, minlength=self.nhalf)
+
+    # -----------------------------------------------------------------
+
+    def annulus(self, index):
+
+        """
+        This function returns the mask of the pixels in an annulus
+        :param index:
+        :return:
+        """
+
+        return ((self.indices == 2 * index + 1) | (self.indices == 2 * index + 2)).reshape(self.shape)
+
+    # -----------------------------------------------------------------
+
+    def aperture(self, index):
+
+        """
+        This function returns the mask of the pixels within the outer radius of an annulus
+        :param index:
+        :return:
+        """
+
+        return (self.indices <= 2 * index + 2).reshape(self.shape)
+
+    # -----------------------------------------------------------------
+
+    def to_bins(self, half_values):
+
+        """
+        This function combines the values for the half bins into the values for the annuli
+        :param half_values:
+        :return:
+        """
+
+        return half_values[1:-1].reshape(self.nbins, 2).sum(axis=1)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def counts(self):
+
+        """
+        This function returns the number of pixels in each annulus
+        :return:
+        """
+
+        return self.to_bins(self.half_counts)
+
+    # -----------------------------------------------------------------
+
+    def sums(self, values, where=None):
+
+        """
+        This function returns the sum of the values in each annulus (NaN values propagate)
+        :param values:
+        :param where:
+        :return:
+        """
+
+        return self.to_bins(self.half_bincount(values, where=where))
+
+    # -----------------------------------------------------------------
+
+    def nansums(self, values):
+
+        """
+        This function returns the sum of the values in each annulus, ignoring NaN values
+        :param values:
+        :return:
+        """
+
+        return self.sums(values, where=np.isfinite(values))
+
+    # -----------------------------------------------------------------
+
+    def means(self, values):
+
+        """
+        This function returns the mean value in each annulus (NaN for empty annuli)
+        :param values:
+        :return:
+        """
+
+        with np.errstate(divide="ignore", invalid="ignore"): return self.sums(values) / self.counts
+
+    # -----------------------------------------------------------------
+
+    def nanmeans(self, values):
+
+        """
+        This function returns the mean value in each annulus, ignoring NaN values
+        :param values:
+        :return:
+        """
+
+        valid = np.isfinite(values)
+        with np.errstate(divide="ignore", invalid="ignore"): return self.sums(values, where=valid) / self.to_bins(self.half_bincount(where=valid))
+
+    # -----------------------------------------------------------------
+
+    def signal_to_noise(self, data, errors):
+
+        """
+        This function returns the mean signal-to-noise ratio of the pixels in each annulus
+        :param data:
+        :param errors:
+        :return:
+        """
+
+        with np.errstate(divide="ignore", invalid="ignore"): return self.means(np.asarray(data) / np.asarray(errors))
+
+    # -----------------------------------------------------------------
+
+    def masked_fractions(self, mask):
+
+        """
+        This function returns, for each annulus, the fraction of the pixels within its center radius that are masked
+        :param mask:
+        :return:
+        """
+
+        # The number of pixels (masked and total) below the center radius of each annulus
+        nmasked = np.cumsum(self.half_bincount(where=mask))[1:-1:2]
+        ntotal = np.cumsum(self.half_counts)[1:-1:2]
+
+        # Return the fractions
+        with np.errstate(divide="ignore", invalid="ignore"): return nmasked / ntotal
+
+    # -----------------------------------------------------------------
+
+    def curve_of_growth(self, values):
+
+        """
+        This function returns the sum of the (finite) values within the outer radius of each annulus
+        :param values:
+        :return:
+        """
+
+        half_sums = self.half_bincount(values, where=np.isfinite(values))
+        return half_sums[0] + np.cumsum(self.to_bins(half_sums))
+
+    # -----------------------------------------------------------------
+
+    def reduce(self, values, measure):
+
+        """
+        This function returns a measure of the (finite) values in each annulus
+        :param values:
+        :param measure: sum, mean, median, min or max
+        :return:
+        """
+
+        if measure == "sum": return self.nansums(values)
+        elif measure == "mean": return self.nanmeans(values)
+        elif measure not in measures: raise ValueError("Invalid value for 'measure': " + measure)
+
+        # Sort the finite values by annulus
+        values = np.asarray(values, dtype=float).ravel()
+        valid = np.isfinite(values) & (self.indices > 0) & (self.indices < self.nhalf - 1)
+        bins = (self.indices[valid] - 1) // 2
+        order = np.argsort(bins, kind="mergesort")
+        bins = bins[order]
+        values = values[valid][order]
+        starts = np.searchsorted(bins, np.arange(self.nbins))
+        nonempty = np.bincount(bins, minlength=self.nbins) > 0
+
+        # Reduce
+        result = np.full(self.nbins, np.nan)
+        if measure == "median": result[nonempty] = [np.median(group) for group in np.split(values, starts[1:]) if len(group) > 0]
+        elif measure == "min": result[nonempty] = np.minimum.reduceat(values, starts[nonempty])
+        else: result[nonempty] = np.maximum.reduceat(values, starts[nonempty])
+        return result
+
+# -----------------------------------------------------------------
+
+def truncation_statistics(bins, data, errors, mask=None):
+
+    """
+    This function returns the radii, the signal-to-noise ratios and the masked fractions, as used for the truncation
+    :param bins: RadialBins instance
+    :param data:
+    :param errors:
+    :param mask:
+    :return:
+    """
+
+    statistics = Map()
+    statistics.radii = list(bins.radii)
+    statistics.snr = list(bins.signal_to_noise(data, errors))
+    statistics.nmasked = list(bins.masked_fractions(mask)) if mask is not None else [0.0] * bins.nbins
+    return statistics
+
+# -----------------------------------------------------------------
+
+# The radial bins of the images, shared by the processes of a pool
+_shared_bins = None
+
+# -----------------------------------------------------------------
+
+def _set_shared_bins(bins):
+
+    """
+    This function sets the radial bins in a process of the pool
+    :param bins:
+    :return:
+    """
+
+    global _shared_bins
+    _shared_bins = bins
+
+# -----------------------------------------------------------------
+
+def _truncation_statistics(arguments):
+
+    """
+    This function ...
+    :param arguments:
+    :return:
+    """
+
+    index, data, errors, mask = arguments
+    return truncation_statistics(_shared_bins[index], data, errors, mask)
+
+# -----------------------------------------------------------------
+
+def truncation_statistics_for_images(arguments, nprocesses=1):
+
+    """
+    This function calculates the truncation statistics for a number of images, in parallel if requested. The
+    different radial bins are passed to the processes once, when the pool is created, instead of with every image.
+    :param arguments: list of (bins, data, errors, mask) tuples
+    :param nprocesses:
+    :return: list of statistics
+    """
+
+    if nprocesses > 1 and len(arguments) > 1:
+
+        # Replace the bins by their index in the list of different bins
+        bins = []
+        indices = dict()
+        tasks = []
+        for image_bins, data, errors, mask in arguments:
+            if id(image_bins) not in indices:
+                indices[id(image_bins)] = len(bins)
+                bins.append(image_bins)
+            tasks.append((indices[id(image_bins)], data, errors, mask))
+
+        # Calculate
+        pool = Pool(processes=min(nprocesses, len(arguments)), initializer=_set_shared_bins, initargs=(bins,))
+        try: return pool.map(_truncation_statistics, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+    else: return [truncation_statistics(*args) for args in arguments]
+
+# -----------------------------------------------------------------
@@ -2206,7 +2206,7 @@ class RemoteDataCube(RemoteImage):
 
     # -----------------------------------------------------------------
 
-    def frames_for_filters(self, filters, convolve=False, nprocesses=8, check_previous_sessions=False):
+    def frames_for_filters(self, filters, convolve=False, nprocesses=8, check_previous_sessions=False, use_store=False):
 
         """
         This function ...
@@ -2214,6 +2214,7 @@ class RemoteDataCube(RemoteImage):
         :param convolve:
         :param nprocesses:
         :param check_previous_sessions:
+        :param use_store: reuse (and store) the convolved frames from the filter convolution store on the remote host
         :return:
         """
 
@@ -2261,7 +2262,7 @@ class RemoteDataCube(RemoteImage):
         if len(for_convolution) > 0:
             # Debugging
             log.debug(str(len(for_convolution)) + " filters require spectral convolution")
-            convolved_frames = self.convolve_with_filters(for_convolution, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions)
+            convolved_frames = self.convolve_with_filters(for_convolution, nprocesses=nprocesses, check_previous_sessions=check_previous_sessions, use_store=use_store)
         else:
             # Debugging
             log.debug("Spectral convolution will be used for none of the filters")
@@ -2279,13 +2280,15 @@ class RemoteDataCube(RemoteImage):
 
     # -----------------------------------------------------------------
 
-    def convolve_with_filters(self, filters, nprocesses=8, check_previous_sessions=False):
+    def convolve_with_filters(self, filters, nprocesses=8, check_previous_sessions=False, use_store=False):
 
         """
         This function ...
         :param filters:
         :param nprocesses:
         :param check_previous_sessions:
+        :param use_store: reuse (and store) the convolved frames from the filter convolution store on the remote host
+        (see DataCube.convolve_with_filters)
         :return:
         """
 
@@ -2299,7 +2302,7 @@ class RemoteDataCube(RemoteImage):
         remoteframes = []
 
         # Do the convolution remotely
-        self.session.send_line_and_raise("filterconvolvedframes = " + self.label + ".convolve_with_filters(filters, nprocesses=" + str(nprocesses) + ", check_previous_sessions=" + str(check_previous_sessions) + ")", timeout=None, show_output=True)
+        self.session.send_line_and_raise("filterconvolvedframes = " + self.label + ".convolve_with_filters(filters, nprocesses=" + str(nprocesses) + ", check_previous_sessions=" + str(check_previous_sessions) + ", use_store=" + str(use_store) + ")", timeout=None, show_output=True)
 
         # Create a remoteframe pointing to each of the frames in 'filterconvolvedframes'
         last_label = None
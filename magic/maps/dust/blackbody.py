@@ -248,12 +248,12 @@ class BlackBodyDustMapsMaker(Configurable):
         pixels_y, pixels_x = np.where(truncation_mask)
         npixels = pixels_x.size
 
+        # Get the FIR-submm SEDs for all pixels
+        seds = self.datacube.pixel_seds(pixels_x, pixels_y, errorcube=self.errorcube)
+
         # Loop over all pixels
         for index in range(npixels):
 
-            # Debugging
-            log.debug("Generating SED for pixel " + str(index + 1) + " of " + str(npixels) + " ...")
-
             # Get x and y index of the pixel
             x = pixels_x[index]
             y = pixels_y[index]
@@ -261,8 +261,8 @@ class BlackBodyDustMapsMaker(Configurable):
             # Create the pixel ID
             pixel = Pixel(x, y)
 
-            # Get the FIR-submm SED for this pixel
-            sed = self.datacube.pixel_sed(x, y, errorcube=self.errorcube)
+            # Get the SED for this pixel
+            sed = seds[index]
 
             # Check values
             if np.any(sed.photometry(asarray=True) < 0): continue
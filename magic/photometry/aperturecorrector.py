@@ -12,8 +12,6 @@ from __future__ import absolute_import, division, print_function
 
 # Import standard modules
 import numpy as np
-import lmfit
-import time
 
 # Import astronomical modules
 import astropy.convolution
@@ -24,6 +22,8 @@ import astropy.modeling
 # Import the relevant PTS classes and modules
 from ...core.basics.configurable import Configurable
 from ..misc import chrisfuncs
+from ..core.radialprofile import RadialBins
+from .sersicfitter import SersicFitter
 
 # -----------------------------------------------------------------
 
@@ -142,61 +142,16 @@ class ApertureCorrector(Configurable):
         initial_sersic_ellip = (self.config.axial_ratio - 1.0) / self.config.axial_ratio
         initial_sersic_theta = np.deg2rad(self.config.angle)
 
-        # Produce sersic model from guess parameters, for time trials
-        sersic_x, sersic_y = np.meshgrid(np.arange(cutout.shape[1]), np.arange(cutout.shape[0]))
-        sersic_model = astropy.modeling.models.Sersic2D(amplitude=initial_sersic_amplitude, r_eff=initial_sersic_r_eff,
-                                                        n=initial_sersic_n, x_0=initial_sersic_x_0,
-                                                        y_0=initial_sersic_y_0, ellip=initial_sersic_ellip,
-                                                        theta=initial_sersic_theta)
-        sersic_map = sersic_model(sersic_x, sersic_y)
-
-        # Make sure that PSF array is smaller than sersic model array (as required for convolution); if not, remove its edges such that it is
-        if psf.shape[0] > sersic_map.shape[0] or psf.shape[1] > sersic_map.shape[1]:
-            excess = max(psf.shape[0] - sersic_map.shape[0], psf.shape[1] - sersic_map.shape[1])
-            border = max(2, int(np.round(np.ceil(float(excess) / 2.0) - 1.0)))
-            psf = psf[border:, border:]
-            psf = psf[:-border, :-border]
-
-        # Determine whether FFT convolution or direct convolution is faster for this kernel,
-        # using sersic model produced with guess parameters
-        time_fft = time.time()
-        conv_map = astropy.convolution.convolve_fft(sersic_map, psf, normalize_kernel=True)
-        time_fft = time.time() - time_fft
-        time_direct = time.time()
-        conv_map = astropy.convolution.convolve(sersic_map, psf, normalize_kernel=True)
-        time_direct = time.time() - time_direct
-
-        if time_fft < time_direct: use_fft = True
-        else: use_fft = False
-
-        # Set up parameters to fit galaxy with 2-dimensional sersic profile
-        params = lmfit.Parameters()
-        params.add('sersic_amplitide', value=initial_sersic_amplitude, vary=True)
-        params.add('sersic_r_eff', value=initial_sersic_r_eff, vary=True, min=0.0, max=self.config.semimaj_pix)
-        params.add('sersic_n', value=initial_sersic_n, vary=True, min=0.1, max=10)
-        params.add('sersic_x_0', value=initial_sersic_x_0, vary=False)
-        params.add('sersic_y_0', value=initial_sersic_y_0, vary=False)
-        params.add('sersic_ellip', value=initial_sersic_ellip, vary=True, min=0.5 * initial_sersic_ellip, max=0.5 * (1.0 - initial_sersic_ellip) + initial_sersic_ellip)
-        params.add('sersic_theta', value=initial_sersic_theta, vary=False)
-
-        # Solve with LMfit to find parameters of best-fit sersic profile
-        result = lmfit.minimize(chi_squared_sersic, params, args=(cutout, psf, mask, use_fft), method='leastsq', ftol=1E-5, xtol=1E-5, maxfev=200)
-
-        # Extract best-fit results
-        sersic_amplitide = result.params['sersic_amplitide'].value
-        sersic_r_eff = result.params['sersic_r_eff'].value
-        sersic_n = result.params['sersic_n'].value
-        sersic_x_0 = result.params['sersic_x_0'].value
-        sersic_y_0 = result.params['sersic_y_0'].value
-        sersic_ellip = result.params['sersic_ellip'].value
-        sersic_theta = result.params['sersic_theta'].value
+        # Create the fitter: the coordinate grid, the PSF transform and the fitted pixels are prepared only once
+        fitter = SersicFitter(cutout, psf, mask)
 
-        # Construct underlying sersic map and convolved sersic map, using best-fit parameters
-        sersic_model = astropy.modeling.models.Sersic2D(amplitude=sersic_amplitide, r_eff=sersic_r_eff, n=sersic_n, x_0=sersic_x_0, y_0=sersic_y_0, ellip=sersic_ellip, theta=sersic_theta)
-        sersic_map = sersic_model(sersic_x, sersic_y)
+        # Fit the convolved sersic profile
+        best = fitter.fit(initial_sersic_amplitude, initial_sersic_r_eff, initial_sersic_n, initial_sersic_x_0,
+                          initial_sersic_y_0, initial_sersic_ellip, initial_sersic_theta, max_r_eff=self.config.semimaj_pix)
 
-        if use_fft: conv_map = astropy.convolution.convolve_fft(sersic_map, psf, normalize_kernel=True)
-        else: conv_map = astropy.convolution.convolve(sersic_map, psf, normalize_kernel=True)
+        # Construct underlying sersic map and convolved sersic map, using best-fit parameters
+        sersic_map = fitter.model(**best)
+        conv_map = fitter.convolve(sersic_map)
 
         # Determine annulus properties before proceeding with photometry
         # bg_inner_semimaj_pix = input_dict['semimaj_pix'] * input_dict['annulus_inner'] # number of pixels of semimajor axis of inner annulus ellipse
@@ -209,10 +164,17 @@ class ApertureCorrector(Configurable):
         centre_i_annulus = self.config.annulus_centre_i
         centre_j_annulus = self.config.annulus_centre_j
 
+        # Determine the pixels in the source aperture and the background annulus once, for both maps
+        if self.config.subpixel_factor == 1.0:
+            aperture_distances = ellipse_distances(cutout.shape, self.config.axial_ratio, self.config.angle, self.config.centre_i, self.config.centre_j)
+            annulus_distances = ellipse_distances(cutout.shape, axial_ratio_annulus, angle_annulus, centre_i_annulus, centre_j_annulus)
+            aperture_bins = RadialBins(aperture_distances, 1, min_distance=0.0, max_distance=self.config.semimaj_pix, right=True)
+            annulus_bins = RadialBins(annulus_distances, 1, min_distance=bg_inner_semimaj_pix, max_distance=bg_inner_semimaj_pix + bg_width, right=True)
+
         # Evaluate pixels in source aperture and background annulus in UNCONVOLVED sersic map
         if self.config.subpixel_factor == 1.0:
-            sersic_ap_calc = chrisfuncs.EllipseSum(sersic_map, self.config.semimaj_pix, self.config.axial_ratio, self.config.angle, self.config.centre_i, self.config.centre_j)
-            sersic_bg_calc = chrisfuncs.AnnulusSum(sersic_map, bg_inner_semimaj_pix, bg_width, axial_ratio_annulus, angle_annulus, centre_i_annulus, centre_j_annulus)
+            sersic_ap_calc = pixels_in(sersic_map, aperture_bins.aperture(0))
+            sersic_bg_calc = pixels_in(sersic_map, annulus_bins.annulus(0))
         elif self.config.subpixel_factor > 1.0:
             sersic_ap_calc = chrisfuncs.EllipseSumUpscale(sersic_map, self.config.semimaj_pix, self.config.axial_ratio, self.config.angle, self.config.centre_i, self.config.centre_j, upscale=self.config.subpixel_factor)
             sersic_bg_calc = chrisfuncs.AnnulusSumUpscale(sersic_map, bg_inner_semimaj_pix, bg_width, axial_ratio_annulus, angle_annulus, centre_i_annulus, centre_j_annulus, upscale=self.config.subpixel_factor)
@@ -225,8 +187,8 @@ class ApertureCorrector(Configurable):
 
         # Evaluate pixels in source aperture and background annulus in CONVOLVED sersic map
         if self.config.subpixel_factor == 1.0:
-            conv_ap_calc = chrisfuncs.EllipseSum(conv_map, self.config.semimaj_pix, self.config.axial_ratio, self.config.angle, self.config.centre_i, self.config.centre_j)
-            conv_bg_calc = chrisfuncs.AnnulusSum(conv_map, bg_inner_semimaj_pix, bg_width, axial_ratio_annulus, angle_annulus, centre_i_annulus, centre_j_annulus)
+            conv_ap_calc = pixels_in(conv_map, aperture_bins.aperture(0))
+            conv_bg_calc = pixels_in(conv_map, annulus_bins.annulus(0))
         elif self.config.subpixel_factor > 1.0:
             conv_ap_calc = chrisfuncs.EllipseSumUpscale(conv_map, self.config.semimaj_pix, self.config.axial_ratio, self.config.angle, self.config.centre_i, self.config.centre_j, upscale=self.config.subpixel_factor)
             conv_bg_calc = chrisfuncs.AnnulusSumUpscale(conv_map, bg_inner_semimaj_pix, bg_width, axial_ratio_annulus, angle_annulus, centre_i_annulus, centre_j_annulus, upscale=self.config.subpixel_factor)
@@ -248,6 +210,42 @@ class ApertureCorrector(Configurable):
 
 # -----------------------------------------------------------------
 
+def ellipse_distances(shape, axial_ratio, angle, i_centre, j_centre):
+
+    """
+    This function returns the semi-major axis of the ellipse through each pixel, for ellipses with the geometry of
+    the apertures of chrisfuncs.EllipseSum and chrisfuncs.AnnulusSum
+    :param shape: the shape of the map
+    :param axial_ratio: the ratio of the semi-major and semi-minor axis
+    :param angle: the position angle, in degrees
+    :param i_centre: the 0th-axis coordinate of the centre
+    :param j_centre: the 1st-axis coordinate of the centre
+    :return:
+    """
+
+    angle = np.radians(float(angle))
+    i_grid, j_grid = np.meshgrid(np.arange(shape[0]) - float(i_centre), np.arange(shape[1]) - float(j_centre), indexing='ij')
+    i_trans = - j_grid * np.sin(angle) + i_grid * np.cos(angle)
+    j_trans = j_grid * np.cos(angle) + i_grid * np.sin(angle)
+    return np.sqrt(j_trans**2 + (float(axial_ratio) * i_trans)**2)
+
+# -----------------------------------------------------------------
+
+def pixels_in(data, mask):
+
+    """
+    This function returns the sum, the number and the values of the pixels in a mask that are not NaN (like the
+    first three results of chrisfuncs.EllipseSum and chrisfuncs.AnnulusSum)
+    :param data:
+    :param mask:
+    :return:
+    """
+
+    values = data[mask & ~np.isnan(data)]
+    return [np.sum(values), len(values), values]
+
+# -----------------------------------------------------------------
+
 def chi_squared_sersic(params, cutout, psf, mask, use_fft, lmfit=True):
 
     """
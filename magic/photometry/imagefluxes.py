@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.photometry.imagefluxes Contains functions to calculate the aperture fluxes of images with a
+#  primary (truncated) frame, a background frame and a truncation mask, as created for the photometry.
+#
+# Only the three planes that are needed are accessed, as views of the memory-mapped FITS file. The fluxes within the
+# truncation ellipse, the total background flux and the background flux within the truncation ellipse are obtained in
+# one masked reduction over the background plane. Images are processed in parallel if requested, and the results are
+# returned as soon as they are finished so that the caller can keep them.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+from multiprocessing import Pool
+
+# Import the relevant PTS classes and modules
+from ..core.fits import open_image
+
+# -----------------------------------------------------------------
+
+def fluxes_from_planes(primary, background, truncation):
+
+    """
+    This function calculates the aperture fluxes from the planes of an image (NaN values are ignored)
+    :param primary: the primary frame (NaN outside the aperture)
+    :param background: the background frame (NaN inside the aperture)
+    :param truncation: the truncation mask (nonzero outside the truncation ellipse)
+    :return: the flux, the truncated flux (with the background within the truncation ellipse) and the asymptotic flux
+    (with all background)
+    """
+
+    # Calculate the flux
+    flux = np.nansum(primary)
+
+    # Sum the finite background values outside (index 1) and inside (index 0) the truncation ellipse
+    background = np.asarray(background).ravel()
+    background_sums = np.bincount((np.asarray(truncation) != 0).ravel(), weights=np.where(np.isfinite(background), background, 0.0), minlength=2)
+
+    # Return the fluxes
+    return flux, flux + background_sums[0], flux + background_sums[0] + background_sums[1]
+
+# -----------------------------------------------------------------
+
+def image_fluxes(path, primary="primary", background="background", truncation="truncation"):
+
+    """
+    This function calculates the aperture fluxes for an image file, reading only the necessary planes
+    :param path:
+    :param primary: the name of the primary frame
+    :param background: the name of the background frame
+    :param truncation: the name of the truncation mask
+    :return:
+    """
+
+    with open_image(path, memoize=False) as handle:
+        planes = [handle.get_data(handle.plane_index(name)) for name in (primary, background, truncation)]
+        return fluxes_from_planes(*planes)
+
+# -----------------------------------------------------------------
+
+def _image_fluxes(path):
+
+    """
+    This function ...
+    :param path:
+    :return:
+    """
+
+    return path, image_fluxes(path)
+
+# -----------------------------------------------------------------
+
+def calculate_image_fluxes(paths, nprocesses=1):
+
+    """
+    This function calculates the aperture fluxes for a number of image files, in parallel if requested. The results
+    are generated in the order in which the images are finished.
+    :param paths:
+    :param nprocesses:
+    :return: generator of (path, (flux, truncated flux, asymptotic flux)) tuples
+    """
+
+    paths = list(paths)
+    if nprocesses > 1 and len(paths) > 1:
+        pool = Pool(processes=min(nprocesses, len(paths)))
+        try:
+            for result in pool.imap_unordered(_image_fluxes, paths): yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for path in paths: yield _image_fluxes(path)
+
+# -----------------------------------------------------------------
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.photometry.sersicfitter Contains the SersicFitter class, which fits PSF-convolved 2D Sérsic
+#  profiles to galaxy cutouts.
+#
+# Everything that does not depend on the Sérsic parameters is prepared only once per cutout: the pixel coordinate
+# grid, the Fourier transform of the padded (normalized) PSF and the indices of the pixels that enter the fit.
+# The Sérsic profile is evaluated in closed form (as astropy's Sersic2D model), with the rotated coordinates cached
+# for the (fixed) center and position angle.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+from multiprocessing import Pool
+from scipy.special import gammaincinv
+
+# Import the relevant PTS classes and modules
+from ..convolution.service import KernelTransform
+
+# -----------------------------------------------------------------
+
+# The names of the parameters (as used by chi_squared_sersic)
+parameter_names = ["sersic_amplitide", "sersic_r_eff", "sersic_n", "sersic_x_0", "sersic_y_0", "sersic_ellip", "sersic_theta"]
+
+# -----------------------------------------------------------------
+
+def crop_psf(psf, shape):
+
+    """
+    This function removes the edges of the PSF if it is larger than the image (as required for convolution)
+    :param psf:
+    :param shape:
+    :return:
+    """
+
+    if psf.shape[0] > shape[0] or psf.shape[1] > shape[1]:
+        excess = max(psf.shape[0] - shape[0], psf.shape[1] - shape[1])
+        border = max(2, int(np.round(np.ceil(float(excess) / 2.0) - 1.0)))
+        psf = psf[border:, border:]
+        psf = psf[:-border, :-border]
+    return psf
+
+# -----------------------------------------------------------------
+
+class SersicFitter(object):
+
+    """
+    This class fits a 2D Sérsic profile, convolved with a PSF, to the pixels of a cutout within a mask
+    """
+
+    def __init__(self, cutout, psf, mask, nthreads=1):
+
+        """
+        The constructor ...
+        :param cutout: the image data
+        :param psf: the PSF data
+        :param mask: the mask of the pixels to fit (nonzero values)
+        :param nthreads: the number of threads for the FFTs
+        """
+
+        # The cutout
+        self.cutout = np.asarray(cutout, dtype=float)
+        self.shape = self.cutout.shape
+
+        # The PSF, and the Fourier transform of the normalized PSF
+        self.psf = crop_psf(np.asarray(psf, dtype=float), self.shape)
+        self.transform = KernelTransform(self.psf / np.sum(self.psf), self.shape, nthreads=nthreads)
+        self.nthreads = nthreads
+
+        # The pixel coordinates
+        self.y, self.x = np.indices(self.shape, dtype=float)
+
+        # The indices and values of the pixels to fit
+        self.indices = np.flatnonzero((np.asarray(mask) != 0) & np.isfinite(self.cutout))
+        self.data = self.cutout.ravel()[self.indices]
+
+        # The squared rotated coordinates, for the last center and position angle
+        self._rotated_key = None
+        self._rotated = None
+
+    # -----------------------------------------------------------------
+
+    def rotated(self, x_0, y_0, theta):
+
+        """
+        This function returns the squared coordinates along the major and minor axis
+        :param x_0:
+        :param y_0:
+        :param theta:
+        :return:
+        """
+
+        key = (x_0, y_0, theta)
+        if key != self._rotated_key:
+
+            cos_theta = np.cos(theta)
+            sin_theta = np.sin(theta)
+            x_maj = (self.x - x_0) * cos_theta + (self.y - y_0) * sin_theta
+            x_min = -(self.x - x_0) * sin_theta + (self.y - y_0) * cos_theta
+            self._rotated = (x_maj**2, x_min**2)
+            self._rotated_key = key
+
+        return self._rotated
+
+    # -----------------------------------------------------------------
+
+    def model(self, amplitude, r_eff, n, x_0, y_0, ellip, theta):
+
+        """
+        This function evaluates the (unconvolved) Sérsic profile on the pixels
+        :param amplitude: surface brightness at r_eff
+        :param r_eff: effective (half-light) radius
+        :param n: Sérsic index
+        :param x_0:
+        :param y_0:
+        :param ellip: ellipticity
+        :param theta: position angle (in radians)
+        :return:
+        """
+
+        bn = gammaincinv(2. * n, 0.5)
+        a, b = r_eff, (1 - ellip) * r_eff
+        x_maj2, x_min2 = self.rotated(x_0, y_0, theta)
+        z2 = x_maj2 / a**2 + x_min2 / b**2
+        return amplitude * np.exp(-bn * (z2 ** (0.5 / n) - 1))
+
+    # -----------------------------------------------------------------
+
+    def convolve(self, data):
+
+        """
+        This function convolves with the PSF (with zero padding beyond the borders)
+        :param data:
+        :return:
+        """
+
+        return self.transform.convolve(data, nthreads=self.nthreads)
+
+    # -----------------------------------------------------------------
+
+    def convolved_model(self, amplitude, r_eff, n, x_0, y_0, ellip, theta):
+
+        """
+        This function ...
+        :param amplitude:
+        :param r_eff:
+        :param n:
+        :param x_0:
+        :param y_0:
+        :param ellip:
+        :param theta:
+        :return:
+        """
+
+        return self.convolve(self.model(amplitude, r_eff, n, x_0, y_0, ellip, theta))
+
+    # -----------------------------------------------------------------
+
+    def residuals(self, params):
+
+        """
+        This function returns the squared residuals of the fitted pixels (as chi_squared_sersic)
+        :param params: the lmfit parameters
+        :return:
+        """
+
+        conv_map = self.convolved_model(*[params[name].value for name in parameter_names])
+        return (self.data - conv_map.ravel()[self.indices]) ** 2.0
+
+    # -----------------------------------------------------------------
+
+    def fit(self, amplitude, r_eff, n, x_0, y_0, ellip, theta, max_r_eff):
+
+        """
+        This function fits the profile, with the center and position angle fixed, starting from the specified values
+        :param amplitude:
+        :param r_eff:
+        :param n:
+        :param x_0:
+        :param y_0:
+        :param ellip:
+        :param theta:
+        :param max_r_eff: the maximum effective radius
+        :return: a dictionary with the best-fit values of amplitude, r_eff, n, x_0, y_0, ellip and theta
+        """
+
+        import lmfit
+
+        # Set up parameters to fit galaxy with 2-dimensional sersic profile
+        params = lmfit.Parameters()
+        params.add('sersic_amplitide', value=amplitude, vary=True)
+        params.add('sersic_r_eff', value=r_eff, vary=True, min=0.0, max=max_r_eff)
+        params.add('sersic_n', value=n, vary=True, min=0.1, max=10)
+        params.add('sersic_x_0', value=x_0, vary=False)
+        params.add('sersic_y_0', value=y_0, vary=False)
+        params.add('sersic_ellip', value=ellip, vary=True, min=0.5 * ellip, max=0.5 * (1.0 - ellip) + ellip)
+        params.add('sersic_theta', value=theta, vary=False)
+
+        # Solve with LMfit to find parameters of best-fit sersic profile
+        result = lmfit.minimize(self.residuals, params, method='leastsq', ftol=1E-5, xtol=1E-5, maxfev=200)
+
+        # Return the best-fit values
+        keys = ["amplitude", "r_eff", "n", "x_0", "y_0", "ellip", "theta"]
+        return dict((key, result.params[name].value) for key, name in zip(keys, parameter_names))
+
+# -----------------------------------------------------------------
+
+def fit_sersic_model(cutout, psf, mask, initial, max_r_eff):
+
+    """
+    This function fits a convolved Sérsic profile to a cutout
+    :param cutout:
+    :param psf:
+    :param mask:
+    :param initial: dictionary of the initial values (amplitude, r_eff, n, x_0, y_0, ellip, theta)
+    :param max_r_eff:
+    :return:
+    """
+
+    return SersicFitter(cutout, psf, mask).fit(max_r_eff=max_r_eff, **initial)
+
+# -----------------------------------------------------------------
+
+def _fit_sersic_model(arguments):
+
+    """
+    This function ...
+    :param arguments:
+    :return:
+    """
+
+    return fit_sersic_model(*arguments)
+
+# -----------------------------------------------------------------
+
+def fit_sersic_models(arguments, nprocesses=1):
+
+    """
+    This function fits convolved Sérsic profiles to a number of cutouts (galaxies or bands), in parallel if requested
+    :param arguments: list of (cutout, psf, mask, initial, max_r_eff) tuples
+    :param nprocesses:
+    :return: list of dictionaries with the best-fit values
+    """
+
+    if nprocesses > 1 and len(arguments) > 1:
+        pool = Pool(processes=min(nprocesses, len(arguments)))
+        try: return pool.map(_fit_sersic_model, arguments)
+        finally:
+            pool.close()
+            pool.join()
+    else: return [fit_sersic_model(*args) for args in arguments]
+
+# -----------------------------------------------------------------
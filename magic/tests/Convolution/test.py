@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+from astropy.convolution import convolve_fft
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.units.parsing import parse_unit as u
+from pts.magic.basics.pixelscale import Pixelscale
+from pts.magic.core.frame import Frame
+from pts.magic.core.kernel import ConvolutionKernel
+from pts.magic.convolution.service import ConvolutionService
+
+# -----------------------------------------------------------------
+
+description = "testing the convolution service against astropy's convolve_fft"
+
+# -----------------------------------------------------------------
+
+class ConvolutionTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(ConvolutionTest, self).__init__(*args, **kwargs)
+
+        # The arrays and kernels
+        self.arrays = []
+        self.kernels = []
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the data
+        self.create()
+
+        # 3. Compare with astropy
+        self.compare()
+
+        # 4. Test the size check
+        self.test_allow_huge()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(ConvolutionTest, self).setup(**kwargs)
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the mock frames and kernels ...")
+
+        np.random.seed(42)
+        pixelscale = Pixelscale(1.0 * u("arcsec"))
+
+        # Without NaNs
+        self.arrays.append(np.random.lognormal(size=(60, 80)))
+
+        # With NaNs, also at the edges, and an infinity
+        data = np.random.lognormal(size=(60, 80))
+        data[np.random.random(data.shape) < 0.05] = np.nan
+        data[0:5, 0:5] = np.nan
+        data[30, 79] = np.nan
+        data[20, 20] = np.inf
+        self.arrays.append(data)
+
+        # With a large NaN area (pixels without weight)
+        data = np.random.lognormal(size=(60, 80))
+        data[10:50, 10:50] = np.nan
+        self.arrays.append(data)
+
+        # The kernels
+        for fwhm in [3., 7., 3.]: self.kernels.append(ConvolutionKernel.gaussian(fwhm * u("arcsec"), pixelscale))
+
+    # -----------------------------------------------------------------
+
+    def compare(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Comparing the convolution service with astropy's convolve_fft ...")
+
+        # Convolve with the service
+        frames = [Frame(data.copy()) for data in self.arrays]
+        service = ConvolutionService(nthreads=2)
+        service.convolve_frames(frames, self.kernels, preserve_nans=False)
+
+        # Compare, including the edges
+        for index, (data, kernel, frame) in enumerate(zip(self.arrays, self.kernels, frames)):
+
+            reference = convolve_fft(data, kernel.data, boundary='fill', nan_treatment="interpolate", normalize_kernel=False, allow_huge=True)
+            np.clip(reference, np.nanmin(data), np.nanmax(data), out=reference)
+
+            difference = np.max(np.abs(frame.data - reference))
+            log.debug("Maximum difference for frame " + str(index) + ": " + repr(difference))
+            if not np.allclose(frame.data, reference, rtol=1e-6, atol=1e-8): raise RuntimeError("The convolved frame " + str(index) + " differs from astropy's result (maximum difference " + repr(difference) + ")")
+
+        # Convolve through the frame
+        frame = Frame(self.arrays[1].copy())
+        frame.convolve(self.kernels[1])
+        if not np.array_equal(np.isnan(frame.data), np.isnan(self.arrays[1])): raise RuntimeError("The NaNs are not preserved")
+
+    # -----------------------------------------------------------------
+
+    def test_allow_huge(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the size check for the FFT arrays ...")
+
+        # More than 1 GB of complex values
+        data = np.zeros((8200, 8200), dtype=np.float32)
+        data[0, 0] = 1.
+        frame = Frame(data)
+        try: frame.convolve(self.kernels[0], allow_huge=False)
+        except ValueError: return
+        raise RuntimeError("The size check for the FFT arrays is not applied")
+
+# -----------------------------------------------------------------
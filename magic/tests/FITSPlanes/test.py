@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+from astropy.io import fits
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.magic.core.frame import Frame
+from pts.magic.core.mask import Mask
+from pts.magic.core.image import Image
+
+# -----------------------------------------------------------------
+
+description = "testing the loading of FITS images with frame and mask planes, and with scaled data"
+
+# -----------------------------------------------------------------
+
+class FITSPlanesTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(FITSPlanesTest, self).__init__(*args, **kwargs)
+
+        # The data
+        self.data = None
+        self.mask_data = None
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Test an image with a mask plane
+        self.test_mask_plane()
+
+        # 3. Test scaled data
+        self.test_scaled()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(FITSPlanesTest, self).setup(**kwargs)
+
+        # Create the data
+        self.data = np.arange(20 * 30, dtype=float).reshape((20, 30))
+        self.mask_data = np.zeros((20, 30), dtype=bool)
+        self.mask_data[5:10, 10:20] = True
+
+    # -----------------------------------------------------------------
+
+    def test_mask_plane(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing an image with a frame and a mask plane ...")
+
+        # Create and save the image
+        image = Image("test")
+        image.add_frame(Frame(self.data), "primary")
+        image.add_mask(Mask(self.mask_data), "bad")
+        path = fs.join(self.path, "planes.fits")
+        image.saveto(path)
+
+        # Load the image again
+        loaded = Image.from_file(path)
+
+        # Check
+        if "primary" not in loaded.frames: raise RuntimeError("The frame plane is not loaded")
+        if "bad" not in loaded.masks: raise RuntimeError("The mask plane is not loaded under its name")
+        if not np.array_equal(np.asarray(loaded.frames["primary"]), self.data): raise RuntimeError("The data of the frame plane is wrong")
+        if not np.array_equal(np.asarray(loaded.masks["bad"]).astype(bool), self.mask_data): raise RuntimeError("The data of the mask plane is wrong")
+
+    # -----------------------------------------------------------------
+
+    def test_scaled(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing an image with scaled (BSCALE/BZERO) data ...")
+
+        # Write integer data with scaling keywords
+        path = fs.join(self.path, "scaled.fits")
+        hdu = fits.PrimaryHDU(np.arange(20 * 30, dtype=np.int16).reshape((20, 30)))
+        hdu.header["BSCALE"] = 0.5
+        hdu.header["BZERO"] = 10.
+        hdu.writeto(path)
+
+        # Load
+        frame = Frame.from_file(path, no_filter=True)
+
+        # Check
+        expected = 0.5 * np.arange(20 * 30).reshape((20, 30)) + 10.
+        if not np.allclose(np.asarray(frame), expected): raise RuntimeError("The scaled data is not loaded correctly")
+
+# -----------------------------------------------------------------
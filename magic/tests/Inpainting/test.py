@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.units.parsing import parse_unit as u
+from pts.magic.basics.pixelscale import Pixelscale
+from pts.magic.core.frame import Frame
+from pts.magic.tools import inpainting
+
+# -----------------------------------------------------------------
+
+description = "testing the inpainting of NaN holes in a smooth frame against the analytic field"
+
+# -----------------------------------------------------------------
+
+def harmonic_field(shape):
+
+    """
+    This function returns a smooth field that is harmonic, also on the pixel grid (the discrete Laplacian of the
+    polynomial is zero), so that it is reproduced by both the harmonic and the biharmonic inpainting
+    :param shape:
+    :return:
+    """
+
+    y, x = np.indices(shape, dtype=float)
+    scale = float(max(shape))
+    x = (x - 0.5 * shape[1]) / scale
+    y = (y - 0.5 * shape[0]) / scale
+    return 10. + 3. * x - 2. * y + x**2 - y**2 + 0.5 * (x**3 - 3. * x * y**2)
+
+# -----------------------------------------------------------------
+
+class InpaintingTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(InpaintingTest, self).__init__(*args, **kwargs)
+
+        # The analytic field, and the field with holes
+        self.field = None
+        self.data = None
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the field with holes
+        self.create()
+
+        # 3. Test the inpainting
+        self.test_inpaint()
+
+        # 4. Test the interpolation of the frame
+        self.test_frame()
+
+        # 5. Test the fallback to the kernel method
+        self.test_fallback()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(InpaintingTest, self).setup(**kwargs)
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the field with holes ...")
+
+        self.field = harmonic_field((100, 120))
+        self.data = self.field.copy()
+
+        # Punch discs and a rectangle of NaN values
+        y, x = np.indices(self.field.shape)
+        for x_center, y_center, radius in [(20, 30, 4), (60, 50, 8), (95, 80, 3), (40, 75, 6)]:
+            self.data[(x - x_center)**2 + (y - y_center)**2 <= radius**2] = np.nan
+        self.data[10:14, 70:90] = np.nan
+
+    # -----------------------------------------------------------------
+
+    def check(self, result, name):
+
+        """
+        This function ...
+        :param result:
+        :param name:
+        :return:
+        """
+
+        holes = np.isnan(self.data)
+
+        # The finite pixels are unchanged, the holes are filled with the analytic field
+        if not np.array_equal(result[~holes], self.data[~holes]): raise RuntimeError("The finite pixels are changed (" + name + ")")
+        if not np.all(np.isfinite(result)): raise RuntimeError("Not all NaN values are filled in (" + name + ")")
+        if not np.allclose(result[holes], self.field[holes], rtol=1e-6, atol=0): raise RuntimeError("The filled in values differ from the analytic field (" + name + ")")
+
+    # -----------------------------------------------------------------
+
+    def test_inpaint(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the inpainting ...")
+
+        for method in inpainting.methods:
+            for nprocesses in [1, 2]:
+
+                data = self.data.copy()
+                result, unsolved = inpainting.inpaint(data, method=method, nprocesses=nprocesses)
+                if np.any(unsolved): raise RuntimeError("Some NaN values are not solved (" + method + ")")
+                if not np.array_equal(np.isnan(data), np.isnan(self.data)) or not np.array_equal(data[np.isfinite(data)], self.data[np.isfinite(self.data)]): raise RuntimeError("The input data is changed (" + method + ")")
+                self.check(result, method + ", " + str(nprocesses) + " processes")
+
+        # A hole that is not bordered by any valid pixel is not solved
+        data = np.full((20, 20), np.nan)
+        result, unsolved = inpainting.inpaint(data)
+        if not np.all(unsolved) or np.any(np.isfinite(result)): raise RuntimeError("A hole without valid pixels is filled in")
+
+    # -----------------------------------------------------------------
+
+    def test_frame(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the interpolation of the frame ...")
+
+        for method in inpainting.methods:
+
+            frame = Frame(self.data.copy())
+            nans = frame.interpolate_nans(method=method)
+            if not np.array_equal(nans, np.isnan(self.data)): raise RuntimeError("The mask of the original NaN values is wrong (" + method + ")")
+            self.check(frame.data, "frame, " + method)
+
+        # The kernel settings can not be used with the other methods
+        try: Frame(self.data.copy()).interpolate_nans(sigma=2., method="biharmonic")
+        except ValueError: pass
+        else: raise RuntimeError("The sigma of the kernel is accepted for the biharmonic method")
+
+    # -----------------------------------------------------------------
+
+    def test_fallback(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the fallback to the kernel method ...")
+
+        # The reference: interpolation with the kernel (the sigma of the kernel follows from the FWHM)
+        reference = Frame(self.data.copy(), fwhm=3. * u("arcsec"), pixelscale=Pixelscale(1.0 * u("arcsec")))
+        reference.interpolate_nans(method="kernel")
+
+        # Frames with more NaN values than the maximum are not inpainted
+        def inpaint(*args, **kwargs): raise RuntimeError("The frame is inpainted while the number of NaN values is too large")
+        original_inpaint, original_max_npixels = inpainting.inpaint, inpainting.max_npixels
+        inpainting.inpaint = inpaint
+        inpainting.max_npixels = np.count_nonzero(np.isnan(self.data)) - 1
+        try:
+            frame = Frame(self.data.copy(), fwhm=3. * u("arcsec"), pixelscale=Pixelscale(1.0 * u("arcsec")))
+            frame.interpolate_nans(method="biharmonic")
+        finally: inpainting.inpaint, inpainting.max_npixels = original_inpaint, original_max_npixels
+
+        # The result of the kernel method
+        if not np.array_equal(frame.data, reference.data): raise RuntimeError("The frame is not interpolated with the kernel method")
+
+# -----------------------------------------------------------------
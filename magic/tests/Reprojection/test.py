@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import numpy as np
+
+# Import astronomical modules
+from astropy.io import fits
+from reproject import reproject_interp
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.magic.basics.coordinatesystem import CoordinateSystem
+from pts.magic.core.frame import Frame
+from pts.magic.tools.reprojection import ReprojectionEngine, pixel_to_pixel
+
+# -----------------------------------------------------------------
+
+description = "testing the reprojection engine against reproject_interp"
+
+# -----------------------------------------------------------------
+
+def create_wcs(nx, ny, pixelscale, angle=0.):
+
+    """
+    This function creates a coordinate system with a TAN projection, centered on the same position
+    :param nx:
+    :param ny:
+    :param pixelscale: the pixelscale in arcsec
+    :param angle: the rotation angle in degrees
+    :return:
+    """
+
+    cos = np.cos(np.radians(angle))
+    sin = np.sin(np.radians(angle))
+    scale = pixelscale / 3600.
+
+    header = fits.Header()
+    header["NAXIS"] = 2
+    header["NAXIS1"] = nx
+    header["NAXIS2"] = ny
+    header["CTYPE1"] = "RA---TAN"
+    header["CTYPE2"] = "DEC--TAN"
+    header["CRVAL1"] = 150.
+    header["CRVAL2"] = 2.
+    header["CRPIX1"] = 0.5 * nx + 0.5
+    header["CRPIX2"] = 0.5 * ny + 0.5
+    header["CD1_1"] = - scale * cos
+    header["CD1_2"] = scale * sin
+    header["CD2_1"] = scale * sin
+    header["CD2_2"] = scale * cos
+    return CoordinateSystem(header)
+
+# -----------------------------------------------------------------
+
+class ReprojectionTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(ReprojectionTest, self).__init__(*args, **kwargs)
+
+        # The source data and coordinate system
+        self.data = None
+        self.wcs = None
+
+        # The cache directory
+        self.cache_path = None
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Compare with reproject_interp
+        self.compare()
+
+        # 3. Compare the rebinning of frames
+        self.compare_frames()
+
+        # 4. Test the size budget of the cache
+        self.test_cache_budget()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(ReprojectionTest, self).setup(**kwargs)
+
+        # Create the data, with NaNs
+        np.random.seed(42)
+        self.data = np.random.lognormal(size=(100, 120))
+        self.data[np.random.random(self.data.shape) < 0.02] = np.nan
+        self.wcs = create_wcs(120, 100, 1.)
+
+        # The cache directory
+        self.cache_path = fs.create_directory_in(self.path, "cache")
+
+    # -----------------------------------------------------------------
+
+    def compare(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Comparing the reprojection engine with reproject_interp ...")
+
+        engine = ReprojectionEngine(cache_path=self.cache_path)
+
+        # Within the source grid, and partly outside of it
+        for target_wcs in [create_wcs(50, 40, 1.7, angle=20.), create_wcs(90, 80, 1.9, angle=10.)]:
+
+            reference, reference_footprint = reproject_interp((self.data, self.wcs), target_wcs, shape_out=target_wcs.shape)
+            data, footprint = engine.reproject(self.data, self.wcs, target_wcs)
+
+            # Compare the values
+            both = np.isfinite(reference) & np.isfinite(data)
+            if not np.allclose(data[both], reference[both], rtol=1e-8, atol=0.): raise RuntimeError("The reprojected values differ from reproject_interp")
+
+            # Compare the footprints: older versions of reproject also interpolate up to one pixel (instead of half a
+            # pixel) beyond the upper edges of the source grid
+            y, x = np.nonzero(footprint != reference_footprint)
+            x_in, y_in = pixel_to_pixel(self.wcs, target_wcs, x.astype(np.float64), y.astype(np.float64))
+            beyond = (x_in > self.wcs.xsize - 0.5) | (y_in > self.wcs.ysize - 0.5)
+            if not np.all(beyond): raise RuntimeError("The footprint differs from the footprint of reproject_interp")
+
+        # Compare a stack of planes with the planes separately
+        target_wcs = create_wcs(50, 40, 1.7, angle=20.)
+        stack = np.array([self.data, 2. * self.data])
+        data, _ = engine.reproject(stack, self.wcs, target_wcs)
+        for plane, reprojected in zip(stack, data):
+            if not np.array_equal(np.isnan(reprojected), np.isnan(engine.reproject(plane, self.wcs, target_wcs)[0])): raise RuntimeError("The reprojected planes are not consistent")
+
+    # -----------------------------------------------------------------
+
+    def compare_frames(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Comparing the rebinning of frames with and without the engine ...")
+
+        engine = ReprojectionEngine(cache_path=self.cache_path)
+        target_wcs = create_wcs(50, 40, 1.7, angle=20.)
+
+        # Rebin
+        frame = Frame(self.data.copy(), wcs=self.wcs.copy())
+        footprint = frame.rebin(target_wcs)
+        engine_frame = Frame(self.data.copy(), wcs=self.wcs.copy())
+        engine_footprint = engine.rebin(engine_frame, target_wcs)
+
+        # Compare
+        if not np.array_equal(np.isnan(frame.data), np.isnan(engine_frame.data)): raise RuntimeError("The NaNs of the rebinned frames differ")
+        valid = np.isfinite(frame.data)
+        if not np.allclose(frame.data[valid], engine_frame.data[valid], rtol=1e-8, atol=0.): raise RuntimeError("The rebinned frames differ")
+        if not np.array_equal(footprint.data, engine_footprint.data): raise RuntimeError("The footprints of the rebinned frames differ")
+
+    # -----------------------------------------------------------------
+
+    def test_cache_budget(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the size budget of the reprojection cache ...")
+
+        # Create an engine with a budget for about one mapping
+        path = fs.create_directory_in(self.path, "budget")
+        engine = ReprojectionEngine(cache_path=path, cache_results=True)
+        engine.get_mapping(self.wcs, create_wcs(50, 40, 1.7))
+        engine.max_cache_size = int(1.5 * sum(os.path.getsize(filepath) for filepath in fs.files_in_path(path)))
+
+        # Add more mappings and results
+        for pixelscale in [1.8, 1.9, 2.0]: engine.reproject(self.data, self.wcs, create_wcs(50, 40, pixelscale))
+
+        # Check
+        size = sum(os.path.getsize(filepath) for filepath in fs.files_in_path(path))
+        if size > engine.max_cache_size: raise RuntimeError("The reprojection cache exceeds its size budget")
+
+# -----------------------------------------------------------------
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.tools.inpainting Provides functions to fill in (inpaint) masked pixels of an image by solving
+#  the Laplace (harmonic) or biharmonic equation over the masked areas.
+#
+# Each connected masked area is treated separately, within its bounding box extended by the pixels that are needed
+# as boundary values. The equation is discretized with the Laplacian of the pixel grid, restricted to the masked
+# pixels and the valid (finite and unmasked) pixels: the values of the masked pixels follow from one sparse linear
+# solve. The solves for small areas are combined in batches, and the batches can be processed in parallel.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+from multiprocessing import Pool
+from scipy import ndimage
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+# -----------------------------------------------------------------
+
+# The inpainting methods, with the number of pixels around a masked area that are used as boundary values
+margins = {"harmonic": 1, "biharmonic": 2}
+methods = sorted(margins.keys())
+
+# The minimum number of pixels (of the bounding boxes) in a batch of masked areas
+batch_npixels = 2**14
+
+# The maximum number of masked pixels for which frames are inpainted (the memory and time of the sparse solve of a
+# large masked area grow quickly with its number of pixels)
+max_npixels = 2**16
+
+# -----------------------------------------------------------------
+
+def laplacian(domain):
+
+    """
+    This function creates the Laplacian matrix of the pixel grid, for the pixels in the domain: each pixel is
+    connected to its horizontal and vertical neighbours in the domain
+    :param domain: boolean array
+    :return: the sparse matrix (in the order of the domain pixels), and the array of the indices of the domain pixels
+    """
+
+    # Number the pixels in the domain
+    indices = np.full(domain.shape, -1, dtype=np.int64)
+    npixels = np.count_nonzero(domain)
+    indices[domain] = np.arange(npixels)
+
+    # Find the pairs of neighbouring pixels
+    horizontal = domain[:, :-1] & domain[:, 1:]
+    vertical = domain[:-1, :] & domain[1:, :]
+    first = np.concatenate((indices[:, :-1][horizontal], indices[:-1, :][vertical]))
+    second = np.concatenate((indices[:, 1:][horizontal], indices[1:, :][vertical]))
+
+    # Create the matrix: the number of neighbours on the diagonal, -1 for each pair of neighbours
+    degrees = np.bincount(first, minlength=npixels) + np.bincount(second, minlength=npixels)
+    rows = np.concatenate((np.arange(npixels), first, second))
+    columns = np.concatenate((np.arange(npixels), second, first))
+    values = np.concatenate((degrees.astype(np.float64), -np.ones(2 * len(first))))
+    matrix = sparse.csr_matrix((values, (rows, columns)), shape=(npixels, npixels))
+
+    # Return
+    return matrix, indices
+
+# -----------------------------------------------------------------
+
+def solve_boxes(boxes, method="biharmonic"):
+
+    """
+    This function fills in the unknown pixels of a number of boxes, with one sparse solve
+    :param boxes: list of (values, unknown) tuples, with the pixel values and the mask of the unknown pixels of a box.
+    Pixels that are not finite and not unknown are ignored.
+    :param method: 'harmonic' or 'biharmonic'
+    :return: list of arrays with the values of the unknown pixels of each box
+    """
+
+    # Combine the boxes in one domain, as a column of boxes separated by rows of ignored pixels
+    width = max(values.shape[1] for values, unknown in boxes)
+    height = sum(values.shape[0] + 1 for values, unknown in boxes)
+    all_values = np.zeros((height, width))
+    domain = np.zeros((height, width), dtype=bool)
+    unknowns = np.zeros((height, width), dtype=bool)
+    row = 0
+    for values, unknown in boxes:
+        ny, nx = values.shape
+        valid = np.isfinite(values) & ~unknown
+        all_values[row:row+ny, :nx][valid] = values[valid]
+        domain[row:row+ny, :nx] = valid | unknown
+        unknowns[row:row+ny, :nx] = unknown
+        row += ny + 1
+
+    # Create the operator
+    matrix, indices = laplacian(domain)
+    if method == "biharmonic": matrix = matrix.dot(matrix)
+    elif method != "harmonic": raise ValueError("Invalid inpainting method: '" + method + "'")
+
+    # Solve the equation for the unknown pixels, with the valid pixels as boundary values
+    unknown_indices = indices[unknowns]
+    known = domain & ~unknowns
+    known_indices = indices[known]
+    matrix = matrix.tocsc()
+    rhs = -matrix[unknown_indices][:, known_indices].dot(all_values[known])
+    solution = spsolve(matrix[unknown_indices][:, unknown_indices], rhs)
+    all_values[unknowns] = np.atleast_1d(solution)
+
+    # Return the values per box
+    results = []
+    row = 0
+    for values, unknown in boxes:
+        ny, nx = values.shape
+        results.append(all_values[row:row+ny, :nx][unknown])
+        row += ny + 1
+    return results
+
+# -----------------------------------------------------------------
+
+def _solve_batch(arguments):
+
+    """
+    This function ...
+    :param arguments:
+    :return:
+    """
+
+    numbers, boxes, method = arguments
+    return numbers, solve_boxes(boxes, method)
+
+# -----------------------------------------------------------------
+
+def inpaint(data, mask=None, method="biharmonic", nprocesses=1):
+
+    """
+    This function fills in the masked pixels of an image
+    :param data: the image data
+    :param mask: the mask of the pixels that have to be filled in (the NaN values if None)
+    :param method: 'harmonic' or 'biharmonic'
+    :param nprocesses: the number of processes
+    :return: the new data, and the mask of the pixels that could not be filled in (masked areas that are not bordered
+    by any valid pixel)
+    """
+
+    if method not in margins: raise ValueError("Invalid inpainting method: '" + method + "'")
+    margin = margins[method]
+
+    # Get the mask
+    if mask is None: mask = np.isnan(data)
+    else: mask = np.asarray(mask).astype(bool)
+
+    # The result
+    result = np.array(data, dtype=np.float64)
+    unsolved = np.zeros(mask.shape, dtype=bool)
+
+    # Find the masked areas, with their bounding boxes
+    labels, nlabels = ndimage.label(mask)
+    if nlabels == 0: return result, unsolved
+    objects = ndimage.find_objects(labels)
+    ignored = mask | ~np.isfinite(result)
+
+    # Create the boxes
+    boxes = []
+    for index, (yslice, xslice) in enumerate(objects):
+
+        # Extend the bounding box
+        box = (slice(max(yslice.start - margin, 0), yslice.stop + margin), slice(max(xslice.start - margin, 0), xslice.stop + margin))
+        unknown = labels[box] == index + 1
+
+        # Check whether the area is bordered by valid pixels
+        border = ndimage.binary_dilation(unknown) & ~unknown & ~ignored[box]
+        if not np.any(border):
+            unsolved[box] |= unknown
+            continue
+
+        # Mask the pixels of other areas (and invalid pixels)
+        values = result[box].copy()
+        values[ignored[box] & ~unknown] = np.nan
+        boxes.append((index + 1, box, values, unknown))
+
+    # Divide the boxes in batches
+    batches = []
+    batch = []
+    npixels = 0
+    for number, box, values, unknown in sorted(boxes, key=lambda item: item[2].size):
+        batch.append((number, box, values, unknown))
+        npixels += values.size
+        if npixels >= batch_npixels:
+            batches.append(batch)
+            batch = []
+            npixels = 0
+    if len(batch) > 0: batches.append(batch)
+    boxes = dict((number, (box, unknown)) for number, box, values, unknown in boxes)
+    arguments = [([number for number, box, values, unknown in batch], [(values, unknown) for number, box, values, unknown in batch], method) for batch in batches]
+
+    # Solve the batches, in parallel if requested
+    if nprocesses > 1 and len(arguments) > 1:
+        pool = Pool(processes=min(nprocesses, len(arguments)))
+        try: solutions = pool.map(_solve_batch, arguments)
+        finally:
+            pool.close()
+            pool.join()
+    else: solutions = [_solve_batch(argument) for argument in arguments]
+
+    # Fill in the values
+    for numbers, values in solutions:
+        for number, box_values in zip(numbers, values):
+            box, unknown = boxes[number]
+            result[box][unknown] = box_values
+
+    # Return the result and the mask of the pixels that could not be filled in
+    return result, unsolved
+
+# -----------------------------------------------------------------
@@ -859,11 +859,13 @@ def plot_radial_profile(box, center, angle, ratio, nbins=20, path=None, title=No
     else: data = box.data
 
     from ..dist_ellipse import distance_ellipse
-    from ...core.basics.range import RealRange
+    from ..core.radialprofile import RadialBins, measures
     from ..basics.coordinate import PixelCoordinate, SkyCoordinate
-    from ..core.mask import intersection
     from ...core.basics.log import log
 
+    # Check the measure
+    if measure not in measures: raise ValueError("Invalid value for 'measure': " + measure)
+
     # Convert center to pixel coordinates
     if isinstance(center, PixelCoordinate): center_pix = center
     elif isinstance(center, SkyCoordinate):
@@ -874,13 +876,6 @@ def plot_radial_profile(box, center, angle, ratio, nbins=20, path=None, title=No
     # Create distance ellipse frame
     distance_frame = distance_ellipse(data.shape, center_pix, ratio, angle)
 
-    radius_list = []
-    value_list = []
-    #nmasked_list = []
-
-    # Determine minimum distance
-    min_distance = np.min(distance_frame)
-
     # Determine maximum distance
     if max_radius is not None:
         from astropy.units import Quantity
@@ -889,50 +884,17 @@ def plot_radial_profile(box, center, angle, ratio, nbins=20, path=None, title=No
             if not (hasattr(box, "pixelscale") and box.pixelscale is not None): raise ValueError("Passed data must have its pixelscale defined")
             max_radius = (max_radius / box.average_pixelscale).to("").value
         max_distance = max_radius
-    else: max_distance = np.max(distance_frame)
+    else: max_distance = None
 
-    # Determine the step size
-    step = (max_distance - min_distance) / float(nbins)
+    # Create the radial bins
+    bins = RadialBins(distance_frame, nbins, max_distance=max_distance)
 
     # Debugging
-    log.debug("Step size for plotting the radial profile is " + str(step) + " pixels")
-
-    # Set the first range
-    radius_range = RealRange(min_distance, min_distance + step)
-
-    # Loop, shifting ranges of radius
-    while True:
-
-        # Check the range
-        if radius_range.min > max_distance: break
-
-        # Get the average radius
-        radius_center = radius_range.center
-
-        above_min_mask = distance_frame >= radius_range.min
-        below_max_mask = distance_frame < radius_range.max
-
-        # Create mask of pixels that are in the range
-        range_mask = intersection(above_min_mask, below_max_mask)
-
-        # Calculate the mean value in the range
-        values = data[range_mask]
-        if measure == "mean": value = np.nanmean(values)
-        elif measure == "median": value = np.nanmedian(values)
-        elif measure == "sum": value = np.nansum(values)
-        elif measure == "min": value = np.nanmin(values)
-        elif measure == "max": value = np.nanmax(values)
-        else: raise ValueError("Invalid value for 'measure': " + measure)
-
-        # Make a mask of all the pixels below the center radius
-        #below_mask = distance_frame < radius_center
-
-        # Add point
-        radius_list.append(radius_center)
-        value_list.append(value)
+    log.debug("Step size for plotting the radial profile is " + str(bins.step) + " pixels")
 
-        # Shift the range
-        radius_range += step
+    # Calculate the values in the bins
+    radius_list = list(bins.radii)
+    value_list = list(bins.reduce(data, measure))
 
     # Create the plot
     plot_xy(radius_list, value_list, title=title, format=format, transparent=transparent, path=path)
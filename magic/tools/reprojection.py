@@ -0,0 +1,569 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.magic.tools.reprojection Contains the ReprojectionEngine class, which rebins frames by applying
+#  a precomputed pixel-to-pixel mapping (the neighbouring source pixels and interpolation weights of each target
+#  pixel) for each pair of coordinate systems.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import hashlib
+import numpy as np
+from multiprocessing import Pool
+
+# Import astronomical modules
+from astropy.io import fits
+from astropy.wcs import WCS
+
+# Import the relevant PTS classes and modules
+from ...core.basics.log import log
+from ...core.tools import filesystem as fs
+from ...core.tools import introspection
+
+# -----------------------------------------------------------------
+
+# The default directory for the cached mappings and results
+reprojection_cache_path = fs.join(introspection.pts_temp_dir, "reprojection")
+
+# The default size budget of the cache directory (in bytes): the least recently used files are removed above this size
+default_max_cache_size = 2 * 1024**3
+
+# The version of the format of the mappings (part of the cache keys)
+mapping_version = 2
+
+# The number of target pixels that are interpolated at once
+chunk_npixels = 2**20
+
+# -----------------------------------------------------------------
+
+def wcs_description(wcs):
+
+    """
+    This function returns a picklable description (header string and shape) of a coordinate system
+    :param wcs:
+    :return:
+    """
+
+    return wcs.to_header_string(), tuple(wcs.shape)
+
+# -----------------------------------------------------------------
+
+def mapping_key(source_description, target_description):
+
+    """
+    This function ...
+    :param source_description:
+    :param target_description:
+    :return:
+    """
+
+    md5 = hashlib.md5(str(mapping_version).encode("utf-8"))
+    for header_string, shape in (source_description, target_description):
+        md5.update(header_string.encode("utf-8"))
+        md5.update(str(shape).encode("utf-8"))
+    return md5.hexdigest()
+
+# -----------------------------------------------------------------
+
+def data_hash(data):
+
+    """
+    This function ...
+    :param data:
+    :return:
+    """
+
+    data = np.ascontiguousarray(data)
+    md5 = hashlib.md5(str(data.dtype).encode("utf-8") + str(data.shape).encode("utf-8"))
+    md5.update(data.view(np.uint8))
+    return md5.hexdigest()
+
+# -----------------------------------------------------------------
+
+def pixel_to_pixel(source_wcs, target_wcs, x, y):
+
+    """
+    This function converts pixel positions in the target coordinate system to pixel positions in the source system
+    :param source_wcs:
+    :param target_wcs:
+    :param x:
+    :param y:
+    :return:
+    """
+
+    try:
+        from astropy.wcs.utils import pixel_to_pixel as _pixel_to_pixel
+        return _pixel_to_pixel(target_wcs.celestial, source_wcs.celestial, x, y)
+    except ImportError:
+        ra, dec = target_wcs.celestial.all_pix2world(x, y, 0)
+        return source_wcs.celestial.all_world2pix(ra, dec, 0)
+
+# -----------------------------------------------------------------
+
+def compute_mapping(source_description, target_description, nrows_per_chunk=256):
+
+    """
+    This function computes the bilinear interpolation of the source pixel grid at the target pixels, equivalent to
+    reproject_interp (order 1): the source grid is (virtually) extended by one pixel with the values at its edges, and
+    target pixels up to half a pixel outside of the source grid are interpolated
+    :param source_description:
+    :param target_description:
+    :param nrows_per_chunk:
+    :return:
+    """
+
+    # Create the coordinate systems
+    source_wcs = WCS(fits.Header.fromstring(source_description[0]))
+    target_wcs = WCS(fits.Header.fromstring(target_description[0]))
+    ny_in, nx_in = source_description[1]
+    ny_out, nx_out = target_description[1]
+
+    pixels = []
+    x_corners = []
+    y_corners = []
+    x_weights = []
+    y_weights = []
+
+    # Loop over chunks of rows of the target grid
+    for y_start in range(0, ny_out, nrows_per_chunk):
+
+        y_end = min(y_start + nrows_per_chunk, ny_out)
+        y_out, x_out = np.mgrid[y_start:y_end, 0:nx_out]
+        x_in, y_in = pixel_to_pixel(source_wcs, target_wcs, x_out.ravel().astype(np.float64), y_out.ravel().astype(np.float64))
+        out_indices = (y_out * nx_out + x_out).ravel()
+
+        # Only pixels that fall on the source grid (up to half a pixel outside, as in reproject)
+        valid = np.isfinite(x_in) & np.isfinite(y_in)
+        valid &= (x_in >= -0.5) & (x_in <= nx_in - 0.5) & (y_in >= -0.5) & (y_in <= ny_in - 0.5)
+
+        # The lower neighbour in the extended grid, and the weight of the upper neighbour
+        x_in = x_in[valid] + 1.
+        y_in = y_in[valid] + 1.
+        x0 = np.minimum(np.floor(x_in), nx_in)
+        y0 = np.minimum(np.floor(y_in), ny_in)
+        pixels.append(out_indices[valid])
+        x_corners.append(x0.astype(np.int32))
+        y_corners.append(y0.astype(np.int32))
+        x_weights.append(x_in - x0)
+        y_weights.append(y_in - y0)
+
+    # Return the mapping
+    return ReprojectionMapping(np.concatenate(pixels), np.concatenate(x_corners), np.concatenate(y_corners),
+                               np.concatenate(x_weights), np.concatenate(y_weights), (ny_in, nx_in), (ny_out, nx_out))
+
+# -----------------------------------------------------------------
+
+def compute_and_save_mapping(source_description, target_description, path):
+
+    """
+    This function is executed by the worker processes
+    :param source_description:
+    :param target_description:
+    :param path:
+    :return:
+    """
+
+    mapping = compute_mapping(source_description, target_description)
+    mapping.saveto(path)
+    return path
+
+# -----------------------------------------------------------------
+
+def _compute_and_save_mapping(arguments): return compute_and_save_mapping(*arguments)
+
+# -----------------------------------------------------------------
+
+class ReprojectionMapping(object):
+
+    """
+    This class represents the mapping of the pixels of one coordinate system onto another: for each target pixel that
+    falls on the source grid, the lower neighbouring source pixel (in the source grid extended by one pixel on each side)
+    and the interpolation weights of the upper neighbours along both axes
+    """
+
+    def __init__(self, pixels, x_corners, y_corners, x_weights, y_weights, shape_in, shape_out):
+
+        """
+        The constructor ...
+        :param pixels: the (flattened) indices of the target pixels
+        :param x_corners:
+        :param y_corners:
+        :param x_weights:
+        :param y_weights:
+        :param shape_in:
+        :param shape_out:
+        """
+
+        self.pixels = pixels
+        self.x_corners = x_corners
+        self.y_corners = y_corners
+        self.x_weights = x_weights
+        self.y_weights = y_weights
+        self.shape_in = tuple(shape_in)
+        self.shape_out = tuple(shape_out)
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def from_file(cls, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        archive = np.load(path)
+        return cls(archive["pixels"], archive["x_corners"], archive["y_corners"], archive["x_weights"],
+                   archive["y_weights"], tuple(archive["shape_in"]), tuple(archive["shape_out"]))
+
+    # -----------------------------------------------------------------
+
+    def saveto(self, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        # Write to a temporary file first, so that concurrent readers never see a partial file
+        with fs.atomic_write(path) as temp_path:
+            np.savez(temp_path, pixels=self.pixels, x_corners=self.x_corners, y_corners=self.y_corners,
+                     x_weights=self.x_weights, y_weights=self.y_weights, shape_in=np.array(self.shape_in),
+                     shape_out=np.array(self.shape_out))
+
+    # -----------------------------------------------------------------
+
+    @property
+    def npixels(self):
+
+        """
+        This function returns the number of target pixels that fall on the source grid
+        :return:
+        """
+
+        return len(self.pixels)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def footprint(self):
+
+        """
+        This function returns the target pixels that fall on the source grid
+        :return:
+        """
+
+        footprint = np.zeros(self.shape_out, dtype=np.float64)
+        footprint.ravel()[self.pixels] = 1.
+        return footprint
+
+    # -----------------------------------------------------------------
+
+    def apply(self, data):
+
+        """
+        This function reprojects a 2D array, or a stack of 2D arrays (planes along the first axis), interpolating
+        a limited number of target pixels at a time
+        :param data:
+        :return:
+        """
+
+        if data.shape[-2:] != self.shape_in: raise ValueError("The shape of the data does not correspond to the source coordinate system")
+        ny_in, nx_in = self.shape_in
+
+        # Flatten the planes
+        nplanes = 1 if data.ndim == 2 else data.shape[0]
+        flat = np.asarray(data, dtype=np.float64).reshape(nplanes, -1)
+
+        # The pixels outside of the source grid are NaN
+        result = np.full((nplanes, self.shape_out[0] * self.shape_out[1]), np.nan)
+
+        # Loop over chunks of target pixels
+        for start in range(0, self.npixels, chunk_npixels):
+
+            end = min(start + chunk_npixels, self.npixels)
+
+            # The neighbouring source pixels (the extended grid has the values at the edges)
+            left = np.clip(self.x_corners[start:end] - 1, 0, nx_in - 1)
+            right = np.clip(self.x_corners[start:end], 0, nx_in - 1)
+            bottom = np.clip(self.y_corners[start:end] - 1, 0, ny_in - 1) * nx_in
+            top = np.clip(self.y_corners[start:end], 0, ny_in - 1) * nx_in
+            dx = self.x_weights[start:end]
+            dy = self.y_weights[start:end]
+
+            # Interpolate: NaNs propagate to the pixels that depend on them (also with zero weight, as in reproject)
+            values = (1. - dx) * (1. - dy) * flat[:, bottom + left]
+            values += dx * (1. - dy) * flat[:, bottom + right]
+            values += (1. - dx) * dy * flat[:, top + left]
+            values += dx * dy * flat[:, top + right]
+            result[:, self.pixels[start:end]] = values
+
+        # Return
+        if data.ndim == 2: return result.reshape(self.shape_out)
+        else: return result.reshape((nplanes,) + self.shape_out)
+
+# -----------------------------------------------------------------
+
+class ReprojectionEngine(object):
+
+    """
+    This class rebins frames (and datacube planes) by computing the pixel-to-pixel mapping only once per pair of
+    coordinate systems. The mappings are cached in memory and on disk, and the mappings that are missing can be
+    computed in parallel. Optionally, the rebinned data is also cached on disk. The least recently used files in the
+    cache directory are removed when it exceeds its size budget.
+    """
+
+    def __init__(self, cache_path=None, nprocesses=1, cache_results=False, max_cache_size=None):
+
+        """
+        The constructor ...
+        :param cache_path:
+        :param nprocesses:
+        :param cache_results:
+        :param max_cache_size: the size budget of the cache directory in bytes
+        """
+
+        # The cache directory
+        if cache_path is None: cache_path = reprojection_cache_path
+        if not fs.is_directory(cache_path): fs.create_directory(cache_path)
+        self.cache_path = cache_path
+
+        # Settings
+        self.nprocesses = nprocesses
+        self.cache_results = cache_results
+        self.max_cache_size = max_cache_size if max_cache_size is not None else default_max_cache_size
+
+        # The mappings in memory
+        self.mappings = dict()
+
+    # -----------------------------------------------------------------
+
+    def mapping_path(self, key):
+
+        """
+        This function ...
+        :param key:
+        :return:
+        """
+
+        return fs.join(self.cache_path, key + ".npz")
+
+    # -----------------------------------------------------------------
+
+    def result_path(self, key, data_key):
+
+        """
+        This function ...
+        :param key:
+        :param data_key:
+        :return:
+        """
+
+        return fs.join(self.cache_path, key + "_" + data_key + ".npy")
+
+    # -----------------------------------------------------------------
+
+    def evict(self):
+
+        """
+        This function removes the least recently used files (by modification time, which is updated when a file is
+        used) until the cache directory is within its size budget
+        :return:
+        """
+
+        # Get the sizes and modification times of the cached files (skip files that are being written)
+        entries = []
+        for name in os.listdir(self.cache_path):
+            if ".part" in name: continue
+            path = fs.join(self.cache_path, name)
+            try: stat = os.stat(path)
+            except OSError: continue # removed by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        # Remove the oldest files
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+
+            if total_size <= self.max_cache_size: break
+
+            # Debugging
+            log.debug("Removing '" + fs.name(path) + "' from the reprojection cache ...")
+
+            # Remove
+            fs.remove_file_if_present(path)
+            total_size -= size
+
+    # -----------------------------------------------------------------
+
+    def mark_used(self, path):
+
+        """
+        This function updates the modification time of a cached file, so that it is evicted last
+        :param path:
+        :return:
+        """
+
+        try: os.utime(path, None)
+        except OSError: pass # removed by another process
+
+    # -----------------------------------------------------------------
+
+    def prepare(self, source_systems, target_wcs):
+
+        """
+        This function makes sure that the mappings from the source coordinate systems to the target are available,
+        computing the missing ones in a process pool
+        :param source_systems:
+        :param target_wcs:
+        :return:
+        """
+
+        target_description = wcs_description(target_wcs)
+
+        # Find the mappings that are not yet available
+        missing = dict()
+        for wcs in source_systems:
+
+            source_description = wcs_description(wcs)
+            key = mapping_key(source_description, target_description)
+            if key in self.mappings or key in missing: continue
+            path = self.mapping_path(key)
+            if fs.is_file(path): continue
+            missing[key] = (source_description, target_description, path)
+
+        # Nothing to compute
+        if len(missing) == 0: return
+
+        # Debugging
+        log.debug("Computing " + str(len(missing)) + " reprojection mappings ...")
+
+        # Compute
+        if self.nprocesses > 1 and len(missing) > 1:
+            pool = Pool(processes=min(self.nprocesses, len(missing)))
+            try: pool.map(_compute_and_save_mapping, list(missing.values()))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for arguments in missing.values(): compute_and_save_mapping(*arguments)
+
+        # Keep the cache within its budget
+        self.evict()
+
+    # -----------------------------------------------------------------
+
+    def get_mapping(self, source_wcs, target_wcs):
+
+        """
+        This function returns the mapping and its key
+        :param source_wcs:
+        :param target_wcs:
+        :return:
+        """
+
+        source_description = wcs_description(source_wcs)
+        target_description = wcs_description(target_wcs)
+        key = mapping_key(source_description, target_description)
+
+        # In memory
+        if key in self.mappings: return self.mappings[key], key
+
+        # On disk
+        path = self.mapping_path(key)
+        mapping = None
+        if fs.is_file(path):
+            try:
+                mapping = ReprojectionMapping.from_file(path)
+                self.mark_used(path)
+            except (IOError, OSError): log.debug("The cached reprojection mapping has been removed") # evicted by another process
+
+        # Compute
+        if mapping is None:
+            log.debug("Computing the reprojection mapping ...")
+            mapping = compute_mapping(source_description, target_description)
+            mapping.saveto(path)
+            self.evict()
+
+        # Keep in memory and return
+        self.mappings[key] = mapping
+        return mapping, key
+
+    # -----------------------------------------------------------------
+
+    def reproject(self, data, source_wcs, target_wcs):
+
+        """
+        This function returns the reprojected data (2D or a stack of planes) and the footprint (as in reproject, the
+        pixels that are not NaN)
+        :param data:
+        :param source_wcs:
+        :param target_wcs:
+        :return:
+        """
+
+        mapping, key = self.get_mapping(source_wcs, target_wcs)
+
+        # Look for a cached result
+        new_data = None
+        if self.cache_results:
+
+            path = self.result_path(key, data_hash(data))
+            if fs.is_file(path):
+                try:
+                    new_data = np.load(path)
+                    self.mark_used(path)
+                    log.debug("Using the cached reprojected data ...")
+                except (IOError, OSError): log.debug("The cached reprojected data has been removed") # evicted by another process
+
+        # Reproject
+        if new_data is None:
+
+            new_data = mapping.apply(data)
+
+            # Cache the result
+            if self.cache_results:
+                with fs.atomic_write(path) as temp_path: np.save(temp_path, new_data)
+                self.evict()
+
+        # Return
+        return new_data, (~np.isnan(new_data)).astype(float)
+
+    # -----------------------------------------------------------------
+
+    def rebin(self, frame, reference_wcs, convert=False):
+
+        """
+        This function rebins a frame in place, like Frame.rebin with interpolation
+        :param frame:
+        :param reference_wcs:
+        :param convert:
+        :return:
+        """
+
+        return frame.rebin(reference_wcs, convert=convert, engine=self)
+
+    # -----------------------------------------------------------------
+
+    def rebinned(self, frame, reference_wcs):
+
+        """
+        This function ...
+        :param frame:
+        :param reference_wcs:
+        :return:
+        """
+
+        return frame.rebinned(reference_wcs, engine=self)
+
+# -----------------------------------------------------------------
@@ -21,11 +21,18 @@ from .component import DustHeatingAnalysisComponent
 from ....core.tools import filesystem as fs
 from ....core.basics.log import log
 from ....core.basics.distribution import Distribution, Distribution2D
-from .tables import AbsorptionTable
+from .cellstore import CellStore, source_signature
+from ....core.simulation.cellprojection import CellProjector, load_cell_extents
 from ....core.tools.utils import lazyproperty
 
 # -----------------------------------------------------------------
 
+# The version of the computation of the derived columns of the cell store: increase it when the computation of any
+# of the derived columns changes, so that they are recomputed for existing stores
+derived_version = 1
+
+# -----------------------------------------------------------------
+
 class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
     
     """
@@ -45,8 +52,8 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
 
         # -- Attributes --
 
-        # The table with the absorbed luminosities
-        self.absorptions = None
+        # The store of the cell coordinates, absorbed luminosities and cell properties
+        self.cells = None
 
         # The heating fraction of the unevolved stellar population for each dust cell
         self.heating_fractions = None
@@ -57,6 +64,9 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # The 2D distribution of heating fractions
         self.radial_distribution = None
 
+        # The maps and profiles of the heating fraction
+        self.maps = None
+
     # -----------------------------------------------------------------
 
     def run(self, **kwargs):
@@ -69,9 +79,8 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # 1. Call the setup function
         self.setup(**kwargs)
 
-        # 2. Create the absorption table
-        if not self.has_absorptions: self.create_absorption_table()
-        else: self.load_absorption_table()
+        # 2. Load or create the cell store
+        self.load_cells()
 
         # 3. Calculate the heating fraction of the unevolved stellar population
         self.calculate_heating_unevolved()
@@ -82,10 +91,13 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # 5. Calculate the distribution of the heating fraction of the unevolved stellar population as a function of radius
         self.calculate_radial_distribution()
 
-        # 6. Writing
+        # 6. Project the heating fraction of the unevolved stellar population onto maps and profiles
+        self.project_heating_fractions()
+
+        # 7. Writing
         self.write()
 
-        # 7. Plotting
+        # 8. Plotting
         self.plot()
 
     # -----------------------------------------------------------------
@@ -110,19 +122,69 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return len(self.total_contribution_absorption_data)
+        return self.cells.ncells
+
+    # -----------------------------------------------------------------
+
+    @property
+    def cell_store_path(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.join(self.cell_heating_path, "cells")
+
+    # -----------------------------------------------------------------
+
+    @property
+    def cell_source_filepaths(self):
+
+        """
+        This function returns the paths of the simulation output files from which the cell store is created
+        :return:
+        """
+
+        return [self.total_contribution_absorption_filepath, self.old_contribution_absorption_filepath,
+                self.young_contribution_absorption_filepath, self.ionizing_contribution_absorption_filepath,
+                self.total_contribution_cell_properties_filepath]
+
+    # -----------------------------------------------------------------
+
+    def load_cells(self):
+
+        """
+        This function loads the cell store, or creates it if it is absent or older than the simulation output
+        :return:
+        """
+
+        # Get the signature of the simulation output
+        signature = source_signature(self.cell_source_filepaths)
+
+        # Load the store
+        store = CellStore(self.cell_store_path)
+        if store.matches(signature):
+
+            # Success
+            log.success("Cell store has already been created: loading from file ...")
+            self.cells = store
+
+        # Create the store
+        else: self.create_cells(signature)
 
     # -----------------------------------------------------------------
 
-    def create_absorption_table(self):
+    def create_cells(self, signature):
 
         """
         Thisn function ...
+        :param signature:
         :return:
         """
 
         # Inform the user
-        log.info("Creating the absorption table ...")
+        log.info("Creating the cell store ...")
 
         # Get the coordinates
         x = self.total_contribution_absorption_data["X coordinate of cell center"]
@@ -141,23 +203,15 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # Get luminosity for ionizing stellar population
         ionizing_absorptions = self.ionizing_contribution_absorption_data["Absorbed bolometric luminosity"]
 
-        # Create the table
-        self.absorptions = AbsorptionTable.from_columns(x, y, z, total_absorptions, old_absorptions, young_absorptions, ionizing_absorptions)
+        # Get the cell volumes
+        volumes = self.cell_properties["Volume"]
+        if volumes.unit is not None: volumes = volumes.to("pc3").value
 
-    # -----------------------------------------------------------------
-
-    def load_absorption_table(self):
-
-        """
-        This function ...
-        :return:
-        """
-
-        # Success
-        log.success("Absorption table has already been created: loading from file ...")
-
-        # Load
-        self.absorptions = AbsorptionTable.from_file(self.absorption_table_path)
+        # Create the store
+        columns = [("x", x), ("y", y), ("z", z), ("total", total_absorptions), ("old", old_absorptions),
+                   ("young", young_absorptions), ("ionizing", ionizing_absorptions),
+                   ("mass_fraction", self.cell_properties["Mass fraction"]), ("volume", volumes)]
+        self.cells = CellStore.create(self.cell_store_path, [(name, np.asarray(values, dtype=float)) for name, values in columns], signature=signature)
 
     # -----------------------------------------------------------------
 
@@ -169,7 +223,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return self.absorptions.zero_absorption_mask
+        return self.cells.derived("zero_absorption", lambda: np.asarray(self.cells["total"]) == 0, version=derived_version)
 
     # -----------------------------------------------------------------
 
@@ -206,19 +260,26 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         #energy_new = volume * density_new * Lnew
         #F_abs_yng = (yng + new + energy_new) / (old + yng + new + energy_new)
 
-        #absorptions_unevolved_diffuse = self.absorptions["Absorbed bolometric luminosity of the young stellar population"] + self.absorptions["Absorbed bolometric luminosity of the ionizing stellar population"]
-        #absorptions_unevolved_diffuse = self.absorptions["young"] + self.absorptions["ionizing"]
-        absorptions_unevolved_diffuse = self.absorptions.unevolved(unit="W", asarray=True)
+        # Calculate the heating fraction of the unevolved stellar population in each dust cell (or load it)
+        self.heating_fractions = self.cells.derived("heating_fraction", self.get_heating_fractions, version=derived_version)
+
+    # -----------------------------------------------------------------
+
+    def get_heating_fractions(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        absorptions_unevolved_diffuse = self.cells["young"] + self.cells["ionizing"]
 
         #absorptions_ionizing_internal = None # TODO !!
 
-        #absorptions_total = self.absorptions["Absorbed bolometric luminosity of the total stellar population"]
-        #absorptions_total = self.absorptions["total"]
-        absorptions_total = self.absorptions.total(unit="W", asarray=True)
+        absorptions_total = self.cells["total"]
         #absorptions_total = absorptions_unevolved_diffuse + absorptions_ionizing_internal + absorptions_evolved # TODO !!
 
-        # Calculate the heating fraction of the unevolved stellar population in each dust cell
-        self.heating_fractions = absorptions_unevolved_diffuse / absorptions_total
+        with np.errstate(divide="ignore", invalid="ignore"): return absorptions_unevolved_diffuse / absorptions_total
 
     # -----------------------------------------------------------------
 
@@ -254,7 +315,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        greater_than_one_mask = self.heating_fractions > 1.0
+        with np.errstate(invalid="ignore"): greater_than_one_mask = self.heating_fractions > 1.0
         ngreater_than_one = np.sum(greater_than_one_mask)
         relative_ngreater_than_one = float(ngreater_than_one) / len(self.heating_fractions)
 
@@ -274,7 +335,19 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return self.heating_fraction_nans + self.heating_fraction_infs + self.heating_fraction_unphysical
+        return self.cells.derived("invalid", lambda: self.heating_fraction_nans + self.heating_fraction_infs + self.heating_fraction_unphysical, version=derived_version)
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def valid_indices(self):
+
+        """
+        This function returns the indices of the cells with a valid heating fraction
+        :return:
+        """
+
+        return self.cells.derived("valid_indices", lambda: np.flatnonzero(~self.heating_fractions_mask), version=derived_version)
 
     # -----------------------------------------------------------------
 
@@ -286,7 +359,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return np.ma.MaskedArray(self.heating_fractions, self.heating_fractions_mask).compressed()
+        return self.heating_fractions[self.valid_indices]
 
     # -----------------------------------------------------------------
 
@@ -298,7 +371,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return self.cell_properties["Mass fraction"]
+        return self.cells["mass_fraction"]
 
     # -----------------------------------------------------------------
 
@@ -310,7 +383,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return np.ma.MaskedArray(self.cell_weights, self.heating_fractions_mask).compressed()
+        return self.cell_weights[self.valid_indices]
 
     # -----------------------------------------------------------------
 
@@ -322,9 +395,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        x_coords = self.absorptions["x"]
-        y_coords = self.absorptions["y"]
-        return np.sqrt(x_coords**2 + y_coords**2)
+        return self.cells.derived("radius", lambda: np.sqrt(self.x_coordinates**2 + self.y_coordinates**2), version=derived_version)
 
     # -----------------------------------------------------------------
 
@@ -336,7 +407,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return np.ma.MaskedArray(self.radii, self.heating_fractions_mask).compressed()
+        return self.radii[self.valid_indices]
 
     # -----------------------------------------------------------------
 
@@ -348,7 +419,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return self.absorptions["x"]
+        return self.cells["x"]
 
     # -----------------------------------------------------------------
 
@@ -360,7 +431,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return np.ma.MaskedArray(self.absorptions["x"], mask=self.heating_fractions_mask).compressed()
+        return self.x_coordinates[self.valid_indices]
 
     # -----------------------------------------------------------------
 
@@ -372,7 +443,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return self.absorptions["y"]
+        return self.cells["y"]
 
     # -----------------------------------------------------------------
 
@@ -384,7 +455,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return np.ma.MaskedArray(self.absorptions["y"], mask=self.heating_fractions_mask).compressed()
+        return self.y_coordinates[self.valid_indices]
 
     # -----------------------------------------------------------------
 
@@ -396,7 +467,7 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return self.absorptions["z"]
+        return self.cells["z"]
 
     # -----------------------------------------------------------------
 
@@ -408,86 +479,118 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         :return:
         """
 
-        return np.ma.MaskedArray(self.absorptions["z"], mask=self.heating_fractions_mask).compressed()
+        return self.z_coordinates[self.valid_indices]
 
     # -----------------------------------------------------------------
 
-    def calculate_distribution(self):
+    @lazyproperty
+    def cell_sizes(self):
+
+        """
+        This function returns the sizes (in pc) of the dust cells along x, y and z: from the dust grid tree if it is
+        present, or assuming cubical cells from the cell volumes otherwise
+        :return:
+        """
+
+        # The sizes depend on the dust grid tree file, if present
+        has_tree = self.total_contribution_output.has_tree
+        dependencies = [self.total_contribution_output.tree[0]] if has_tree else None
+        return self.cells.derived_columns(["x_size", "y_size", "z_size"], lambda: self.get_cell_sizes(has_tree), version=derived_version, dependencies=dependencies)
+
+    # -----------------------------------------------------------------
+
+    def get_cell_sizes(self, has_tree):
 
         """
         This function ...
+        :param has_tree:
         :return:
         """
 
-        # Inform the user
-        log.info("Calculating the distribution of heating fractions of the unevolved stellar population ...")
+        # From the dust grid tree
+        if has_tree:
+            extents, length_unit = load_cell_extents(self.total_contribution_output.tree[0])
+            sizes = (extents[:, 1::2] - extents[:, 0::2]) * length_unit.to("pc")
+            return sizes[:, 0], sizes[:, 1], sizes[:, 2]
 
-        # Generate the distribution
-        self.distribution = Distribution.from_values(self.valid_heating_fractions, bins=20, weights=self.valid_cell_weights)
+        # From the cell volumes
+        else:
+            sizes = np.cbrt(self.cells["volume"])
+            return sizes, sizes, sizes
 
     # -----------------------------------------------------------------
 
-    def calculate_radial_distribution(self):
+    @lazyproperty
+    def valid_cell_sizes(self):
 
         """
         This function ...
         :return:
         """
 
-        # Inform the user
-        log.info("Calculating the radial distribution of heating fractions of the unevolved stellar population ...")
-
-        # Generate the radial distribution
-        self.radial_distribution = Distribution2D.from_values(self.valid_radii, self.valid_heating_fractions, weights=self.valid_cell_weights, x_name="radius (pc)", y_name="Heating fraction of unevolved stars")
+        return [sizes[self.valid_indices] for sizes in self.cell_sizes]
 
     # -----------------------------------------------------------------
 
-    def write(self):
+    @lazyproperty
+    def projector(self):
 
         """
         This function ...
         :return:
         """
 
-        # Inform the user
-        log.info("Writing ...")
+        x_sizes, y_sizes, z_sizes = self.valid_cell_sizes
+        return CellProjector(self.valid_x_coordinates, self.valid_y_coordinates, self.valid_z_coordinates, x_sizes, y_sizes, z_sizes)
 
-        # Write the absorption table
-        self.write_absorptions()
+    # -----------------------------------------------------------------
 
-        # Write the distribution of heating fractions
-        self.write_distribution()
+    def project_heating_fractions(self):
 
-        # Write the radial distribution of heating fractions
-        self.write_radial_distribution()
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Projecting the heating fractions of the unevolved stellar population onto face-on, edge-on and mid-plane maps ...")
+
+        # Project, weighted by the dust mass
+        self.maps = self.projector.project(self.valid_heating_fractions, weights=self.valid_cell_weights, exact=True)
 
     # -----------------------------------------------------------------
 
-    @property
-    def absorption_table_path(self):
+    def calculate_distribution(self):
 
         """
         This function ...
         :return:
         """
 
-        return fs.join(self.cell_heating_path, "absorptions.dat")
+        # Inform the user
+        log.info("Calculating the distribution of heating fractions of the unevolved stellar population ...")
+
+        # Generate the distribution
+        self.distribution = Distribution.from_values(self.valid_heating_fractions, bins=20, weights=self.valid_cell_weights)
 
     # -----------------------------------------------------------------
 
-    @property
-    def has_absorptions(self):
+    def calculate_radial_distribution(self):
 
         """
         This function ...
         :return:
         """
 
-        return fs.is_file(self.absorption_table_path)
+        # Inform the user
+        log.info("Calculating the radial distribution of heating fractions of the unevolved stellar population ...")
+
+        # Generate the radial distribution
+        self.radial_distribution = Distribution2D.from_values(self.valid_radii, self.valid_heating_fractions, weights=self.valid_cell_weights, x_name="radius (pc)", y_name="Heating fraction of unevolved stars")
 
     # -----------------------------------------------------------------
 
-    def write_absorptions(self):
+    def write(self):
 
         """
         This function ...
@@ -495,10 +598,13 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
         """
 
         # Inform the user
-        log.info("Writing the absorption table ...")
+        log.info("Writing ...")
+
+        # Write the distribution of heating fractions
+        self.write_distribution()
 
-        # Save the table
-        self.absorptions.saveto(self.absorption_table_path)
+        # Write the radial distribution of heating fractions
+        self.write_radial_distribution()
 
     # -----------------------------------------------------------------
 
@@ -628,49 +734,55 @@ class CellDustHeatingAnalyser(DustHeatingAnalysisComponent):
 
     # -----------------------------------------------------------------
 
-    def plot_map(self):
+    @property
+    def heating_edgeon_map_plot_path(self):
 
         """
         This function ...
         :return:
         """
 
-        # Inform the user
-        log.info("Plotting a map of the heating fraction of the unevolved stellar population for a face-on view of the galaxy ...")
-
-        # Create figure
-        plt.figure()
+        return fs.join(self.cell_heating_path, "map_edgeon.pdf")
 
-        x = self.valid_x_coordinates
-        y = self.valid_y_coordinates
-        z = self.valid_heating_fractions
-
-        #plt.pcolormesh(x, y, z, cmap='RdBu', vmin=0.0, vmax=1.0)
+    # -----------------------------------------------------------------
 
-        from matplotlib import mlab
+    @property
+    def heating_midplane_map_plot_path(self):
 
-        x_ticks = x
-        y_ticks = y
+        """
+        This function ...
+        :return:
+        """
 
-        z_grid = mlab.griddata(x, y, z, x, y)
+        return fs.join(self.cell_heating_path, "map_midplane.pdf")
 
-        from matplotlib.backends import backend_agg as agg
-        from matplotlib import cm
+    # -----------------------------------------------------------------
 
-        # plot
-        # fig = Figure()  # create the figure
-        fig = plt.figure()
-        agg.FigureCanvasAgg(fig)  # attach the rasterizer
-        ax = fig.add_subplot(1, 1, 1)  # make axes to plot on
-        ax.set_title("Interpolated Contour Plot of Experimental Data")
-        ax.set_xlabel("X")
-        ax.set_ylabel("Y")
+    def plot_map(self):
 
-        cmap = cm.get_cmap("hot")  # get the "hot" color map
-        contourset = ax.contourf(x_ticks, y_ticks, z_grid, 10, cmap=cmap)
+        """
+        This function ...
+        :return:
+        """
 
-        # Plot
-        plt.savefig(self.heating_map_plot_path)
-        plt.close()
+        # Inform the user
+        log.info("Plotting maps of the heating fraction of the unevolved stellar population ...")
+
+        # Face-on, edge-on and mid-plane
+        for name, path, y_edges, ylabel in [("faceon", self.heating_map_plot_path, self.maps.y_edges, "y (pc)"),
+                                            ("edgeon", self.heating_edgeon_map_plot_path, self.maps.z_edges, "z (pc)"),
+                                            ("midplane", self.heating_midplane_map_plot_path, self.maps.y_edges, "y (pc)")]:
+
+            # Create figure
+            plt.figure()
+            plt.pcolormesh(self.maps.x_edges, y_edges, np.ma.masked_invalid(self.maps[name]), cmap="hot", vmin=0.0, vmax=1.0)
+            plt.colorbar()
+            plt.gca().set_aspect("equal")
+            plt.xlabel("x (pc)")
+            plt.ylabel(ylabel)
+
+            # Plot
+            plt.savefig(path)
+            plt.close()
 
 # -----------------------------------------------------------------
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.modeling.analysis.heating.cellstore Contains the CellStore class, a columnar store of per-cell
+#  quantities of the simulations of the different contributions (stellar populations).
+#
+# All contributions share the same dust grid, so their per-cell outputs are aligned on one cell index and the cell
+# coordinates are stored only once. Each column is a binary numpy file in the store directory, which is loaded
+# memory-mapped. Derived columns (heating fractions, validity masks, ...) are computed on first use and are then
+# saved next to the other columns, with a stamp of the version of their computation and of the other files they
+# depend on (such as the dust grid tree), so that they are recomputed when either changes. The store keeps the
+# signature (names, sizes and modification times) of the simulation output files it was created from, so that it is
+# recreated when these files change.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from ....core.tools import filesystem as fs
+
+# -----------------------------------------------------------------
+
+def source_signature(paths):
+
+    """
+    This function returns the signature of the files from which a store is created (None if not all files exist)
+    :param paths:
+    :return:
+    """
+
+    if not all(fs.is_file(path) for path in paths): return None
+    return fs.files_signature(paths)
+
+# -----------------------------------------------------------------
+
+class CellStore(object):
+
+    """
+    This class represents a directory of memory-mapped per-cell columns, aligned on a shared cell index
+    """
+
+    def __init__(self, path):
+
+        """
+        The constructor ...
+        :param path: the store directory
+        """
+
+        # The store directory
+        self.path = path
+
+        # The loaded (memory-mapped) columns
+        self.columns = dict()
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def create(cls, path, columns, signature=None):
+
+        """
+        This function creates a new store (replacing the columns of an existing store)
+        :param path: the store directory
+        :param columns: sequence of (name, values) pairs (the data type of the values is kept)
+        :param signature: the signature of the source files
+        :return:
+        """
+
+        # Create or clear the directory
+        if fs.is_directory(path): fs.clear_directory(path)
+        else: fs.create_directory(path, recursive=True)
+
+        # Create the store and add the columns
+        store = cls(path)
+        for name, values in columns: store.add_column(name, values)
+
+        # Write the signature last: its presence marks the store as complete
+        with fs.atomic_write(store.signature_path) as temp_path: fs.write_line(temp_path, signature if signature is not None else "")
+
+        # Return the store
+        return store
+
+    # -----------------------------------------------------------------
+
+    @property
+    def signature_path(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.join(self.path, "signature.txt")
+
+    # -----------------------------------------------------------------
+
+    @property
+    def exists(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.is_file(self.signature_path)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def signature(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        if not self.exists: return None
+        lines = list(fs.read_lines(self.signature_path))
+        return lines[0] if len(lines) > 0 and lines[0] else None
+
+    # -----------------------------------------------------------------
+
+    def matches(self, signature):
+
+        """
+        This function returns whether the store exists and was created from the source files with the given signature
+        (any existing store matches if the signature is None, i.e. if the source files are no longer present)
+        :param signature:
+        :return:
+        """
+
+        if not self.exists: return False
+        return signature is None or self.signature == signature
+
+    # -----------------------------------------------------------------
+
+    def column_path(self, name):
+
+        """
+        This function ...
+        :param name:
+        :return:
+        """
+
+        return fs.join(self.path, name + ".npy")
+
+    # -----------------------------------------------------------------
+
+    def has_column(self, name):
+
+        """
+        This function ...
+        :param name:
+        :return:
+        """
+
+        return name in self.columns or fs.is_file(self.column_path(name))
+
+    # -----------------------------------------------------------------
+
+    def __contains__(self, name):
+
+        """
+        This function ...
+        :param name:
+        :return:
+        """
+
+        return self.has_column(name)
+
+    # -----------------------------------------------------------------
+
+    def __getitem__(self, name):
+
+        """
+        This function returns a column (memory-mapped)
+        :param name:
+        :return:
+        """
+
+        if name not in self.columns:
+            if not fs.is_file(self.column_path(name)): raise KeyError("The store has no column '" + name + "'")
+            self.columns[name] = np.load(self.column_path(name), mmap_mode="r")
+        return self.columns[name]
+
+    # -----------------------------------------------------------------
+
+    @property
+    def column_names(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return sorted(fs.files_in_path(self.path, extension="npy", returns="name"))
+
+    # -----------------------------------------------------------------
+
+    @property
+    def ncells(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return len(self["x"])
+
+    # -----------------------------------------------------------------
+
+    def add_column(self, name, values, dtype=None):
+
+        """
+        This function adds a column (or replaces it), first writing it to a temporary file which is then renamed
+        :param name:
+        :param values:
+        :param dtype: the data type (that of the values if None)
+        :return:
+        """
+
+        path = self.column_path(name)
+        with fs.atomic_write(path) as temp_path: np.save(temp_path, np.asarray(values, dtype=dtype))
+
+        # Load memory-mapped
+        self.columns[name] = np.load(path, mmap_mode="r")
+        return self.columns[name]
+
+    # -----------------------------------------------------------------
+
+    def stamp_path(self, name):
+
+        """
+        This function ...
+        :param name:
+        :return:
+        """
+
+        return fs.join(self.path, name + ".stamp")
+
+    # -----------------------------------------------------------------
+
+    def get_stamp(self, name):
+
+        """
+        This function returns the stamp with which a derived column was saved (None if there is none)
+        :param name:
+        :return:
+        """
+
+        if not fs.is_file(self.stamp_path(name)): return None
+        lines = list(fs.read_lines(self.stamp_path(name)))
+        return lines[0] if len(lines) > 0 else None
+
+    # -----------------------------------------------------------------
+
+    def derived(self, name, function, dtype=None, version=1, dependencies=None):
+
+        """
+        This function returns a derived column: it is loaded if it has been saved before with the same stamp,
+        otherwise it is computed and saved
+        :param name:
+        :param function: function without arguments that computes the column values
+        :param dtype:
+        :param version: the version of the computation (increase it when the computation changes)
+        :param dependencies: the paths of the other files (than those of the store) that the column depends on
+        :return:
+        """
+
+        return self.derived_columns([name], lambda: [function()], dtype=dtype, version=version, dependencies=dependencies)[0]
+
+    # -----------------------------------------------------------------
+
+    def derived_columns(self, names, function, dtype=None, version=1, dependencies=None):
+
+        """
+        This function returns a number of derived columns that are computed together
+        :param names:
+        :param function: function without arguments that computes the values of the columns (in the order of the names)
+        :param dtype:
+        :param version: the version of the computation (increase it when the computation changes)
+        :param dependencies: the paths of the other files (than those of the store) that the columns depend on
+        :return:
+        """
+
+        # Determine the stamp
+        stamp = str(version)
+        if dependencies: stamp += ":" + fs.files_signature(dependencies)
+
+        # Load
+        if all(self.has_column(name) and self.get_stamp(name) == stamp for name in names): return [self[name] for name in names]
+
+        # Compute and add the columns, and then their stamps
+        columns = [self.add_column(name, values, dtype=dtype) for name, values in zip(names, function())]
+        for name in names:
+            with fs.atomic_write(self.stamp_path(name)) as temp_path: fs.write_line(temp_path, stamp)
+
+        # Return the columns
+        return columns
+
+# -----------------------------------------------------------------
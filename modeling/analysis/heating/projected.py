@@ -24,7 +24,9 @@ from ....core.tools import tables
 from ....core.data.sed import SED
 from ....core.simulation.wavelengthgrid import WavelengthGrid
 from ....magic.core.datacube import DataCube
+from ....magic.core.frame import Frame
 from ....magic.plot.imagegrid import StandardImageGridPlotter
+from .cellstore import CellStore, source_signature
 
 # -----------------------------------------------------------------
 
@@ -47,6 +49,9 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
 
         # -- Attributes --
 
+        # The store of the datacubes of the contributions (memory-mapped) and of the TIR maps
+        self.cubes = None
+
         # The flux fractions
         self.fractions = None
         self.fraction_maps = dict()
@@ -69,16 +74,19 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # 1. Call the setup function
         self.setup(**kwargs)
 
-        # 2. Calculate the heating fractions
+        # 2. Load or create the store of the datacubes
+        self.load_cubes()
+
+        # 3. Calculate the heating fractions
         self.calculate_heating_fractions()
 
-        # 3. Calculate maps of the TIR luminosity
+        # 4. Calculate maps of the TIR luminosity
         self.calculate_tir_maps()
 
-        # 4. Writing
+        # 5. Writing
         self.write()
 
-        # 5. Plotting
+        # 6. Plotting
         self.plot()
 
     # -----------------------------------------------------------------
@@ -120,6 +128,63 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
 
     # -----------------------------------------------------------------
 
+    @property
+    def cube_store_path(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.join(self.projected_heating_path, "cubes")
+
+    # -----------------------------------------------------------------
+
+    @property
+    def cube_source_filepaths(self):
+
+        """
+        This function returns the paths of the datacube files from which the store of the datacubes is created
+        :return:
+        """
+
+        return [self.total_contribution_data.images["earth"].get_raw("total"),
+                self.old_contribution_data.images["earth"].get_raw("total"),
+                self.unevolved_contribution_data.images["earth"].get_raw("total")]
+
+    # -----------------------------------------------------------------
+
+    def load_cubes(self):
+
+        """
+        This function loads the store of the datacubes, or creates it if it is absent or older than the datacube files
+        :return:
+        """
+
+        # Get the signature of the datacube files
+        signature = source_signature(self.cube_source_filepaths)
+
+        # Load the store
+        store = CellStore(self.cube_store_path)
+        if store.matches(signature):
+
+            # Success
+            log.success("Datacube store has already been created: loading from file ...")
+            self.cubes = store
+
+        # Create the store, with the wavelength axis first
+        else:
+
+            # Inform the user
+            log.info("Creating the datacube store ...")
+
+            # Create
+            columns = [("total", self.total_datacube.asarray(axis=0)), ("old", self.old_datacube.asarray(axis=0)),
+                       ("unevolved", self.unevolved_datacube.asarray(axis=0))]
+            self.cubes = CellStore.create(self.cube_store_path, columns, signature=signature)
+
+    # -----------------------------------------------------------------
+
     def calculate_heating_fractions(self):
 
         """
@@ -261,19 +326,17 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
             index = self.wavelength_grid.closest_wavelength_index(wavelength)
             wavelength = self.wavelength_grid.table["Wavelength"][index]
 
-            # Determine the name of the corresponding frame in the datacube image
-            frame_name = "frame" + str(index)
-
-            total_fluxes = self.total_datacube.frames[frame_name]
-            evolved_fluxes = self.old_datacube.frames[frame_name]
-            unevolved_fluxes = self.unevolved_datacube.frames[frame_name]
+            # Get the corresponding planes of the datacubes
+            total_fluxes = self.cubes["total"][index]
+            evolved_fluxes = self.cubes["old"][index]
+            unevolved_fluxes = self.cubes["unevolved"][index]
 
             # Calculate the heating fractions
-            unevolved_fractions = 0.5 * (unevolved_fluxes + total_fluxes - evolved_fluxes) / total_fluxes
+            with np.errstate(divide="ignore", invalid="ignore"): unevolved_fractions = 0.5 * (unevolved_fluxes + total_fluxes - evolved_fluxes) / total_fluxes
             #evolved_fractions = 0.5 * (evolved_fluxes + total_fluxes - unevolved_fluxes) / total_fluxes
 
             # Add the fraction map to the dictionary
-            self.fraction_maps[wavelength] = unevolved_fractions
+            self.fraction_maps[wavelength] = Frame(unevolved_fractions)
 
     # -----------------------------------------------------------------
 
@@ -304,12 +367,8 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # Inform the user
         log.info("Calculating the total TIR luminosity in each pixel ...")
 
-        cube = self.total_datacube.asarray()
-        wavelengths = self.wavelength_grid.wavelengths(asarray=True, unit="micron")
-        deltas = self.wavelength_grid.deltas(asarray=True, unit="micron")
-
-        # Calculate the map
-        self.total_tir_map = integrate_pixel_seds(cube, wavelengths, deltas)
+        # Calculate the map (or load it)
+        self.total_tir_map = self.get_tir_map("total")
 
     # -----------------------------------------------------------------
 
@@ -323,12 +382,8 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # Inform the user
         log.info("Calculating the unevolved TIR luminosity in each pixel ...")
 
-        cube = self.unevolved_datacube.asarray()
-        wavelengths = self.wavelength_grid.wavelengths(asarray=True, unit="micron")
-        deltas = self.wavelength_grid.deltas(asarray=True, unit="micron")
-
-        # Calculate the map
-        self.unevolved_tir_map = integrate_pixel_seds(cube, wavelengths, deltas)
+        # Calculate the map (or load it)
+        self.unevolved_tir_map = self.get_tir_map("unevolved")
 
     # -----------------------------------------------------------------
 
@@ -342,12 +397,23 @@ class ProjectedDustHeatingAnalyser(DustHeatingAnalysisComponent):
         # Inform the user
         log.info("Calculating the evolved TIR luminosity in each pixel ...")
 
-        cube = self.old_datacube.asarray()
+        # Calculate the map (or load it)
+        self.evolved_tir_map = self.get_tir_map("old")
+
+    # -----------------------------------------------------------------
+
+    def get_tir_map(self, name):
+
+        """
+        This function returns the TIR map of one of the datacubes in the store: it is calculated on first use, and
+        then saved in the store
+        :param name:
+        :return:
+        """
+
         wavelengths = self.wavelength_grid.wavelengths(asarray=True, unit="micron")
         deltas = self.wavelength_grid.deltas(asarray=True, unit="micron")
-
-        # Calculate the map
-        self.evolved_tir_map = integrate_pixel_seds(cube, wavelengths, deltas)
+        return Frame(np.array(self.cubes.derived("tir_" + name, lambda: integrate_pixel_seds(self.cubes[name], wavelengths, deltas))))
 
     # -----------------------------------------------------------------
 
@@ -501,7 +567,7 @@ def integrate_pixel_seds(cube, wls, dwls):
 
     """
     This function ...
-    :param cube:
+    :param cube: the datacube, with the wavelength axis first
     :param wls:
     :param dwls:
     :return:
@@ -510,16 +576,7 @@ def integrate_pixel_seds(cube, wls, dwls):
     Lsun = 3.846e26 # Watts
     MjySr_to_LsunMicron = 1.e6 * (36./206264.806247)**2 * 1.e-26 * 4*np.pi*(0.785e6*3.086e+16)**2 * 3.e14/(wls**2) / Lsun
 
-    xaxis = len(cube[0,0,0:])
-    yaxis = len(cube[0,0:,0])
-    zaxis = len(cube[0:,0,0])
-
-    slice = np.zeros((yaxis,xaxis))
-    for i in range(0,yaxis):
-        for j in range(0,xaxis):
-            sed = cube[0:,i,j]
-            slice[i,j] = np.sum(sed * MjySr_to_LsunMicron * dwls)
-
-    return slice
+    # Integrate the SEDs of all pixels at once
+    return np.tensordot(MjySr_to_LsunMicron * dwls, cube, axes=1)
 
 # -----------------------------------------------------------------
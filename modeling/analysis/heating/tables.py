@@ -12,6 +12,12 @@
 # Ensure Python 3 compatibility
 from __future__ import absolute_import, division, print_function
 
+# Import standard modules
+import numpy as np
+
+# Import astronomical modules
+from astropy.table import Column
+
 # Import the relevant PTS classes and modules
 from ....core.basics.table import SmartTable
 from ....core.tools import arrays
@@ -118,6 +124,21 @@ class AbsorptionTable(SmartTable):
 
     # -----------------------------------------------------------------
 
+    @classmethod
+    def from_store(cls, store):
+
+        """
+        This function creates the table from the columns of a cell store (see CellStore), in which the coordinates of
+        the cells are stored only once for all contributions
+        :param store:
+        :return:
+        """
+
+        columns = [Column(np.asarray(store[name]), name=name) for name in ["x", "y", "z", "total", "old", "young", "ionizing"]]
+        return cls.from_columns(*columns)
+
+    # -----------------------------------------------------------------
+
     def add_entry(self, x, y, z, total, old, young, ionizing):
 
         """
@@ -25,6 +25,7 @@ definition.add_optional("factor_nvalues", "integer", "the number of values for t
 #definition.add_optional("best_factor", "real", "the best estimate for the value of the factor", 0.82)
 
 definition.add_optional("nbins", "positive_integer", "number of bins for signal to noise curve", 20)
+definition.add_optional("nprocesses", "positive_integer", "number of parallel processes for calculating the statistics of the images", 1)
 
 # Cache
 #cache_host_id = get_cache_host_id(modeling_path)
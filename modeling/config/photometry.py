@@ -24,6 +24,7 @@ definition.add_optional("noise_method", "string", "method to use for the apertur
 # -----------------------------------------------------------------
 
 definition.add_flag("plot", "plot SEDs", True)
+definition.add_flag("plot_curves_of_growth", "plot the curve of growth of each image", False)
 
 # -----------------------------------------------------------------
 
@@ -34,3 +35,7 @@ definition.add_optional("reprocess", "lazy_broad_band_filter_list", "reprocess i
 definition.add_optional("plot_images", "lazy_broad_band_filter_list", "plot the image frame and masks for certain filters")
 
 # -----------------------------------------------------------------
+
+definition.add_optional("nprocesses", "positive_integer", "number of processes for the calculation of the fluxes", 1)
+
+# -----------------------------------------------------------------
@@ -23,6 +23,8 @@ from ...core.tools import filesystem as fs
 from ...core.units.parsing import parse_unit as u
 from pts.core.tools.utils import lazyproperty
 from ...core.basics.log import log
+from . import sedlibraries
+from .sedlibraries import BruzualCharlotLibrary
 
 # -----------------------------------------------------------------
 
@@ -123,146 +125,46 @@ def create_bruzual_charlot_sed(metallicity, age, mass=1.):
     :return:
     """
 
-    #seconds_in_year = 31557600.
+    # Get the library (loaded only once)
+    library = BruzualCharlotLibrary.load()
 
-    #// find the appropriate SED from interpolating in the BC library
+    # Interpolate the library in metallicity and age, resample the emissivities to a logarithmic wavelength grid
+    # (the wavelengths of the library have a weird spacing) and convert them to luminosities (i.e. multiply by the
+    # wavelength bins and by the mass of the population in solar masses)
+    luminosity_column = library.luminosities(metallicity, age, mass)[0]
 
-    #// get the luminosities for arbitrary mass and for the appropriate Z and t
-    #setLuminosities(bc.luminosities(1., _metallicity, _age / Constants::year()));
-
-    # double M, double Z, double t, double z=0
-
-    # Load the data
-    _lambdav, _tv, _zv, j_dict = load_bruzual_charlot_data()
-
-    nlambda = 1221
-    nz = 6
-    nt = 221
-    hZ = 0.0
-
-    if metallicity <= _zv[0]: mL = mR = 0
-    elif metallicity >= _zv[nz-1]: mL = mR = nz-1
-    else:
-
-        mL = locate_clip(_zv,metallicity)
-        mR = mL+1
-        #double ZL = _Zv[mL];
-        #double ZR = _Zv[mR];
-        zl = _zv[mL]
-        zr = _zv[mR]
-        #hZ = (Z-ZL)/(ZR-ZL);
-        hz = (metallicity-zl)/(zr-zl)
-
-    ht = 0.0
-
-    age_years = age.to("yr").value
-
-    #print(age, age_years)
-
-    #tl = tr = None
-    #print(_tv[0])
-    #print(_tv[-1])
-
-    if age_years <= _tv[0]: pL = pR = 0
-    elif age_years >= _tv[nt-1]: pL = pR = nt - 1
-    else:
-
-        #pL = NR::locate_clip(_tv,t);
-        pL = locate_clip(_tv, age_years)
-        pR = pL + 1
-        #double tL = _tv[pL];
-        #double tR = _tv[pR];
-        tl = _tv[pL]
-        tr = _tv[pR]
-        #ht = (t-tL)/(tR-tL);
-        ht = (age_years - tl) / (tr - tl)
-
-    #print(tl, tr, pL, pR, ht)
-
-    #const Array& jLLv = _jvv(pL,mL);
-    #const Array& jLRv = _jvv(pL,mR);
-    #const Array& jRLv = _jvv(pR,mL);
-    #const Array& jRRv = _jvv(pR,mR);
-
-    #Array jv(Nlambda);
-
-    jv = [None] * nlambda
-
-    jLLv = j_dict[(pL, mL)]
-    jLRv = j_dict[(pL, mR)]
-    jRLv = j_dict[(pR, mL)]
-    jRRv = j_dict[(pR, mR)]
-
-    #for (int k=0; k<Nlambda; k++)
-    for k in range(nlambda):
-
-        jv[k] = (1.0-ht)*(1.0-hZ) * jLLv[k] + (1.0-ht)*hZ*jLRv[k] + ht*(1.0-hZ)*jRLv[k] + ht * hZ * jRRv[k]
-
-    #// resample to the possibly redshifted simulation wavelength grid,
-    #// convert emissivities to luminosities (i.e. multiply by the wavelength bins),
-    #// multiply by the mass of the population (in solar masses),
-    #// and return the result
-
-    #return NR::resample<NR::interpolate_loglog>(_lambdagrid->lambdav()*(1-z), _lambdav, jv)
-    #                                * _lambdagrid->dlambdav() * M;
-
-    # Return
-    #return jv
-
-    #return NR::resample < NR::interpolateLogLog > (_lambdagrid->lambdav() * (1 - z), _lambdav, jv) * _lambdagrid->dlambdav() * M
-
-    # Array dlambdav(Nlambda);
-    #setWavelengthBins(lambdav, dlambdav);   // set the grid with temporary widths so that lambdamin/max work
-    #for (int ell=0; ell<Nlambda; ell++)
-    #{
-    #    dlambdav[ell] = lambdamax(ell)-lambdamin(ell);
-    #}
-
-    min_wavelength = _lambdav[0]
-    max_wavelength = _lambdav[-1]
-    #print(min_wavelength * 1e6, "micron", max_wavelength * 1e6, "micron")
-
-    from ...core.basics.range import RealRange
-    nwavelength_points = int(round(nlambda * 1.5))
-    wavelength_range = RealRange(min_wavelength, max_wavelength)
-    new_wavelengths = wavelength_range.log(nwavelength_points)
-
-    #dlambdas = []
-    #for index in range(nwavelength_points):
-    #    dlambda = lambdamax(wavelength_column, index) - lambdamin(wavelength_column, index)
-    #    dlambdas.append(dlambda)
+    # Create the SED
+    sed = SED.from_arrays(library.sed_wavelengths, luminosity_column, wavelength_unit="m", photometry_unit="W") # ACTUALLY WHAT IS THE LUMINOSITY UNIT?
 
-    from ...core.simulation.wavelengthgrid import WavelengthGrid
-    new_wavelength_grid = WavelengthGrid.from_wavelengths(new_wavelengths, unit="m")
-    #new_wavelength_grid.plot()
-    #new_wavelength_grid.plot
+    # Return the SED
+    return sed
 
-    # WEIRD SPACING OF BRUZUAL-CHARLOT TEMPLATE WAVELENGTHS!
-    #bc_wavelength_grid = WavelengthGrid.from_wavelengths(_lambdav, unit="m")
-    #bc_wavelength_grid.plot()
-    #bc_wavelength_grid.plot_logdeltas()
+# -----------------------------------------------------------------
 
-    # Interpolate Bruzual-Charlot j's to the new wavelength grid
-    new_jv = resample_log_log(new_wavelengths, _lambdav, jv)
+def create_bruzual_charlot_seds(metallicity, age, mass=1.):
 
-    # In micrometers
-    #wavelength_column = [wavelength_meter * 1e6 for wavelength_meter in _lambdav]
-    #wavelength_column =
+    """
+    This function creates the Bruzual & Charlot SEDs for a batch of parameter sets at once
+    :param metallicity: array of metallicities
+    :param age: array of ages (quantity)
+    :param mass: array of masses
+    :return: the wavelengths (in m) and the luminosities (in W), an array of shape (nmodels, nwavelengths)
+    """
 
-    if hasattr(mass, "unit"): mass_in_solar = mass.to("Msun").value
-    else: mass_in_solar = mass
+    library = BruzualCharlotLibrary.load()
+    return library.sed_wavelengths, library.luminosities(metallicity, age, mass)
 
-    # Get the delta lambdas, in meter
-    deltas = new_wavelength_grid.deltas(unit="m", asarray=True)
+# -----------------------------------------------------------------
 
-    # Create luminositites
-    luminosity_column = np.array(new_jv) * deltas * mass_in_solar
+def bruzual_charlot_paths():
 
-    # Create the SED
-    sed = SED.from_arrays(new_wavelengths, luminosity_column, wavelength_unit="m", photometry_unit="W") # ACTUALLY WHAT IS THE LUMINOSITY UNIT?
+    """
+    This function returns the paths of the files of the Bruzual & Charlot library, in the order of the metallicities
+    :return:
+    """
 
-    # Return the SED
-    return sed
+    zcodev = ["m22", "m32", "m42", "m52", "m62", "m72"]
+    return [fs.join(chabrier_path, "bc2003_lr_" + zcode + "_chab_ssp.ised_ASCII") for zcode in zcodev]
 
 # -----------------------------------------------------------------
 
@@ -286,14 +188,14 @@ def load_bruzual_charlot_data():
     _lambdav = [None] * nlambda
     _tv = [None] * nt
     _zv = [0.0001, 0.0004, 0.004, 0.008, 0.02, 0.05]
-    zcodev = ["m22", "m32", "m42", "m52", "m62", "m72"]
+    filepaths = bruzual_charlot_paths()
 
     j_dict = dict()
 
     # Read the wavelength, age and emissivity vectors from the Bruzual & Charlot library
     for m in range(nz):
 
-        filepath = fs.join(chabrier_path, "bc2003_lr_" + zcodev[m] + "_chab_ssp.ised_ASCII")
+        filepath = filepaths[m]
         #print(filepath)
 
         # Inform the user
@@ -488,26 +390,8 @@ def resample_log_log(xresv, xoriv, yoriv):
     :return:
     """
 
-    Nori = len(xoriv)
-    xmin = xoriv[0]
-    xmax = xoriv[Nori-1]
-    Nres = len(xresv)
-    yresv = [None] * Nres
-
-    # Loop over
-    for l in range(Nres):
-
-        x = xresv[l]
-        if abs(1.0 - x/xmin) < 1e-5: yresv[l] = yoriv[0]
-        elif abs(1.0 - x/xmax) < 1e-5: yresv[l] = yoriv[Nori-1]
-        elif x < xmin or x > xmax: yresv[l] = 0.0
-        else:
-
-            k = locate(xoriv,x)
-            yresv[l] = interpolate_log_log(x, xoriv[k], xoriv[k+1], yoriv[k], yoriv[k+1])
-
-    # Return the interpolated values
-    return yresv
+    # Resample all points at once
+    return list(sedlibraries.resample_log_log(xresv, xoriv, yoriv))
 
 # -----------------------------------------------------------------
 
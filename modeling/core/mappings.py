@@ -21,6 +21,7 @@ from ...core.tools import introspection, tables
 from ...core.tools import filesystem as fs
 from ...core.units.parsing import parse_unit as u
 from pts.core.tools.utils import lazyproperty
+from .sedlibraries import MappingsLibrary
 
 # -----------------------------------------------------------------
 
@@ -227,111 +228,52 @@ def create_mappings_sed(metallicity, pressure, compactness, covering_factor, sfr
     # Add unit to SFR
     if not hasattr(sfr, "unit"): sfr = sfr * u("Msun/yr")
 
-    # Load the data files
-    lambdav, _Zrelv, _logCv, _logpv, j0_dict, j1_dict = load_mappings_data()
-
-    # Convert the input parameters to the parameters that are assumed in MAPPINGS III.
-    # - the metallicity is converted from an absolute value Z to a value Zrel relative to the
-    #   sun, where Zsun = 0.0122 as in Asplund et al. (2005). The same value is used in the MAPPINGS III
-    #   models of Groves et al. (2008).
-    # - the pressure is converted from the actual pressure in SI units (i.e. in Pa = N/m^2) to
-    #   log(p/k), with k Boltzmann's constant, and in units of K/cm^3
-
-    # Relative metallicity
-    rel_metallicity = metallicity / 0.0122
-
-    # Log(pressure)
-    # pressure_in_Kcm3 = (pressure / boltzman).to("K/cm3").value # in SKIRT, the pressure is in program units (=SI units)
-    pressure_in_Kcm3 = pressure.to("K/cm3").value
-    log_p = np.log10(pressure_in_Kcm3)
-
-    # Log(compactness)
-    log_c = compactness  # compactness is already logarithmic
-
-    # Covering factor
-    fPDR = covering_factor
-
-    # Ensure that the value of the parameters is within the boundaries of the parameter space
-    rel_metallicity = max(rel_metallicity, 0.05)
-    rel_metallicity = min(rel_metallicity, 2.0 - 1e-8)
-    log_c = max(log_c, 4.0)
-    log_c = min(log_c, 6.5 - 1e-8)
-    log_p = max(log_p, 4.0)
-    log_p = min(log_p, 8.0 - 1e-8)
-
-    # Find the appropriate SED from interpolating in the library
-    # i_ = find_nearest(np.array(_Zrelv), rel_metallicity)
-    i = locate_clip(_Zrelv, rel_metallicity)
-    # if i_ != i: print(i_, i)
-    hZrel = (rel_metallicity - _Zrelv[i]) / (_Zrelv[i + 1] - _Zrelv[i])
-
-    # j_ = find_nearest(np.array(_logCv), log_c)
-    j = locate_clip(_logCv, log_c)
-    # if j_ != j: print(j_, j)
-    hlogC = (log_c - _logCv[j]) / (_logCv[j + 1] - _logCv[j])
-
-    # k_ = find_nearest(np.array(_logpv), log_p)
-    k = locate_clip(_logpv, log_p)
-    # if k_ != k: print(k_, k)
-    hlogp = (log_p - _logpv[k]) / (_logpv[k + 1] - _logpv[k])
-
-    j0LLLv = j0_dict[i, j, k]
-    j0RLLv = j0_dict[i + 1, j, k]
-    j0LRLv = j0_dict[i, j + 1, k]
-    j0RRLv = j0_dict[i + 1, j + 1, k]
-    j0LLRv = j0_dict[i, j, k + 1]
-    j0RLRv = j0_dict[i + 1, j, k + 1]
-    j0LRRv = j0_dict[i, j + 1, k + 1]
-    j0RRRv = j0_dict[i + 1, j + 1, k + 1]
-    j1LLLv = j1_dict[i, j, k]
-    j1RLLv = j1_dict[i + 1, j, k]
-    j1LRLv = j1_dict[i, j + 1, k]
-    j1RRLv = j1_dict[i + 1, j + 1, k]
-    j1LLRv = j1_dict[i, j, k + 1]
-    j1RLRv = j1_dict[i + 1, j, k + 1]
-    j1LRRv = j1_dict[i, j + 1, k + 1]
-    j1RRRv = j1_dict[i + 1, j + 1, k + 1]
-
-    # Initialize jv
-    jv = np.zeros(len(lambdav))
-
-    # Fill jv
-    for k in range(len(lambdav)):
-        j0 = (1.0 - hZrel) * (1.0 - hlogC) * (1.0 - hlogp) * j0LLLv[k] \
-             + hZrel * (1.0 - hlogC) * (1.0 - hlogp) * j0RLLv[k] \
-             + (1.0 - hZrel) * hlogC * (1.0 - hlogp) * j0LRLv[k] \
-             + hZrel * hlogC * (1.0 - hlogp) * j0RRLv[k] \
-             + (1.0 - hZrel) * (1.0 - hlogC) * hlogp * j0LLRv[k] \
-             + hZrel * (1.0 - hlogC) * hlogp * j0RLRv[k] \
-             + (1.0 - hZrel) * hlogC * hlogp * j0LRRv[k] \
-             + hZrel * hlogC * hlogp * j0RRRv[k]
-
-        j1 = (1.0 - hZrel) * (1.0 - hlogC) * (1.0 - hlogp) * j1LLLv[k] \
-             + hZrel * (1.0 - hlogC) * (1.0 - hlogp) * j1RLLv[k] \
-             + (1.0 - hZrel) * hlogC * (1.0 - hlogp) * j1LRLv[k] \
-             + hZrel * hlogC * (1.0 - hlogp) * j1RRLv[k] \
-             + (1.0 - hZrel) * (1.0 - hlogC) * hlogp * j1LLRv[k] \
-             + hZrel * (1.0 - hlogC) * hlogp * j1RLRv[k] \
-             + (1.0 - hZrel) * hlogC * hlogp * j1LRRv[k] \
-             + hZrel * hlogC * hlogp * j1RRRv[k]
-
-        jk = (1.0 - fPDR) * j0 + fPDR * j1
-        jv[k] = jk
-
-    # Get scalar SFR
-    sfr_scalar = sfr.to("Msun/yr").value
-
-    wavelength_column = [wavelength_meter * 1e6 for wavelength_meter in lambdav]
-    luminosity_column = jv * sfr_scalar * 1e-6 # 1e-6 is to go from per meter to per micron
+    # Get the library (loaded only once)
+    library = MappingsLibrary.load()
+
+    # Interpolate the library (see MappingsLibrary.emissivities for the conversion of the input parameters to the
+    # parameters that are assumed in MAPPINGS III)
+    luminosity_column = library.luminosities(metallicity, pressure, compactness, covering_factor, sfr)[0]
 
     # Create the SED
-    sed = SED.from_arrays(wavelength_column, luminosity_column, wavelength_unit="micron", photometry_unit="W/micron")
+    sed = SED.from_arrays(library.wavelengths_micron, luminosity_column, wavelength_unit="micron", photometry_unit="W/micron")
 
     # Return the SED
     return sed
 
 # -----------------------------------------------------------------
 
+def create_mappings_seds(metallicity, pressure, compactness, covering_factor, sfr=1.0):
+
+    """
+    This function creates the MAPPINGS SEDs for a batch of parameter sets at once
+    :param metallicity: array of metallicities
+    :param pressure: array of pressures (quantity)
+    :param compactness: array of compactnesses
+    :param covering_factor: array of covering factors
+    :param sfr: array of star formation rates
+    :return: the wavelengths (in micron) and the luminosities (in W/micron), an array of shape (nmodels, nwavelengths)
+    """
+
+    library = MappingsLibrary.load()
+    return library.wavelengths_micron, library.luminosities(metallicity, pressure, compactness, covering_factor, sfr)
+
+# -----------------------------------------------------------------
+
+def mappings_filenames():
+
+    """
+    This function returns the names of the files of the MAPPINGS library, in the order of the library grid
+    :return:
+    """
+
+    Zrelnamev = ["Z005", "Z020", "Z040", "Z100", "Z200"]
+    logCnamev = ["C40", "C45", "C50", "C55", "C60", "C65"]
+    logpnamev = ["p4", "p5", "p6", "p7", "p8"]
+    return ["Mappings_" + zname + "_" + cname + "_" + pname + ".dat" for zname in Zrelnamev for cname in logCnamev for pname in logpnamev]
+
+# -----------------------------------------------------------------
+
 def load_mappings_data():
 
     """
@@ -350,15 +292,9 @@ def load_mappings_data():
     _lambdav = None
 
     _Zrelv = [0.05, 0.20, 0.40, 1., 2.]
-    Zrelnamev = ["Z005", "Z020", "Z040", "Z100", "Z200"]
-
-    # vector<QString> logCnamev(NlogC);
     _logCv = [4., 4.5, 5., 5.5, 6., 6.5]
-    logCnamev = ["C40", "C45", "C50", "C55", "C60", "C65"]
-
-    # vector<QString> logpnamev(Nlogp);
     _logpv = [4., 5., 6., 7., 8.]
-    logpnamev = ["p4", "p5", "p6", "p7", "p8"]
+    filenames = iter(mappings_filenames())
 
     # The j0 and j1 values
     j0_dict = dict()
@@ -369,7 +305,7 @@ def load_mappings_data():
         for j in range(NlogC):
             for k in range(Nlogp):
 
-                filename = "Mappings_" + Zrelnamev[i] + "_" + logCnamev[j] + "_" + logpnamev[k] + ".dat"
+                filename = next(filenames)
                 path = fs.join(mappings_path, filename)
 
                 # Check whether the file exists
@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.modeling.core.sedlibraries Contains the MappingsLibrary and BruzualCharlotLibrary classes, which
+#  evaluate the MAPPINGS III and Bruzual & Charlot template SEDs for many sets of parameters at once.
+#
+# The libraries are read from the SKIRT resources only once: the emissivities are stored as binary numpy cubes in the
+# PTS temporary directory (rebuilt when the library files change), and are memory-mapped when loaded.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from ...core.tools import introspection
+from ...core.tools import filesystem as fs
+from ...core.basics.log import log
+
+# -----------------------------------------------------------------
+
+# The path to the directory with the binary library cubes
+cache_path = fs.join(introspection.pts_temp_dir, "sed-libraries")
+
+# The loaded libraries
+_libraries = dict()
+
+# -----------------------------------------------------------------
+
+def load_cached_arrays(name, signature, names, create):
+
+    """
+    This function loads the arrays of a library from the binary cache (memory-mapped), or creates them and adds them
+    to the cache if the cache is absent or outdated
+    :param name: the name of the library
+    :param signature: the signature of the library files
+    :param names: the names of the arrays
+    :param create: function that reads the library files and returns the arrays (in the order of the names)
+    :return:
+    """
+
+    # Determine the paths
+    directory = fs.join(cache_path, name)
+    signature_path = fs.join(directory, "signature.txt")
+    paths = [fs.join(directory, array_name + ".npy") for array_name in names]
+
+    # Load from the cache
+    if fs.is_file(signature_path) and list(fs.read_lines(signature_path))[0] == signature and all(fs.is_file(path) for path in paths):
+        return [np.load(path, mmap_mode="r") for path in paths]
+
+    # Read the library files
+    log.info("Creating the binary cache of the " + name + " library ...")
+    arrays = create()
+
+    # Write the arrays (first to temporary files, then renamed), and then the signature
+    if not fs.is_directory(directory): fs.create_directory(directory, recursive=True)
+    for path, array in zip(paths, arrays):
+        with fs.atomic_write(path) as temp_path: np.save(temp_path, np.asarray(array, dtype=float))
+    fs.write_line(signature_path, signature)
+
+    # Return the arrays, memory-mapped
+    return [np.load(path, mmap_mode="r") for path in paths]
+
+# -----------------------------------------------------------------
+
+def interpolation_indices(grid, values):
+
+    """
+    This function returns, for each value, the index of the grid interval that contains it (clipped to the first and
+    last interval) and the relative position within that interval, as locate_clip does for one value
+    :param grid:
+    :param values:
+    :return:
+    """
+
+    grid = np.asarray(grid, dtype=float)
+    indices = np.clip(np.searchsorted(grid[:-1], values, side="right") - 1, 0, len(grid) - 2)
+    weights = (values - grid[indices]) / (grid[indices + 1] - grid[indices])
+    return indices, weights
+
+# -----------------------------------------------------------------
+
+def resample_log_log(new_wavelengths, wavelengths, values):
+
+    """
+    This function resamples function values defined on a grid onto a new grid, with logarithmic interpolation in both
+    the grid and the function values (or linear interpolation in the function values where these are not positive).
+    Values beyond the original grid are set to zero.
+    :param new_wavelengths: the new grid
+    :param wavelengths: the original grid
+    :param values: the function values on the original grid: an array of shape (..., len(wavelengths))
+    :return: an array of shape (..., len(new_wavelengths))
+    """
+
+    x = np.asarray(new_wavelengths, dtype=float)
+    xv = np.asarray(wavelengths, dtype=float)
+    yv = np.asarray(values, dtype=float)
+    n = len(xv)
+
+    # Locate the new grid points
+    at_min = np.abs(1.0 - x / xv[0]) < 1e-5
+    at_max = ~at_min & (np.abs(1.0 - x / xv[-1]) < 1e-5)
+    inside = ~at_min & ~at_max & (x >= xv[0]) & (x <= xv[-1])
+    k = np.where(x == xv[-1], n - 2, np.searchsorted(xv, x, side="right") - 1)
+    k = np.clip(k, 0, n - 2)
+
+    # Interpolate
+    logx = np.log10(x)
+    logx1 = np.log10(xv[k])
+    logx2 = np.log10(xv[k + 1])
+    f1 = yv[..., k]
+    f2 = yv[..., k + 1]
+    logf = (f1 > 0) & (f2 > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g1 = np.where(logf, np.log10(np.where(logf, f1, 1.)), f1)
+        g2 = np.where(logf, np.log10(np.where(logf, f2, 1.)), f2)
+        fx = g1 + ((logx - logx1) / (logx2 - logx1)) * (g2 - g1)
+        fx = np.where(logf, np.power(10., fx), fx)
+
+    # Set the values at the grid borders and beyond the grid
+    result = np.where(inside, fx, 0.0)
+    result = np.where(at_min, yv[..., :1], result)
+    result = np.where(at_max, yv[..., -1:], result)
+    return result
+
+# -----------------------------------------------------------------
+
+def convolve_with_filters(wavelengths, luminosities, filters):
+
+    """
+    This function convolves a batch of SEDs with a number of filters
+    :param wavelengths: the wavelengths in micron
+    :param luminosities: the spectral luminosities, an array of shape (nmodels, nwavelengths)
+    :param filters: the filters
+    :return: an array of shape (nmodels, nfilters)
+    """
+
+    luminosities = np.atleast_2d(luminosities)
+    return np.column_stack([np.broadcast_to(fltr.convolve(wavelengths, luminosities), (len(luminosities),)) for fltr in filters])
+
+# -----------------------------------------------------------------
+
+class MappingsLibrary(object):
+
+    """
+    This class contains the MAPPINGS III library of the SEDs of star-forming regions (Groves et al. 2008), as used by
+    the MappingsSED class of SKIRT, and evaluates the SEDs for many sets of parameters at once
+    """
+
+    # The library grid
+    zrel_grid = [0.05, 0.20, 0.40, 1., 2.]
+    logc_grid = [4., 4.5, 5., 5.5, 6., 6.5]
+    logp_grid = [4., 5., 6., 7., 8.]
+
+    # -----------------------------------------------------------------
+
+    def __init__(self, wavelengths, j0, j1):
+
+        """
+        The constructor ...
+        :param wavelengths: the wavelengths in m
+        :param j0: the emissivities without PDR, an array of shape (nZrel, nlogC, nlogp, nwavelengths)
+        :param j1: the emissivities with PDR
+        """
+
+        self.wavelengths = wavelengths
+        self.j0 = j0
+        self.j1 = j1
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def load(cls):
+
+        """
+        This function returns the library, read only once per process
+        :return:
+        """
+
+        if "mappings" not in _libraries:
+
+            from .mappings import load_mappings_data, mappings_path, mappings_filenames
+
+            # Define a function to read the library files
+            def create():
+                lambdav, zrelv, logcv, logpv, j0_dict, j1_dict = load_mappings_data()
+                shape = (len(zrelv), len(logcv), len(logpv))
+                j0 = np.array([j0_dict[index] for index in np.ndindex(*shape)]).reshape(shape + (-1,))
+                j1 = np.array([j1_dict[index] for index in np.ndindex(*shape)]).reshape(shape + (-1,))
+                return lambdav, j0, j1
+
+            # Load
+            signature = fs.files_signature([fs.join(mappings_path, filename) for filename in mappings_filenames()])
+            _libraries["mappings"] = cls(*load_cached_arrays("mappings", signature, ["wavelengths", "j0", "j1"], create))
+
+        # Return the library
+        return _libraries["mappings"]
+
+    # -----------------------------------------------------------------
+
+    def emissivities(self, metallicity, pressure, compactness, covering_factor):
+
+        """
+        This function interpolates the library for a batch of parameter sets
+        :param metallicity: the (absolute) metallicities
+        :param pressure: the pressures, as a quantity or in K/cm3
+        :param compactness: the logarithmic compactnesses
+        :param covering_factor: the PDR covering factors
+        :return: the emissivities per unit of SFR (in W/m per Msun/yr), an array of shape (nmodels, nwavelengths)
+        """
+
+        # Convert the input parameters to the parameters that are assumed in MAPPINGS III:
+        # - the metallicity is converted from an absolute value Z to a value Zrel relative to the sun, where
+        #   Zsun = 0.0122 as in Asplund et al. (2005), the value used in the models of Groves et al. (2008)
+        # - the pressure is converted to log(p/k), with k Boltzmann's constant, in units of K/cm3
+        # - the compactness is already logarithmic
+        # and ensure that the parameters are within the boundaries of the parameter space
+        if hasattr(pressure, "unit"): pressure = pressure.to("K/cm3").value
+        metallicity, pressure, compactness, covering_factor = np.broadcast_arrays(np.atleast_1d(metallicity), pressure, compactness, covering_factor)
+        rel_metallicity = np.minimum(np.maximum(metallicity / 0.0122, 0.05), 2.0 - 1e-8)
+        log_c = np.minimum(np.maximum(compactness, 4.0), 6.5 - 1e-8)
+        log_p = np.minimum(np.maximum(np.log10(pressure), 4.0), 8.0 - 1e-8)
+        fpdr = covering_factor[:, np.newaxis]
+
+        # Locate in the grid
+        i, hzrel = interpolation_indices(self.zrel_grid, rel_metallicity)
+        j, hlogc = interpolation_indices(self.logc_grid, log_c)
+        k, hlogp = interpolation_indices(self.logp_grid, log_p)
+
+        # The corners and their weights, in the order of create_mappings_sed
+        corners = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0), (0, 0, 1), (1, 0, 1), (0, 1, 1), (1, 1, 1)]
+        factors = [(1.0 - hzrel, hzrel), (1.0 - hlogc, hlogc), (1.0 - hlogp, hlogp)]
+
+        # Interpolate
+        j0 = j1 = 0
+        for di, dj, dk in corners:
+            weight = (factors[0][di] * factors[1][dj] * factors[2][dk])[:, np.newaxis]
+            j0 = j0 + weight * self.j0[i + di, j + dj, k + dk]
+            j1 = j1 + weight * self.j1[i + di, j + dj, k + dk]
+
+        # Combine
+        return (1.0 - fpdr) * j0 + fpdr * j1
+
+    # -----------------------------------------------------------------
+
+    def luminosities(self, metallicity, pressure, compactness, covering_factor, sfr=1.0):
+
+        """
+        This function ...
+        :param metallicity:
+        :param pressure:
+        :param compactness:
+        :param covering_factor:
+        :param sfr: the star formation rates, as a quantity or in Msun/yr
+        :return: the spectral luminosities (in W/micron), an array of shape (nmodels, nwavelengths)
+        """
+
+        if hasattr(sfr, "unit"): sfr = sfr.to("Msun/yr").value
+        jv = self.emissivities(metallicity, pressure, compactness, covering_factor)
+        return jv * np.reshape(sfr, (-1, 1)) * 1e-6 # 1e-6 is to go from per meter to per micron
+
+    # -----------------------------------------------------------------
+
+    @property
+    def wavelengths_micron(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.wavelengths * 1e6
+
+# -----------------------------------------------------------------
+
+class BruzualCharlotLibrary(object):
+
+    """
+    This class contains the Bruzual & Charlot (2003) library of simple stellar population SEDs with a Chabrier IMF, as
+    used by the BruzualCharlotSEDFamily class of SKIRT, and evaluates the SEDs for many sets of parameters at once
+    """
+
+    # The library metallicities
+    metallicity_grid = [0.0001, 0.0004, 0.004, 0.008, 0.02, 0.05]
+
+    # -----------------------------------------------------------------
+
+    def __init__(self, wavelengths, ages, j):
+
+        """
+        The constructor ...
+        :param wavelengths: the wavelengths in m
+        :param ages: the ages in yr
+        :param j: the emissivities (in W/m per Msun), an array of shape (nages, nmetallicities, nwavelengths)
+        """
+
+        self.wavelengths = wavelengths
+        self.ages = ages
+        self.j = j
+
+        # The regular (logarithmic) wavelength grid of the SEDs
+        self._sed_wavelengths = None
+        self._sed_deltas = None
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def load(cls):
+
+        """
+        This function returns the library, read only once per process
+        :return:
+        """
+
+        if "bruzual_charlot" not in _libraries:
+
+            from .bruzualcharlot import load_bruzual_charlot_data, bruzual_charlot_paths
+
+            # Define a function to read the library files
+            def create():
+                lambdav, tv, zv, j_dict = load_bruzual_charlot_data()
+                j = np.array([[j_dict[(p, m)] for m in range(len(zv))] for p in range(len(tv))])
+                return lambdav, tv, j
+
+            # Load
+            signature = fs.files_signature(bruzual_charlot_paths())
+            _libraries["bruzual_charlot"] = cls(*load_cached_arrays("bruzual_charlot", signature, ["wavelengths", "ages", "j"], create))
+
+        # Return the library
+        return _libraries["bruzual_charlot"]
+
+    # -----------------------------------------------------------------
+
+    def emissivities(self, metallicity, age):
+
+        """
+        This function interpolates the library for a batch of parameter sets (clipping to the borders of the library)
+        :param metallicity: the metallicities
+        :param age: the ages, as a quantity or in yr
+        :return: the emissivities (in W/m per Msun), an array of shape (nmodels, nwavelengths)
+        """
+
+        if hasattr(age, "unit"): age = age.to("yr").value
+        metallicity, age = np.broadcast_arrays(np.atleast_1d(np.asarray(metallicity, dtype=float)), np.asarray(age, dtype=float))
+
+        # Locate in the grid
+        m, hz = interpolation_indices(self.metallicity_grid, metallicity)
+        p, ht = interpolation_indices(self.ages, age)
+        hz = np.clip(hz, 0., 1.)[:, np.newaxis]
+        ht = np.clip(ht, 0., 1.)[:, np.newaxis]
+
+        # Interpolate
+        return (1.0-ht)*(1.0-hz) * self.j[p, m] + (1.0-ht)*hz*self.j[p, m+1] + ht*(1.0-hz)*self.j[p+1, m] + ht * hz * self.j[p+1, m+1]
+
+    # -----------------------------------------------------------------
+
+    @property
+    def sed_wavelengths(self):
+
+        """
+        This function returns the logarithmic wavelength grid (in m) on which the SEDs are created
+        :return:
+        """
+
+        if self._sed_wavelengths is None: self._create_sed_grid()
+        return self._sed_wavelengths
+
+    # -----------------------------------------------------------------
+
+    @property
+    def sed_deltas(self):
+
+        """
+        This function returns the widths (in m) of the wavelength bins of the SED grid
+        :return:
+        """
+
+        if self._sed_deltas is None: self._create_sed_grid()
+        return self._sed_deltas
+
+    # -----------------------------------------------------------------
+
+    def _create_sed_grid(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        from ...core.basics.range import RealRange
+        from ...core.simulation.wavelengthgrid import WavelengthGrid
+
+        nwavelength_points = int(round(len(self.wavelengths) * 1.5))
+        self._sed_wavelengths = RealRange(float(self.wavelengths[0]), float(self.wavelengths[-1])).log(nwavelength_points)
+        self._sed_deltas = WavelengthGrid.from_wavelengths(self._sed_wavelengths, unit="m").deltas(unit="m", asarray=True)
+
+    # -----------------------------------------------------------------
+
+    def luminosities(self, metallicity, age, mass=1.0, wavelengths=None):
+
+        """
+        This function ...
+        :param metallicity:
+        :param age:
+        :param mass: the masses, as a quantity or in Msun
+        :param wavelengths: the wavelengths (in m) onto which the SEDs are resampled (the logarithmic SED grid if None)
+        :return: the luminosities per wavelength bin (in W), an array of shape (nmodels, nwavelengths)
+        """
+
+        if hasattr(mass, "unit"): mass = mass.to("Msun").value
+
+        # Get the wavelength grid
+        if wavelengths is None: wavelengths, deltas = self.sed_wavelengths, self.sed_deltas
+        else:
+            from ...core.simulation.wavelengthgrid import WavelengthGrid
+            deltas = WavelengthGrid.from_wavelengths(wavelengths, unit="m").deltas(unit="m", asarray=True)
+
+        # Interpolate and resample
+        jv = resample_log_log(wavelengths, self.wavelengths, self.emissivities(metallicity, age))
+        return jv * deltas * np.reshape(mass, (-1, 1))
+
+# -----------------------------------------------------------------
@@ -0,0 +1,534 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+## \package pts.modeling.fitting.history Contains the FittingHistory class, a consolidated store of all models
+#  that have been evaluated in the different generations of a fitting run.
+
+# -----------------------------------------------------------------
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from ...core.basics.log import log
+from ...core.tools import filesystem as fs
+from ...core.units.parsing import parse_unit as u
+from ...core.filter.filter import parse_filter
+from ..core.model import Model
+
+# -----------------------------------------------------------------
+
+class FittingHistory(object):
+
+    """
+    This class contains the simulation name, generation, parameter values, chi squared value and (optionally)
+    the relative flux differences of every model that has been evaluated in a fitting run, as flat arrays.
+    It is indexed by generation and by the unique values of each parameter, so that the marginal probability
+    distributions can be obtained in a single pass.
+    """
+
+    def __init__(self, parameter_labels, units=None, filter_names=None):
+
+        """
+        The constructor ...
+        :param parameter_labels:
+        :param units: the units of the parameter values (dictionary of strings)
+        :param filter_names: the names of the filters for the flux differences
+        """
+
+        # The parameters and their units
+        self.parameter_labels = list(parameter_labels)
+        self.units = dict(units) if units is not None else dict()
+
+        # The filters
+        self.filter_names = list(filter_names) if filter_names is not None else []
+
+        # The generation names (in the order in which they have been added)
+        self.generation_names = []
+
+        # The model data
+        self.simulation_names = np.array([], dtype=str)
+        self.generation_indices = np.array([], dtype=np.int64)
+        self.parameter_values = np.zeros((0, len(self.parameter_labels)), dtype=np.float64)
+        self.chi_squared = np.array([], dtype=np.float64)
+        self.differences = np.zeros((0, len(self.filter_names)), dtype=np.float64)
+
+        # The modification times of the chi squared and parameters tables from which each generation was added
+        self.table_stamps = dict()
+
+        # The path
+        self.path = None
+
+        # The indices
+        self._simulation_index = None
+        self._unique = dict()
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def from_file(cls, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        # Load the arrays (and close the file)
+        with np.load(path) as archive:
+
+            # Create
+            units = dict((str(label), str(unit)) for label, unit in zip(archive["unit_labels"], archive["unit_strings"]))
+            history = cls([str(label) for label in archive["parameter_labels"]], units=units, filter_names=[str(name) for name in archive["filter_names"]])
+
+            # Set the data
+            history.generation_names = [str(name) for name in archive["generation_names"]]
+            history.simulation_names = archive["simulation_names"].astype(str)
+            history.generation_indices = archive["generation_indices"]
+            history.parameter_values = archive["parameter_values"]
+            history.chi_squared = archive["chi_squared"]
+            history.differences = archive["differences"]
+
+            # Set the modification times of the tables (histories saved without them are updated completely)
+            if "stamp_generations" in archive.files:
+                history.table_stamps = dict((str(name), tuple(stamps)) for name, stamps in zip(archive["stamp_generations"], archive["stamp_values"]))
+
+        # Set the path
+        history.path = path
+
+        # Return
+        return history
+
+    # -----------------------------------------------------------------
+
+    @classmethod
+    def for_fitting_run(cls, fitting_run, update=True):
+
+        """
+        This function loads the history of a fitting run and (if update is enabled) adds the models of the finished
+        generations that are not yet in it
+        :param fitting_run:
+        :param update:
+        :return:
+        """
+
+        path = fitting_run.history_path
+
+        # Load or create
+        if fs.is_file(path): history = cls.from_file(path)
+        else:
+            units = dict((label, str(unit)) for label, unit in fitting_run.parameter_units.items() if unit is not None)
+            history = cls(fitting_run.free_parameter_labels, units=units, filter_names=fitting_run.fitting_filter_names)
+            history.path = path
+
+        # Update
+        if update and history.update(fitting_run): history.save()
+
+        # Return
+        return history
+
+    # -----------------------------------------------------------------
+
+    @property
+    def nmodels(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return len(self.chi_squared)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def ngenerations(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return len(self.generation_names)
+
+    # -----------------------------------------------------------------
+
+    def has_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return generation_name in self.generation_names
+
+    # -----------------------------------------------------------------
+
+    def nmodels_in_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        if not self.has_generation(generation_name): return 0
+        return int(np.count_nonzero(self.generation_indices == self.generation_names.index(generation_name)))
+
+    # -----------------------------------------------------------------
+
+    def update(self, fitting_run):
+
+        """
+        This function adds the models of the finished generations that are not in the history yet, or of which the
+        chi squared or parameters table has been modified since they were added
+        :param fitting_run:
+        :return: whether the history has been changed
+        """
+
+        changed = False
+
+        # Loop over the finished generations
+        for generation_name in fitting_run.finished_generations:
+
+            # Get the modification times of the tables
+            stamps = (os.path.getmtime(fitting_run.chi_squared_table_path_for_generation(generation_name)),
+                      os.path.getmtime(fitting_run.parameters_table_path_for_generation(generation_name)))
+
+            # Already added, from the same tables
+            if self.has_generation(generation_name) and self.table_stamps.get(generation_name) == stamps: continue
+
+            # Debugging
+            log.debug("Adding the models of generation '" + generation_name + "' to the fitting history ...")
+
+            # Load the chi squared and parameters table
+            chi_squared_table = fitting_run.chi_squared_table_for_generation(generation_name)
+            parameters_table = fitting_run.parameters_table_for_generation(generation_name)
+
+            # Add, with the flux differences
+            self.add_generation(generation_name, chi_squared_table, parameters_table)
+            self.load_differences(fitting_run, generation_name)
+            self.table_stamps[generation_name] = stamps
+            changed = True
+
+        # Return
+        return changed
+
+    # -----------------------------------------------------------------
+
+    def load_differences(self, fitting_run, generation_name):
+
+        """
+        This function sets the relative flux differences of the models of a generation, from the flux differences
+        tables written by the model analyser (models that have not been analysed keep NaN values)
+        :param fitting_run:
+        :param generation_name:
+        :return:
+        """
+
+        from .modelanalyser import FluxDifferencesTable
+
+        # The filter names of the history, by the string of the parsed filter
+        names = dict((str(parse_filter(name)), name) for name in self.filter_names)
+
+        # Loop over the simulations of the generation
+        for index in self.indices_for_generation(generation_name):
+
+            simulation_name = str(self.simulation_names[index])
+            path = fitting_run.flux_differences_path_for_simulation(generation_name, simulation_name)
+            if not fs.is_file(path): continue
+
+            # Load the table and set the differences
+            table = FluxDifferencesTable.from_file(path)
+            differences = dict()
+            for fltr, difference in zip(table.filters(), table["Relative difference"]):
+                if str(fltr) in names: differences[names[str(fltr)]] = difference
+            self.set_differences(simulation_name, differences)
+
+    # -----------------------------------------------------------------
+
+    def add_generation(self, generation_name, chi_squared_table, parameters_table):
+
+        """
+        This function (re)places the models of a generation, joining the chi squared and parameters tables
+        :param generation_name:
+        :param chi_squared_table:
+        :param parameters_table:
+        :return:
+        """
+
+        # Join on the simulation name
+        chi_squared_names = np.array(chi_squared_table["Simulation name"]).astype(str)
+        parameters_names = np.array(parameters_table["Simulation name"]).astype(str)
+        row_for_name = dict((name, index) for index, name in enumerate(parameters_names))
+        try: rows = np.array([row_for_name[name] for name in chi_squared_names], dtype=np.int64)
+        except KeyError as e: raise ValueError("Simulation " + str(e) + " of generation '" + generation_name + "' is not in the parameters table")
+
+        # Get the parameter values, in the units of the history
+        values = np.empty((len(rows), len(self.parameter_labels)), dtype=np.float64)
+        for j, label in enumerate(self.parameter_labels):
+            column = np.asarray(parameters_table[label], dtype=np.float64)[rows]
+            unit = parameters_table.column_unit(label)
+            if unit is not None and label in self.units: column = column * unit.to(u(self.units[label]))
+            values[:, j] = column
+
+        # Add the models
+        self.add_models(generation_name, chi_squared_names, values, np.asarray(chi_squared_table["Chi squared"], dtype=np.float64))
+
+    # -----------------------------------------------------------------
+
+    def add_models(self, generation_name, simulation_names, parameter_values, chi_squared, differences=None):
+
+        """
+        This function (re)places the models of a generation
+        :param generation_name:
+        :param simulation_names:
+        :param parameter_values: array of shape (nmodels, nparameters)
+        :param chi_squared:
+        :param differences: relative flux differences, array of shape (nmodels, nfilters)
+        :return:
+        """
+
+        # Get the generation index, remove models that were already added
+        if generation_name in self.generation_names:
+            index = self.generation_names.index(generation_name)
+            keep = self.generation_indices != index
+            self.simulation_names = self.simulation_names[keep]
+            self.generation_indices = self.generation_indices[keep]
+            self.parameter_values = self.parameter_values[keep]
+            self.chi_squared = self.chi_squared[keep]
+            self.differences = self.differences[keep]
+        else:
+            index = len(self.generation_names)
+            self.generation_names.append(generation_name)
+
+        nmodels = len(chi_squared)
+        if differences is None: differences = np.full((nmodels, len(self.filter_names)), np.nan)
+
+        # Append
+        self.simulation_names = np.concatenate((self.simulation_names, np.asarray(simulation_names).astype(str)))
+        self.generation_indices = np.concatenate((self.generation_indices, np.full(nmodels, index, dtype=np.int64)))
+        self.parameter_values = np.concatenate((self.parameter_values, np.asarray(parameter_values, dtype=np.float64).reshape(nmodels, -1)))
+        self.chi_squared = np.concatenate((self.chi_squared, np.asarray(chi_squared, dtype=np.float64)))
+        self.differences = np.concatenate((self.differences, np.asarray(differences, dtype=np.float64).reshape(nmodels, -1)))
+
+        # Reset the indices
+        self._simulation_index = None
+        self._unique = dict()
+
+    # -----------------------------------------------------------------
+
+    def set_differences(self, simulation_name, differences):
+
+        """
+        This function sets the relative flux differences of a model
+        :param simulation_name:
+        :param differences: dictionary of filter name to relative difference
+        :return:
+        """
+
+        index = self.index_for_simulation(simulation_name)
+        for filter_name, difference in differences.items():
+            if filter_name not in self.filter_names: continue
+            self.differences[index, self.filter_names.index(filter_name)] = difference
+
+    # -----------------------------------------------------------------
+
+    def index_for_simulation(self, simulation_name):
+
+        """
+        This function ...
+        :param simulation_name:
+        :return:
+        """
+
+        if self._simulation_index is None: self._simulation_index = dict((name, index) for index, name in enumerate(self.simulation_names))
+        return self._simulation_index[simulation_name]
+
+    # -----------------------------------------------------------------
+
+    def selection(self, generation_names=None):
+
+        """
+        This function returns the indices of the models of the specified generations (all models if None)
+        :param generation_names:
+        :return:
+        """
+
+        if generation_names is None: return np.arange(self.nmodels)
+        generation_indices = [self.generation_names.index(name) for name in generation_names if name in self.generation_names]
+        return np.where(np.in1d(self.generation_indices, generation_indices))[0]
+
+    # -----------------------------------------------------------------
+
+    def indices_for_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return self.selection([generation_name])
+
+    # -----------------------------------------------------------------
+
+    def unique_values(self, label):
+
+        """
+        This function returns the sorted unique values of a parameter, and for each model the index of its value
+        :param label:
+        :return:
+        """
+
+        if label not in self._unique: self._unique[label] = np.unique(self.parameter_values[:, self.parameter_labels.index(label)], return_inverse=True)
+        return self._unique[label]
+
+    # -----------------------------------------------------------------
+
+    @property
+    def probabilities(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return np.exp(-0.5 * self.chi_squared)
+
+    # -----------------------------------------------------------------
+
+    def parameter_values_for_index(self, index):
+
+        """
+        This function ...
+        :param index:
+        :return:
+        """
+
+        values = dict()
+        for j, label in enumerate(self.parameter_labels):
+            if label in self.units: values[label] = self.parameter_values[index, j] * u(self.units[label])
+            else: values[label] = self.parameter_values[index, j]
+        return values
+
+    # -----------------------------------------------------------------
+
+    def parameter_values_for_simulation(self, simulation_name):
+
+        """
+        This function ...
+        :param simulation_name:
+        :return:
+        """
+
+        return self.parameter_values_for_index(self.index_for_simulation(simulation_name))
+
+    # -----------------------------------------------------------------
+
+    def parameter_probabilities(self, label, generation_names=None):
+
+        """
+        This function returns the unique values of a parameter and the combined probability of all models with
+        each value
+        :param label:
+        :param generation_names:
+        :return:
+        """
+
+        values, inverse = self.unique_values(label)
+        selection = self.selection(generation_names)
+        probabilities = np.bincount(inverse[selection], weights=self.probabilities[selection], minlength=len(values))
+
+        # Only the values that occur in the selection
+        present = np.bincount(inverse[selection], minlength=len(values)) > 0
+        return values[present], probabilities[present]
+
+    # -----------------------------------------------------------------
+
+    def best_index(self, generation_names=None):
+
+        """
+        This function ...
+        :param generation_names:
+        :return:
+        """
+
+        selection = self.selection(generation_names)
+        if len(selection) == 0: return None
+        return selection[np.argmin(self.chi_squared[selection])]
+
+    # -----------------------------------------------------------------
+
+    def best_model(self, generation_names=None):
+
+        """
+        This function returns the model with the lowest chi squared value
+        :param generation_names:
+        :return:
+        """
+
+        index = self.best_index(generation_names)
+        if index is None: return None
+        return Model(simulation_name=str(self.simulation_names[index]), chi_squared=self.chi_squared[index], parameter_values=self.parameter_values_for_index(index))
+
+    # -----------------------------------------------------------------
+
+    def best_model_for_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return self.best_model([generation_name])
+
+    # -----------------------------------------------------------------
+
+    def save(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        if self.path is None: raise RuntimeError("Path is not defined")
+        self.saveto(self.path)
+
+    # -----------------------------------------------------------------
+
+    def saveto(self, path):
+
+        """
+        This function ...
+        :param path:
+        :return:
+        """
+
+        unit_labels = sorted(self.units.keys())
+        stamp_generations = sorted(self.table_stamps.keys())
+
+        # Write to a temporary file first and then move it into place
+        with fs.atomic_write(path) as temp_path:
+            np.savez(temp_path, parameter_labels=np.array(self.parameter_labels, dtype=str),
+                     unit_labels=np.array(unit_labels, dtype=str), unit_strings=np.array([self.units[label] for label in unit_labels], dtype=str),
+                     filter_names=np.array(self.filter_names, dtype=str), generation_names=np.array(self.generation_names, dtype=str),
+                     simulation_names=self.simulation_names.astype(str), generation_indices=self.generation_indices,
+                     parameter_values=self.parameter_values, chi_squared=self.chi_squared, differences=self.differences,
+                     stamp_generations=np.array(stamp_generations, dtype=str),
+                     stamp_values=np.array([self.table_stamps[name] for name in stamp_generations], dtype=np.float64).reshape(-1, 2))
+
+        # Set the path
+        self.path = path
+
+# -----------------------------------------------------------------
@@ -39,6 +39,7 @@ from ..build.component import get_representation
 from ...core.tools import sequences
 from ..build.component import get_model_definition
 from pts.core.tools.utils import lazyproperty
+from .history import FittingHistory
 
 # -----------------------------------------------------------------
 
@@ -167,6 +168,9 @@ class FittingRun(object):
         # The directory with the combined probability tables for the different free parameters
         self.prob_parameters_path = fs.create_directory_in(self.prob_path, "parameters")
 
+        # The file with the consolidated history of all evaluated models
+        self.history_path = fs.join(self.prob_path, "history.npz")
+
         ## BEST PARAMETERS TABLE
 
         # Set the path to the best parameters table
@@ -1366,6 +1370,19 @@ class FittingRun(object):
 
     # -----------------------------------------------------------------
 
+    def flux_differences_path_for_simulation(self, generation_name, simulation_name):
+
+        """
+        This function returns the path of the flux differences table that is written by the model analyser
+        :param generation_name:
+        :param simulation_name:
+        :return:
+        """
+
+        return fs.join(self.get_generation_path(generation_name), simulation_name, "misc", "differences.dat")
+
+    # -----------------------------------------------------------------
+
     def parameters_table_for_generation(self, generation_name):
 
         """
@@ -1738,27 +1755,39 @@ class FittingRun(object):
     # -----------------------------------------------------------------
 
     @lazyproperty
-    def best_model_finished_generations(self):
+    def history(self):
 
         """
-        This function ...
+        This function loads the fitting history (use update_history to add the models of new finished generations)
         :return:
         """
 
-        # Set best model to None initially
-        best_model = None
+        return FittingHistory.for_fitting_run(self, update=False)
 
-        # Loop over the finished generations
-        for generation_name in self.finished_generations:
+    # -----------------------------------------------------------------
 
-            # Get the best model for this generation
-            model = self.best_model_for_generation(generation_name)
+    def update_history(self):
 
-            # Replace the best model if necessary
-            if best_model is None or model.chi_squared < best_model.chi_squared: best_model = model
+        """
+        This function adds the models of the finished generations that are not yet in the fitting history, or of which
+        the tables have changed, and saves the history
+        :return:
+        """
 
-        # Return the best model
-        return best_model
+        if self.history.update(self): self.history.save()
+        return self.history
+
+    # -----------------------------------------------------------------
+
+    @lazyproperty
+    def best_model_finished_generations(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return self.update_history().best_model(self.finished_generations)
 
     # -----------------------------------------------------------------
 
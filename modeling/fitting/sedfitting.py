@@ -160,6 +160,9 @@ class SEDFitter(FittingComponent):
         # Inform the user
         log.info("Calculating the probabilities ...")
 
+        # Add the models of new (or changed) finished generations to the fitting history
+        self.fitting_run.update_history()
+
         # Calculate the probability tables
         self.calculate_model_probabilities()
 
@@ -196,36 +199,22 @@ class SEDFitter(FittingComponent):
             # Otherwise, calculate the probabilities based on the chi squared table
             else:
 
-                # Load the parameter table
-                parameter_table = self.fitting_run.parameters_table_for_generation(generation_name)
-
-                # Load the chi squared table
-                chi_squared_table = self.fitting_run.chi_squared_table_for_generation(generation_name)
+                # Get the indices of the models of this generation in the fitting history
+                history = self.fitting_run.history
+                indices = history.indices_for_generation(generation_name)
 
-                # Sort the table for decreasing chi squared value
-                chi_squared_table.sort("Chi squared")
-                chi_squared_table.reverse()
-
-                # Get the chi squared values
-                chi_squared_values = chi_squared_table["Chi squared"]
+                # Sort for decreasing chi squared value
+                indices = indices[np.argsort(history.chi_squared[indices])[::-1]]
 
                 # Calculate the probability for each model
-                probabilities = np.exp(-0.5 * chi_squared_values)
+                probabilities = history.probabilities[indices]
 
                 # Create the probabilities table
                 probabilities_table = ModelProbabilitiesTable(parameters=self.fitting_run.free_parameter_labels, units=self.fitting_run.parameter_units)
 
                 # Add the entries to the model probabilities table
-                for i in range(len(chi_squared_table)):
-
-                    # Get the simulation name
-                    simulation_name = chi_squared_table["Simulation name"][i]
-
-                    # Get a dictionary with the parameter values for this simulation
-                    parameter_values = parameter_table.parameter_values_for_simulation(simulation_name)
-
-                    # Add an entry to the table
-                    probabilities_table.add_entry(simulation_name, parameter_values, probabilities[i])
+                for index, probability in zip(indices, probabilities):
+                    probabilities_table.add_entry(history.simulation_names[index], history.parameter_values_for_index(index), probability)
 
                 # Save the model probabilities table
                 probabilities_table.saveto(self.prob_generations_table_paths[generation_name])
@@ -248,37 +237,14 @@ class SEDFitter(FittingComponent):
         # Loop over the free parameters
         for label in self.fitting_run.free_parameter_labels:
 
-            # Create a set for the unique values
-            unique_values = set()
-
-            # Loop over the generations to extract all unique values for the parameter
-            for generation_name in self.model_probabilities:
-
-                # Loop over the values of this parameter for this generation, and expand the set accordingly
-                for value in self.model_probabilities[generation_name][label]: unique_values.add(value)
-
-            # Get a (sorted) list of all the unique values for this parameter
-            unique_values = sorted(list(unique_values))
+            # Combine the probabilities of all models with the same value for this parameter
+            values, probabilities = self.fitting_run.history.parameter_probabilities(label, list(self.model_probabilities.keys()))
 
             # Initialize a ParameterProbabilitiesTable instance for this parameter
             table = ParameterProbabilitiesTable()
 
             # Add an entry for each unique parameter value that has been encountered
-            for value in unique_values:
-
-                # Add the probabilities from all models that have this value
-                individual_probabilities = []
-
-                for generation_name in self.model_probabilities:
-
-                    simulation_indices = self.model_probabilities[generation_name][label] == value
-                    individual_probabilities += list(self.model_probabilities[generation_name]["Probability"][simulation_indices])
-
-                # Combine the individual probabilities
-                combined_probability = np.sum(np.array(individual_probabilities))
-
-                # Add an entry to the table
-                table.add_entry(value, combined_probability)
+            for value, probability in zip(values, probabilities): table.add_entry(value, probability)
 
             # Set the table
             self.parameter_probabilities[label] = table
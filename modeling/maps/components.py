@@ -9266,13 +9266,14 @@ def interpolate_map_in_frame(the_map, method, region_or_mask, smoothing_factor=N
     log.info("Interpolating the map as a frame ...")
 
     # Check interpolation method
-    if method != "kernel": raise ValueError("The interpolation method can only be 'kernel'")
+    if method not in ["kernel", "harmonic", "biharmonic"]: raise ValueError("The interpolation method can only be 'kernel', 'harmonic' or 'biharmonic'")
 
     # Plot?
     if plot: plotting.plot_frame(the_map, title="before interpolation")
 
     # Get the map and interpolate in the ellipse region
-    mask = the_map.interpolate(region_or_mask, max_iterations=None, smoothing_factor=smoothing_factor)
+    if method == "kernel": mask = the_map.interpolate(region_or_mask, max_iterations=None, smoothing_factor=smoothing_factor, method=method)
+    else: mask = the_map.interpolate(region_or_mask, method=method)
 
     # Plot mask
     if plot: plotting.plot_mask(mask, title="interpolation mask")
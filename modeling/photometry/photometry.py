@@ -31,10 +31,13 @@ from .tables import FluxDifferencesTable
 from ...core.basics.configuration import DictConfigurationSetter, ConfigurationDefinition
 from ..preparation.preparer import has_statistics, load_statistics
 from ...dustpedia.core.properties import has_calibration_error, get_calibration_error
-from ...core.tools.utils import lazyproperty
+from ...core.tools.utils import lazyproperty, LazyDictionary
+from ...core.filter.broad import BroadBandFilter
 from ...magic.core.mask import intersection, union
 from ...magic.core.image import Image
 from ...magic.core.frame import Frame
+from ...magic.core.radialprofile import RadialBins
+from ...magic.photometry.imagefluxes import calculate_image_fluxes
 from ...core.filter.filter import parse_filter
 from ...magic.tools import plotting
 from ...core.tools import numbers
@@ -98,12 +101,11 @@ class PhotoMeter(PhotometryComponent):
         # Call the constructor of the base class
         super(PhotoMeter, self).__init__(*args, **kwargs)
 
-        # The list of images
-        self.images = dict()
+        # The images (loaded when they are first used)
+        self.images = LazyDictionary(self.load_image)
 
-        # Masks
-        self.truncation_masks = dict()
-        self.clip_masks = dict()
+        # The filters of the images
+        self.filters = dict()
 
         # The SED
         self.sed = None
@@ -144,22 +146,19 @@ class PhotoMeter(PhotometryComponent):
         # 2. Load the images
         if not self.has_seds: self.load_images()
 
-        # 3. Load masks
-        if not self.has_all_images: self.load_masks()
-
-        # 4. Apply masks
+        # 3. Create the masks, apply them, and write the images with the masks
         if not self.has_all_images: self.apply_masks()
 
-        # 5. Calculate the fluxes
+        # 4. Calculate the fluxes
         if not self.has_seds: self.calculate_fluxes()
 
-        # 6. Calculate the differences between the calculated photometry and the reference SEDs
+        # 5. Calculate the differences between the calculated photometry and the reference SEDs
         if not self.has_differences: self.calculate_differences()
 
-        # 7. Writing
+        # 6. Writing
         self.write()
 
-        # 8. Plotting
+        # 7. Plotting
         if self.config.plot: self.plot()
 
     # -----------------------------------------------------------------
@@ -203,61 +202,62 @@ class PhotoMeter(PhotometryComponent):
     def load_images(self):
 
         """
-        This function ...
+        This function determines the images and their filters: the images (or the frames of the dataset for the images
+        that have not been created yet) are only loaded when they are used
         :return:
         """
 
         # Inform the user
         log.info("Loading the images and error maps ...")
 
-        # Load all data
+        # Loop over the images of the dataset
         for name in self.dataset.names:
 
             # Debugging
             log.debug("Loading the " + name + " image ...")
 
+            # Remove the image if it has to be reprocessed
+            if self.reprocess_image(name): fs.remove_file_if_present(self.get_path_for_image(name))
+
+            # Get the filter (from the header), only broad band filters
+            fltr = self.dataset.get_filter(name)
+            if not isinstance(fltr, BroadBandFilter): continue
+
             # Image already created
-            if self.has_image(name):
+            if self.has_image(name): log.success("Truncated '" + name + "' image with masks has already been created")
 
-                # Success
-                log.success("Truncated '" + name + "' image with masks has already been created: loading ...")
+            # Check whether preparation statistics can be found
+            elif not has_statistics(self.config.path, name): raise ValueError("Something went wrong in preparation: statistics not found")
 
-                # Load the image
-                self.images[name] = self.load_image(name)
-                continue
+            # Add the image, to be loaded when it is used
+            self.images[name] = name
+            self.filters[name] = fltr
 
-            # Load the frame
-            frame = self.dataset.get_frame(name)
+    # -----------------------------------------------------------------
 
-            # Only broad band filters
-            if not frame.is_broad_band: continue
+    def load_image(self, name):
 
-            # Check whether preparation statistics can be found
-            if not has_statistics(self.config.path, name): raise ValueError("Something went wrong in preparation: statistics not found")
-
-            # # Load the statistics
-            # statistics = load_statistics(self.config.path, name)
-            # mean_frame = statistics.mean_frame
-            # median_frame = statistics.median_frame
-            # stddev_frame = statistics.stddev_frame
-            # mean_frame_not_clipped = statistics.mean_frame_not_clipped
-            # median_frame_not_clipped = statistics.median_frame_not_clipped
-            # stddev_frame_not_clipped = statistics.stddev_frame_not_clipped
-            # mean_sky = statistics.mean_sky
-            # median_sky = statistics.median_sky
-            # mean_noise = statistics.mean_noise
-            # mean_subtracted = statistics.mean_subtracted
-            # median_subtracted = statistics.median_subtracted
-            # stddev_subtracted = statistics.stddev_subtracted
+        """
+        This function loads an image: the image with masks if it has already been created, the frame of the dataset
+        (converted to a non- angular or intrinsic area unit) otherwise
+        :param name:
+        :return:
+        """
 
-            # Debugging
-            log.debug("Checking the units of the image ...")
+        # Load the image with masks
+        if self.has_image(name): return Image.from_file(self.get_path_for_image(name))
+
+        # Load the frame
+        frame = self.dataset.get_frame(name)
+
+        # Debugging
+        log.debug("Checking the units of the image ...")
 
-            # Convert to non- angular or intrinsic area unit
-            if frame.is_per_angular_or_intrinsic_area: frame.convert_to_corresponding_non_angular_or_intrinsic_area_unit()
+        # Convert to non- angular or intrinsic area unit
+        if frame.is_per_angular_or_intrinsic_area: frame.convert_to_corresponding_non_angular_or_intrinsic_area_unit()
 
-            # Add to the appropriate dictionary
-            self.images[name] = frame #+ sky # add the sky to the frame # FOR FULL TREATMENT AS CAAPR
+        # Return the frame
+        return frame #+ sky # add the sky to the frame # FOR FULL TREATMENT AS CAAPR
 
     # -----------------------------------------------------------------
 
@@ -269,7 +269,7 @@ class PhotoMeter(PhotometryComponent):
         :return:
         """
 
-        return list(sorted(self.images.keys(), key=lambda name: self.images[name].filter.wavelength.to("micron").value))
+        return list(sorted(self.images.keys(), key=lambda name: self.filters[name].wavelength.to("micron").value))
 
     # -----------------------------------------------------------------
 
@@ -309,7 +309,7 @@ class PhotoMeter(PhotometryComponent):
         :return:
         """
 
-        return self.images[name].filter
+        return self.filters[name]
 
     # -----------------------------------------------------------------
 
@@ -333,50 +333,26 @@ class PhotoMeter(PhotometryComponent):
         :return:
         """
 
-        return self.images[name].wcs
-
-    # -----------------------------------------------------------------
-
-    def load_masks(self):
-
-        """
-        Thisn function ...
-        :return:
-        """
-
-        # Inform the user
-        log.info("Loading the masks ...")
-
-        # Loop over the images
-        for name in self.image_names:
-
-            # Masks already in created image
-            if self.has_image(name): continue
-
-            # Get frame and error map
-            frame = self.images[name]
-            errors = self.dataset.get_errormap(name)
-            wcs = frame.wcs
-
-            # Get the masks
-            truncation_mask = self.get_truncation_mask(wcs)
-            clip_mask = self.get_significance_mask(frame, errors)
-
-            # Add the masks
-            self.truncation_masks[name] = truncation_mask
-            self.clip_masks[name] = clip_mask
+        return self.dataset.get_wcs(name)
 
     # -----------------------------------------------------------------
 
     def get_masks(self, name):
 
         """
-        This function ...
+        This function creates the truncation mask and the significance (clip) mask of an image
         :param name:
         :return:
         """
 
-        return [self.truncation_masks[name], self.clip_masks[name]]
+        # Get frame and error map
+        frame = self.get_frame(name)
+        errors = self.dataset.get_errormap(name)
+
+        # Get the masks
+        truncation_mask = self.get_truncation_mask(frame.wcs)
+        clip_mask = self.get_significance_mask(frame, errors)
+        return truncation_mask, clip_mask
 
     # -----------------------------------------------------------------
 
@@ -403,7 +379,7 @@ class PhotoMeter(PhotometryComponent):
         log.info("Applying the masks to the images ...")
 
         # Loop over all the images
-        for name in self.images:
+        for name in self.image_names:
 
             # Masks already in created image
             if self.has_image(name): continue
@@ -418,8 +394,7 @@ class PhotoMeter(PhotometryComponent):
             fltr = self.get_filter(name)
 
             # Get masks
-            truncation_mask = self.truncation_masks[name]
-            clip_mask = self.clip_masks[name]
+            truncation_mask, clip_mask = self.get_masks(name)
 
             # Create total mask
             mask = union(truncation_mask, clip_mask)
@@ -452,8 +427,11 @@ class PhotoMeter(PhotometryComponent):
             image.add_mask(truncation_mask, "truncation")
             image.add_mask(clip_mask, "clip")
 
-            # Set the image
-            self.images[name] = image
+            # Write the image (through a temporary file, so that an interrupted run never leaves a partial image)
+            with fs.atomic_write(self.get_path_for_image(name)) as temp_path: image.saveto(temp_path)
+
+            # Release the image and the frame: the image is loaded from file when it is used
+            self.images[name] = name
 
     # -----------------------------------------------------------------
 
@@ -527,40 +505,83 @@ class PhotoMeter(PhotometryComponent):
         # Inform the user
         log.info("Calculating the aperture fluxes ...")
 
-        # Loop over all the images
-        for name in self.images:
+        # Get the fluxes that have already been calculated
+        fluxes = self.load_flux_checkpoint()
 
-            # Already has fluxes
-            if self.has_fluxes_for_image(name): continue
+        # Determine the images for which the fluxes have to be calculated
+        names = [name for name in self.image_names if not self.has_fluxes_for_image(name) and name not in fluxes]
+        paths = dict((self.get_path_for_image(name), name) for name in names)
+
+        # Calculate the fluxes from the primary and background frames and the truncation mask, in parallel
+        for path, image_fluxes in calculate_image_fluxes(paths.keys(), nprocesses=self.config.nprocesses):
 
             # Debugging
-            log.debug("Calculating the flux in the " + name + " image ...")
+            name = paths[path]
+            log.debug("Calculated the flux in the " + name + " image")
 
-            # Get the image
-            image = self.get_image(name)
+            # Add to the checkpoint
+            fluxes[name] = image_fluxes
+            fs.append_line(self.flux_checkpoint_path, name + " " + " ".join(repr(float(flux)) for flux in image_fluxes))
 
-            # Get the filter
-            fltr = self.get_filter(name)
+        # Add the fluxes
+        for name in self.image_names:
+            if self.has_fluxes_for_image(name): continue
+            flux, truncated, asymptotic = fluxes[name]
+            self.add_fluxes(self.get_filter(name), flux, truncated, asymptotic)
+
+    # -----------------------------------------------------------------
+
+    @property
+    def flux_checkpoint_path(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        return fs.join(self.phot_path, "fluxes_checkpoint.dat")
+
+    # -----------------------------------------------------------------
 
-            # Get the truncated frame and the background frame
-            frame = image.primary
-            background = image.frames["background"]
+    def load_flux_checkpoint(self):
 
-            # Calculate proper flux
-            flux = frame.sum()
+        """
+        This function loads the fluxes (flux, truncated and asymptotic) of the images that were finished before
+        (except for the images that have to be reprocessed)
+        :return:
+        """
 
-            # Calculate the flux in the background frame
-            background_flux = background.sum()
+        fluxes = dict()
+        if not fs.is_file(self.flux_checkpoint_path): return fluxes
+        for line in fs.read_lines(self.flux_checkpoint_path):
+            if not line: continue
+            name, flux, truncated, asymptotic = line.rsplit(" ", 3)
+            if self.reprocess_image(name): continue
+            fluxes[name] = (float(flux), float(truncated), float(asymptotic))
+        return fluxes
 
-            # Get truncation mask
-            truncation_mask = image.masks["truncation"]
+    # -----------------------------------------------------------------
 
-            # Calculate the truncated background flux
-            background = background.applied_mask_nans(truncation_mask)
-            truncated_background_flux = background.sum()
+    def get_curve_of_growth(self, name, nbins=50):
 
-            # Add the fluxes
-            self.add_fluxes(fltr, flux, flux + truncated_background_flux, flux + background_flux, )
+        """
+        This function returns the curve of growth of an image within the truncation ellipse
+        :param name:
+        :param nbins:
+        :return: the radii (semimajor axes in pixels) and the flux within each radius
+        """
+
+        # Get the truncated frame
+        image = self.images[name]
+        frame = image.primary if isinstance(image, Image) else image
+
+        # Get the truncation ellipse in pixel coordinates
+        ellipse = self.truncation_ellipse.to_pixel(frame.wcs)
+        ratio = ellipse.radius.y / ellipse.radius.x
+
+        # Create the radial bins, and calculate the cumulative flux
+        bins = RadialBins.from_ellipse(frame.shape, ellipse.center, ratio, ellipse.angle, nbins, min_distance=0.0, max_distance=ellipse.radius.x)
+        return bins.upper, bins.curve_of_growth(frame.data)
 
     # -----------------------------------------------------------------
 
@@ -756,9 +777,6 @@ class PhotoMeter(PhotometryComponent):
         # Inform the user
         log.info("Writing ...")
 
-        # Write the images
-        self.write_images()
-
         # Write SED table
         if not self.has_sed: self.write_sed()
 
@@ -768,6 +786,9 @@ class PhotoMeter(PhotometryComponent):
         # Truncated SED
         if not self.has_truncated_sed: self.write_truncated_sed()
 
+        # Remove the flux checkpoint (the fluxes are in the SEDs)
+        if fs.is_file(self.flux_checkpoint_path): fs.remove_file(self.flux_checkpoint_path)
+
         # Write the differences
         self.write_differences()
 
@@ -809,24 +830,7 @@ class PhotoMeter(PhotometryComponent):
         :return:
         """
 
-        path = self.get_path_for_image(name)
-        if self.reprocess_image(name):
-            if fs.is_file(path): fs.remove_file(path)
-            return False
-        else: return fs.is_file(path)
-
-    # -----------------------------------------------------------------
-
-    def load_image(self, name):
-
-        """
-        This function ..
-        :param name:
-        :return:
-        """
-
-        path = self.get_path_for_image(name)
-        return Image.from_file(path)
+        return fs.is_file(self.get_path_for_image(name))
 
     # -----------------------------------------------------------------
 
@@ -844,30 +848,6 @@ class PhotoMeter(PhotometryComponent):
 
     # -----------------------------------------------------------------
 
-    def write_images(self):
-
-        """
-        This function ...
-        :return:
-        """
-
-        # Inform the user
-        log.info("Writing the images ...")
-
-        # Loop over the images
-        for name in self.image_names:
-
-            # Check
-            if self.has_image(name): continue
-
-            # Get path
-            path = self.get_path_for_image(name)
-
-            # SAve
-            self.images[name].saveto(path)
-
-    # -----------------------------------------------------------------
-
     @property
     def sed_path(self):
 
@@ -1058,6 +1038,9 @@ class PhotoMeter(PhotometryComponent):
         # Plot the SED with the alternative SEDs
         self.plot_sed_with_alternative()
 
+        # Plot the curves of growth
+        if self.config.plot_curves_of_growth: self.plot_curves_of_growth()
+
     # -----------------------------------------------------------------
 
     def plot_sed(self):
@@ -1135,6 +1118,31 @@ class PhotoMeter(PhotometryComponent):
 
     # -----------------------------------------------------------------
 
+    def plot_curves_of_growth(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Plotting the curves of growth ...")
+
+        # Loop over the images
+        for name in self.images:
+
+            # Get the curve of growth
+            radii, fluxes = self.get_curve_of_growth(name)
+
+            # Plot
+            path = fs.join(self.phot_path, "curve_of_growth_" + name + ".pdf")
+            plotting.plot_xy(radii, fluxes, title=name, path=path)
+
+            # Release the image
+            self.images[name] = name
+
+    # -----------------------------------------------------------------
+
     def noise_path_for_image(self, name):
 
         """
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import os
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.tools import filesystem as fs
+from pts.core.units.parsing import parse_unit as u
+from pts.modeling.fitting.tables import ParametersTable, ChiSquaredTable
+from pts.modeling.fitting.history import FittingHistory
+
+# -----------------------------------------------------------------
+
+description = "testing the fitting history with the parameters and chi squared tables of a mock fitting run"
+
+# -----------------------------------------------------------------
+
+class MockFittingRun(object):
+
+    """
+    This class has the properties and functions of a fitting run that are used by the fitting history
+    """
+
+    def __init__(self, path):
+
+        """
+        The constructor ...
+        :param path:
+        """
+
+        self.path = path
+        self.history_path = fs.join(path, "history.npz")
+        self.free_parameter_labels = ["dust_mass", "fuv_young"]
+        self.parameter_units = {"dust_mass": u("Msun"), "fuv_young": None}
+        self.fitting_filter_names = ["SDSS r", "Pacs 160"]
+        self.finished_generations = []
+
+    # -----------------------------------------------------------------
+
+    def chi_squared_table_path_for_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return fs.join(self.path, generation_name + "_chi_squared.dat")
+
+    # -----------------------------------------------------------------
+
+    def parameters_table_path_for_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return fs.join(self.path, generation_name + "_parameters.dat")
+
+    # -----------------------------------------------------------------
+
+    def chi_squared_table_for_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return ChiSquaredTable.from_file(self.chi_squared_table_path_for_generation(generation_name))
+
+    # -----------------------------------------------------------------
+
+    def parameters_table_for_generation(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        return ParametersTable.from_file(self.parameters_table_path_for_generation(generation_name))
+
+    # -----------------------------------------------------------------
+
+    def flux_differences_path_for_simulation(self, generation_name, simulation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :param simulation_name:
+        :return:
+        """
+
+        # The models are not analysed
+        return fs.join(self.path, generation_name, simulation_name, "differences.dat")
+
+# -----------------------------------------------------------------
+
+class FittingHistoryTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(FittingHistoryTest, self).__init__(*args, **kwargs)
+
+        # The mock fitting run
+        self.fitting_run = None
+
+        # The simulation names, parameter values (dust mass, FUV luminosity) and chi squared values, per generation
+        self.models = dict()
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the tables of the generations
+        self.create()
+
+        # 3. Test the history that is stored
+        self.test_store()
+
+        # 4. Test the update of a generation of which the tables are modified
+        self.test_refresh()
+
+        # 5. Test the probabilities and the best model
+        self.test_probabilities()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(FittingHistoryTest, self).setup(**kwargs)
+
+        # Create the fitting run
+        self.fitting_run = MockFittingRun(self.path)
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the tables of the generations ...")
+
+        # Values that recur in both generations
+        self.models["initial"] = [("initial_0", 1e7, 1.0, 4.0), ("initial_1", 2e7, 1.0, 2.0), ("initial_2", 1e7, 2.0, 3.0), ("initial_3", 3e7, 2.0, 6.0)]
+        self.models["generation1"] = [("generation1_0", 2e7, 2.0, 0.5), ("generation1_1", 2e7, 3.0, 1.0), ("generation1_2", 3e7, 1.0, 5.0)]
+
+        # Write the tables
+        for generation_name in ["initial", "generation1"]: self.write_tables(generation_name)
+        self.fitting_run.finished_generations = ["initial", "generation1"]
+
+    # -----------------------------------------------------------------
+
+    def write_tables(self, generation_name):
+
+        """
+        This function ...
+        :param generation_name:
+        :return:
+        """
+
+        parameters_table = ParametersTable(parameters=self.fitting_run.free_parameter_labels, units={"dust_mass": u("Msun")})
+        chi_squared_table = ChiSquaredTable()
+
+        # Add the models, in a different order in the two tables
+        for simulation_name, dust_mass, fuv_young, chi_squared in self.models[generation_name]:
+            parameters_table.add_entry(simulation_name, {"dust_mass": dust_mass * u("Msun"), "fuv_young": fuv_young})
+        for simulation_name, dust_mass, fuv_young, chi_squared in reversed(self.models[generation_name]):
+            chi_squared_table.add_entry(simulation_name, chi_squared)
+
+        # Save
+        parameters_table.saveto(self.fitting_run.parameters_table_path_for_generation(generation_name))
+        chi_squared_table.saveto(self.fitting_run.chi_squared_table_path_for_generation(generation_name))
+
+    # -----------------------------------------------------------------
+
+    def check_models(self, history):
+
+        """
+        This function ...
+        :param history:
+        :return:
+        """
+
+        for generation_name in self.models:
+
+            if history.nmodels_in_generation(generation_name) != len(self.models[generation_name]): raise RuntimeError("The number of models of generation '" + generation_name + "' is wrong")
+
+            for simulation_name, dust_mass, fuv_young, chi_squared in self.models[generation_name]:
+
+                index = history.index_for_simulation(simulation_name)
+                if history.generation_names[history.generation_indices[index]] != generation_name: raise RuntimeError("The generation of simulation '" + simulation_name + "' is wrong")
+                if history.chi_squared[index] != chi_squared: raise RuntimeError("The chi squared value of simulation '" + simulation_name + "' is wrong")
+                values = history.parameter_values_for_simulation(simulation_name)
+                if values["dust_mass"].to("Msun").value != dust_mass or values["fuv_young"] != fuv_young: raise RuntimeError("The parameter values of simulation '" + simulation_name + "' are wrong")
+
+            # Not analysed
+            if not np.all(np.isnan(history.differences[history.indices_for_generation(generation_name)])): raise RuntimeError("The flux differences of generation '" + generation_name + "' are set")
+
+    # -----------------------------------------------------------------
+
+    def test_store(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the history that is stored ...")
+
+        # Create the history
+        history = FittingHistory.for_fitting_run(self.fitting_run)
+        if not fs.is_file(self.fitting_run.history_path): raise RuntimeError("The history is not saved")
+        self.check_models(history)
+
+        # Load the history
+        loaded = FittingHistory.from_file(self.fitting_run.history_path)
+        if loaded.generation_names != history.generation_names or loaded.parameter_labels != history.parameter_labels or loaded.filter_names != history.filter_names: raise RuntimeError("The loaded history has different generations, parameters or filters")
+        if loaded.units != history.units or loaded.table_stamps != history.table_stamps: raise RuntimeError("The loaded history has different units or table stamps")
+        if not np.array_equal(loaded.simulation_names, history.simulation_names) or not np.array_equal(loaded.parameter_values, history.parameter_values) or not np.array_equal(loaded.chi_squared, history.chi_squared): raise RuntimeError("The loaded history has different models")
+        self.check_models(loaded)
+
+        # Nothing is changed: the history is not updated
+        if loaded.update(self.fitting_run): raise RuntimeError("The history is updated while the tables are not modified")
+
+    # -----------------------------------------------------------------
+
+    def test_refresh(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the update of a generation of which the tables are modified ...")
+
+        # Change the chi squared values of the last generation
+        self.models["generation1"] = [(name, dust_mass, fuv_young, chi_squared + 1.) for name, dust_mass, fuv_young, chi_squared in self.models["generation1"]]
+        self.write_tables("generation1")
+
+        # Make sure the modification time is different from the stamp
+        path = self.fitting_run.chi_squared_table_path_for_generation("generation1")
+        mtime = os.path.getmtime(path) + 10.
+        os.utime(path, (mtime, mtime))
+
+        # The generation is replaced
+        history = FittingHistory.for_fitting_run(self.fitting_run)
+        if history.table_stamps["generation1"][0] != mtime: raise RuntimeError("The modification time of the table is not stamped")
+        self.check_models(history)
+
+        # The updated history is saved
+        self.check_models(FittingHistory.from_file(self.fitting_run.history_path))
+
+    # -----------------------------------------------------------------
+
+    def test_probabilities(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Testing the probabilities and the best model ...")
+
+        history = FittingHistory.for_fitting_run(self.fitting_run, update=False)
+
+        for generation_names in [None, ["initial"], ["generation1"]]:
+
+            # The models
+            models = [model for name in (generation_names if generation_names is not None else self.models.keys()) for model in self.models[name]]
+
+            # Combined probabilities of the unique parameter values
+            for label, column in [("dust_mass", 1), ("fuv_young", 2)]:
+
+                expected = dict()
+                for model in models: expected[model[column]] = expected.get(model[column], 0.) + np.exp(-0.5 * model[3])
+
+                values, probabilities = history.parameter_probabilities(label, generation_names=generation_names)
+                if list(values) != sorted(expected.keys()): raise RuntimeError("The values of the '" + label + "' parameter are wrong")
+                if not np.allclose(probabilities, [expected[value] for value in sorted(expected.keys())], rtol=1e-12): raise RuntimeError("The probabilities of the '" + label + "' parameter are wrong")
+
+            # The best model
+            best = min(models, key=lambda model: model[3])
+            model = history.best_model(generation_names=generation_names)
+            if model.simulation_name != best[0] or model.chi_squared != best[3]: raise RuntimeError("The best model is wrong")
+            if model.parameter_values["dust_mass"].to("Msun").value != best[1] or model.parameter_values["fuv_young"] != best[2]: raise RuntimeError("The parameter values of the best model are wrong")
+
+        # No models
+        if history.best_model(generation_names=["generation2"]) is not None: raise RuntimeError("There is a best model for a generation without models")
+
+# -----------------------------------------------------------------
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# *****************************************************************
+# **       PTS -- Python Toolkit for working with SKIRT          **
+# **       © Astronomical Observatory, Ghent University          **
+# *****************************************************************
+
+# Ensure Python 3 compatibility
+from __future__ import absolute_import, division, print_function
+
+# Import standard modules
+import numpy as np
+
+# Import the relevant PTS classes and modules
+from pts.core.test.implementation import TestImplementation
+from pts.core.basics.log import log
+from pts.core.basics.map import Map
+from pts.core.tools import filesystem as fs
+from pts.core.filter.filter import parse_filter
+from pts.core.data.sed import ObservedSED
+from pts.magic.core.frame import Frame
+from pts.magic.core.mask import Mask
+from pts.magic.core.image import Image
+from pts.magic.photometry.imagefluxes import fluxes_from_planes
+from pts.modeling.photometry.photometry import PhotoMeter
+
+# -----------------------------------------------------------------
+
+description = "testing the photometry with images with masks and fluxes from a previous (interrupted) run"
+
+# -----------------------------------------------------------------
+
+class PhotometryCheckpointTest(TestImplementation):
+
+    """
+    This class ...
+    """
+
+    def __init__(self, *args, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        """
+
+        # Call the constructor of the base class
+        super(PhotometryCheckpointTest, self).__init__(*args, **kwargs)
+
+        # The photometer
+        self.photometer = None
+
+        # The image names and the expected fluxes
+        self.names = ["SDSS r", "2MASS H", "IRAC I1"]
+        self.fluxes = dict()
+
+        # The fluxes in the checkpoint
+        self.checkpoint_name = "2MASS H"
+        self.checkpoint_fluxes = (1.5, 2.5, 3.5)
+
+    # -----------------------------------------------------------------
+
+    def run(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # 1. Call the setup function
+        self.setup(**kwargs)
+
+        # 2. Create the images with masks and the checkpoint
+        self.create()
+
+        # 3. Calculate the fluxes
+        self.calculate()
+
+        # 4. Check
+        self.check()
+
+    # -----------------------------------------------------------------
+
+    def setup(self, **kwargs):
+
+        """
+        This function ...
+        :param kwargs:
+        :return:
+        """
+
+        # Call the setup function of the base class
+        super(PhotometryCheckpointTest, self).setup(**kwargs)
+
+        # Create the photometer, with the paths of the modeling environment
+        self.photometer = PhotoMeter(no_config=True)
+        self.photometer.config = Map(reprocess=None, nprocesses=2)
+        phot_path = fs.create_directory_in(self.path, "phot")
+        self.photometer.environment = Map(phot_path=phot_path, phot_images_path=fs.create_directory_in(phot_path, "images"))
+
+        # Create the SEDs
+        self.photometer.sed = ObservedSED(photometry_unit="Jy")
+        self.photometer.asymptotic_sed = ObservedSED(photometry_unit="Jy")
+        self.photometer.truncated_sed = ObservedSED(photometry_unit="Jy")
+
+    # -----------------------------------------------------------------
+
+    def create(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Creating the images with masks and the flux checkpoint ...")
+
+        np.random.seed(42)
+        y, x = np.mgrid[0:40, 0:50]
+        truncation = ((x - 25.)**2 / 15.**2 + (y - 20.)**2 / 10.**2) > 1.
+
+        # Create the images
+        for name in self.names:
+
+            data = np.random.lognormal(size=(40, 50))
+            clip = np.random.random(data.shape) < 0.1
+            mask = truncation | clip
+
+            # Create the image like the photometer does
+            primary = Frame(data.copy())
+            primary[mask] = np.nan
+            background = Frame(data.copy())
+            background[~mask] = np.nan
+            image = Image()
+            image.add_frame(primary, "primary")
+            image.add_frame(background, "background")
+            image.add_mask(Mask(truncation), "truncation")
+            image.add_mask(Mask(clip), "clip")
+            image.saveto(self.photometer.get_path_for_image(name))
+            self.fluxes[name] = fluxes_from_planes(primary.data, background.data, truncation)
+
+            # Add the image, to be loaded when it is used
+            self.photometer.images[name] = name
+            self.photometer.filters[name] = parse_filter(name)
+
+        # Create the checkpoint
+        fs.append_line(self.photometer.flux_checkpoint_path, self.checkpoint_name + " " + " ".join(repr(flux) for flux in self.checkpoint_fluxes))
+
+    # -----------------------------------------------------------------
+
+    def calculate(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Calculating the fluxes ...")
+
+        # All images are created: no masks have to be applied
+        if not self.photometer.has_all_images: raise RuntimeError("The images with masks are not found")
+
+        # Calculate the fluxes
+        self.photometer.calculate_fluxes()
+
+    # -----------------------------------------------------------------
+
+    def check(self):
+
+        """
+        This function ...
+        :return:
+        """
+
+        # Inform the user
+        log.info("Checking the fluxes ...")
+
+        # The images should not have been loaded
+        if any(self.photometer.images.evaluated[name] for name in self.names): raise RuntimeError("The images are loaded to calculate the fluxes")
+
+        # Check the fluxes
+        for name in self.names:
+
+            expected = self.checkpoint_fluxes if name == self.checkpoint_name else self.fluxes[name]
+            fluxes = [self.photometer.get_flux(name), self.photometer.get_truncated_flux(name), self.photometer.get_asymptotic_flux(name)]
+            if not np.allclose([flux.to("Jy").value for flux in fluxes], expected, rtol=1e-12): raise RuntimeError("The fluxes of the " + name + " image are wrong")
+
+        # The calculated fluxes are added to the checkpoint
+        lines = [line for line in fs.read_lines(self.photometer.flux_checkpoint_path) if line]
+        if len(lines) != len(self.names): raise RuntimeError("The fluxes are not added to the checkpoint")
+        if self.photometer.load_flux_checkpoint()[self.checkpoint_name] != self.checkpoint_fluxes: raise RuntimeError("The fluxes in the checkpoint are changed")
+
+        # Load an image with masks
+        image = self.photometer.get_image(self.names[0])
+        if "truncation" not in image.masks or "clip" not in image.masks: raise RuntimeError("The masks of the image are not loaded")
+        if not np.array_equal(np.isnan(image.frames["background"].data), ~(np.asarray(image.masks["truncation"]) | np.asarray(image.masks["clip"]))): raise RuntimeError("The background frame of the image is wrong")
+
+# -----------------------------------------------------------------
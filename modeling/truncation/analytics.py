@@ -23,10 +23,7 @@ from ...magic.region.list import SkyRegionList, PixelRegionList
 from .component import TruncationComponent
 from ...core.tools import filesystem as fs
 from ...core.basics.log import log
-from ...magic.dist_ellipse import distance_ellipse
-from ...core.basics.range import RealRange
-from ...core.basics.map import Map
-from ...magic.core.mask import intersection
+from ...magic.core.radialprofile import RadialBins, truncation_statistics_for_images
 from ...core.units.parsing import parse_quantity
 from pts.core.tools.utils import lazyproperty
 
@@ -226,7 +223,11 @@ class TruncationAnalyticsCalculator(TruncationComponent):
         # Determine the ratio of semimajor and semiminor
         ratio = semiminor / semimajor
 
+        # The radial bins, shared by the images with the same shape and center pixel
+        bins = dict()
+
         # Loop over all prepared images
+        arguments = []
         for name in self.frames.names:
 
             # Get the image
@@ -238,65 +239,19 @@ class TruncationAnalyticsCalculator(TruncationComponent):
             # Convert center to pixel coordinates
             center_pix = center.to_pixel(frame.wcs)
 
-            # Create distance ellipse frame
-            distance_frame = distance_ellipse(frame.shape, center_pix, ratio, angle)
-
-            radius_list = []
-            signal_to_noise_list = []
-            nmasked_list = []
-
-            # Loop over the radii
-            min_distance = np.min(distance_frame)
-            max_distance = np.max(distance_frame)
-            step = (max_distance - min_distance) / float(self.config.nbins)
-
-            # Set the first range
-            radius_range = RealRange(min_distance, min_distance + step)
-
-            # Loop, shifting ranges of radius
-            while True:
-
-                # Check the range
-                if radius_range.min > max_distance: break
-
-                # Get the average radius
-                radius_center = radius_range.center
-
-                above_min_mask = distance_frame >= radius_range.min
-                below_max_mask = distance_frame < radius_range.max
-
-                # Make a mask of the pixels corresponding to the current radius range
-                #range_mask = radius_range.min <= distance_frame < radius_range.max
-
-                range_mask = intersection(above_min_mask, below_max_mask)
-
-                # Calculate the mean signal to noise in the pixels
-                signal_to_noises = self.frames[name][range_mask] / self.errormaps[name][range_mask]
-
-                # Calcalute the mean signal to noise
-                signal_to_noise = np.mean(signal_to_noises)
-
-                # Make a mask of all the pixels below the center radius
-                below_mask = distance_frame < radius_center
-
-                # Calculate the number of masked pixels
-                nmasked = np.sum(mask[below_mask])
-                ntotal = np.sum(below_mask)
-                rel_nmasked = nmasked / ntotal
+            # Create the radial bins (from the distance ellipse frame)
+            key = (frame.shape, center_pix.x, center_pix.y)
+            if key not in bins: bins[key] = RadialBins.from_ellipse(frame.shape, center_pix, ratio, angle, self.config.nbins)
 
-                # Add point
-                radius_list.append(radius_center)
-                signal_to_noise_list.append(signal_to_noise)
-                nmasked_list.append(rel_nmasked)
+            # Add the arguments
+            mask_data = mask.data if mask is not None else None
+            arguments.append((bins[key], self.frames[name].data, self.errormaps[name].data, mask_data))
 
-                # Shift the range
-                radius_range += step
+        # Calculate the statistics for all images
+        all_statistics = truncation_statistics_for_images(arguments, nprocesses=self.config.nprocesses)
+        for name, statistics in zip(self.frames.names, all_statistics):
 
             # Set the statistics for this image
-            statistics = Map()
-            statistics.radii = radius_list
-            statistics.snr = signal_to_noise_list
-            statistics.nmasked = nmasked_list
             self.statistics[name] = statistics
 
     # -----------------------------------------------------------------